@@ -7,6 +7,7 @@
 */
 #pragma once
 
+#include <memory>
 #include <vector>
 
 namespace tiny_dnn {
@@ -37,4 +38,76 @@ TEST(selu, gradient_check) {
   }
 }
 
+TEST(softmax, gradient_check) {
+  const size_t dim = 10;
+  softmax_layer sft(dim);
+  std::vector<tensor_t> input_data = generate_test_data({1}, {dim});
+  std::vector<tensor_t> out_data   = generate_test_data({1}, {dim});
+  std::vector<tensor_t> out_grad   = generate_test_data({1}, {dim});
+  const size_t trials              = 100;
+  for (size_t i = 0; i < trials; i++) {
+    const size_t in_idx  = uniform_idx(input_data[0][0]);
+    const size_t out_idx = uniform_idx(out_data[0][0]);
+    float_t ngrad =
+      numeric_gradient(sft, input_data, 0, in_idx, out_data, 0, out_idx);
+    float_t cgrad = analytical_gradient(sft, input_data, 0, in_idx, out_data,
+                                        out_grad, 0, out_idx);
+    EXPECT_NEAR(ngrad, cgrad, epsilon<float_t>());
+  }
+}
+
+TEST(softmax, fused_cross_entropy_gradient_check) {
+  // bprop skips the softmax jacobian for cross_entropy_multiclass
+  network<sequential> nn;
+  nn << fully_connected_layer(10, 5) << softmax_layer();
+
+  const auto test_data = generate_gradient_check_data(nn.in_data_size());
+  nn.init_weight();
+
+  EXPECT_TRUE(nn.gradient_check<cross_entropy_multiclass>(
+    test_data.first, test_data.second, epsilon<float_t>(), GRAD_CHECK_ALL));
+}
+
+TEST(softmax, fused_cross_entropy_gradient_check_graph) {
+  // the output layer of a graph is fused, whatever its position in the
+  // node list
+  auto in  = std::make_shared<input_layer>(shape3d(10, 1, 1));
+  auto fc  = std::make_shared<fully_connected_layer>(10, 5);
+  auto out = std::make_shared<softmax_layer>(5);
+  in << fc << out;
+
+  network<graph> nn;
+  construct_graph(nn, {in}, {out});
+
+  const auto test_data = generate_gradient_check_data(nn.in_data_size());
+  nn.init_weight();
+
+  EXPECT_TRUE(nn.gradient_check<cross_entropy_multiclass>(
+    test_data.first, test_data.second, epsilon<float_t>(), GRAD_CHECK_ALL));
+  EXPECT_TRUE(nn.gradient_check<mse>(test_data.first, test_data.second,
+                                     epsilon<float_t>(), GRAD_CHECK_ALL));
+}
+
+TEST(softmax, fused_cross_entropy_gradient) {
+  // y * sum(t) - t, what -t / y through the softmax jacobian gives
+  const vec_t y = {0.7, 0.2, 0.1};
+  const vec_t t = {1, 0, 0};
+  const vec_t c = {2, 1, 1};
+
+  auto d = softmax_cross_entropy_gradient({tensor_t{y}}, {tensor_t{t}},
+                                          std::vector<tensor_t>());
+  EXPECT_NEAR(float_t(-0.3), d[0][0][0], 1e-6);
+  EXPECT_NEAR(float_t(0.2), d[0][0][1], 1e-6);
+  EXPECT_NEAR(float_t(0.1), d[0][0][2], 1e-6);
+
+  softmax_layer sft(3);
+  vec_t dy = cross_entropy_multiclass::df(y, t), dx(3);
+  for (size_t i = 0; i < 3; i++) dy[i] *= c[i];
+  sft.backward_activation(vec_t(3), y, dx, dy);
+
+  d = softmax_cross_entropy_gradient({tensor_t{y}}, {tensor_t{t}},
+                                     {tensor_t{c}});
+  for (size_t i = 0; i < 3; i++) EXPECT_NEAR(dx[i], d[0][0][i], 1e-6);
+}
+
 }  // namespace tiny_dnn
@@ -70,6 +70,58 @@ TEST(ave_pool, forward_stride) {
   }
 }
 
+TEST(ave_pool, backward_overlapping) {
+  // an input shared by overlapping windows collects all of their gradients
+  average_pooling_layer l(4, 4, 1, 2, 1, false);
+  // clang-format off
+    vec_t in = {
+        0,  1,  2,  3,
+        8,  7,  5,  6,
+        4,  3,  1,  2,
+        0, -1, -2, -3
+    };
+
+    vec_t out_grad = {
+        1, 1, 1,
+        1, 1, 1,
+        1, 1, 1
+    };
+
+    vec_t in_grad_expected = {
+        0.25, 0.5, 0.5, 0.25,
+        0.5,  1.0, 1.0, 0.5,
+        0.5,  1.0, 1.0, 0.5,
+        0.25, 0.5, 0.5, 0.25
+    };
+  // clang-format on
+
+  l.weight_init(weight_init::constant(1.0));
+  l.bias_init(weight_init::constant(0.0));
+  l.init_weight();
+
+  std::vector<const tensor_t*> out;
+  l.forward({{in}}, out);
+  vec_t in_grad = l.backward(std::vector<tensor_t>{{out_grad}})[0][0];
+
+  for (size_t i = 0; i < in_grad.size(); i++) {
+    EXPECT_FLOAT_EQ(in_grad_expected[i], in_grad[i]);
+  }
+}
+
+TEST(ave_pool, gradient_check_overlapping) {
+  using loss_func = mse;
+  using network   = network<sequential>;
+
+  network nn;
+  nn << average_pooling_layer(6, 6, 2, 3, 3, 2, 2);  // 6x6 => 2x2
+
+  const auto test_data = generate_gradient_check_data(nn.in_data_size());
+  nn.init_weight();
+
+  EXPECT_TRUE(nn.gradient_check<loss_func>(test_data.first, test_data.second,
+                                           epsilon<float_t>(), GRAD_CHECK_ALL));
+}
+
 TEST(ave_pool, read_write) {
   average_pooling_layer l1(100, 100, 5, 2);
   average_pooling_layer l2(100, 100, 5, 2);
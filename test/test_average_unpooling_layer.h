@@ -103,6 +103,20 @@ TEST(ave_unpool, gradient_check) {
                                            epsilon<float_t>(), GRAD_CHECK_ALL));
 }
 
+TEST(ave_unpool, gradient_check_overlapping) {
+  using loss_func = mse;
+  using network   = network<sequential>;
+
+  network nn;
+  nn << average_unpooling_layer(3, 3, 2, 3, 2);  // 3x3 => 7x7
+
+  const auto test_data = generate_gradient_check_data(nn.in_data_size());
+  nn.init_weight();
+
+  EXPECT_TRUE(nn.gradient_check<loss_func>(test_data.first, test_data.second,
+                                           epsilon<float_t>(), GRAD_CHECK_ALL));
+}
+
 TEST(ave_unpool, read_write) {
   average_unpooling_layer l1(100, 100, 5, 2);
   average_unpooling_layer l2(100, 100, 5, 2);
@@ -247,6 +247,36 @@ TEST(batchnorm, forward) {
   }
 }
 
+TEST(batchnorm, fold_into_previous_layer) {
+  network<sequential> nn;
+  nn << convolutional_layer(6, 6, 3, 2, 4)  // 6x6x2 => 4x4x4
+     << batch_normalization_layer(16, 4) << linear_layer(64, 2.0, -0.5)
+     << relu_layer() << fully_connected_layer(64, 5)
+     << batch_normalization_layer(5, 1);
+  nn.init_weight();
+
+  vec_t mean(4), variance(4);
+  uniform_rand(mean.begin(), mean.end(), -1.0, 1.0);
+  uniform_rand(variance.begin(), variance.end(), 0.5, 2.0);
+  nn.at<batch_normalization_layer>(1).set_mean(mean);
+  nn.at<batch_normalization_layer>(1).set_variance(variance);
+  nn.at<batch_normalization_layer>(5).set_mean({0.5});
+  nn.at<batch_normalization_layer>(5).set_variance({3.0});
+  nn.set_netphase(net_phase::test);
+
+  vec_t in(72);
+  uniform_rand(in.begin(), in.end(), -1.0, 1.0);
+  const vec_t expected = nn.predict(in);
+
+  EXPECT_EQ(2u, nn.fold_batch_norm());
+  EXPECT_EQ(3u, nn.depth());
+
+  const vec_t actual = nn.predict(in);
+  for (size_t i = 0; i < expected.size(); i++) {
+    EXPECT_NEAR(expected[i], actual[i], 1e-5);
+  }
+}
+
 TEST(batchnorm, read_write) {
   batch_normalization_layer l1(100, 100);
   batch_normalization_layer l2(100, 100);
@@ -498,7 +498,263 @@ TEST(convolutional, bprop_avx_wstride) {
 
 #endif  // CNN_USE_AVX
 
+#ifdef CNN_USE_CBLAS
+TEST(convolutional, fprop_cblas) {
+  convolutional_layer l(9, 9, 3, 2, 4);
+
+  tensor_buf buf(l), buf2(l);
+
+  l.set_backend_type(tiny_dnn::core::backend_t::internal);
+  l.forward_propagation(buf.in_buf(), buf.out_buf());
+
+  l.set_backend_type(tiny_dnn::core::backend_t::cblas);
+  l.forward_propagation(buf.in_buf(), buf2.out_buf());
+
+  vec_t &out_cblas    = buf2.out_at(0)[0];
+  vec_t &out_internal = buf.out_at(0)[0];
+  for (size_t i = 0; i < out_cblas.size(); i++) {
+    EXPECT_NEAR(out_cblas[i], out_internal[i], 1E-5);
+  }
+}
+
+TEST(convolutional, bprop_cblas) {
+  convolutional_layer l(9, 9, 3, 2, 4);
+
+  tensor_buf data(l), grad1(l);
+  tensor_buf grad2(grad1);
+
+  l.set_backend_type(tiny_dnn::core::backend_t::internal);
+  l.forward_propagation(data.in_buf(), data.out_buf());
+  l.back_propagation(data.in_buf(), data.out_buf(), grad1.out_buf(),
+                     grad1.in_buf());
+
+  l.set_backend_type(tiny_dnn::core::backend_t::cblas);
+  l.forward_propagation(data.in_buf(), data.out_buf());
+  l.back_propagation(data.in_buf(), data.out_buf(), grad2.out_buf(),
+                     grad2.in_buf());
+
+  for (size_t ch = 0; ch < l.in_channels(); ch++) {
+    vec_t &out_internal = grad1.in_at(ch)[0];
+    vec_t &out_cblas    = grad2.in_at(ch)[0];
+    for (size_t i = 0; i < out_cblas.size(); i++) {
+      EXPECT_NEAR(out_cblas[i], out_internal[i], 1E-5);
+    }
+  }
+}
+#endif  // CNN_USE_CBLAS
+
 #ifdef CNN_USE_NNPACK
+TEST(convolutional, fprop_bprop_gemm) {
+  // the im2col + GEMM kernels must match the direct loops
+  core::conv_params params;
+  params.in         = shape3d(11, 9, 3);
+  params.in_padded  = params.in;
+  params.weight     = shape3d(3, 2, 3 * 10);
+  params.out        = shape3d(5, 8, 10);
+  params.w_stride   = 2;
+  params.h_stride   = 1;
+  params.w_dilation = 1;
+  params.h_dilation = 1;
+  params.has_bias   = true;
+
+  const size_t n = 3;
+  vec_t W(params.weight.size()), bias(params.out.depth_);
+  uniform_rand(W.begin(), W.end(), -1.0, 1.0);
+  uniform_rand(bias.begin(), bias.end(), -1.0, 1.0);
+
+  tensor_t in(n, vec_t(params.in.size()));
+  tensor_t delta(n, vec_t(params.out.size()));
+  for (size_t i = 0; i < n; i++) {
+    uniform_rand(in[i].begin(), in[i].end(), -1.0, 1.0);
+    uniform_rand(delta[i].begin(), delta[i].end(), -1.0, 1.0);
+  }
+
+  tensor_t out1(n, vec_t(params.out.size(), 0)), out2(out1);
+  kernels::conv2d_op_internal(in, W, bias, out1, params, true);
+  kernels::conv2d_op_gemm(in, W, bias, out2, params, true);
+
+  tensor_t dW1(2, vec_t(W.size(), 0)), dW2(dW1);
+  tensor_t db1(2, vec_t(bias.size(), 0)), db2(db1);
+  tensor_t prev_delta1(n, vec_t(params.in.size(), 0)), prev_delta2(prev_delta1);
+  kernels::conv2d_op_internal(in, W, dW1, db1, delta, prev_delta1, params,
+                              true);
+  kernels::conv2d_op_gemm(in, W, dW2, db2, delta, prev_delta2, params, true);
+
+  auto expect_near = [](const tensor_t &t1, const tensor_t &t2) {
+    for (size_t i = 0; i < t1.size(); i++) {
+      for (size_t j = 0; j < t1[i].size(); j++) {
+        EXPECT_NEAR(t1[i][j], t2[i][j], 1E-4);
+      }
+    }
+  };
+  expect_near(out1, out2);
+  expect_near(dW1, dW2);
+  expect_near(db1, db2);
+  expect_near(prev_delta1, prev_delta2);
+}
+
+TEST(convolutional, fprop_winograd) {
+  // F(2x2,3x3) and F(4x4,3x3) must match the direct loops, also when the
+  // output is not a multiple of the tile size
+  core::conv_params params;
+  params.in         = shape3d(13, 10, 5);
+  params.in_padded  = params.in;
+  params.weight     = shape3d(3, 3, 5 * 6);
+  params.out        = shape3d(11, 8, 6);
+  params.w_stride   = 1;
+  params.h_stride   = 1;
+  params.w_dilation = 1;
+  params.h_dilation = 1;
+  params.has_bias   = true;
+
+  const size_t n = 2;
+  vec_t W(params.weight.size()), bias(params.out.depth_);
+  uniform_rand(W.begin(), W.end(), -1.0, 1.0);
+  uniform_rand(bias.begin(), bias.end(), -1.0, 1.0);
+
+  tensor_t in(n, vec_t(params.in.size()));
+  for (size_t i = 0; i < n; i++) {
+    uniform_rand(in[i].begin(), in[i].end(), -1.0, 1.0);
+  }
+
+  tensor_t expected(n, vec_t(params.out.size(), 0));
+  kernels::conv2d_op_internal(in, W, bias, expected, params, true);
+
+  for (size_t tile : {2, 4}) {
+    kernels::conv2d_winograd_cache cache;
+    tensor_t out(n, vec_t(params.out.size(), 0));
+    kernels::conv2d_op_winograd(in, W, bias, out, params, tile, 1, cache,
+                                true);
+
+    for (size_t i = 0; i < n; i++) {
+      for (size_t j = 0; j < out[i].size(); j++) {
+        EXPECT_NEAR(expected[i][j], out[i][j], 1E-3);
+      }
+    }
+  }
+}
+
+TEST(convolutional, winograd_weights_shared) {
+  // the transformed weights are computed once per version of the weights
+  // and handed to every caller of the cache
+  core::conv_params params;
+  params.in         = shape3d(10, 10, 4);
+  params.in_padded  = params.in;
+  params.weight     = shape3d(3, 3, 4 * 4);
+  params.out        = shape3d(8, 8, 4);
+  params.w_stride   = 1;
+  params.h_stride   = 1;
+  params.w_dilation = 1;
+  params.h_dilation = 1;
+  params.has_bias   = false;
+
+  vec_t W(params.weight.size());
+  uniform_rand(W.begin(), W.end(), -1.0, 1.0);
+
+  kernels::conv2d_winograd_cache cache;
+  auto U1 = kernels::conv2d_winograd_weights(W, params, 2, 1, cache);
+  auto U2 = kernels::conv2d_winograd_weights(W, params, 2, 1, cache);
+  EXPECT_EQ(U1.get(), U2.get());
+
+  W[0] += float_t(1);
+  auto U3 = kernels::conv2d_winograd_weights(W, params, 2, 2, cache);
+  EXPECT_NE(U1.get(), U3.get());
+  EXPECT_NE((*U1)[0], (*U3)[0]);
+}
+
+TEST(convolutional, fprop_fft) {
+  // overlap-save FFT convolution must match the direct loops, with
+  // non-square kernels and several tiles per sample
+  core::conv_params params;
+  params.in         = shape3d(40, 23, 3);
+  params.in_padded  = params.in;
+  params.weight     = shape3d(7, 5, 3 * 4);
+  params.out        = shape3d(34, 19, 4);
+  params.w_stride   = 1;
+  params.h_stride   = 1;
+  params.w_dilation = 1;
+  params.h_dilation = 1;
+  params.has_bias   = true;
+
+  const size_t n = 2;
+  vec_t W(params.weight.size()), bias(params.out.depth_);
+  uniform_rand(W.begin(), W.end(), -1.0, 1.0);
+  uniform_rand(bias.begin(), bias.end(), -1.0, 1.0);
+
+  tensor_t in(n, vec_t(params.in.size()));
+  for (size_t i = 0; i < n; i++) {
+    uniform_rand(in[i].begin(), in[i].end(), -1.0, 1.0);
+  }
+
+  tensor_t expected(n, vec_t(params.out.size(), 0));
+  kernels::conv2d_op_internal(in, W, bias, expected, params, true);
+
+  // the second call runs with the cached kernel spectra, the third one
+  // recomputes them for a new version of the weights
+  kernels::conv2d_fft_cache cache;
+  for (size_t version : {1, 1, 2}) {
+    if (version == 2) {
+      uniform_rand(W.begin(), W.end(), -1.0, 1.0);
+      expected = tensor_t(n, vec_t(params.out.size(), 0));
+      kernels::conv2d_op_internal(in, W, bias, expected, params, true);
+    }
+    tensor_t out(n, vec_t(params.out.size(), 0));
+    kernels::conv2d_op_fft(in, W, bias, out, params, version, cache, true);
+
+    for (size_t j = 0; j < n; j++) {
+      for (size_t k = 0; k < out[j].size(); k++) {
+        EXPECT_NEAR(expected[j][k], out[j][k], 1E-3);
+      }
+    }
+  }
+}
+
+TEST(convolutional, weights_version) {
+  // the caches of transformed weights are keyed on the version of the
+  // weight edge, anything which may write the weights must change it
+  convolutional_layer l(8, 8, 3, 2, 4);
+  l.init_weight();
+
+  auto version = [&]() { return l.prev()[1]->data_version(); };
+  size_t v = version();
+
+  const layer &cl = l;
+  cl.weights();
+  EXPECT_EQ(v, version());
+
+  l.weights();
+  EXPECT_NE(v, version());
+  v = version();
+
+  l.init_weight();
+  EXPECT_NE(v, version());
+}
+
+TEST(convolutional, choose_algorithm) {
+  auto params = [](size_t in_size, size_t in_depth, size_t out_depth,
+                   size_t kernel, size_t stride) {
+    core::conv_params p;
+    size_t out_size = (in_size - kernel) / stride + 1;
+    p.in            = shape3d(in_size, in_size, in_depth);
+    p.in_padded     = p.in;
+    p.weight        = shape3d(kernel, kernel, in_depth * out_depth);
+    p.out           = shape3d(out_size, out_size, out_depth);
+    p.w_stride = p.h_stride = stride;
+    p.w_dilation = p.h_dilation = 1;
+    p.has_bias                  = true;
+    return p;
+  };
+
+  EXPECT_EQ(kernels::conv2d_algorithm::winograd,
+            kernels::conv2d_choose_algorithm(params(58, 64, 64, 3, 1)));
+  EXPECT_EQ(kernels::conv2d_algorithm::fft,
+            kernels::conv2d_choose_algorithm(params(128, 16, 16, 11, 1)));
+  EXPECT_EQ(kernels::conv2d_algorithm::gemm,
+            kernels::conv2d_choose_algorithm(params(64, 32, 32, 5, 2)));
+  EXPECT_EQ(kernels::conv2d_algorithm::direct,
+            kernels::conv2d_choose_algorithm(params(8, 1, 6, 5, 1)));
+}
+
 TEST(convolutional, fprop_nnp) {
   convolutional_layer<sigmoid> l(5, 5, 3, 1, 2, padding::valid, true, 1, 1,
                                  core::backend_t::nnpack);
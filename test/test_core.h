@@ -7,11 +7,16 @@
 */
 #pragma once
 
+#include <cstdlib>
 #include <map>
 #include <string>
 #include <utility>
 #include <vector>
 
+#ifdef __linux__
+#include <unistd.h>
+#endif
+
 #if defined(USE_OPENCL) || defined(USE_CUDA)
 #include "third_party/CLCudaAPI/clpp11.h"
 #endif  // defined(USE_OPENCL) || defined(USE_CUDA)
@@ -238,4 +243,135 @@ TEST(core, ocl_conv) {
   }
 }
 
+TEST(core, vectorize_isa_levels) {
+  // every kernel level the CPU can run must agree with the scalar one
+  const size_t M = 13, N = 37, K = 301;
+  vec_t A(M * K), B(K * N);
+  uniform_rand(A.begin(), A.end(), -1.0, 1.0);
+  uniform_rand(B.begin(), B.end(), -1.0, 1.0);
+
+  const auto &scalar = vectorize::detail::kernels_for<float_t>(
+    vectorize::isa::scalar);
+  vec_t expected(M * N, 0);
+  scalar.gemm(false, true, M, N, K, &A[0], K, &B[0], K, &expected[0], N);
+  const float_t expected_dot = scalar.dot(&A[1], &B[3], K - 5);
+
+  for (int l = 0; l <= static_cast<int>(vectorize::active_isa()); l++) {
+    const auto &k =
+      vectorize::detail::kernels_for<float_t>(static_cast<vectorize::isa>(l));
+    vec_t C(M * N, 0);
+    k.gemm(false, true, M, N, K, &A[0], K, &B[0], K, &C[0], N);
+    for (size_t i = 0; i < C.size(); i++) {
+      EXPECT_NEAR(expected[i], C[i], 1e-4);
+    }
+    EXPECT_NEAR(expected_dot, k.dot(&A[1], &B[3], K - 5), 1e-4);
+    EXPECT_NEAR(scalar.sum(&A[1], K - 5), k.sum(&A[1], K - 5), 1e-4);
+
+    vec_t filled(K + 2, float_t(0));
+    k.fill(&filled[1], K, float_t(0.5));
+    EXPECT_EQ(float_t(0), filled.front());
+    EXPECT_EQ(float_t(0), filled.back());
+    for (size_t i = 1; i <= K; i++) EXPECT_EQ(float_t(0.5), filled[i]);
+  }
+}
+
+TEST(core, vectorize_builds_only_active_tables) {
+  // the tables above the active level are compiled for instructions the
+  // CPU may lack, even building them could crash
+  vec_t x(100, float_t(1));
+  EXPECT_EQ(float_t(100), vectorize::dot(&x[0], &x[0], x.size()));
+
+  const unsigned built = vectorize::detail::built_kernel_tables();
+  const int active     = static_cast<int>(vectorize::active_isa());
+  for (int l = active + 1; l <= static_cast<int>(vectorize::isa::avx512);
+       l++) {
+    EXPECT_EQ(0u, built & (1u << l));
+  }
+}
+
+#if defined(__linux__) && defined(VECTORIZE_X86)
+TEST(core, vectorize_sse2_builds_no_avx_tables) {
+  // the tables of this process are built already, run the test above in a
+  // fresh one
+  char exe[4096];
+  const ssize_t len = readlink("/proc/self/exe", exe, sizeof(exe) - 1);
+  ASSERT_TRUE(len > 0);
+  exe[len] = '\0';
+
+  const std::string cmd = "TINYDNN_SIMD=sse2 '" + std::string(exe) +
+                          "' core_vectorize_builds_only_active_tables"
+                          " > /dev/null";
+  EXPECT_EQ(0, std::system(cmd.c_str()));
+}
+#endif
+
+TEST(core, vectorize_activations) {
+  // the polynomial exp/sigmoid/tanh/softplus of every level against libm,
+  // over a range that covers the saturated tails
+  const size_t n = 1003;
+  vec_t x(n), y(n);
+  for (size_t i = 0; i < n; i++) {
+    x[i] = float_t(-30) + float_t(60) * float_t(i) / float_t(n - 1);
+  }
+
+  for (int l = 0; l <= static_cast<int>(vectorize::active_isa()); l++) {
+    const auto &k =
+      vectorize::detail::kernels_for<float_t>(static_cast<vectorize::isa>(l));
+
+    k.exp(&x[0], n, &y[0]);
+    for (size_t i = 0; i < n; i++) {
+      EXPECT_NEAR(1, y[i] / std::exp(x[i]), 1e-5);
+    }
+    k.sigmoid(&x[0], n, &y[0]);
+    for (size_t i = 0; i < n; i++) {
+      EXPECT_NEAR(float_t(1) / (float_t(1) + std::exp(-x[i])), y[i], 1e-6);
+    }
+    k.tanh(&x[0], n, &y[0]);
+    for (size_t i = 0; i < n; i++) {
+      EXPECT_NEAR(std::tanh(x[i]), y[i], 1e-6);
+    }
+    k.softplus(&x[0], n, &y[0]);
+    for (size_t i = 0; i < n; i++) {
+      const float_t expected = std::log1p(std::exp(x[i]));
+      EXPECT_NEAR(expected, y[i], 1e-6 * std::max(float_t(1), expected));
+    }
+  }
+}
+
+TEST(core, vectorize_activations_special_values) {
+  // NaN passes through, infinities and results out of range saturate. 11
+  // values, so that some of them go through the padded tail register
+  const float_t inf = std::numeric_limits<float_t>::infinity();
+  const float_t nan = std::numeric_limits<float_t>::quiet_NaN();
+  const vec_t x     = {nan, inf, -inf, 1000, -1000, nan,
+                   inf, -inf, 1000, -1000, nan};
+  const size_t n    = x.size();
+  vec_t y(n);
+
+  auto expect = [&](const vec_t &values) {
+    for (size_t i = 0; i < n; i++) {
+      const float_t e = values[i % 5];
+      if (std::isnan(e)) {
+        EXPECT_TRUE(std::isnan(y[i]));
+      } else {
+        EXPECT_EQ(e, y[i]);
+      }
+    }
+  };
+
+  for (int l = 0; l <= static_cast<int>(vectorize::active_isa()); l++) {
+    const auto &k =
+      vectorize::detail::kernels_for<float_t>(static_cast<vectorize::isa>(l));
+
+    k.exp(&x[0], n, &y[0]);
+    expect({nan, inf, 0, inf, 0});
+    k.sigmoid(&x[0], n, &y[0]);
+    expect({nan, 1, 0, 1, 0});
+    k.tanh(&x[0], n, &y[0]);
+    expect({nan, 1, -1, 1, -1});
+    k.softplus(&x[0], n, &y[0]);
+    expect({nan, inf, 0, 1000, 0});
+  }
+}
+
 }  // namespace tiny_dnn
@@ -63,6 +63,131 @@ TEST(fully_connected, forward) {
   }
 }
 
+TEST(fully_connected, forward_single_sample_parallel) {
+  // a single sample is split over the output neurons
+  fully_connected_layer l(3, 37);
+  l.weight_init(weight_init::constant(1.0));
+  l.bias_init(weight_init::constant(0.5));
+
+  set_num_threads(4);
+  vec_t in = {1, 2, 3};
+  std::vector<const tensor_t *> o;
+  l.forward({{in}}, o);
+  set_num_threads(0);
+
+  for (auto v : (*o[0])[0]) {
+    EXPECT_FLOAT_EQ(float_t(6.5), v);
+  }
+}
+
+TEST(fully_connected, forward_batch) {
+  // the batch runs as one GEMM, with packed weights once they are frozen
+  const size_t in_size = 37, out_size = 53, n = 70;
+  fully_connected_layer l(in_size, out_size);
+  l.bias_init(weight_init::constant(0.5));
+
+  tensor_t in(n, vec_t(in_size));
+  for (auto &sample : in) {
+    uniform_rand(sample.begin(), sample.end(), -1.0, 1.0);
+  }
+
+  for (int frozen = 0; frozen < 2; frozen++) {
+    if (frozen) l.freeze_weights();
+
+    std::vector<const tensor_t *> o;
+    l.forward({in}, o);
+
+    const vec_t &W = *l.weights()[0];
+    for (size_t s = 0; s < n; s++) {
+      for (size_t i = 0; i < out_size; i++) {
+        float_t expected = float_t(0.5);
+        for (size_t c = 0; c < in_size; c++) {
+          expected += W[c * out_size + i] * in[s][c];
+        }
+        EXPECT_NEAR(expected, (*o[0])[s][i], 1E-4);
+      }
+    }
+  }
+}
+
+TEST(fully_connected, freeze_shares_packed_weights) {
+  // the weights are packed once by freeze_weights() of the source layer,
+  // a layer sharing them uses that packed copy instead of packing its own
+  const size_t in_size = 19, out_size = 23, n = 8;
+  fully_connected_layer src(in_size, out_size);
+  tensor_t in(n, vec_t(in_size));
+  for (auto &sample : in) {
+    uniform_rand(sample.begin(), sample.end(), -1.0, 1.0);
+  }
+
+  std::vector<const tensor_t *> o;
+  src.forward({in}, o);
+  const tensor_t expected = *o[0];
+  src.freeze_weights();
+
+  // not allowed once frozen, but shows which copy the layers read
+  vec_t &W = *src.weights()[0];
+  std::fill(W.begin(), W.end(), float_t(0));
+
+  fully_connected_layer ws(in_size, out_size);
+  ws.share_weights(src);
+  ws.freeze_weights();
+
+  for (layer *l : {static_cast<layer *>(&src), static_cast<layer *>(&ws)}) {
+    l->forward({in}, o);
+    for (size_t s = 0; s < n; s++) {
+      for (size_t i = 0; i < out_size; i++) {
+        EXPECT_NEAR(expected[s][i], (*o[0])[s][i], 1E-5);
+      }
+    }
+  }
+}
+
+TEST(fully_connected, backward_batch) {
+  // the batch runs as two GEMMs, with one dW/db accumulator per thread
+  const size_t in_size = 41, out_size = 29, n = 50;
+  fully_connected_layer l(in_size, out_size);
+
+  tensor_t in(n, vec_t(in_size)), delta(n, vec_t(out_size));
+  for (size_t s = 0; s < n; s++) {
+    uniform_rand(in[s].begin(), in[s].end(), -1.0, 1.0);
+    uniform_rand(delta[s].begin(), delta[s].end(), -1.0, 1.0);
+  }
+
+  set_num_threads(4);
+  std::vector<const tensor_t *> o;
+  l.forward({in}, o);
+  std::vector<tensor_t> grads = l.backward({delta});
+  set_num_threads(0);
+
+  const vec_t &W = *l.weights()[0];
+  for (size_t s = 0; s < n; s++) {
+    for (size_t c = 0; c < in_size; c++) {
+      float_t expected{0};
+      for (size_t i = 0; i < out_size; i++) {
+        expected += delta[s][i] * W[c * out_size + i];
+      }
+      EXPECT_NEAR(expected, grads[0][s][c], 1E-4);
+    }
+  }
+
+  for (size_t c = 0; c < in_size; c++) {
+    for (size_t i = 0; i < out_size; i++) {
+      float_t expected{0}, actual{0};
+      for (size_t s = 0; s < n; s++) expected += delta[s][i] * in[s][c];
+      for (auto &slot : grads[1]) actual += slot[c * out_size + i];
+      EXPECT_NEAR(expected, actual, 1E-4);
+    }
+  }
+
+  for (size_t i = 0; i < out_size; i++) {
+    float_t expected{0}, actual{0};
+    for (size_t s = 0; s < n; s++) expected += delta[s][i];
+    for (auto &slot : grads[2]) actual += slot[i];
+    EXPECT_NEAR(expected, actual, 1E-4);
+  }
+}
+
 void test_fully_connected_forward(core::backend_t backend) {
   fully_connected_layer l(4, 2, true, backend);
   EXPECT_EQ(l.in_channels(), 3u);  // in, W and b
@@ -94,6 +219,30 @@ TEST(fully_connected, forward_intel_mkl) {
 }
 #endif
 
+#ifdef CNN_USE_CBLAS
+TEST(fully_connected, forward_cblas) {
+  test_fully_connected_forward(core::backend_t::cblas);
+}
+
+TEST(fully_connected, forward_cblas_batch) {
+  // every sample of the batch goes through the GEMM, not just the first
+  fully_connected_layer l(4, 2, true, core::backend_t::cblas);
+  l.weight_init(weight_init::constant(1.0));
+  l.bias_init(weight_init::constant(0.5));
+
+  tensor_t in = {{0, 1, 2, 3}, {1, 1, 1, 1}, {2, 2, 2, 2}};
+  std::vector<const tensor_t *> o;
+  l.forward({in}, o);
+
+  vec_t out_expected = {6.5, 4.5, 8.5};
+  for (size_t s = 0; s < in.size(); s++) {
+    for (auto v : (*o[0])[s]) {
+      EXPECT_FLOAT_EQ(out_expected[s], v);
+    }
+  }
+}
+#endif
+
 #ifdef CNN_USE_AVX
 TEST(fully_connected, forward_avx) {
   test_fully_connected_forward(core::backend_t::avx);
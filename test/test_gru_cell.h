@@ -43,6 +43,62 @@ TEST(gru, blackbox_gradient_check) {
   }
 }
 
+TEST(gru, projected_inputs) {
+  // a step whose gate inputs from x were computed for the whole sequence
+  // matches a step which computes them itself
+  const size_t in_size  = 7;
+  const size_t out_size = 5;
+  const size_t batch    = 3;
+  const size_t seq_len  = 4;
+  core::gru_cell_params params;
+  params.in_size_  = in_size;
+  params.out_size_ = out_size;
+  params.has_bias_ = true;
+
+  std::vector<tensor_t> W = generate_test_data(
+    {1, 1, 1, 1, 1, 1, 1, 1, 1},
+    {in_size * out_size, in_size * out_size, in_size * out_size,
+     out_size * out_size, out_size * out_size, out_size * out_size, out_size,
+     out_size, out_size});
+  std::vector<tensor_t> in =
+    generate_test_data({batch * seq_len, batch}, {in_size, out_size});
+
+  for (size_t step = 0; step < seq_len; step++) {
+    tensor_t x(in[0].begin() + step * batch,
+               in[0].begin() + (step + 1) * batch);
+    std::vector<tensor_t> out[2];
+    for (size_t k = 0; k < 2; k++) {
+      const bool projected = k == 1;
+      if (projected) {
+        kernels::gru_cell_concat_weights(W[0][0], W[1][0], W[2][0], W[4][0],
+                                         W[5][0], W[6][0], W[7][0], W[8][0],
+                                         params, params.W_x_, params.W_h_,
+                                         params.b_);
+        kernels::project_inputs(in[0], params.W_x_, params.b_, in_size,
+                                3 * out_size, params.x_proj_, false);
+        params.step_ = step;
+      }
+      out[k].assign(6, tensor_t(batch, vec_t(out_size)));
+      kernels::gru_cell_op_internal(
+        x, in[1], W[0][0], W[1][0], W[2][0], W[3][0], W[4][0], W[5][0],
+        W[6][0], W[7][0], W[8][0], out[k][0], out[k][1], out[k][2], out[k][3],
+        out[k][4], out[k][5], params, false);
+    }
+    params.W_x_.clear();
+    params.W_h_.clear();
+    params.b_.clear();
+    params.x_proj_.clear();
+
+    for (size_t o = 0; o < 6; o++) {
+      for (size_t sample = 0; sample < batch; sample++) {
+        for (size_t i = 0; i < out_size; i++) {
+          EXPECT_NEAR(out[0][o][sample][i], out[1][o][sample][i], 1e-5);
+        }
+      }
+    }
+  }
+}
+
 TEST(gru, read_write) {
   recurrent_layer l1(gru(100, 100), 1);
   recurrent_layer l2(gru(100, 100), 1);
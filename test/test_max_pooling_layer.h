@@ -280,6 +280,95 @@ TEST(max_pool, backward) {
   }
 }
 
+TEST(max_pool, backward_overlapping) {
+  // a max shared by overlapping windows collects all of their gradients
+  max_pooling_layer l(4, 4, 1, 2, 1, false);
+  // clang-format off
+    vec_t in = {
+        0,  1,  2,  3,
+        8,  7,  5,  6,
+        4,  3,  1,  2,
+        0, -1, -2, -3
+    };
+
+    vec_t out_grad = {
+        1, 1, 1,
+        1, 1, 1,
+        1, 1, 1
+    };
+
+    vec_t in_grad_expected = {
+        0, 0, 0, 0,
+        2, 2, 0, 2,
+        1, 1, 0, 1,
+        0, 0, 0, 0
+    };
+  // clang-format on
+
+  std::vector<const tensor_t*> out;
+  l.forward({{in}}, out);
+  vec_t in_grad = l.backward(std::vector<tensor_t>{{out_grad}})[0][0];
+
+  for (size_t i = 0; i < in_grad.size(); i++) {
+    EXPECT_FLOAT_EQ(in_grad_expected[i], in_grad[i]);
+  }
+}
+
+TEST(max_pool, avx_matches_internal) {
+  // the 2x2 and 3x3 stride 2 vector paths, with clipped windows at the
+  // border from ceil_mode
+  for (size_t pool = 2; pool <= 3; pool++) {
+    max_pooling_layer avx(37, 35, 3, pool, pool, 2, 2, true, padding::valid,
+                          core::backend_t::avx);
+    max_pooling_layer internal(37, 35, 3, pool, pool, 2, 2, true,
+                               padding::valid, core::backend_t::internal);
+
+    vec_t in(avx.in_data_size());
+    uniform_rand(in.begin(), in.end(), -1.0, 1.0);
+    vec_t out_grad(avx.out_data_size());
+    uniform_rand(out_grad.begin(), out_grad.end(), -1.0, 1.0);
+
+    std::vector<const tensor_t*> out_avx, out_internal;
+    avx.forward({{in}}, out_avx);
+    internal.forward({{in}}, out_internal);
+    for (size_t i = 0; i < out_grad.size(); i++) {
+      EXPECT_FLOAT_EQ((*out_internal[0])[0][i], (*out_avx[0])[0][i]);
+    }
+
+    vec_t grad_avx = avx.backward(std::vector<tensor_t>{{out_grad}})[0][0];
+    vec_t grad_internal =
+      internal.backward(std::vector<tensor_t>{{out_grad}})[0][0];
+    for (size_t i = 0; i < in.size(); i++) {
+      EXPECT_FLOAT_EQ(grad_internal[i], grad_avx[i]);
+    }
+  }
+}
+
+TEST(max_pool, avx_block_at_row_end) {
+  // a single row of windows, so the row end is the end of the input. The
+  // vector block must not read beyond it (checked with address sanitizer):
+  // with width 15 + pool it runs, for pool 3 up to the last column, with
+  // one column less the 8 outputs go through the scalar loop
+  for (size_t pool = 2; pool <= 3; pool++) {
+    for (size_t width : {14 + pool, 15 + pool}) {
+      max_pooling_layer avx(width, pool, 1, pool, pool, 2, 2, false,
+                            padding::valid, core::backend_t::avx);
+      max_pooling_layer internal(width, pool, 1, pool, pool, 2, 2, false,
+                                 padding::valid, core::backend_t::internal);
+
+      vec_t in(avx.in_data_size());
+      uniform_rand(in.begin(), in.end(), -1.0, 1.0);
+
+      std::vector<const tensor_t*> out_avx, out_internal;
+      avx.forward({{in}}, out_avx);
+      internal.forward({{in}}, out_internal);
+      for (size_t i = 0; i < avx.out_data_size(); i++) {
+        EXPECT_FLOAT_EQ((*out_internal[0])[0][i], (*out_avx[0])[0][i]);
+      }
+    }
+  }
+}
+
 #ifndef CNN_NO_SERIALIZATION
 TEST(max_pool, serialization) {
   max_pooling_layer src(4, 4, 1, 2);
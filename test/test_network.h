@@ -9,6 +9,8 @@
 
 #include <functional>
 #include <memory>
+#include <sstream>
+#include <thread>
 #include <utility>
 #include <vector>
 
@@ -316,6 +318,262 @@ TEST(network, train_predict_different_batches) {
   }
 }
 
+TEST(network, train_data_parallel) {
+  // splitting a minibatch over several replicas must give the same update
+  // as propagating the whole minibatch at once
+  std::vector<vec_t> data;
+  std::vector<vec_t> out;
+  for (size_t i = 0; i < 64; i++) {
+    data.push_back({uniform_rand(float_t(-1), float_t(1)),
+                    uniform_rand(float_t(-1), float_t(1))});
+    out.push_back({data.back()[0] * float_t(0.5), data.back()[1]});
+  }
+
+  network<sequential> serial, parallel;
+  serial << fully_connected_layer(2, 8) << tanh_layer()
+         << fully_connected_layer(8, 2);
+  parallel << fully_connected_layer(2, 8) << tanh_layer()
+           << fully_connected_layer(8, 2);
+  serial.weight_init(weight_init::constant(0.1));
+  serial.bias_init(weight_init::constant(0.2));
+  parallel.weight_init(weight_init::constant(0.1));
+  parallel.bias_init(weight_init::constant(0.2));
+
+  gradient_descent opt_serial, opt_parallel;
+  set_num_threads(4);
+  serial.fit<mse>(opt_serial, data, out, 16, 3, nop, nop, true, 1);
+  parallel.fit<mse>(opt_parallel, data, out, 16, 3, nop, nop, true, 4);
+  set_num_threads(0);
+
+  for (size_t l = 0; l < serial.depth(); l++) {
+    auto w1 = serial[l]->weights();
+    auto w2 = parallel[l]->weights();
+    for (size_t i = 0; i < w1.size(); i++) {
+      for (size_t j = 0; j < w1[i]->size(); j++) {
+        EXPECT_NEAR((*w1[i])[j], (*w2[i])[j], 1e-5);
+      }
+    }
+  }
+}
+
+TEST(network, freeze_concurrent_predict) {
+  network<sequential> net;
+  net << convolutional_layer(8, 8, 3, 1, 4) << relu_layer()
+      << max_pooling_layer(6, 6, 4, 2) << fully_connected_layer(36, 5)
+      << softmax_layer();
+  net.init_weight();
+
+  std::vector<vec_t> in;
+  std::vector<vec_t> expected;
+  for (size_t i = 0; i < 16; i++) {
+    vec_t v(64);
+    uniform_rand(v.begin(), v.end(), float_t(-1), float_t(1));
+    in.push_back(v);
+    expected.push_back(net.predict(v));
+  }
+
+  net.freeze();
+  EXPECT_TRUE(net.frozen());
+  EXPECT_TRUE(net[0]->weights_grads()[0]->empty());
+
+  // every call predicts on its own workspace but reads the same weights
+  std::vector<std::vector<vec_t>> results(4, std::vector<vec_t>(in.size()));
+  std::vector<std::thread> threads;
+  for (size_t t = 0; t < results.size(); t++) {
+    threads.emplace_back([&, t]() {
+      for (size_t i = 0; i < in.size(); i++) {
+        results[t][i] = net.predict(in[(i + t) % in.size()]);
+      }
+    });
+  }
+  for (auto &t : threads) t.join();
+
+  for (size_t t = 0; t < results.size(); t++) {
+    for (size_t i = 0; i < in.size(); i++) {
+      const vec_t &e = expected[(i + t) % in.size()];
+      for (size_t j = 0; j < e.size(); j++) {
+        EXPECT_NEAR(e[j], results[t][i][j], 1e-6);
+      }
+    }
+  }
+
+  adagrad opt;
+  EXPECT_THROW(net.train<mse>(opt, in, expected, 4, 1), nn_error);
+}
+
+TEST(network, freeze_test_and_loss) {
+  network<sequential> net;
+  net << convolutional_layer(8, 8, 3, 1, 4) << relu_layer()
+      << max_pooling_layer(6, 6, 4, 2) << fully_connected_layer(36, 5)
+      << softmax_layer();
+  net.init_weight();
+
+  std::vector<vec_t> in;
+  std::vector<label_t> labels;
+  for (size_t i = 0; i < 32; i++) {
+    vec_t v(64);
+    uniform_rand(v.begin(), v.end(), float_t(-1), float_t(1));
+    in.push_back(v);
+    labels.push_back(label_t(i % 5));
+  }
+
+  // several batches of 4, which run in parallel once the net is frozen
+  const std::vector<vec_t> expected = net.test(in, 4);
+  const result expected_result      = net.test(in, labels, 4);
+  const float_t expected_loss       = net.get_loss<mse>(in, labels, 4);
+
+  net.freeze();
+
+  const std::vector<vec_t> out = net.test(in, 4);
+  for (size_t i = 0; i < in.size(); i++) {
+    for (size_t j = 0; j < expected[i].size(); j++) {
+      EXPECT_NEAR(expected[i][j], out[i][j], 1e-6);
+    }
+  }
+  EXPECT_EQ(expected_result.num_success, net.test(in, labels, 4).num_success);
+  EXPECT_NEAR(expected_loss, net.get_loss<mse>(in, labels, 4), 1e-5);
+}
+
+TEST(network, freeze_reuses_workspaces) {
+  network<sequential> net;
+  net << fully_connected_layer(4, 8) << tanh_layer()
+      << fully_connected_layer(8, 3);
+  net.init_weight();
+  net.freeze();
+
+  vec_t in(4);
+  uniform_rand(in.begin(), in.end(), float_t(-1), float_t(1));
+  const vec_t expected = net.predict(in);
+  EXPECT_EQ(net.workspace_count(), size_t(1));
+
+  // short-lived threads one after another share one workspace
+  for (size_t t = 0; t < 16; t++) {
+    std::thread([&]() {
+      const vec_t out = net.predict(in);
+      for (size_t j = 0; j < out.size(); j++) {
+        EXPECT_NEAR(expected[j], out[j], 1e-6);
+      }
+    }).join();
+  }
+  EXPECT_EQ(net.workspace_count(), size_t(1));
+
+  // concurrent ones need more, but no more than the threads are kept
+  std::vector<std::thread> threads;
+  for (size_t t = 0; t < 16; t++) {
+    threads.emplace_back([&]() {
+      for (size_t i = 0; i < 8; i++) net.predict(in);
+    });
+  }
+  for (auto &t : threads) t.join();
+  EXPECT_LE(net.workspace_count(), parallel_concurrency());
+}
+
+TEST(network, request_batching) {
+  network<sequential> net;
+  net << fully_connected_layer(4, 8) << tanh_layer()
+      << fully_connected_layer(8, 3);
+  net.init_weight();
+
+  std::vector<vec_t> in;
+  std::vector<vec_t> expected;
+  for (size_t i = 0; i < 32; i++) {
+    vec_t v(4);
+    uniform_rand(v.begin(), v.end(), float_t(-1), float_t(1));
+    in.push_back(v);
+    expected.push_back(net.predict(v));
+  }
+
+  // concurrent calls are gathered into batches and answered individually
+  net.set_request_batching(8, std::chrono::microseconds(1000));
+  std::vector<std::vector<vec_t>> results(4, std::vector<vec_t>(in.size()));
+  std::vector<std::thread> threads;
+  for (size_t t = 0; t < results.size(); t++) {
+    threads.emplace_back([&, t]() {
+      for (size_t i = 0; i < in.size(); i++) {
+        results[t][i] = net.predict(in[i]);
+      }
+    });
+  }
+  for (auto &t : threads) t.join();
+  net.set_request_batching(0);
+
+  for (size_t t = 0; t < results.size(); t++) {
+    for (size_t i = 0; i < in.size(); i++) {
+      for (size_t j = 0; j < expected[i].size(); j++) {
+        EXPECT_NEAR(expected[i][j], results[t][i][j], 1e-6);
+      }
+    }
+  }
+}
+
+TEST(network, request_batching_not_copied) {
+  std::unique_ptr<network<sequential>> net(new network<sequential>());
+  *net << fully_connected_layer(4, 8) << tanh_layer()
+       << fully_connected_layer(8, 3);
+  net->init_weight();
+
+  vec_t in(4);
+  uniform_rand(in.begin(), in.end(), float_t(-1), float_t(1));
+  const vec_t expected = net->predict(in);
+
+  // the copy runs predict() itself, after the original is gone
+  net->set_request_batching(8, std::chrono::microseconds(1000));
+  network<sequential> copy(*net);
+  net.reset();
+
+  const vec_t out = copy.predict(in);
+  for (size_t j = 0; j < expected.size(); j++) {
+    EXPECT_NEAR(expected[j], out[j], 1e-6);
+  }
+}
+
+TEST(network, train_data_parallel_batch_norm) {
+  // batch normalization needs the statistics of the whole minibatch, so
+  // asking for several threads must not change a training step
+  std::vector<vec_t> data;
+  std::vector<vec_t> out;
+  for (size_t i = 0; i < 8; i++) {
+    data.push_back({uniform_rand(float_t(-1), float_t(1)),
+                    uniform_rand(float_t(-1), float_t(1))});
+    out.push_back({data.back()[0] * float_t(0.5), data.back()[1]});
+  }
+
+  network<sequential> serial, parallel;
+  serial << fully_connected_layer(2, 4) << batch_normalization_layer(1, 4)
+         << tanh_layer() << fully_connected_layer(4, 2);
+  parallel << fully_connected_layer(2, 4) << batch_normalization_layer(1, 4)
+           << tanh_layer() << fully_connected_layer(4, 2);
+  serial.weight_init(weight_init::xavier());
+  serial.init_weight();
+  parallel.weight_init(weight_init::xavier());
+  parallel.init_weight();
+  for (size_t l = 0; l < serial.depth(); l++) {
+    auto w1 = serial[l]->weights();
+    auto w2 = parallel[l]->weights();
+    for (size_t i = 0; i < w1.size(); i++) *w2[i] = *w1[i];
+  }
+
+  gradient_descent opt_serial, opt_parallel;
+  set_num_threads(4);
+  serial.fit<mse>(opt_serial, data, out, 8, 1, nop, nop, false, 1);
+  parallel.fit<mse>(opt_parallel, data, out, 8, 1, nop, nop, false, 4);
+  set_num_threads(0);
+
+  // layer::save covers the weights and the running mean/variance
+  for (size_t l = 0; l < serial.depth(); l++) {
+    std::stringstream ss1, ss2;
+    serial[l]->save(ss1);
+    parallel[l]->save(ss2);
+
+    float_t v1, v2;
+    while (ss1 >> v1) {
+      ASSERT_TRUE(static_cast<bool>(ss2 >> v2));
+      EXPECT_NEAR(v1, v2, 1e-5);
+    }
+    EXPECT_FALSE(static_cast<bool>(ss2 >> v2));
+  }
+}
+
 TEST(network, set_netphase) {
   // TODO(nyanp): add unit-test for public api
 }
@@ -347,8 +605,57 @@ TEST(network, test) {
   }
 }
 
+TEST(network, test_batched) {
+  network<sequential> net;
+  net << fully_connected_layer(10, 4) << softmax_layer();
+  net.init_weight();
+
+  std::vector<vec_t> in;
+  std::vector<label_t> labels;
+  for (size_t i = 0; i < 101; i++) {
+    vec_t v(10);
+    uniform_rand(v.begin(), v.end(), float_t(-1), float_t(1));
+    in.push_back(v);
+    labels.push_back(label_t(i % 4));
+  }
+
+  result expected;
+  for (size_t i = 0; i < in.size(); i++) {
+    label_t predicted = net.predict_label(in[i]);
+    if (predicted == labels[i]) expected.num_success++;
+    expected.num_total++;
+    expected.confusion_matrix[predicted][labels[i]]++;
+  }
+
+  // the batch size must not change the result, the last batch is partial
+  for (size_t batch_size : {1, 7, 64, 200}) {
+    result r = net.test(in, labels, batch_size);
+    EXPECT_EQ(expected.num_success, r.num_success);
+    EXPECT_EQ(expected.num_total, r.num_total);
+    EXPECT_TRUE(expected.confusion_matrix == r.confusion_matrix);
+  }
+}
+
 TEST(network, get_loss) {
-  // TODO(nyanp): add unit-test for public api
+  network<sequential> net;
+  net << fully_connected_layer(3, 2);
+  net.init_weight();
+
+  std::vector<vec_t> in, t;
+  for (size_t i = 0; i < 37; i++) {
+    vec_t v(3);
+    uniform_rand(v.begin(), v.end(), float_t(-1), float_t(1));
+    in.push_back(v);
+    t.push_back(vec_t{float_t(0.5), float_t(-0.5)});
+  }
+
+  float_t expected = float_t(0);
+  for (size_t i = 0; i < in.size(); i++) {
+    expected += mse::f(net.predict(in[i]), t[i]);
+  }
+
+  EXPECT_NEAR(expected, net.get_loss<mse>(in, t), 1e-4);
+  EXPECT_NEAR(expected, net.get_loss<mse>(in, t, 5), 1e-4);
 }
 
 TEST(network, at) {
@@ -462,6 +769,27 @@ TEST(network, gradient_check) {  // sigmoid - cross-entropy
     test_data.first, test_data.second, epsilon<float_t>(), GRAD_CHECK_RANDOM));
 }
 
+TEST(network, gradient_check_per_thread_accumulators) {
+  using loss_func = mse;
+  using network   = network<sequential>;
+
+  // 8 samples are summed into one dW accumulator per thread (3 for conv,
+  // 1 for fully-connected)
+  set_num_threads(3);
+  network nn;
+  nn << convolutional_layer(8, 8, 3, 2, 4) << tanh_layer()
+     << fully_connected_layer(6 * 6 * 4, 3) << tanh_layer();
+
+  const auto test_data = generate_gradient_check_data(nn.in_data_size(), 8);
+  nn.init_weight();
+  EXPECT_TRUE(nn.gradient_check<loss_func>(
+    test_data.first, test_data.second, epsilon<float_t>(), GRAD_CHECK_ALL));
+
+  EXPECT_EQ(nn[0]->weights_grads()[0]->size(), 3u);
+  EXPECT_EQ(nn[2]->weights_grads()[0]->size(), 1u);
+  set_num_threads(0);
+}
+
 TEST(network, gradient_check2) {  // tan_h - mse
   using loss_func  = mse;
   using network    = network<sequential>;
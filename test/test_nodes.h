@@ -18,6 +18,65 @@ TEST(nodes, sequential) {
      << fully_connected_layer(100, 10) << softmax();
 }
 
+TEST(nodes, sequential_memory_reuse) {
+  sequential s;
+  s.add(fully_connected_layer(10, 20));
+  s.add(tanh_layer());
+  s.add(fully_connected_layer(20, 30));
+  s.add(tanh_layer());
+  s.add(fully_connected_layer(30, 5));
+  s.setup(true);
+
+  // a chain of layers needs only two alternating buffers
+  EXPECT_EQ(s.memory_arena_count(), 2u);
+
+  std::vector<tensor_t> in(3, tensor_t{vec_t(10)});
+  for (auto &sample : in) {
+    uniform_rand(sample[0].begin(), sample[0].end(), -1, 1);
+  }
+
+  auto expected = s.forward(in);
+  s.set_memory_reuse(true);
+  auto actual = s.forward(in);
+  actual      = s.forward(in);  // buffers are passed around on every call
+
+  for (size_t i = 0; i < in.size(); i++) {
+    for (size_t j = 0; j < expected[i][0].size(); j++) {
+      EXPECT_FLOAT_EQ(expected[i][0][j], actual[i][0][j]);
+    }
+  }
+
+  // intermediate edges don't keep gradients during inference
+  EXPECT_TRUE(s[0]->outputs()[0]->get_gradient()->empty());
+
+  // backward re-runs forward without reuse
+  std::vector<tensor_t> grad(3, tensor_t{vec_t(5, float_t(1))});
+  s.backward(grad);
+  EXPECT_EQ(s[0]->outputs()[0]->get_gradient()->size(), 3u);
+}
+
+TEST(nodes, graph_memory_reuse) {
+  auto in1   = std::make_shared<input_layer>(shape3d(3, 1, 1));
+  auto in2   = std::make_shared<input_layer>(shape3d(3, 1, 1));
+  auto added = std::make_shared<layers::add>(2, 3);
+  auto lin   = std::make_shared<linear_layer>(3);
+  auto out   = std::make_shared<relu>(3);
+
+  (in1, in2) << added;
+  added << lin << out;
+
+  network<graph> net;
+  construct_graph(net, {in1, in2}, {out});
+  net.set_memory_reuse(true);
+
+  for (int i = 0; i < 2; i++) {
+    auto res = net.predict({{2, 4, 3}, {-1, 2, -5}})[0];
+    EXPECT_FLOAT_EQ(static_cast<float_t>(res[0]), static_cast<float_t>(1.0));
+    EXPECT_FLOAT_EQ(static_cast<float_t>(res[1]), static_cast<float_t>(6.0));
+    EXPECT_FLOAT_EQ(static_cast<float_t>(res[2]), static_cast<float_t>(0.0));
+  }
+}
+
 TEST(nodes, graph_no_branch) {
   // declare nodes
   auto in = std::make_shared<input_layer>(shape3d(8, 8, 1));
@@ -592,4 +592,42 @@ TEST(tensor, print_view) {
   std::cout << tensor << std::endl << t_view << std::endl;
 }
 
+TEST(tensor, host_pointer) {
+  Tensor<float_t> tensor({2, 3}, 0);
+  tensor.host_at(1, 2) = 5;
+  EXPECT_EQ(tensor.host_pointer()[5], float_t(5));
+}
+
+TEST(batch_tensor, from_to_tensor) {
+  tensor_t src = {{1, 2, 3}, {4, 5, 6}};
+  BatchTensor<> batch(src);
+
+  EXPECT_EQ(batch.num_samples(), 2u);
+  EXPECT_EQ(batch.sample_size(), 3u);
+  EXPECT_EQ(batch.sample(1), batch.data() + 3);
+  for (size_t i = 0; i < batch.size(); i++) {
+    EXPECT_EQ(batch.data()[i], float_t(i + 1));
+  }
+
+  batch(0, 1) = 7;
+  tensor_t dst = batch.to_tensor();
+  EXPECT_EQ(dst.size(), 2u);
+  EXPECT_EQ(dst[0][1], float_t(7));
+  EXPECT_EQ(dst[1][2], float_t(6));
+}
+
+TEST(batch_tensor, resize) {
+  BatchTensor<> batch(4, 8);
+  const float_t *p = batch.data();
+
+  // shrinking keeps the allocation
+  batch.resize(2, 8);
+  EXPECT_EQ(batch.data(), p);
+  EXPECT_EQ(batch.size(), 16u);
+
+  batch.resize(16, 8);
+  batch.fill(float_t(1));
+  EXPECT_EQ(batch(15, 7), float_t(1));
+}
+
 }  // namespace tiny_dnn
@@ -0,0 +1,141 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <atomic>
+#include <chrono>
+#include <vector>
+
+namespace tiny_dnn {
+
+TEST(thread_pool, run_all_tasks) {
+  thread_pool pool(3);
+  std::vector<int> hit(1000, 0);
+
+  pool.run(hit.size(), [&](size_t i) { hit[i]++; });
+
+  for (auto h : hit) EXPECT_EQ(h, 1);
+}
+
+TEST(thread_pool, nested_run) {
+  thread_pool pool(4);
+  std::atomic<size_t> sum(0);
+
+  pool.run(16, [&](size_t i) {
+    pool.run(8, [&](size_t j) { sum += i * j; });
+  });
+
+  EXPECT_EQ(sum.load(), size_t(120 * 28));
+}
+
+TEST(thread_pool, nested_run_does_not_reenter_outer_tasks) {
+  thread_pool pool(4);
+  static thread_local size_t depth = 0;
+  std::atomic<size_t> reentered(0);
+
+  pool.run(16, [&](size_t) {
+    if (depth++ > 0) reentered++;
+    pool.run(8, [&](size_t) {
+      // busy enough that threads wait for the inner loop
+      volatile size_t x = 0;
+      for (size_t k = 0; k < 10000; k++) x = x + k;
+    });
+    depth--;
+  });
+
+  EXPECT_EQ(reentered.load(), size_t(0));
+}
+
+TEST(thread_pool, propagate_exception) {
+  thread_pool pool(2);
+  EXPECT_THROW(pool.run(10,
+                        [](size_t i) {
+                          if (i == 7) throw nn_error("task failed");
+                        }),
+               nn_error);
+}
+
+TEST(thread_pool, set_num_threads) {
+  set_num_threads(2);
+  EXPECT_EQ(num_threads(), size_t(2));
+
+  std::vector<int> hit(100, 0);
+  for_i(hit.size(), [&](size_t i) { hit[i]++; });
+  for (auto h : hit) EXPECT_EQ(h, 1);
+
+  set_num_threads(0);
+  EXPECT_EQ(num_threads(), thread_pool::default_num_workers() + 1);
+}
+
+TEST(thread_pool, for_honors_grainsize) {
+  std::atomic<size_t> chunks(0);
+  std::vector<int> hit(1000, 0);
+
+  for_(true, 0u, hit.size(),
+       [&](const blocked_range &r) {
+         EXPECT_TRUE(r.end() - r.begin() >= 100 || r.end() == hit.size());
+         chunks++;
+         for (size_t i = r.begin(); i < r.end(); i++) hit[i]++;
+       },
+       100);
+  EXPECT_LE(chunks.load(), size_t(10));
+  for (auto h : hit) EXPECT_EQ(h, 1);
+
+  // a range not larger than grainsize is not split at all
+  chunks = 0;
+  for_(true, 0u, size_t(50), [&](const blocked_range &) { chunks++; }, 100);
+  EXPECT_EQ(chunks.load(), size_t(1));
+}
+
+TEST(thread_pool, adaptive_grainsize_covers_range) {
+  std::vector<int> hit(1000, 0);
+  auto body = [&](const blocked_range &r) {
+    for (size_t i = r.begin(); i < r.end(); i++) hit[i]++;
+  };
+
+  // the first call measures the cost of one iteration; however the range is
+  // split, every index is visited exactly once per call
+  for_(true, 0u, hit.size(), body);
+  for (auto h : hit) EXPECT_EQ(h, 1);
+  for_(true, 0u, hit.size(), body);
+  for (auto h : hit) EXPECT_EQ(h, 2);
+}
+
+TEST(thread_pool, adaptive_grainsize_from_iteration_cost) {
+  typedef std::chrono::nanoseconds ns;
+
+  // cheap loops run serially, whatever the concurrency
+  detail::adaptive_grain cheap;
+  cheap.record(1, ns(10));
+  EXPECT_GE(cheap.grainsize(1000, 4), size_t(1000));
+
+  // expensive ones are split into chunks of about target_ns
+  detail::adaptive_grain expensive;
+  expensive.record(1, ns(1000000));
+  EXPECT_EQ(expensive.grainsize(1000, 4), size_t(1));
+
+  detail::adaptive_grain medium;
+  medium.record(10, ns(100000));
+  EXPECT_EQ(medium.grainsize(1000, 4), size_t(6));
+  EXPECT_GE(medium.grainsize(10, 4), size_t(10));
+
+  // a single thread never splits
+  EXPECT_GE(expensive.grainsize(1000, 1), size_t(1000));
+}
+
+TEST(thread_pool, intra_item_split) {
+  set_num_threads(8);
+  EXPECT_EQ(intra_item_split(true, 1, 100), size_t(8));
+  EXPECT_EQ(intra_item_split(true, 3, 100), size_t(3));
+  EXPECT_EQ(intra_item_split(true, 1, 5), size_t(5));
+  EXPECT_EQ(intra_item_split(true, 8, 100), size_t(1));
+  EXPECT_EQ(intra_item_split(false, 1, 100), size_t(1));
+  set_num_threads(0);
+}
+
+}  // namespace tiny_dnn
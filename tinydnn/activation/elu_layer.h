@@ -37,9 +37,9 @@ class elu_layer : public activation_layer {
   std::string layer_type() const override { return "elu-activation"; }
 
   void forward_activation(const vec_t &x, vec_t &y) override {
+    vectorize::exp(x.data(), x.size(), y.data());
     for (size_t j = 0; j < x.size(); j++) {
-      y[j] =
-        x[j] < float_t(0) ? (alpha_ * (std::exp(x[j]) - float_t(1))) : x[j];
+      y[j] = x[j] < float_t(0) ? (alpha_ * (y[j] - float_t(1))) : x[j];
     }
   }
 
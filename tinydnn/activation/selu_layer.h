@@ -79,10 +79,10 @@ class selu_layer : public activation_layer {
   float_t alpha_value() { return alpha_; }
 
   void forward_activation(const vec_t &x, vec_t &y) override {
+    vectorize::exp(x.data(), x.size(), y.data());
     for (size_t j = 0; j < x.size(); j++) {
       y[j] =
-        lambda_ *
-        (x[j] > float_t(0) ? x[j] : alpha_ * (std::exp(x[j]) - float_t(1)));
+        lambda_ * (x[j] > float_t(0) ? x[j] : alpha_ * (y[j] - float_t(1)));
     }
   }
 
@@ -90,10 +90,11 @@ class selu_layer : public activation_layer {
                            const vec_t &y,
                            vec_t &dx,
                            const vec_t &dy) override {
-    // dx = dy * (gradient of selu)
+    // dx = dy * (gradient of selu), with exp(x) staged in dx
+    vectorize::exp(x.data(), x.size(), dx.data());
     for (size_t j = 0; j < x.size(); j++) {
       dx[j] =
-        dy[j] * lambda_ * (x[j] > float_t(0) ? 1.0 : alpha_ * std::exp(x[j]));
+        dy[j] * lambda_ * (x[j] > float_t(0) ? float_t(1) : alpha_ * dx[j]);
     }
   }
 
@@ -21,9 +21,7 @@ class sigmoid_layer : public activation_layer {
   std::string layer_type() const override { return "sigmoid-activation"; }
 
   void forward_activation(const vec_t &x, vec_t &y) override {
-    for (size_t j = 0; j < x.size(); j++) {
-      y[j] = float_t(1) / (float_t(1) + std::exp(-x[j]));
-    }
+    vectorize::sigmoid(x.data(), x.size(), y.data());
   }
 
   void backward_activation(const vec_t &x,
@@ -22,11 +22,11 @@ class softmax_layer : public activation_layer {
 
   void forward_activation(const vec_t &x, vec_t &y) override {
     const float_t alpha = *std::max_element(x.begin(), x.end());
-    float_t denominator(0);
     for (size_t j = 0; j < x.size(); j++) {
-      y[j] = std::exp(x[j] - alpha);
-      denominator += y[j];
+      y[j] = x[j] - alpha;
     }
+    vectorize::exp(y.data(), y.size(), y.data());
+    const float_t denominator = vectorize::sum(y.data(), y.size());
     for (size_t j = 0; j < x.size(); j++) {
       y[j] /= denominator;
     }
@@ -36,28 +36,34 @@ class softmax_layer : public activation_layer {
                            const vec_t &y,
                            vec_t &dx,
                            const vec_t &dy) override {
-    const size_t len = dy.size();
-
-// auxilliary vector to store element wise softmax gradients of all elements
-
-#if HAS_CXX11_THREAD_LOCAL
-    thread_local
-#endif
-      vec_t df(len, 0);
-    for (size_t j = 0; j < x.size(); j++) {
-      for (size_t k = 0; k < x.size(); k++) {
-        df[k] = (k == j) ? y[j] * (float_t(1) - y[j]) : -y[k] * y[j];
-      }
-      // dx = dy * (gradient of softmax)
-      dx[j] = vectorize::dot(&dy[0], &df[0], len);
+    if (fused_loss_) {
+      // dy already is the gradient with respect to the softmax input
+      dx = dy;
+      return;
+    }
+    // dx = dy * (gradient of softmax) = y * (dy - <dy, y>), the product with
+    // the jacobian diag(y) - y y^T without forming it
+    const float_t dot = vectorize::dot(&dy[0], &y[0], dy.size());
+    for (size_t j = 0; j < dx.size(); j++) {
+      dx[j] = y[j] * (dy[j] - dot);
     }
   }
 
+  /**
+   * Pass the gradient through unchanged in backward passes, for a loss which
+   * was fused with this layer and differentiates with respect to its input.
+   * Set by network::bprop around the backward pass.
+   */
+  void set_fused_loss(bool fused) { fused_loss_ = fused; }
+
   std::pair<float_t, float_t> scale() const override {
     return std::make_pair(float_t(0), float_t(1));
   }
 
   friend struct serialization_buddy;
+
+ private:
+  bool fused_loss_ = false;
 };
 
 }  // namespace tinydnn
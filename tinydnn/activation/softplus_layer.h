@@ -82,9 +82,11 @@ class softplus_layer : public activation_layer {
 
   void forward_activation(const vec_t &x, vec_t &y) override {
     for (size_t j = 0; j < x.size(); j++) {
-      float_t betain = beta_ * x[j];
-      y[j]           = (betain > threshold_) ? x[j]
-                                   : (1 / beta_) * std::log1p(std::exp(betain));
+      y[j] = beta_ * x[j];
+    }
+    vectorize::softplus(y.data(), y.size(), y.data());
+    for (size_t j = 0; j < x.size(); j++) {
+      y[j] = (beta_ * x[j] > threshold_) ? x[j] : y[j] / beta_;
     }
   }
 
@@ -92,11 +94,14 @@ class softplus_layer : public activation_layer {
                            const vec_t &y,
                            vec_t &dx,
                            const vec_t &dy) override {
+    // dx = dy * (gradient of softplus), where the gradient
+    // (exp(beta * y) - 1) / exp(beta * y) = 1 - exp(-beta * y)
+    for (size_t j = 0; j < y.size(); j++) {
+      dx[j] = -beta_ * y[j];
+    }
+    vectorize::exp(dx.data(), dx.size(), dx.data());
     for (size_t j = 0; j < x.size(); j++) {
-      float_t betaout = beta_ * y[j];
-      float_t exp_bo  = std::exp(betaout);
-      // dx = dy * (gradient of softplus)
-      dx[j] = (betaout > threshold_) ? dy[j] : dy[j] * (exp_bo - 1) / exp_bo;
+      dx[j] = (beta_ * y[j] > threshold_) ? dy[j] : dy[j] * (1 - dx[j]);
     }
   }
 
@@ -21,9 +21,7 @@ class tanh_layer : public activation_layer {
   std::string layer_type() const override { return "tanh-activation"; }
 
   void forward_activation(const vec_t &x, vec_t &y) override {
-    for (size_t j = 0; j < x.size(); j++) {
-      y[j] = std::tanh(x[j]);
-    }
+    vectorize::tanh(x.data(), x.size(), y.data());
   }
 
   void backward_activation(const vec_t &x,
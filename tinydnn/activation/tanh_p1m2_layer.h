@@ -21,11 +21,11 @@ class tanh_p1m2_layer : public activation_layer {
   std::string layer_type() const override { return "tanh-scaled-activation"; }
 
   void forward_activation(const vec_t &x, vec_t &y) override {
-    float_t ep;
+    // e^x / (e^x + e^-x) = sigmoid(2x)
     for (size_t j = 0; j < x.size(); j++) {
-      ep   = std::exp(x[j]);
-      y[j] = ep / (ep + (float_t(1) / ep));
+      y[j] = float_t(2) * x[j];
     }
+    vectorize::sigmoid(y.data(), y.size(), y.data());
   }
 
   void backward_activation(const vec_t &x,
@@ -14,6 +14,7 @@
 #include "tinydnn/core/global_avepool_params.h"
 #include "tinydnn/core/maxpool_params.h"
 #include "tinydnn/node.h"
+#include "tinydnn/utils/cpu_features.h"
 
 #ifdef USE_NNPACK
 #include <nnpack.h>
@@ -39,16 +40,13 @@ inline std::ostream &operator<<(std::ostream &os, backend_t type) {
   return os;
 }
 
+// the AVX backend if it was built in and the CPU (or TINYDNN_SIMD, see
+// vectorize::active_isa) allows it, the internal one otherwise
 inline backend_t default_engine() {
 #ifdef USE_AVX
-#if defined(__AVX__) || defined(__AVX2__)
-  return backend_t::avx;
-#else
-#error "your compiler does not support AVX"
+  if (vectorize::active_isa() >= vectorize::isa::avx) return backend_t::avx;
 #endif
-#else
   return backend_t::internal;
-#endif
 }
 
 #ifdef USE_NNPACK
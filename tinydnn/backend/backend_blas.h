@@ -5,4 +5,69 @@
   Use of this source code is governed by a BSD-style license that can be found
   in the LICENSE file.
 */
-#pragma once
\ No newline at end of file
+#pragma once
+
+#include "tinydnn/utils/logging.h"
+#include "tinydnn/utils/macro.h"
+#include "tinydnn/utils/types.h"
+
+#ifdef CNN_USE_CBLAS
+extern "C" {
+#include <cblas.h>
+}
+#endif
+
+namespace tinydnn {
+namespace core {
+
+/**
+ * C = alpha * op(A) * op(B) + beta * C on row-major matrices, with
+ * op(A) (M x K), op(B) (K x N) and C (M x N). Calls cblas_sgemm or
+ * cblas_dgemm, depending on float_t. The BLAS library runs its own threads.
+ */
+inline void blas_gemm(bool trans_a,
+                      bool trans_b,
+                      size_t M,
+                      size_t N,
+                      size_t K,
+                      float_t alpha,
+                      const float_t *A,
+                      size_t lda,
+                      const float_t *B,
+                      size_t ldb,
+                      float_t beta,
+                      float_t *C,
+                      size_t ldc) {
+#ifdef CNN_USE_CBLAS
+  if (M == 0 || N == 0) return;
+  const CBLAS_TRANSPOSE ta = trans_a ? CblasTrans : CblasNoTrans;
+  const CBLAS_TRANSPOSE tb = trans_b ? CblasTrans : CblasNoTrans;
+#ifdef CNN_USE_DOUBLE
+  cblas_dgemm(CblasRowMajor, ta, tb, static_cast<int>(M), static_cast<int>(N),
+              static_cast<int>(K), alpha, A, static_cast<int>(lda), B,
+              static_cast<int>(ldb), beta, C, static_cast<int>(ldc));
+#else
+  cblas_sgemm(CblasRowMajor, ta, tb, static_cast<int>(M), static_cast<int>(N),
+              static_cast<int>(K), alpha, A, static_cast<int>(lda), B,
+              static_cast<int>(ldb), beta, C, static_cast<int>(ldc));
+#endif
+#else
+  UNREFERENCED_PARAMETER(trans_a);
+  UNREFERENCED_PARAMETER(trans_b);
+  UNREFERENCED_PARAMETER(M);
+  UNREFERENCED_PARAMETER(N);
+  UNREFERENCED_PARAMETER(K);
+  UNREFERENCED_PARAMETER(alpha);
+  UNREFERENCED_PARAMETER(A);
+  UNREFERENCED_PARAMETER(lda);
+  UNREFERENCED_PARAMETER(B);
+  UNREFERENCED_PARAMETER(ldb);
+  UNREFERENCED_PARAMETER(beta);
+  UNREFERENCED_PARAMETER(C);
+  UNREFERENCED_PARAMETER(ldc);
+  throw nn_error("Compiled without CBLAS support");
+#endif  // CNN_USE_CBLAS
+}
+
+}  // namespace core
+}  // namespace tinydnn
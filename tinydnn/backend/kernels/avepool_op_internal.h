@@ -0,0 +1,278 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <vector>
+#include "tinydnn/core/avepool_params.h"
+#include "tinydnn/utils/utils.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * nx x ny windows of size_x x size_y over a width x height plane, window
+ * (ox, oy) starting at (ox * stride_x, oy * stride_y). The windows must lie
+ * inside the plane.
+ **/
+struct pool_windows {
+  size_t width;
+  size_t height;
+  size_t size_x;
+  size_t size_y;
+  size_t stride_x;
+  size_t stride_y;
+  size_t nx;
+  size_t ny;
+
+  // columns covered by a row of windows
+  size_t span() const { return nx == 0 ? 0 : (nx - 1) * stride_x + size_x; }
+
+  // every element of the plane is in exactly one window
+  bool tiles() const {
+    return size_x == stride_x && size_y == stride_y && nx * size_x == width &&
+           ny * size_y == height;
+  }
+};
+
+// the windows of average pooling which fit in the input; ceil_mode and same
+// padding can add outputs beyond them, which only get the bias
+inline pool_windows avepool_windows(const core::avepool_params &params) {
+  auto fit = [](size_t in, size_t pool, size_t stride, size_t out) {
+    return in < pool ? size_t(0) : std::min(out, (in - pool) / stride + 1);
+  };
+  return {params.in.width_,
+          params.in.height_,
+          params.pool_size_x,
+          params.pool_size_y,
+          params.stride_x,
+          params.stride_y,
+          fit(params.in.width_, params.pool_size_x, params.stride_x,
+              params.out.width_),
+          fit(params.in.height_, params.pool_size_y, params.stride_y,
+              params.out.height_)};
+}
+
+// the windows of average unpooling, one per input element in the output
+inline pool_windows aveunpool_windows(const core::avepool_params &params) {
+  return {params.out.width_, params.out.height_, params.pool_size_x,
+          params.pool_size_y, params.stride_x,   params.stride_y,
+          params.in.width_,  params.in.height_};
+}
+
+/**
+ * dst[oy * dst_stride + ox] = sum of src over window (ox, oy). The rows of a
+ * window are added with vectorize::add, then each window sums its columns.
+ * buffer needs windows.span() elements.
+ **/
+inline void window_sums(const float_t *src,
+                        const pool_windows &windows,
+                        float_t *dst,
+                        size_t dst_stride,
+                        float_t *buffer) {
+  const size_t span = windows.span();
+  for (size_t oy = 0; oy < windows.ny; oy++) {
+    const float_t *row = src + oy * windows.stride_y * windows.width;
+    std::copy(row, row + span, buffer);
+    for (size_t r = 1; r < windows.size_y; r++) {
+      vectorize::add(row + r * windows.width, span, buffer);
+    }
+
+    float_t *out = dst + oy * dst_stride;
+    for (size_t ox = 0; ox < windows.nx; ox++) {
+      const float_t *col = buffer + ox * windows.stride_x;
+      float_t sum{0};
+      for (size_t k = 0; k < windows.size_x; k++) sum += col[k];
+      out[ox] = sum;
+    }
+  }
+}
+
+/**
+ * dst (the whole width x height plane) = sum over the windows containing each
+ * element of value[oy * value_stride + ox]. Windows which tile the plane are
+ * written without clearing or accumulating, disjoint rows of windows are
+ * copied instead of added. buffer needs windows.span() elements.
+ **/
+inline void window_scatter(const float_t *value,
+                           size_t value_stride,
+                           const pool_windows &windows,
+                           float_t *dst,
+                           float_t *buffer) {
+  const size_t span        = windows.span();
+  const bool disjoint_cols = windows.stride_x >= windows.size_x;
+  const bool disjoint_rows = windows.stride_y >= windows.size_y;
+  if (!windows.tiles()) {
+    std::fill(dst, dst + windows.width * windows.height, float_t{0});
+  }
+
+  for (size_t oy = 0; oy < windows.ny; oy++) {
+    const float_t *v = value + oy * value_stride;
+    if (!disjoint_cols || windows.stride_x > windows.size_x) {
+      std::fill(buffer, buffer + span, float_t{0});
+    }
+    for (size_t ox = 0; ox < windows.nx; ox++) {
+      float_t *col = buffer + ox * windows.stride_x;
+      if (disjoint_cols) {
+        std::fill(col, col + windows.size_x, v[ox]);
+      } else {
+        for (size_t k = 0; k < windows.size_x; k++) col[k] += v[ox];
+      }
+    }
+
+    float_t *row = dst + oy * windows.stride_y * windows.width;
+    for (size_t r = 0; r < windows.size_y; r++) {
+      if (disjoint_rows) {
+        std::copy(buffer, buffer + span, row + r * windows.width);
+      } else {
+        vectorize::add(buffer, span, row + r * windows.width);
+      }
+    }
+  }
+}
+
+/**
+ * out = W[c] * scale_factor * (sum of the window) + b[c], per channel c;
+ * outputs without a window in the input get b[c].
+ **/
+inline void avepool_op_internal(const tensor_t &in_data,
+                                const vec_t &W,
+                                const vec_t &bias,
+                                tensor_t &out_data,
+                                const core::avepool_params &params,
+                                float_t scale_factor,
+                                const bool layer_parallelize) {
+  const pool_windows windows = avepool_windows(params);
+  const size_t depth         = params.in.depth_;
+  const size_t in_area       = params.in.area();
+  const size_t out_w         = params.out.width_;
+  const size_t out_area      = params.out.area();
+
+  // one task per channel of each sample
+  for_i(layer_parallelize, in_data.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    float_t *out        = &out_data[sample][c * out_area];
+    const float_t w     = W[c] * scale_factor;
+    vec_t buffer(windows.span());
+
+    window_sums(&in_data[sample][c * in_area], windows, out, out_w,
+                buffer.data());
+    for (size_t oy = 0; oy < params.out.height_; oy++) {
+      for (size_t ox = 0; ox < out_w; ox++) {
+        float_t &o = out[oy * out_w + ox];
+        o = (ox < windows.nx && oy < windows.ny) ? w * o + bias[c] : bias[c];
+      }
+    }
+  });
+}
+
+inline void avepool_grad_op_internal(const tensor_t &prev_out,
+                                     const vec_t &W,
+                                     tensor_t &dW,
+                                     tensor_t &db,
+                                     tensor_t &prev_delta,
+                                     const tensor_t &curr_delta,
+                                     const core::avepool_params &params,
+                                     float_t scale_factor,
+                                     const bool layer_parallelize) {
+  const pool_windows windows = avepool_windows(params);
+  const size_t depth         = params.in.depth_;
+  const size_t in_area       = params.in.area();
+  const size_t out_w         = params.out.width_;
+  const size_t out_area      = params.out.area();
+
+  for_i(layer_parallelize, prev_out.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    const float_t *in   = &prev_out[sample][c * in_area];
+    const float_t *curr = &curr_delta[sample][c * out_area];
+    const float_t w     = W[c] * scale_factor;
+    vec_t buffer(windows.span());
+    vec_t sums(windows.nx * windows.ny);
+
+    db[sample][c] += vectorize::sum(curr, out_area);
+
+    window_sums(in, windows, sums.data(), windows.nx, buffer.data());
+    float_t diff{0};
+    for (size_t oy = 0; oy < windows.ny; oy++) {
+      diff += vectorize::dot(curr + oy * out_w, &sums[oy * windows.nx],
+                             windows.nx);
+    }
+    dW[sample][c] += diff * scale_factor;
+
+    // reuse sums for the gradient of each window
+    for (size_t oy = 0; oy < windows.ny; oy++) {
+      for (size_t ox = 0; ox < windows.nx; ox++) {
+        sums[oy * windows.nx + ox] = w * curr[oy * out_w + ox];
+      }
+    }
+    window_scatter(sums.data(), windows.nx, windows,
+                   &prev_delta[sample][c * in_area], buffer.data());
+  });
+}
+
+/**
+ * out = W[c] * (sum of the inputs whose window covers it) + b[c], per
+ * channel c.
+ **/
+inline void aveunpool_op_internal(const tensor_t &in_data,
+                                  const vec_t &W,
+                                  const vec_t &bias,
+                                  tensor_t &out_data,
+                                  const core::avepool_params &params,
+                                  const bool layer_parallelize) {
+  const pool_windows windows = aveunpool_windows(params);
+  const size_t depth         = params.in.depth_;
+  const size_t in_area       = params.in.area();
+  const size_t out_area      = params.out.area();
+
+  for_i(layer_parallelize, in_data.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    float_t *out        = &out_data[sample][c * out_area];
+    vec_t buffer(windows.span());
+
+    window_scatter(&in_data[sample][c * in_area], params.in.width_, windows,
+                   out, buffer.data());
+    for (size_t i = 0; i < out_area; i++) out[i] = W[c] * out[i] + bias[c];
+  });
+}
+
+inline void aveunpool_grad_op_internal(const tensor_t &prev_out,
+                                       const vec_t &W,
+                                       tensor_t &dW,
+                                       tensor_t &db,
+                                       tensor_t &prev_delta,
+                                       const tensor_t &curr_delta,
+                                       const core::avepool_params &params,
+                                       const bool layer_parallelize) {
+  const pool_windows windows = aveunpool_windows(params);
+  const size_t depth         = params.in.depth_;
+  const size_t in_area       = params.in.area();
+  const size_t out_area      = params.out.area();
+
+  for_i(layer_parallelize, prev_out.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    const float_t *curr = &curr_delta[sample][c * out_area];
+    float_t *prev       = &prev_delta[sample][c * in_area];
+    vec_t buffer(windows.span());
+
+    db[sample][c] += vectorize::sum(curr, out_area);
+
+    // the gradient of each input sums its window of the output gradient
+    window_sums(curr, windows, prev, params.in.width_, buffer.data());
+    dW[sample][c] += vectorize::dot(&prev_out[sample][c * in_area], prev,
+                                    in_area);
+    for (size_t i = 0; i < in_area; i++) prev[i] *= W[c];
+  });
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
@@ -0,0 +1,111 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <vector>
+#include "tinydnn/utils/utils.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * dst = the rows x out_size weights of each gate side by side, a
+ * rows x (W.size() * out_size) matrix, so that a single gemm computes all
+ * of the gates. Empty weights (no bias) give an empty dst.
+ **/
+inline void concat_gates(const std::vector<const vec_t *> &W,
+                         size_t rows,
+                         size_t out_size,
+                         vec_t &dst) {
+  if (W[0]->empty()) {
+    dst.clear();
+    return;
+  }
+  const size_t cols = W.size() * out_size;
+  dst.resize(rows * cols);
+  for (size_t g = 0; g < W.size(); g++) {
+    for (size_t r = 0; r < rows; r++) {
+      const float_t *src = &(*W[g])[r * out_size];
+      std::copy(src, src + out_size, &dst[r * cols + g * out_size]);
+    }
+  }
+}
+
+// dst (rows end - begin, row stride cols) = rows begin .. end of t
+inline void gather_rows(const tensor_t &t,
+                        size_t begin,
+                        size_t end,
+                        size_t cols,
+                        float_t *dst) {
+  for (size_t s = begin; s < end; s++) {
+    std::copy(&t[s][0], &t[s][0] + cols, dst + (s - begin) * cols);
+  }
+}
+
+// rows begin .. end of t = src (row stride cols)
+inline void scatter_rows(const float_t *src,
+                         size_t begin,
+                         size_t end,
+                         size_t cols,
+                         tensor_t &t) {
+  for (size_t s = begin; s < end; s++) {
+    const float_t *row = src + (s - begin) * cols;
+    std::copy(row, row + cols, &t[s][0]);
+  }
+}
+
+/**
+ * the gate inputs from x of samples begin .. end, x W + b with the
+ * concatenated in_size x gates weights W (and bias b, unless empty), into
+ * dst (row stride gates). buffer needs (end - begin) * in_size elements.
+ **/
+inline void project_rows(const tensor_t &x,
+                         size_t begin,
+                         size_t end,
+                         const vec_t &W,
+                         const vec_t &b,
+                         size_t in_size,
+                         size_t gates,
+                         float_t *buffer,
+                         float_t *dst) {
+  const size_t rows = end - begin;
+  for (size_t k = 0; k < rows; k++) {
+    if (b.empty()) {
+      std::fill(dst + k * gates, dst + (k + 1) * gates, float_t{0});
+    } else {
+      std::copy(b.begin(), b.end(), dst + k * gates);
+    }
+  }
+  gather_rows(x, begin, end, in_size, buffer);
+  vectorize::gemm(false, false, rows, gates, in_size, buffer, in_size, &W[0],
+                  gates, dst, gates);
+}
+
+/**
+ * the gate inputs from x of every sample of x at once, x W + b, into proj
+ * (x.size() x gates). A recurrent layer runs this for all the steps of a
+ * sequence before the steps, which then only add the recurrent part.
+ **/
+inline void project_inputs(const tensor_t &x,
+                           const vec_t &W,
+                           const vec_t &b,
+                           size_t in_size,
+                           size_t gates,
+                           vec_t &proj,
+                           const bool layer_parallelize) {
+  proj.resize(x.size() * gates);
+  for_(layer_parallelize, 0u, x.size(), [&](const blocked_range &r) {
+    vec_t buffer((r.end() - r.begin()) * in_size);
+    project_rows(x, r.begin(), r.end(), W, b, in_size, gates, buffer.data(),
+                 &proj[r.begin() * gates]);
+  });
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
@@ -0,0 +1,96 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <cmath>
+
+#include "tinydnn/core/conv_params.h"
+#include "tinydnn/backend/kernels/conv2d_op_fft.h"
+#include "tinydnn/backend/kernels/conv2d_op_gemm.h"
+#include "tinydnn/backend/kernels/conv2d_op_winograd.h"
+
+namespace tinydnn {
+namespace kernels {
+
+enum class conv2d_algorithm { direct, gemm, winograd, fft };
+
+/**
+ * estimated time of the forward kernels for one sample, in about
+ * nanoseconds on one core. The coefficients were fitted to measurements
+ * of layers with 1-64 channels, 3x3 to 11x11 kernels and 32x32 to 128x128
+ * inputs; only their ratios matter.
+ */
+inline double conv2d_direct_cost(const core::conv_params &params) {
+  double macs = static_cast<double>(params.in.depth_ * params.weight.area() *
+                                    params.out.depth_ * params.out.area());
+  return 0.55 * macs;
+}
+
+inline double conv2d_gemm_cost(const core::conv_params &params) {
+  double k    = static_cast<double>(params.in.depth_ * params.weight.area());
+  double np   = static_cast<double>(params.out.area());
+  double macs = k * np * params.out.depth_;
+  return 0.04 * macs + 1.35 * k * np;  // GEMM + im2col
+}
+
+inline double conv2d_fft_cost(const core::conv_params &params) {
+  const size_t th =
+    conv2d_fft_tile_size(params.in_padded.height_, params.weight.height_);
+  const size_t tw =
+    conv2d_fft_tile_size(params.in_padded.width_, params.weight.width_);
+  const size_t sy     = th - params.weight.height_ + 1;
+  const size_t sx     = tw - params.weight.width_ + 1;
+  const size_t rows   = (params.out.height_ + sy - 1) / sy;
+  const size_t tiles  = rows * ((params.out.width_ + sx - 1) / sx);
+  const size_t f      = th * (tw / 2 + 1);
+  const size_t chunk  = conv2d_fft_chunk(params, tiles, f);
+  const double id     = static_cast<double>(params.in.depth_);
+  const double od     = static_cast<double>(params.out.depth_);
+  const double n      = static_cast<double>(th * tw);
+  const double chunks = static_cast<double>((tiles + chunk - 1) / chunk);
+  const double ffts   = static_cast<double>(tiles) * (id + od);
+  const double macs   = 4 * id * od * static_cast<double>(f);
+
+  // transforms, and 4 GEMMs per frequency and chunk (packing + products)
+  return 0.7 * ffts * n * std::log2(n) +
+         macs * (0.02 * static_cast<double>(tiles) + 1.6 * chunks);
+}
+
+/**
+ * the forward kernel for the layer: Winograd for the 3x3, stride 1 layers
+ * it applies to, otherwise the cheapest of direct, GEMM and FFT by the
+ * estimates above
+ */
+inline conv2d_algorithm conv2d_choose_algorithm(
+  const core::conv_params &params) {
+  if (conv2d_winograd_tile(params)) return conv2d_algorithm::winograd;
+
+  conv2d_algorithm best = conv2d_algorithm::direct;
+  double cost           = conv2d_direct_cost(params);
+
+  if (conv2d_use_gemm(params) && conv2d_gemm_cost(params) < cost) {
+    best = conv2d_algorithm::gemm;
+    cost = conv2d_gemm_cost(params);
+  }
+
+  // the kernel spectra are cached, keep them below 256MB
+  const size_t th =
+    conv2d_fft_tile_size(params.in_padded.height_, params.weight.height_);
+  const size_t tw =
+    conv2d_fft_tile_size(params.in_padded.width_, params.weight.width_);
+  const size_t spectra =
+    3 * th * (tw / 2 + 1) * params.in.depth_ * params.out.depth_;
+  if (conv2d_fft_applicable(params) && spectra <= (size_t(1) << 26) &&
+      conv2d_fft_cost(params) < cost) {
+    best = conv2d_algorithm::fft;
+  }
+  return best;
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
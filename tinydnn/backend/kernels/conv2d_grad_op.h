@@ -9,6 +9,8 @@
 
 #include "tinydnn/core/op_kernel.h"
 #include "tinydnn/backend/kernels/conv2d_grad_op_avx.h"
+#include "tinydnn/backend/kernels/conv2d_op_cblas.h"
+#include "tinydnn/backend/kernels/conv2d_op_gemm.h"
 #include "tinydnn/backend/kernels/conv2d_op_internal.h"
 
 namespace tinydnn {
@@ -38,11 +40,19 @@ class Conv2dGradOp : public core::OpKernel {
     const core::backend_t engine = context.engine();
 
     if (engine == core::backend_t::internal) {
-      kernels::conv2d_op_internal(prev_out, W[0], dW, db, curr_delta,
-                                  prev_delta, params, context.parallelize());
+      if (kernels::conv2d_use_gemm(params)) {
+        kernels::conv2d_op_gemm(prev_out, W[0], dW, db, curr_delta, prev_delta,
+                                params, context.parallelize());
+      } else {
+        kernels::conv2d_op_internal(prev_out, W[0], dW, db, curr_delta,
+                                    prev_delta, params, context.parallelize());
+      }
     } else if (engine == core::backend_t::avx) {
       kernels::conv2d_grad_op_avx(prev_out, W[0], dW, db, curr_delta,
                                   prev_delta, params, context.parallelize());
+    } else if (engine == core::backend_t::cblas) {
+      kernels::conv2d_op_cblas(prev_out, W[0], dW, db, curr_delta, prev_delta,
+                               params, context.parallelize());
     } else {
       throw nn_error("Not supported engine: " + to_string(engine));
     }
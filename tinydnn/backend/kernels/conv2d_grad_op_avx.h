@@ -8,6 +8,7 @@
 #pragma once
 
 #include <vector>
+#include "tinydnn/backend/kernels/conv2d_op_gemm.h"
 #include "tinydnn/backend/kernels/conv2d_op_internal.h"
 #include "tinydnn/core/conv_params.h"
 #ifdef USE_AVX
@@ -866,10 +867,15 @@ void avx_conv2d_5x5_back_kernel(
   std::vector<std::vector<float, Allocator>> &curr_delta,
   std::vector<std::vector<float, Allocator>> &prev_delta,
   bool layer_parallelize) {
-  for_i(layer_parallelize, prev_out.size(), [&](size_t sample) {
-    avx_conv2d_5x5_back_kernel_one(params, prev_out[sample], W, dW[sample],
-                                   db[sample], curr_delta[sample],
-                                   &prev_delta[sample]);
+  // samples of one slot share its dW/db accumulator, see conv2d_op_internal
+  const size_t num_slots = dW.size();
+  for_i(layer_parallelize, num_slots, [&](size_t slot) {
+    blocked_range samples = accumulator_range(slot, prev_out.size(), num_slots);
+    for (size_t sample = samples.begin(); sample < samples.end(); sample++) {
+      avx_conv2d_5x5_back_kernel_one(params, prev_out[sample], W, dW[slot],
+                                     db[slot], curr_delta[sample],
+                                     &prev_delta[sample]);
+    }
   });
 }
 
@@ -884,13 +890,19 @@ inline void conv2d_grad_op_avx(const tensor_t &prev_out,
                                const core::conv_params &params,
                                const bool layer_parallelize) {
 #ifdef USE_AVX
-  if (params.weight.height_ == 5 && params.weight.width_ == 5) {
+  if (params.weight.height_ == 5 && params.weight.width_ == 5 &&
+      !conv2d_use_avx512_gemm(params)) {
     avx_conv2d_5x5_back_kernel(params, prev_out, W, dW, db, curr_delta,
                                prev_delta, layer_parallelize);
     return;
   }
 #endif
 
+  if (conv2d_use_gemm(params)) {
+    conv2d_op_gemm(prev_out, W, dW, db, curr_delta, prev_delta, params,
+                   layer_parallelize);
+    return;
+  }
   conv2d_op_internal(prev_out, W, dW, db, curr_delta, prev_delta, params,
                      layer_parallelize);
 }
@@ -8,7 +8,9 @@
 #pragma once
 
 #include "tinydnn/core/op_kernel.h"
+#include "tinydnn/backend/kernels/conv2d_algorithm.h"
 #include "tinydnn/backend/kernels/conv2d_op_avx.h"
+#include "tinydnn/backend/kernels/conv2d_op_cblas.h"
 #include "tinydnn/backend/kernels/conv2d_op_internal.h"
 #include "tinydnn/backend/kernels/conv2d_op_nnpack.h"
 
@@ -37,17 +39,70 @@ class Conv2dOp : public core::OpKernel {
     const core::backend_t engine = context.engine();
 
     if (engine == core::backend_t::internal) {
-      kernels::conv2d_op_internal(in_data, W[0], bias[0], out_data, params,
+      // estimate which algorithm is fastest for the layer
+      switch (kernels::conv2d_choose_algorithm(params)) {
+        case kernels::conv2d_algorithm::winograd:
+          compute_winograd(in_data, W[0], bias[0], out_data, params,
+                           context.weightsVersion(), context.parallelize());
+          break;
+        case kernels::conv2d_algorithm::fft:
+          kernels::conv2d_op_fft(in_data, W[0], bias[0], out_data, params,
+                                 context.weightsVersion(), fft_,
+                                 context.parallelize());
+          break;
+        case kernels::conv2d_algorithm::gemm:
+          kernels::conv2d_op_gemm(in_data, W[0], bias[0], out_data, params,
                                   context.parallelize());
+          break;
+        default:
+          kernels::conv2d_op_internal(in_data, W[0], bias[0], out_data,
+                                      params, context.parallelize());
+          break;
+      }
     } else if (engine == core::backend_t::nnpack) {
       kernels::conv2d_op_nnpack(in_data, W[0], bias[0], out_data, params);
     } else if (engine == core::backend_t::avx) {
-      kernels::conv2d_op_avx(in_data, W[0], bias[0], out_data, params,
-                             context.parallelize());
+      // Winograd and FFT take over where they are expected to be faster
+      switch (kernels::conv2d_choose_algorithm(params)) {
+        case kernels::conv2d_algorithm::winograd:
+          compute_winograd(in_data, W[0], bias[0], out_data, params,
+                           context.weightsVersion(), context.parallelize());
+          break;
+        case kernels::conv2d_algorithm::fft:
+          kernels::conv2d_op_fft(in_data, W[0], bias[0], out_data, params,
+                                 context.weightsVersion(), fft_,
+                                 context.parallelize());
+          break;
+        default:
+          kernels::conv2d_op_avx(in_data, W[0], bias[0], out_data, params,
+                                 context.parallelize());
+          break;
+      }
+    } else if (engine == core::backend_t::cblas) {
+      kernels::conv2d_op_cblas(in_data, W[0], bias[0], out_data, params,
+                               context.parallelize());
     } else {
       throw nn_error("Not supported engine: " + to_string(engine));
     }
   }
+
+ private:
+  void compute_winograd(const tensor_t &in_data,
+                        const vec_t &W,
+                        const vec_t &bias,
+                        tensor_t &out_data,
+                        const core::conv_params &params,
+                        size_t weights_version,
+                        const bool parallelize) {
+    kernels::conv2d_op_winograd(in_data, W, bias, out_data, params,
+                                kernels::conv2d_winograd_tile(params),
+                                weights_version, *params.winograd_cache,
+                                parallelize);
+  }
+
+  // transformed weights of the FFT path, kept between calls (the Winograd
+  // ones are shared through the params, see conv_params::winograd_cache)
+  kernels::conv2d_fft_cache fft_;
 };
 
 }  // namespace tinydnn
@@ -8,6 +8,7 @@
 #pragma once
 
 #include <vector>
+#include "tinydnn/backend/kernels/conv2d_op_gemm.h"
 #include "tinydnn/backend/kernels/conv2d_op_internal.h"
 #include "tinydnn/core/conv_params.h"
 
@@ -455,7 +456,8 @@ inline void conv2d_op_avx(const tensor_t &in_data,
                           const core::conv_params &params,
                           const bool layer_parallelize) {
 #ifdef USE_AVX
-  if (params.weight.height_ == 5 && params.weight.width_ == 5) {
+  if (params.weight.height_ == 5 && params.weight.width_ == 5 &&
+      !conv2d_use_avx512_gemm(params)) {
     // @todo consider better parallelization
     for_i(layer_parallelize, in_data.size(), [&](size_t i) {
       avx_conv2d_5x5_kernel(params, in_data[i], W, bias, out_data[i],
@@ -464,6 +466,10 @@ inline void conv2d_op_avx(const tensor_t &in_data,
     return;
   }
 #endif
+  if (conv2d_use_gemm(params)) {
+    conv2d_op_gemm(in_data, W, bias, out_data, params, layer_parallelize);
+    return;
+  }
   conv2d_op_internal(in_data, W, bias, out_data, params, layer_parallelize);
 }
 
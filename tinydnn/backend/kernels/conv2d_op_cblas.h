@@ -0,0 +1,118 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <numeric>
+
+#include "tinydnn/backend/backend_blas.h"
+#include "tinydnn/backend/kernels/conv2d_op_gemm.h"
+#include "tinydnn/backend/kernels/conv2d_op_internal.h"
+#include "tinydnn/core/conv_params.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * forward convolution as im2col + BLAS GEMM per block of output pixels,
+ * see conv2d_op_gemm. The samples run one after another, the BLAS library
+ * runs its own threads. Layers with a connection table use
+ * conv2d_op_internal.
+ */
+inline void conv2d_op_cblas(const tensor_t &in_data,
+                            const vec_t &W,
+                            const vec_t &bias,
+                            tensor_t &out_data,
+                            const core::conv_params &params,
+                            const bool parallelize) {
+  if (!params.tbl.is_empty()) {
+    conv2d_op_internal(in_data, W, bias, out_data, params, parallelize);
+    return;
+  }
+
+  const size_t od   = params.out.depth_;
+  const size_t np   = params.out.area();
+  const size_t k    = params.in.depth_ * params.weight.area();
+  const size_t cols = conv2d_gemm_columns(params);
+
+  thread_local vec_t col;
+  col.resize(k * cols);
+
+  for (size_t sample = 0; sample < in_data.size(); sample++) {
+    float_t *out = &out_data[sample][0];
+    for (size_t p0 = 0; p0 < np; p0 += cols) {
+      const size_t n = std::min(cols, np - p0);
+      conv2d_im2col(&in_data[sample][0], params, p0, p0 + n, &col[0]);
+      core::blas_gemm(false, false, od, n, k, float_t{1}, &W[0], k, &col[0],
+                      n, float_t{1}, out + p0, np);
+    }
+
+    if (params.has_bias) {
+      for (size_t o = 0; o < od; o++) {
+        vectorize::add(bias[o], np, out + o * np);
+      }
+    }
+  }
+}
+
+/**
+ * backward convolution as im2col + BLAS GEMM: dW += delta * col^T, and
+ * prev_delta gets col2im(W^T * delta). All samples are summed into the
+ * first dW/db slot.
+ */
+inline void conv2d_op_cblas(const tensor_t &prev_out,
+                            const vec_t &W,
+                            tensor_t &dW,
+                            tensor_t &db,
+                            tensor_t &curr_delta,
+                            tensor_t &prev_delta,
+                            const core::conv_params &params,
+                            const bool parallelize) {
+  if (!params.tbl.is_empty()) {
+    conv2d_op_internal(prev_out, W, dW, db, curr_delta, prev_delta, params,
+                       parallelize);
+    return;
+  }
+
+  const size_t od   = params.out.depth_;
+  const size_t np   = params.out.area();
+  const size_t k    = params.in.depth_ * params.weight.area();
+  const size_t cols = conv2d_gemm_columns(params);
+
+  thread_local vec_t col, dcol;
+  col.resize(k * cols);
+  dcol.resize(k * cols);
+
+  for (size_t sample = 0; sample < prev_out.size(); sample++) {
+    const float_t *delta = &curr_delta[sample][0];
+
+    for (size_t p0 = 0; p0 < np; p0 += cols) {
+      const size_t n = std::min(cols, np - p0);
+
+      // dW[o][k] += sum_p delta[o][p] * col[k][p]
+      conv2d_im2col(&prev_out[sample][0], params, p0, p0 + n, &col[0]);
+      core::blas_gemm(false, true, od, k, n, float_t{1}, delta + p0, np,
+                      &col[0], n, float_t{1}, &dW[0][0], k);
+
+      // dcol[k][p] = sum_o W[o][k] * delta[o][p]
+      core::blas_gemm(true, false, k, n, od, float_t{1}, &W[0], k, delta + p0,
+                      np, float_t{0}, &dcol[0], n);
+      conv2d_col2im(&dcol[0], params, p0, p0 + n, &prev_delta[sample][0]);
+    }
+
+    if (params.has_bias) {
+      for (size_t o = 0; o < od; o++) {
+        db[0][o] +=
+          std::accumulate(delta + o * np, delta + (o + 1) * np, float_t{0});
+      }
+    }
+  }
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
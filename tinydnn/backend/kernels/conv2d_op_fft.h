@@ -0,0 +1,311 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <vector>
+
+#include "tinydnn/core/conv_params.h"
+#include "tinydnn/utils/fft.h"
+#include "tinydnn/utils/utils.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * kernel spectra and scratch buffers of conv2d_op_fft. The spectra are only
+ * recomputed if the version of the weights changes (see edge::data_version),
+ * i.e. once per weight update. All
+ * spectra are stored as separate real and imaginary parts, frequency
+ * major, so that the sums over the channels are real GEMMs.
+ */
+struct conv2d_fft_cache {
+  size_t th = 0;  // height of the FFT tiles
+  size_t tw = 0;  // width of the FFT tiles
+  size_t version = 0;  // version of the weights of the spectra, 0 if none
+  vec_t Wr;       // kernel spectra, [th * (tw / 2 + 1)][out.depth][in.depth]
+  vec_t Wi;
+  vec_t Wi_neg;  // -Wi
+  vec_t Xr;      // input tile spectra, [th * (tw / 2 + 1)][in.depth][T]
+  vec_t Xi;
+  vec_t Pr;  // products, [th * (tw / 2 + 1)][out.depth][T]
+  vec_t Pi;
+};
+
+/**
+ * true if conv2d_op_fft can compute the layer (dense connections, stride
+ * and dilation 1)
+ */
+inline bool conv2d_fft_applicable(const core::conv_params &params) {
+  return params.tbl.is_empty() && params.w_stride == 1 &&
+         params.h_stride == 1 && params.w_dilation == 1 &&
+         params.h_dilation == 1;
+}
+
+/**
+ * FFT size along one axis for an input of length in and a kernel of
+ * length k: a power of two of about 4 * k, so that most of each tile
+ * (t - k + 1 outputs) is valid, but no larger than the input needs
+ */
+inline size_t conv2d_fft_tile_size(size_t in, size_t k) {
+  size_t t = 8;
+  while (t < 4 * k && t < in) t <<= 1;
+  return t;
+}
+
+/**
+ * number of tiles of a sample processed at once, bounds the spectra of the
+ * input tiles and products to about 8MB
+ */
+inline size_t conv2d_fft_chunk(const core::conv_params &params,
+                               size_t tiles,
+                               size_t f) {
+  size_t channels = params.in.depth_ + params.out.depth_;
+  return std::max<size_t>(1,
+                          std::min(tiles, (size_t(1) << 20) / (channels * f)));
+}
+
+namespace detail {
+
+// spectrum S[ky][kx], kx <= tw / 2, of a real th x tw tile. Two rows are
+// transformed at once as the real and imaginary part of one complex row,
+// then the tw / 2 + 1 columns are transformed. work holds tw values.
+inline void fft2d_forward(const fft_plan &rows,
+                          const fft_plan &cols,
+                          const float_t *in,
+                          complex_t *spec,
+                          complex_t *work) {
+  const size_t th = cols.size();
+  const size_t tw = rows.size();
+  const size_t fw = tw / 2 + 1;
+
+  for (size_t y = 0; y < th; y += 2) {
+    for (size_t x = 0; x < tw; x++) {
+      work[x] = complex_t(in[y * tw + x], in[(y + 1) * tw + x]);
+    }
+    rows.forward(work);
+    // Z = X + iY with real x, y: X = (Z[k] + Z*[-k]) / 2, Y = (Z[k] -
+    // Z*[-k]) / 2i
+    for (size_t k = 0; k < fw; k++) {
+      const complex_t a = work[k];
+      const complex_t b = std::conj(work[(tw - k) % tw]);
+      const complex_t d = a - b;
+      spec[y * fw + k]       = (a + b) * float_t(0.5);
+      spec[(y + 1) * fw + k] = complex_t(d.imag(), -d.real()) * float_t(0.5);
+    }
+  }
+  cols.forward(spec, fw, fw);
+}
+
+// inverse of fft2d_forward, scaled by th * tw. spec is overwritten.
+inline void fft2d_inverse(const fft_plan &rows,
+                          const fft_plan &cols,
+                          complex_t *spec,
+                          float_t *out,
+                          complex_t *work) {
+  const size_t th = cols.size();
+  const size_t tw = rows.size();
+  const size_t fw = tw / 2 + 1;
+
+  cols.inverse(spec, fw, fw);
+  for (size_t y = 0; y < th; y += 2) {
+    // the rows are real, so the missing half of their spectra is the
+    // conjugate mirror of the stored one
+    for (size_t k = 0; k < tw; k++) {
+      const complex_t a =
+        k < fw ? spec[y * fw + k] : std::conj(spec[y * fw + tw - k]);
+      const complex_t b = k < fw ? spec[(y + 1) * fw + k]
+                                 : std::conj(spec[(y + 1) * fw + tw - k]);
+      work[k] = complex_t(a.real() - b.imag(), a.imag() + b.real());
+    }
+    rows.inverse(work);
+    for (size_t x = 0; x < tw; x++) {
+      out[y * tw + x]       = work[x].real();
+      out[(y + 1) * tw + x] = work[x].imag();
+    }
+  }
+}
+
+}  // namespace detail
+
+/**
+ * W[xi][o][c] = FFT of the kernel connecting input channel c to output o,
+ * zero-padded to the tile size, unless the cache was computed from the
+ * same version of the weights. Version 0 means unknown and always
+ * recomputes.
+ */
+inline void conv2d_fft_weights(const vec_t &W,
+                               const core::conv_params &params,
+                               size_t weights_version,
+                               conv2d_fft_cache &cache) {
+  const size_t th =
+    conv2d_fft_tile_size(params.in_padded.height_, params.weight.height_);
+  const size_t tw =
+    conv2d_fft_tile_size(params.in_padded.width_, params.weight.width_);
+  if (weights_version != 0 && cache.version == weights_version &&
+      cache.th == th && cache.tw == tw) {
+    return;
+  }
+
+  const size_t id = params.in.depth_;
+  const size_t od = params.out.depth_;
+  const size_t kh = params.weight.height_;
+  const size_t kw = params.weight.width_;
+  const size_t f  = th * (tw / 2 + 1);
+  const fft_plan rows(tw), cols(th);
+
+  cache.Wr.resize(f * od * id);
+  cache.Wi.resize(f * od * id);
+  cache.Wi_neg.resize(f * od * id);
+  vec_t tile(th * tw, float_t{0});
+  std::vector<complex_t> spec(f), work(tw);
+  for (size_t i = 0; i < od * id; i++) {
+    const float_t *w = &W[params.weight.get_index(0, 0, i)];
+    for (size_t y = 0; y < kh; y++) {
+      std::copy(w + y * kw, w + (y + 1) * kw, &tile[y * tw]);
+    }
+    detail::fft2d_forward(rows, cols, &tile[0], &spec[0], &work[0]);
+    for (size_t xi = 0; xi < f; xi++) {
+      cache.Wr[xi * od * id + i]     = spec[xi].real();
+      cache.Wi[xi * od * id + i]     = spec[xi].imag();
+      cache.Wi_neg[xi * od * id + i] = -spec[xi].imag();
+    }
+  }
+  cache.th      = th;
+  cache.tw      = tw;
+  cache.version = weights_version;
+}
+
+/**
+ * forward convolution in the frequency domain (overlap-save).
+ *
+ * The output is split into tiles of (th - kh + 1) x (tw - kw + 1) pixels.
+ * The th x tw input tile of every tile and channel is transformed once.
+ * For every frequency, the products with the conjugated kernel spectra
+ * summed over the input channels are four real GEMMs:
+ *
+ *     Pr = Wr * Xr + Wi * Xi,  Pi = Wr * Xi - Wi * Xr
+ *
+ * and each output channel is transformed back once per tile. The cost per
+ * output hardly depends on the kernel size, so this pays off for large
+ * kernels.
+ */
+inline void conv2d_op_fft(const tensor_t &in_data,
+                          const vec_t &W,
+                          const vec_t &bias,
+                          tensor_t &out_data,
+                          const core::conv_params &params,
+                          size_t weights_version,
+                          conv2d_fft_cache &cache,
+                          const bool parallelize) {
+  conv2d_fft_weights(W, params, weights_version, cache);
+
+  const size_t th      = cache.th;
+  const size_t tw      = cache.tw;
+  const size_t f       = th * (tw / 2 + 1);
+  const size_t id      = params.in.depth_;
+  const size_t od      = params.out.depth_;
+  const size_t iw      = params.in_padded.width_;
+  const size_t ih      = params.in_padded.height_;
+  const size_t ow      = params.out.width_;
+  const size_t oh      = params.out.height_;
+  const size_t sy      = th - params.weight.height_ + 1;
+  const size_t sx      = tw - params.weight.width_ + 1;
+  const size_t tiles_x = (ow + sx - 1) / sx;
+  const size_t tiles   = tiles_x * ((oh + sy - 1) / sy);
+  const float_t scale  = float_t(1) / static_cast<float_t>(th * tw);
+  const fft_plan rows(tw), cols(th);
+
+  const size_t chunk = conv2d_fft_chunk(params, tiles, f);
+  cache.Xr.resize(f * id * chunk);
+  cache.Xi.resize(f * id * chunk);
+  cache.Pr.resize(f * od * chunk);
+  cache.Pi.resize(f * od * chunk);
+
+  for (size_t sample = 0; sample < in_data.size(); sample++) {
+    const vec_t &in = in_data[sample];
+    vec_t &out      = out_data[sample];
+
+    for (size_t t0 = 0; t0 < tiles; t0 += chunk) {
+      const size_t nt = std::min(chunk, tiles - t0);
+
+      // X[xi][c][t] = FFT(input tile)[xi]
+      for_i(parallelize, id, [&](size_t c) {
+        thread_local vec_t tile;
+        thread_local std::vector<complex_t> spec, work;
+        tile.resize(th * tw);
+        spec.resize(f);
+        work.resize(tw);
+
+        const float_t *pin = &in[params.in_padded.get_index(0, 0, c)];
+        for (size_t t = 0; t < nt; t++) {
+          const size_t y0 = ((t0 + t) / tiles_x) * sy;
+          const size_t x0 = ((t0 + t) % tiles_x) * sx;
+          for (size_t y = 0; y < th; y++) {
+            for (size_t x = 0; x < tw; x++) {
+              bool inside = y0 + y < ih && x0 + x < iw;
+              tile[y * tw + x] =
+                inside ? pin[(y0 + y) * iw + x0 + x] : float_t{0};
+            }
+          }
+          detail::fft2d_forward(rows, cols, &tile[0], &spec[0], &work[0]);
+          for (size_t xi = 0; xi < f; xi++) {
+            cache.Xr[(xi * id + c) * chunk + t] = spec[xi].real();
+            cache.Xi[(xi * id + c) * chunk + t] = spec[xi].imag();
+          }
+        }
+      });
+
+      // P[xi] = conj(W[xi]) * X[xi], a correlation
+      for_i(parallelize, f, [&](size_t xi) {
+        const float_t *wr = &cache.Wr[xi * od * id];
+        const float_t *wi = &cache.Wi[xi * od * id];
+        const float_t *wn = &cache.Wi_neg[xi * od * id];
+        const float_t *xr = &cache.Xr[xi * id * chunk];
+        const float_t *xm = &cache.Xi[xi * id * chunk];
+        float_t *pr       = &cache.Pr[xi * od * chunk];
+        float_t *pi       = &cache.Pi[xi * od * chunk];
+        std::fill(pr, pr + od * chunk, float_t{0});
+        std::fill(pi, pi + od * chunk, float_t{0});
+        vectorize::gemm(false, false, od, nt, id, wr, id, xr, chunk, pr, chunk);
+        vectorize::gemm(false, false, od, nt, id, wi, id, xm, chunk, pr, chunk);
+        vectorize::gemm(false, false, od, nt, id, wr, id, xm, chunk, pi, chunk);
+        vectorize::gemm(false, false, od, nt, id, wn, id, xr, chunk, pi, chunk);
+      });
+
+      // out[o] = IFFT(P[o])
+      for_i(parallelize, od, [&](size_t o) {
+        thread_local vec_t tile;
+        thread_local std::vector<complex_t> spec, work;
+        tile.resize(th * tw);
+        spec.resize(f);
+        work.resize(tw);
+
+        float_t *pout   = &out[params.out.get_index(0, 0, o)];
+        const float_t b = params.has_bias ? bias[o] : float_t{0};
+        for (size_t t = 0; t < nt; t++) {
+          const size_t y0 = ((t0 + t) / tiles_x) * sy;
+          const size_t x0 = ((t0 + t) % tiles_x) * sx;
+          for (size_t xi = 0; xi < f; xi++) {
+            spec[xi] = complex_t(cache.Pr[(xi * od + o) * chunk + t],
+                                 cache.Pi[(xi * od + o) * chunk + t]);
+          }
+          detail::fft2d_inverse(rows, cols, &spec[0], &tile[0], &work[0]);
+          for (size_t y = 0; y < sy && y0 + y < oh; y++) {
+            for (size_t x = 0; x < sx && x0 + x < ow; x++) {
+              pout[(y0 + y) * ow + x0 + x] += tile[y * tw + x] * scale + b;
+            }
+          }
+        }
+      });
+    }
+  }
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
@@ -0,0 +1,209 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <numeric>
+
+#include "tinydnn/core/conv_params.h"
+#include "tinydnn/utils/utils.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * true if the im2col + GEMM path is expected to beat the direct loops of
+ * conv2d_op_internal. im2col costs about one copy of the receptive fields,
+ * which pays off once a sample needs enough multiply-adds.
+ */
+inline bool conv2d_use_gemm(const core::conv_params &params) {
+  if (!params.tbl.is_empty()) return false;  // sparse connections
+
+  size_t k    = params.in.depth_ * params.weight.area();
+  size_t macs = k * params.out.depth_ * params.out.area();
+  return params.out.depth_ >= 8 && k >= 16 && macs >= (size_t(1) << 20);
+}
+
+/**
+ * true if the avx engine should take the GEMM path over its hand-written
+ * 256-bit 5x5 kernels: with AVX-512 the GEMM micro-kernel is twice as wide
+ */
+inline bool conv2d_use_avx512_gemm(const core::conv_params &params) {
+  return vectorize::active_isa() >= vectorize::isa::avx512 &&
+         conv2d_use_gemm(params);
+}
+
+/**
+ * number of output pixels lowered by im2col at a time. keeps the column
+ * buffer (receptive field x columns) at about 512KB
+ */
+inline size_t conv2d_gemm_columns(const core::conv_params &params) {
+  size_t k  = params.in.depth_ * params.weight.area();
+  size_t np = params.out.area();
+  return std::min(np, std::max<size_t>(16, (size_t(1) << 17) / k));
+}
+
+/**
+ * lower the receptive fields of the output pixels [p0, p1) of one padded
+ * input sample into a (in.depth * kh * kw) x (p1 - p0) matrix
+ */
+inline void conv2d_im2col(const float_t *in,
+                          const core::conv_params &params,
+                          size_t p0,
+                          size_t p1,
+                          float_t *col) {
+  const size_t iw = params.in_padded.width_;
+  const size_t ow = params.out.width_;
+  const size_t n  = p1 - p0;
+
+  for (size_t inc = 0; inc < params.in.depth_; inc++) {
+    for (size_t wy = 0; wy < params.weight.height_; wy++) {
+      for (size_t wx = 0; wx < params.weight.width_; wx++) {
+        const float_t *pin = in + params.in_padded.get_index(0, 0, inc) +
+                             wy * params.h_dilation * iw +
+                             wx * params.w_dilation;
+        size_t y = p0 / ow, x = p0 % ow;
+        for (size_t j = 0; j < n; j++) {
+          col[j] = pin[y * params.h_stride * iw + x * params.w_stride];
+          if (++x == ow) {
+            x = 0;
+            y++;
+          }
+        }
+        col += n;
+      }
+    }
+  }
+}
+
+/**
+ * add the columns of col (see conv2d_im2col) back to the receptive fields
+ * of the output pixels [p0, p1) of one padded input sample
+ */
+inline void conv2d_col2im(const float_t *col,
+                          const core::conv_params &params,
+                          size_t p0,
+                          size_t p1,
+                          float_t *in) {
+  const size_t iw = params.in_padded.width_;
+  const size_t ow = params.out.width_;
+  const size_t n  = p1 - p0;
+
+  for (size_t inc = 0; inc < params.in.depth_; inc++) {
+    for (size_t wy = 0; wy < params.weight.height_; wy++) {
+      for (size_t wx = 0; wx < params.weight.width_; wx++) {
+        float_t *pin = in + params.in_padded.get_index(0, 0, inc) +
+                       wy * params.h_dilation * iw + wx * params.w_dilation;
+        size_t y = p0 / ow, x = p0 % ow;
+        for (size_t j = 0; j < n; j++) {
+          pin[y * params.h_stride * iw + x * params.w_stride] += col[j];
+          if (++x == ow) {
+            x = 0;
+            y++;
+          }
+        }
+        col += n;
+      }
+    }
+  }
+}
+
+/**
+ * forward convolution as a GEMM per block of output pixels:
+ * out[o][p] += sum_k W[o][k] * col[k][p], where col holds the receptive
+ * fields (im2col) of the block.
+ */
+inline void conv2d_op_gemm(const tensor_t &in_data,
+                           const vec_t &W,
+                           const vec_t &bias,
+                           tensor_t &out_data,
+                           const core::conv_params &params,
+                           const bool parallelize) {
+  const size_t od         = params.out.depth_;
+  const size_t np         = params.out.area();
+  const size_t k          = params.in.depth_ * params.weight.area();
+  const size_t cols       = conv2d_gemm_columns(params);
+  const size_t num_blocks = (np + cols - 1) / cols;
+
+  for_i(parallelize, in_data.size() * num_blocks, [&](size_t task) {
+    const size_t sample = task / num_blocks;
+    const size_t p0     = (task % num_blocks) * cols;
+    const size_t p1     = std::min(p0 + cols, np);
+
+    thread_local vec_t col;
+    col.resize(k * cols);
+    conv2d_im2col(&in_data[sample][0], params, p0, p1, &col[0]);
+
+    float_t *out = &out_data[sample][0];
+    vectorize::gemm(false, false, od, p1 - p0, k, &W[0], k, &col[0], p1 - p0,
+                    out + p0, np);
+
+    if (params.has_bias) {
+      for (size_t o = 0; o < od; o++) {
+        vectorize::add(bias[o], p1 - p0, out + o * np + p0);
+      }
+    }
+  });
+}
+
+/**
+ * backward convolution with the same lowering as the forward pass:
+ * dW += delta * col^T, and prev_delta gets col2im(W^T * delta).
+ * The samples of one dW/db slot run one after another, the slots run in
+ * parallel (see conv2d_op_internal).
+ */
+inline void conv2d_op_gemm(const tensor_t &prev_out,
+                           const vec_t &W,
+                           tensor_t &dW,
+                           tensor_t &db,
+                           tensor_t &curr_delta,
+                           tensor_t &prev_delta,
+                           const core::conv_params &params,
+                           const bool parallelize) {
+  const size_t od   = params.out.depth_;
+  const size_t np   = params.out.area();
+  const size_t k    = params.in.depth_ * params.weight.area();
+  const size_t cols = conv2d_gemm_columns(params);
+
+  const size_t num_slots = dW.size();
+  for_i(parallelize, num_slots, [&](size_t slot) {
+    thread_local vec_t col, dcol;
+    col.resize(k * cols);
+    dcol.resize(k * cols);
+
+    blocked_range samples = accumulator_range(slot, prev_out.size(), num_slots);
+    for (size_t sample = samples.begin(); sample < samples.end(); sample++) {
+      const float_t *delta = &curr_delta[sample][0];
+
+      for (size_t p0 = 0; p0 < np; p0 += cols) {
+        const size_t n = std::min(cols, np - p0);
+
+        // dW[o][k] += sum_p delta[o][p] * col[k][p]
+        conv2d_im2col(&prev_out[sample][0], params, p0, p0 + n, &col[0]);
+        vectorize::gemm(false, true, od, k, n, delta + p0, np, &col[0], n,
+                        &dW[slot][0], k);
+
+        // dcol[k][p] = sum_o W[o][k] * delta[o][p]
+        std::fill(dcol.begin(), dcol.begin() + k * n, float_t{0});
+        vectorize::gemm(true, false, k, n, od, &W[0], k, delta + p0, np,
+                        &dcol[0], n);
+        conv2d_col2im(&dcol[0], params, p0, p0 + n, &prev_delta[sample][0]);
+      }
+
+      if (params.has_bias) {
+        for (size_t o = 0; o < od; o++) {
+          db[slot][o] += std::accumulate(delta + o * np, delta + (o + 1) * np,
+                                         float_t{0});
+        }
+      }
+    }
+  });
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
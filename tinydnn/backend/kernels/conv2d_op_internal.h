@@ -16,57 +16,66 @@ inline void conv2d_op_internal(const tensor_t &in_data,
                                tensor_t &out_data,
                                const core::conv_params &params,
                                const bool parallelize) {
-  for_(parallelize, 0u, in_data.size(),
+  size_t od = params.out.depth_;
+  size_t oh = params.out.height_;
+
+  // one task per (sample, output channel, block of output rows). rows are
+  // only split if there are fewer channels*samples than threads
+  size_t row_split = intra_item_split(parallelize, in_data.size() * od, oh);
+  size_t num_tasks = in_data.size() * od * row_split;
+
+  for_(parallelize, 0u, num_tasks,
        [&](const blocked_range &r) {
-         size_t out_area    = params.out.area();
          size_t iw          = params.in_padded.width_;
          size_t id          = params.in.depth_;
          size_t ow          = params.out.width_;
-         size_t oh          = params.out.height_;
-         size_t od          = params.out.depth_;
          size_t kw          = params.weight.width_;
          size_t kh          = params.weight.height_;
          size_t w_dilation  = params.w_dilation;
          size_t h_dilation  = params.h_dilation;
          size_t elem_stride = params.w_stride;
          size_t line_stride = iw * params.h_stride;
-         for (size_t sample = r.begin(); sample < r.end(); sample++) {
+         for (size_t task = r.begin(); task < r.end(); task++) {
+           size_t part   = task % row_split;
+           size_t o      = (task / row_split) % od;
+           size_t sample = task / (row_split * od);
+           size_t y0     = oh * part / row_split;
+           size_t y1     = oh * (part + 1) / row_split;
+
            const vec_t &in = in_data[sample];
            vec_t &a        = out_data[sample];
-           for (size_t o = 0; o < od; o++) {
-             float_t *pa = &a[params.out.get_index(0, 0, o)];
-             for (size_t inc = 0; inc < id; inc++) {
-               if (!params.tbl.is_connected(o, inc)) continue;
-               size_t idx;
-               idx                = params.weight.get_index(0, 0, id * o + inc);
-               const float_t *pw  = &W[idx];
-               idx                = params.in_padded.get_index(0, 0, inc);
-               const float_t *pin = &in[idx];
-               float_t *pout      = pa;
-               for (size_t y = 0; y < oh; y++) {
-                 const float_t *pin_line = pin;
-                 for (size_t x = 0; x < ow; x++) {
-                   const float_t *pin_element = pin_line;
-                   const float_t *pw_element  = pw;
-                   float_t sum{0};
-                   // should be optimized for small kernel(3x3,5x5)
-                   for (size_t wy = 0; wy < kh; wy++) {    // NOLINT
-                     for (size_t wx = 0; wx < kw; wx++) {  // NOLINT
-                       sum += pw_element[wx] * pin_element[wx * w_dilation];
-                     }
-                     pw_element += kw;
-                     pin_element += iw * h_dilation;
+           float_t *pa     = &a[params.out.get_index(0, y0, o)];
+           for (size_t inc = 0; inc < id; inc++) {
+             if (!params.tbl.is_connected(o, inc)) continue;
+             size_t idx;
+             idx                = params.weight.get_index(0, 0, id * o + inc);
+             const float_t *pw  = &W[idx];
+             idx                = params.in_padded.get_index(0, 0, inc);
+             const float_t *pin = &in[idx] + y0 * line_stride;
+             float_t *pout      = pa;
+             for (size_t y = y0; y < y1; y++) {
+               const float_t *pin_line = pin;
+               for (size_t x = 0; x < ow; x++) {
+                 const float_t *pin_element = pin_line;
+                 const float_t *pw_element  = pw;
+                 float_t sum{0};
+                 // should be optimized for small kernel(3x3,5x5)
+                 for (size_t wy = 0; wy < kh; wy++) {    // NOLINT
+                   for (size_t wx = 0; wx < kw; wx++) {  // NOLINT
+                     sum += pw_element[wx] * pin_element[wx * w_dilation];
                    }
-                   pout[x] += sum;
-                   pin_line += elem_stride;
+                   pw_element += kw;
+                   pin_element += iw * h_dilation;
                  }
-                 pout += ow;
-                 pin += line_stride;
+                 pout[x] += sum;
+                 pin_line += elem_stride;
                }
+               pout += ow;
+               pin += line_stride;
              }
-             if (params.has_bias) {
-               vectorize::add(bias[o], out_area, pa);
-             }
+           }
+           if (params.has_bias) {
+             vectorize::add(bias[o], (y1 - y0) * ow, pa);
            }
          }
        },
@@ -86,95 +95,102 @@ void conv2d_op_internal(const tensor_t &prev_out,
                         const bool parallelize) {
   typedef typename vec_t::value_type float_t;
 
-  for_i(parallelize, prev_out.size(), [&](size_t sample) {
-    // propagate delta to previous layer
-    for (size_t inc = 0; inc < params.in.depth_; inc++) {
-      for (size_t outc = 0; outc < params.out.depth_; outc++) {
-        if (!params.tbl.is_connected(outc, inc)) continue;
-
-        size_t idx        = 0;
-        idx               = params.in.depth_ * outc + inc;
-        idx               = params.weight.get_index(0, 0, idx);
-        const float_t *pw = &W[idx];
-
-        idx                       = params.out.get_index(0, 0, outc);
-        const float_t *pdelta_src = &curr_delta[sample][idx];
-
-        idx = params.in_padded.get_index(0, 0, inc);
-        // float_t* pdelta_dst = &(*prev_delta)[sample][idx];
-        float_t *pdelta_dst = &prev_delta[sample][idx];
-
-        for (size_t y = 0; y < params.out.height_; y++) {
-          for (size_t x = 0; x < params.out.width_; x++) {
-            const float_t *ppw = pw;
-
-            idx                       = y * params.out.width_ + x;
-            const float_t ppdelta_src = pdelta_src[idx];
-
-            float_t *ppdelta_dst =
-              pdelta_dst + y * params.h_stride * params.in_padded.width_ +
-              x * params.w_stride;
-
-            for (size_t wy = 0; wy < params.weight.height_; wy++) {   // NOLINT
-              for (size_t wx = 0; wx < params.weight.width_; wx++) {  // NOLINT
-                idx = wy * params.in_padded.width_ + wx;
-                ppdelta_dst[idx] += *ppw++ * ppdelta_src;
+  // the samples of one slot run one after another and are summed into its
+  // dW/db accumulator, the slots run in parallel
+  const size_t num_slots = dW.size();
+  for_i(parallelize, num_slots, [&](size_t slot) {
+    blocked_range samples = accumulator_range(slot, prev_out.size(), num_slots);
+    for (size_t sample = samples.begin(); sample < samples.end(); sample++) {
+      // propagate delta to previous layer
+      for (size_t inc = 0; inc < params.in.depth_; inc++) {
+        for (size_t outc = 0; outc < params.out.depth_; outc++) {
+          if (!params.tbl.is_connected(outc, inc)) continue;
+
+          size_t idx        = 0;
+          idx               = params.in.depth_ * outc + inc;
+          idx               = params.weight.get_index(0, 0, idx);
+          const float_t *pw = &W[idx];
+
+          idx                       = params.out.get_index(0, 0, outc);
+          const float_t *pdelta_src = &curr_delta[sample][idx];
+
+          idx = params.in_padded.get_index(0, 0, inc);
+          // float_t* pdelta_dst = &(*prev_delta)[sample][idx];
+          float_t *pdelta_dst = &prev_delta[sample][idx];
+
+          for (size_t y = 0; y < params.out.height_; y++) {
+            for (size_t x = 0; x < params.out.width_; x++) {
+              const float_t *ppw = pw;
+
+              idx                       = y * params.out.width_ + x;
+              const float_t ppdelta_src = pdelta_src[idx];
+
+              float_t *ppdelta_dst =
+                pdelta_dst + y * params.h_stride * params.in_padded.width_ +
+                x * params.w_stride;
+
+              for (size_t wy = 0; wy < params.weight.height_; wy++) {
+                for (size_t wx = 0; wx < params.weight.width_; wx++) {
+                  idx = wy * params.in_padded.width_ + wx;
+                  ppdelta_dst[idx] += *ppw++ * ppdelta_src;
+                }
               }
             }
           }
         }
       }
-    }
 
-    // accumulate dw
-    for (size_t inc = 0; inc < params.in.depth_; inc++) {
-      for (size_t outc = 0; outc < params.out.depth_; outc++) {
-        if (!params.tbl.is_connected(outc, inc)) continue;
+      // accumulate dw
+      for (size_t inc = 0; inc < params.in.depth_; inc++) {
+        for (size_t outc = 0; outc < params.out.depth_; outc++) {
+          if (!params.tbl.is_connected(outc, inc)) continue;
 
-        for (size_t wy = 0; wy < params.weight.height_; wy++) {
-          for (size_t wx = 0; wx < params.weight.width_; wx++) {
-            float_t dst{0};
+          for (size_t wy = 0; wy < params.weight.height_; wy++) {
+            for (size_t wx = 0; wx < params.weight.width_; wx++) {
+              float_t dst{0};
 
-            size_t idx           = 0;
-            idx                  = params.in_padded.get_index(wx, wy, inc);
-            const float_t *prevo = &prev_out[sample][idx];
+              size_t idx           = 0;
+              idx                  = params.in_padded.get_index(wx, wy, inc);
+              const float_t *prevo = &prev_out[sample][idx];
 
-            idx                  = params.out.get_index(0, 0, outc);
-            const float_t *delta = &curr_delta[sample][idx];
+              idx                  = params.out.get_index(0, 0, outc);
+              const float_t *delta = &curr_delta[sample][idx];
 
-            if (params.w_stride > 1) {
-              for (size_t y = 0; y < params.out.height_; y++) {
-                size_t prevo_idx =
-                  y * params.in_padded.width_ * params.h_stride;
-                size_t delta_idx = y * params.out.width_;
+              if (params.w_stride > 1) {
+                for (size_t y = 0; y < params.out.height_; y++) {
+                  size_t prevo_idx =
+                    y * params.in_padded.width_ * params.h_stride;
+                  size_t delta_idx = y * params.out.width_;
 
-                for (size_t x = 0; x < params.out.width_; x++) {
-                  dst += prevo[prevo_idx + x * params.w_stride] *
-                         delta[delta_idx + x];
+                  for (size_t x = 0; x < params.out.width_; x++) {
+                    dst += prevo[prevo_idx + x * params.w_stride] *
+                           delta[delta_idx + x];
+                  }
+                }
+              } else {
+                for (size_t y = 0; y < params.out.height_; y++) {
+                  dst += vectorize::dot(
+                    prevo + y * params.in_padded.width_ * params.h_stride,
+                    delta + y * params.out.width_, params.out.width_);
                 }
               }
-            } else {
-              for (size_t y = 0; y < params.out.height_; y++) {
-                dst += vectorize::dot(
-                  prevo + y * params.in_padded.width_ * params.h_stride,
-                  delta + y * params.out.width_, params.out.width_);
-              }
-            }
 
-            idx = params.in.depth_ * outc + inc;
-            dW[sample][params.weight.get_index(wx, wy, idx)] += dst;
+              idx = params.in.depth_ * outc + inc;
+              dW[slot][params.weight.get_index(wx, wy, idx)] += dst;
+            }
           }
         }
       }
-    }
 
-    // accumulate db
-    if (params.has_bias) {
-      for (size_t outc = 0; outc < params.out.depth_; outc++) {
-        size_t idx            = params.out.get_index(0, 0, outc);
-        const float_t *delta  = &curr_delta[sample][idx];
-        const float_t *deltaa = delta + params.out.width_ * params.out.height_;
-        db[sample][outc] += std::accumulate(delta, deltaa, float_t{0});
+      // accumulate db
+      if (params.has_bias) {
+        for (size_t outc = 0; outc < params.out.depth_; outc++) {
+          size_t idx            = params.out.get_index(0, 0, outc);
+          const float_t *delta  = &curr_delta[sample][idx];
+          const float_t *deltaa =
+            delta + params.out.width_ * params.out.height_;
+          db[slot][outc] += std::accumulate(delta, deltaa, float_t{0});
+        }
       }
     }
   });
@@ -0,0 +1,320 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <memory>
+#include <mutex>
+
+#include "tinydnn/core/conv_params.h"
+#include "tinydnn/utils/utils.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * transformed weights of conv2d_op_winograd. The transform is only
+ * recomputed if the version of the weights (see edge::data_version) or the
+ * tile size changes, i.e. once per weight update. Layers reading the same
+ * weight edge share one cache (see convolutional_layer::share_weights), so
+ * the workspaces of a frozen network transform the weights only once.
+ */
+struct conv2d_winograd_cache {
+  std::mutex mutex;    // guards the members below
+  size_t tile    = 0;  // output tile size m of F(m x m, 3 x 3)
+  size_t version = 0;  // version of the weights of U, 0 if none
+  std::shared_ptr<const vec_t> U;  // [alpha * alpha][out.depth][in.depth]
+};
+
+/**
+ * output tile size of the Winograd kernel for the layer (2 for F(2x2,3x3),
+ * 4 for F(4x4,3x3)), or 0 if the layer should use another kernel.
+ * Winograd needs 3x3 filters with stride and dilation 1, and enough
+ * channels to amortize the transforms.
+ */
+inline size_t conv2d_winograd_tile(const core::conv_params &params) {
+  if (!params.tbl.is_empty()) return 0;
+  if (params.weight.width_ != 3 || params.weight.height_ != 3) return 0;
+  if (params.w_stride != 1 || params.h_stride != 1) return 0;
+  if (params.w_dilation != 1 || params.h_dilation != 1) return 0;
+  if (params.in.depth_ < 4 || params.out.depth_ < 4) return 0;
+
+  size_t macs = params.in.depth_ * params.out.depth_ * 9 * params.out.area();
+  if (macs < (size_t(1) << 18)) return 0;
+
+  // larger tiles save more multiplies, but waste work on small maps
+  return params.out.width_ >= 8 && params.out.height_ >= 8 ? 4 : 2;
+}
+
+namespace detail {
+
+// transform matrices of F(m x m, 3 x 3), alpha = m + 2
+struct winograd_matrices {
+  const float_t *BT;  // alpha x alpha, input transform
+  const float_t *G;   // alpha x 3, filter transform
+  const float_t *AT;  // m x alpha, output transform
+};
+
+inline winograd_matrices winograd_f2x3() {
+  static const float_t BT[] = {1, 0, -1, 0,   //
+                               0, 1, 1,  0,   //
+                               0, -1, 1, 0,   //
+                               0, 1, 0,  -1};
+  static const float_t G[]  = {1,   0,    0,    //
+                              0.5, 0.5,  0.5,  //
+                              0.5, -0.5, 0.5,  //
+                              0,   0,    1};
+  static const float_t AT[] = {1, 1, 1,  0,  //
+                               0, 1, -1, -1};
+  return winograd_matrices{BT, G, AT};
+}
+
+inline winograd_matrices winograd_f4x3() {
+  static const float_t a = float_t(1) / 4, b = float_t(1) / 6;
+  static const float_t c = float_t(1) / 12, d = float_t(1) / 24;
+
+  static const float_t BT[] = {4, 0,  -5, 0,  1, 0,  //
+                               0, -4, -4, 1,  1, 0,  //
+                               0, 4,  -4, -1, 1, 0,  //
+                               0, -2, -1, 2,  1, 0,  //
+                               0, 2,  -1, -2, 1, 0,  //
+                               0, 4,  0,  -5, 0, 1};
+  static const float_t G[]  = {a,  0,  0,   //
+                              -b, -b, -b,  //
+                              -b, b,  -b,  //
+                              d,  c,  b,   //
+                              d,  -c, b,   //
+                              0,  0,  1};
+  static const float_t AT[] = {1, 1, 1,  1, 1,  0,  //
+                               0, 1, -1, 2, -2, 0,  //
+                               0, 1, 1,  4, 4,  0,  //
+                               0, 1, -1, 8, -8, 1};
+  return winograd_matrices{BT, G, AT};
+}
+
+// R = L * X * L^T, with L (r x a), X (a x a) and R (r x r)
+inline void winograd_transform(const float_t *L,
+                               size_t r,
+                               size_t a,
+                               const float_t *X,
+                               float_t *R) {
+  float_t LX[6 * 6];
+  for (size_t i = 0; i < r; i++) {
+    for (size_t j = 0; j < a; j++) {
+      float_t sum{0};
+      for (size_t k = 0; k < a; k++) sum += L[i * a + k] * X[k * a + j];
+      LX[i * a + j] = sum;
+    }
+  }
+  for (size_t i = 0; i < r; i++) {
+    for (size_t j = 0; j < r; j++) {
+      float_t sum{0};
+      for (size_t k = 0; k < a; k++) sum += LX[i * a + k] * L[j * a + k];
+      R[i * r + j] = sum;
+    }
+  }
+}
+
+// R[i][j][t] = (L * X[t] * L^T)[i][j] for a batch of n tiles, where element
+// (k, l) of all tiles is a row X + (k * a + l) * ldx and element (i, j) of
+// the results is R + (i * r + j) * ldr. tmp holds r * a rows of n values.
+// Zero coefficients are skipped, the rows are combined with vectorized
+// multiply-adds.
+inline void winograd_transform_rows(const float_t *L,
+                                    size_t r,
+                                    size_t a,
+                                    const float_t *X,
+                                    size_t ldx,
+                                    float_t *R,
+                                    size_t ldr,
+                                    size_t n,
+                                    float_t *tmp) {
+  for (size_t i = 0; i < r; i++) {
+    for (size_t l = 0; l < a; l++) {
+      float_t *row = tmp + (i * a + l) * n;
+      std::fill(row, row + n, float_t{0});
+      for (size_t k = 0; k < a; k++) {
+        const float_t c = L[i * a + k];
+        if (c != 0) vectorize::muladd(X + (k * a + l) * ldx, c, n, row);
+      }
+    }
+  }
+  for (size_t i = 0; i < r; i++) {
+    for (size_t j = 0; j < r; j++) {
+      float_t *row = R + (i * r + j) * ldr;
+      std::fill(row, row + n, float_t{0});
+      for (size_t l = 0; l < a; l++) {
+        const float_t c = L[j * a + l];
+        if (c != 0) vectorize::muladd(tmp + (i * a + l) * n, c, n, row);
+      }
+    }
+  }
+}
+
+}  // namespace detail
+
+/**
+ * U[xi][o][c] = (G g G^T)[xi] for every 3x3 filter g, taken from the cache
+ * if it was computed from the same version of the weights. Version 0 means
+ * unknown and always recomputes. The returned U stays valid while the cache
+ * moves on to newer weights.
+ */
+inline std::shared_ptr<const vec_t> conv2d_winograd_weights(
+  const vec_t &W,
+  const core::conv_params &params,
+  size_t tile,
+  size_t weights_version,
+  conv2d_winograd_cache &cache) {
+  std::lock_guard<std::mutex> lock(cache.mutex);
+  if (weights_version != 0 && cache.version == weights_version &&
+      cache.tile == tile && cache.U) {
+    return cache.U;
+  }
+
+  const detail::winograd_matrices mat =
+    tile == 4 ? detail::winograd_f4x3() : detail::winograd_f2x3();
+  const size_t alpha = tile + 2;
+  const size_t id    = params.in.depth_;
+  const size_t od    = params.out.depth_;
+
+  auto U = std::make_shared<vec_t>(alpha * alpha * od * id);
+  for (size_t o = 0; o < od; o++) {
+    for (size_t c = 0; c < id; c++) {
+      const float_t *g = &W[params.weight.get_index(0, 0, id * o + c)];
+      float_t u[6 * 6];
+      detail::winograd_transform(mat.G, alpha, 3, g, u);
+      for (size_t xi = 0; xi < alpha * alpha; xi++) {
+        (*U)[(xi * od + o) * id + c] = u[xi];
+      }
+    }
+  }
+  cache.U       = U;
+  cache.tile    = tile;
+  cache.version = weights_version;
+  return U;
+}
+
+/**
+ * number of tiles of a sample conv2d_op_winograd processes at a time: at
+ * most 1024 to bound the scratch buffers, and few enough that small batches
+ * still give every thread a (sample, chunk) task. Chunks keep at least 64
+ * tiles for the GEMMs.
+ */
+inline size_t conv2d_winograd_chunk(size_t tiles,
+                                    size_t samples,
+                                    const bool parallelize) {
+  size_t chunk = std::min<size_t>(tiles, 1024);
+  if (!parallelize || samples == 0) return chunk;
+
+  const size_t wanted = (parallel_concurrency() + samples - 1) / samples;
+  return std::min(chunk, std::max<size_t>(64, (tiles + wanted - 1) / wanted));
+}
+
+/**
+ * forward convolution of 3x3, stride 1 layers with Winograd's minimal
+ * filtering algorithm F(m x m, 3 x 3), m = tile (2 or 4).
+ *
+ * The output is split into m x m tiles. The (m + 2) x (m + 2) input tiles
+ * are transformed (V = B^T d B), multiplied elementwise with the transformed
+ * filters and summed over the input channels, which is one GEMM per tile
+ * element (M = U * V), and transformed back (Y = A^T M A). This needs
+ * 16/4 = 4x (F(2x2)) or 36/16 = 2.25x (F(4x4)) fewer multiplies per
+ * output than the direct convolution.
+ */
+inline void conv2d_op_winograd(const tensor_t &in_data,
+                               const vec_t &W,
+                               const vec_t &bias,
+                               tensor_t &out_data,
+                               const core::conv_params &params,
+                               size_t tile,
+                               size_t weights_version,
+                               conv2d_winograd_cache &cache,
+                               const bool parallelize) {
+  const std::shared_ptr<const vec_t> U =
+    conv2d_winograd_weights(W, params, tile, weights_version, cache);
+
+  const detail::winograd_matrices mat =
+    tile == 4 ? detail::winograd_f4x3() : detail::winograd_f2x3();
+  const size_t m       = tile;
+  const size_t alpha   = m + 2;
+  const size_t a2      = alpha * alpha;
+  const size_t id      = params.in.depth_;
+  const size_t od      = params.out.depth_;
+  const size_t iw      = params.in_padded.width_;
+  const size_t ih      = params.in_padded.height_;
+  const size_t ow      = params.out.width_;
+  const size_t oh      = params.out.height_;
+  const size_t tiles_x = (ow + m - 1) / m;
+  const size_t tiles_y = (oh + m - 1) / m;
+  const size_t tiles   = tiles_x * tiles_y;
+
+  // every (sample, chunk of tiles) is a task with its own scratch buffers
+  const size_t chunk =
+    conv2d_winograd_chunk(tiles, in_data.size(), parallelize);
+  const size_t num_chunks = (tiles + chunk - 1) / chunk;
+
+  for_i(parallelize, in_data.size() * num_chunks, [&](size_t task) {
+    const vec_t &in = in_data[task / num_chunks];
+    vec_t &out      = out_data[task / num_chunks];
+    const size_t t0 = (task % num_chunks) * chunk;
+    const size_t nt = std::min(chunk, tiles - t0);
+
+    thread_local vec_t V, M, d, y, tmp;
+    V.resize(a2 * id * nt);  // transformed input tiles, [xi][c][t]
+    M.resize(a2 * od * nt);  // products, [xi][o][t]
+    d.resize(a2 * nt);
+    y.resize(m * m * nt);
+    tmp.resize(alpha * alpha * nt);
+
+    // V[xi][c][t] = (B^T d B)[xi]
+    for (size_t c = 0; c < id; c++) {
+      const float_t *pin = &in[params.in_padded.get_index(0, 0, c)];
+      for (size_t t = 0; t < nt; t++) {
+        const size_t y0 = ((t0 + t) / tiles_x) * m;
+        const size_t x0 = ((t0 + t) % tiles_x) * m;
+        for (size_t dy = 0; dy < alpha; dy++) {
+          for (size_t dx = 0; dx < alpha; dx++) {
+            bool inside = y0 + dy < ih && x0 + dx < iw;
+            d[(dy * alpha + dx) * nt + t] =
+              inside ? pin[(y0 + dy) * iw + x0 + dx] : float_t{0};
+          }
+        }
+      }
+      detail::winograd_transform_rows(mat.BT, alpha, alpha, &d[0], nt,
+                                      &V[c * nt], id * nt, nt, &tmp[0]);
+    }
+
+    // M[xi] = U[xi] * V[xi]
+    std::fill(M.begin(), M.end(), float_t{0});
+    for (size_t xi = 0; xi < a2; xi++) {
+      vectorize::gemm(false, false, od, nt, id, &(*U)[xi * od * id], id,
+                      &V[xi * id * nt], nt, &M[xi * od * nt], nt);
+    }
+
+    // Y = A^T M A
+    for (size_t o = 0; o < od; o++) {
+      detail::winograd_transform_rows(mat.AT, m, alpha, &M[o * nt], od * nt,
+                                      &y[0], nt, nt, &tmp[0]);
+
+      float_t *pout   = &out[params.out.get_index(0, 0, o)];
+      const float_t b = params.has_bias ? bias[o] : float_t{0};
+      for (size_t t = 0; t < nt; t++) {
+        const size_t y0 = ((t0 + t) / tiles_x) * m;
+        const size_t x0 = ((t0 + t) % tiles_x) * m;
+        for (size_t dy = 0; dy < m && y0 + dy < oh; dy++) {
+          for (size_t dx = 0; dx < m && x0 + dx < ow; dx++) {
+            pout[(y0 + dy) * ow + x0 + dx] += y[(dy * m + dx) * nt + t] + b;
+          }
+        }
+      }
+    }
+  });
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
@@ -8,7 +8,7 @@
 #pragma once
 
 #include "tinydnn/core/op_kernel.h"
-#include "tinydnn/backend/kernels/fully_connected_op_avx.h"
+#include "tinydnn/backend/kernels/fully_connected_op_cblas.h"
 #include "tinydnn/backend/kernels/fully_connected_op_internal.h"
 
 namespace tinydnn {
@@ -37,12 +37,14 @@ class FullyConnectedGradOp : public core::OpKernel {
 
     const core::backend_t engine = context.engine();
 
-    if (engine == core::backend_t::internal) {
+    if (engine == core::backend_t::internal ||
+        engine == core::backend_t::avx) {
+      // batched GEMMs, vectorized with the instruction set picked at startup
       kernels::fully_connected_op_internal(
         prev_out, W[0], dW, params.has_bias_ ? *db : dummy, curr_delta,
         prev_delta, params, context.parallelize());
-    } else if (engine == core::backend_t::avx) {
-      kernels::fully_connected_op_avx(
+    } else if (engine == core::backend_t::cblas) {
+      kernels::fully_connected_op_cblas(
         prev_out, W[0], dW, params.has_bias_ ? *db : dummy, curr_delta,
         prev_delta, params, context.parallelize());
     } else {
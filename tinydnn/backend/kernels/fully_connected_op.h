@@ -8,7 +8,6 @@
 #pragma once
 
 #include "tinydnn/core/framework/op_kernel.h"
-#include "tinydnn/core/kernels/fully_connected_op_avx.h"
 #include "tinydnn/core/kernels/fully_connected_op_cblas.h"
 #include "tinydnn/core/kernels/fully_connected_op_intel_mkl.h"
 #include "tinydnn/core/kernels/fully_connected_op_internal.h"
@@ -37,18 +36,16 @@ class FullyConnectedOp : public core::OpKernel {
 
     const core::backend_t engine = context.engine();
 
-    if (engine == core::backend_t::internal) {
+    if (engine == core::backend_t::internal ||
+        engine == core::backend_t::avx) {
+      // batched GEMM, vectorized with the instruction set picked at startup
       kernels::fully_connected_op_internal(
         in_data, W[0], params.has_bias_ ? (*bias)[0] : vec_t(), out_data,
-        params, context.parallelize());
+        params, context.parallelize(), params.packed_W_.get());
     } else if (engine == core::backend_t::nnpack) {
       kernels::fully_connected_op_nnpack(
         in_data, W[0], params.has_bias_ ? (*bias)[0] : vec_t(), out_data,
         params, context.parallelize());
-    } else if (engine == core::backend_t::avx) {
-      kernels::fully_connected_op_avx(in_data, W[0],
-                                      params.has_bias_ ? (*bias)[0] : vec_t(),
-                                      out_data, params, context.parallelize());
     } else if (engine == core::backend_t::cblas) {
       kernels::fully_connected_op_cblas(
         in_data, W[0], params.has_bias_ ? (*bias)[0] : vec_t(), out_data,
@@ -7,45 +7,97 @@
 */
 #pragma once
 
-#include "tinydnn/core/params/fully_params.h"
+#include <algorithm>
 
-#ifdef CNN_USE_CBLAS
-extern "C" {
-#include <cblas.h>
-}
-#endif
+#include "tinydnn/backend/backend_blas.h"
+#include "tinydnn/core/fully_params.h"
+#include "tinydnn/utils/utils.h"
 
 namespace tinydnn {
 namespace kernels {
 
+/**
+ * forward pass as one BLAS GEMM over the batch, out = in * W + bias with
+ * one sample per row
+ */
 inline void fully_connected_op_cblas(const tensor_t &in_data,
                                      const vec_t &W,
                                      const vec_t &bias,
                                      tensor_t &out_data,
                                      const core::fully_params &params,
                                      const bool layer_parallelize) {
-#ifdef CNN_USE_CBLAS
-  size_t out_size       = params.out_size_;
-  size_t in_size        = params.in_size_;
-  float_t alpha         = 1;
-  float_t beta          = 1;
-  const float_t *input  = in_data[0].data();
-  const float_t *weight = W.data();
-  float_t *output       = out_data[0].data();
-  if (bias.empty())
-    memset(output, 0, sizeof(float_t) * out_size);
-  else
-    memcpy(output, bias.data(), sizeof(float_t) * out_size);
-#ifdef CNN_USE_DOUBLE
-  cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, 1, out_size, in_size,
-              alpha, input, in_size, weight, out_size, beta, output, out_size);
-#else
-  cblas_sgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, 1, out_size, in_size,
-              alpha, input, in_size, weight, out_size, beta, output, out_size);
-#endif
-#else
-  throw nn_error("Compiled without CBLAS support");
-#endif  // CNN_USE_CBLAS
+  UNREFERENCED_PARAMETER(layer_parallelize);  // BLAS runs its own threads
+  const size_t n        = in_data.size();
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
+
+  thread_local vec_t batch_in, batch_out;
+  batch_in.resize(n * in_size);
+  batch_out.resize(n * out_size);
+  for (size_t i = 0; i < n; i++) {
+    std::copy(in_data[i].begin(), in_data[i].begin() + in_size,
+              &batch_in[i * in_size]);
+    if (params.has_bias_) {
+      std::copy(bias.begin(), bias.begin() + out_size,
+                &batch_out[i * out_size]);
+    } else {
+      std::fill(&batch_out[i * out_size], &batch_out[i * out_size] + out_size,
+                float_t{0});
+    }
+  }
+
+  core::blas_gemm(false, false, n, out_size, in_size, float_t{1}, &batch_in[0],
+                  in_size, &W[0], out_size, float_t{1}, &batch_out[0],
+                  out_size);
+
+  for (size_t i = 0; i < n; i++) {
+    std::copy(&batch_out[i * out_size], &batch_out[i * out_size] + out_size,
+              out_data[i].begin());
+  }
+}
+
+/**
+ * backward pass as two BLAS GEMMs over the batch: prev_delta = delta * W^T
+ * and dW += in^T * delta. The whole batch is summed into the first dW/db
+ * slot, a single large GEMM keeps the BLAS threads busier than one per slot.
+ */
+inline void fully_connected_op_cblas(const tensor_t &prev_out,
+                                     const vec_t &W,
+                                     tensor_t &dW,
+                                     tensor_t &db,
+                                     tensor_t &curr_delta,
+                                     tensor_t &prev_delta,
+                                     const core::fully_params &params,
+                                     const bool layer_parallelize) {
+  UNREFERENCED_PARAMETER(layer_parallelize);
+  const size_t n        = prev_out.size();
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
+
+  thread_local vec_t batch_in, batch_delta, batch_prev_delta;
+  batch_in.resize(n * in_size);
+  batch_delta.resize(n * out_size);
+  batch_prev_delta.resize(n * in_size);
+  for (size_t i = 0; i < n; i++) {
+    std::copy(prev_out[i].begin(), prev_out[i].begin() + in_size,
+              &batch_in[i * in_size]);
+    std::copy(curr_delta[i].begin(), curr_delta[i].begin() + out_size,
+              &batch_delta[i * out_size]);
+  }
+
+  core::blas_gemm(false, true, n, in_size, out_size, float_t{1},
+                  &batch_delta[0], out_size, &W[0], out_size, float_t{0},
+                  &batch_prev_delta[0], in_size);
+  core::blas_gemm(true, false, in_size, out_size, n, float_t{1}, &batch_in[0],
+                  in_size, &batch_delta[0], out_size, float_t{1}, &dW[0][0],
+                  out_size);
+
+  for (size_t i = 0; i < n; i++) {
+    vectorize::add(&batch_prev_delta[i * in_size], in_size, &prev_delta[i][0]);
+    if (params.has_bias_) {
+      vectorize::add(&batch_delta[i * out_size], out_size, &db[0][0]);
+    }
+  }
 }
 
 }  // namespace kernels
@@ -7,35 +7,91 @@
 */
 #pragma once
 
+#include <algorithm>
+
 #include "tinydnn/core/fully_params.h"
 #include "tinydnn/utils/utils.h"
 
 namespace tinydnn {
 namespace kernels {
 
-inline void fully_connected_op_internal(const tensor_t &in_data,
-                                        const vec_t &W,
-                                        const vec_t &bias,
-                                        tensor_t &out_data,
-                                        const core::fully_params &params,
-                                        const bool layer_parallelize) {
-  for_i(layer_parallelize, in_data.size(), [&](size_t sample) {
-    const vec_t &in = in_data[sample];
-    vec_t &out      = out_data[sample];
-
-    for (size_t i = 0; i < params.out_size_; i++) {
-      out[i] = float_t{0};
-      for (size_t c = 0; c < params.in_size_; c++) {
-        out[i] += W[c * params.out_size_ + i] * in[c];
-      }
+/**
+ * forward pass as one GEMM over the batch, out = in * W + bias with one
+ * sample per row. The batch is processed in blocks of rows, which are split
+ * into blocks of columns if there are fewer of them than threads. W is read
+ * from packed_W instead if it is given.
+ */
+inline void fully_connected_op_internal(
+  const tensor_t &in_data,
+  const vec_t &W,
+  const vec_t &bias,
+  tensor_t &out_data,
+  const core::fully_params &params,
+  const bool layer_parallelize,
+  const vectorize::packed_matrix<float_t> *packed_W = nullptr) {
+  const size_t n        = in_data.size();
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
 
-      if (params.has_bias_) {
-        out[i] += bias[i];
+  // gather the samples into row-major matrices
+  thread_local vec_t batch_in, batch_out;
+  batch_in.resize(n * in_size);
+  batch_out.resize(n * out_size);
+  float_t *a = batch_in.data();
+  float_t *c = batch_out.data();
+  for (size_t i = 0; i < n; i++) {
+    std::copy(in_data[i].begin(), in_data[i].begin() + in_size,
+              a + i * in_size);
+    if (params.has_bias_) {
+      std::copy(bias.begin(), bias.begin() + out_size, c + i * out_size);
+    } else {
+      std::fill(c + i * out_size, c + (i + 1) * out_size, float_t{0});
+    }
+  }
+
+  const size_t rows       = 64;
+  const size_t row_blocks = (n + rows - 1) / rows;
+  const size_t nr         = vectorize::packed_matrix<float_t>::panel_width();
+  const size_t panels     = (out_size + nr - 1) / nr;
+  const size_t split = intra_item_split(layer_parallelize, row_blocks, panels);
+
+  for_i(layer_parallelize, row_blocks * split, [&](size_t task) {
+    const size_t i0   = (task / split) * rows;
+    const size_t m    = std::min(rows, n - i0);
+    const size_t part = task % split;
+    const size_t j0   = panels * part / split * nr;
+    const size_t j1   = std::min(out_size, panels * (part + 1) / split * nr);
+    if (j0 >= j1) return;
+
+    if (m < 4) {
+      // too few rows for the GEMM kernel, stream W once per row
+      for (size_t i = i0; i < i0 + m; i++) {
+        for (size_t k = 0; k < in_size; k++) {
+          vectorize::muladd(&W[k * out_size + j0], a[i * in_size + k],
+                            j1 - j0, c + i * out_size + j0);
+        }
       }
+    } else if (packed_W) {
+      vectorize::gemm(false, m, j1 - j0, a + i0 * in_size, in_size, *packed_W,
+                      j0, c + i0 * out_size + j0, out_size);
+    } else {
+      vectorize::gemm(false, false, m, j1 - j0, in_size, a + i0 * in_size,
+                      in_size, &W[j0], out_size, c + i0 * out_size + j0,
+                      out_size);
     }
   });
+
+  for (size_t i = 0; i < n; i++) {
+    std::copy(c + i * out_size, c + (i + 1) * out_size, out_data[i].begin());
+  }
 }
 
+/**
+ * backward pass as two GEMMs over the samples of each dW/db slot, with one
+ * sample per row: prev_delta = delta * W^T and dW += in^T * delta. The slots
+ * run in parallel (see accumulator_count), and their columns are split if
+ * there are fewer slots than threads.
+ */
 inline void fully_connected_op_internal(const tensor_t &prev_out,
                                         const vec_t &W,
                                         tensor_t &dW,
@@ -44,30 +100,86 @@ inline void fully_connected_op_internal(const tensor_t &prev_out,
                                         tensor_t &prev_delta,
                                         const core::fully_params &params,
                                         const bool layer_parallelize) {
-  for (size_t sample = 0; sample < prev_out.size(); sample++) {
-    for (size_t c = 0; c < params.in_size_; c++) {
-      // propagate delta to previous layer
-      // prev_delta[c] += current_delta[r] * W_[c * out_size_ + r]
-      prev_delta[sample][c] += vectorize::dot(
-        &curr_delta[sample][0], &W[c * params.out_size_], params.out_size_);
-    }
+  const size_t n        = prev_out.size();
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
 
-    for_(layer_parallelize, 0, params.out_size_, [&](const blocked_range &r) {
-      // accumulate weight-step using delta
-      // dW[c * out_size + i] += current_delta[i] * prev_out[c]
-      for (size_t c = 0; c < params.in_size_; c++) {
-        vectorize::muladd(&curr_delta[sample][r.begin()], prev_out[sample][c],
-                          r.end() - r.begin(),
-                          &dW[sample][c * params.out_size_ + r.begin()]);
-      }
+  // gather the samples into row-major matrices
+  thread_local vec_t batch_in, batch_delta, batch_prev_delta;
+  batch_in.resize(n * in_size);
+  batch_delta.resize(n * out_size);
+  batch_prev_delta.resize(n * in_size);
+  float_t *a  = batch_in.data();
+  float_t *d  = batch_delta.data();
+  float_t *pd = batch_prev_delta.data();
+  for (size_t i = 0; i < n; i++) {
+    std::copy(prev_out[i].begin(), prev_out[i].begin() + in_size,
+              a + i * in_size);
+    std::copy(curr_delta[i].begin(), curr_delta[i].begin() + out_size,
+              d + i * out_size);
+    std::copy(prev_delta[i].begin(), prev_delta[i].begin() + in_size,
+              pd + i * in_size);
+  }
+
+  const size_t num_slots  = dW.size();
+  const size_t nr         = vectorize::packed_matrix<float_t>::panel_width();
+  const size_t out_panels = (out_size + nr - 1) / nr;
+  const size_t in_panels  = (in_size + nr - 1) / nr;
+  const size_t split      = intra_item_split(layer_parallelize, num_slots,
+                                        std::max(out_panels, in_panels));
 
+  for_i(layer_parallelize, num_slots * split, [&](size_t task) {
+    const size_t slot = task / split;
+    const size_t part = task % split;
+    blocked_range samples = accumulator_range(slot, n, num_slots);
+    const size_t s0       = samples.begin();
+    const size_t m        = samples.end() - samples.begin();
+
+    // dW[k][j] += sum_s in[s][k] * delta[s][j], db[j] += sum_s delta[s][j]
+    const size_t j0 = out_panels * part / split * nr;
+    const size_t j1 = std::min(out_size, out_panels * (part + 1) / split * nr);
+    if (j0 < j1) {
+      if (m < 4) {
+        // too few samples for the GEMM kernel
+        for (size_t s = s0; s < s0 + m; s++) {
+          for (size_t k = 0; k < in_size; k++) {
+            vectorize::muladd(d + s * out_size + j0, a[s * in_size + k],
+                              j1 - j0, &dW[slot][k * out_size + j0]);
+          }
+        }
+      } else {
+        vectorize::gemm(true, false, in_size, j1 - j0, m, a + s0 * in_size,
+                        in_size, d + s0 * out_size + j0, out_size,
+                        &dW[slot][j0], out_size);
+      }
       if (params.has_bias_) {
-        // vec_t& db = *in_grad[2];
-        for (size_t i = r.begin(); i < r.end(); i++) {
-          db[sample][i] += curr_delta[sample][i];
+        for (size_t s = s0; s < s0 + m; s++) {
+          vectorize::add(d + s * out_size + j0, j1 - j0, &db[slot][j0]);
         }
       }
-    });
+    }
+
+    // prev_delta[s][k] += sum_j delta[s][j] * W[k][j]
+    const size_t k0 = in_panels * part / split * nr;
+    const size_t k1 = std::min(in_size, in_panels * (part + 1) / split * nr);
+    if (k0 < k1) {
+      if (m < 4) {
+        for (size_t s = s0; s < s0 + m; s++) {
+          for (size_t k = k0; k < k1; k++) {
+            pd[s * in_size + k] +=
+              vectorize::dot(d + s * out_size, &W[k * out_size], out_size);
+          }
+        }
+      } else {
+        vectorize::gemm(false, true, m, k1 - k0, out_size, d + s0 * out_size,
+                        out_size, &W[k0 * out_size], out_size,
+                        pd + s0 * in_size + k0, in_size);
+      }
+    }
+  });
+
+  for (size_t i = 0; i < n; i++) {
+    std::copy(pd + i * in_size, pd + (i + 1) * in_size, prev_delta[i].begin());
   }
 }
 
@@ -7,11 +7,43 @@
 */
 #pragma once
 
+#include <algorithm>
+#include "tinydnn/backend/kernels/cell_op_internal.h"
 #include "tinydnn/core/gru_cell_params.h"
 
 namespace tinydnn {
 namespace kernels {
 
+/**
+ * the gate weights side by side: W_x (in_size x 3 * out_size) and b are
+ * z, r, h, W_h (out_size x 2 * out_size) is z, r. W[hr->c] acts on
+ * h(t-1) * r(t), which needs r(t) first, and stays apart.
+ **/
+inline void gru_cell_concat_weights(const vec_t &W_x2z,
+                                    const vec_t &W_x2r,
+                                    const vec_t &W_x2h,
+                                    const vec_t &W_s2z,
+                                    const vec_t &W_s2r,
+                                    const vec_t &b_2z,
+                                    const vec_t &b_2r,
+                                    const vec_t &b_2h,
+                                    const core::gru_cell_params &params,
+                                    vec_t &W_x,
+                                    vec_t &W_h,
+                                    vec_t &b) {
+  const size_t out_size = params.out_size_;
+  concat_gates({&W_x2z, &W_x2r, &W_x2h}, params.in_size_, out_size, W_x);
+  concat_gates({&W_s2z, &W_s2r}, out_size, out_size, W_h);
+  concat_gates({&b_2z, &b_2r, &b_2h}, 1, out_size, b);
+}
+
+/**
+ * One step for a batch of samples: the inputs of the gates from x(t)
+ * (computed for the whole sequence up front when params.x_proj_ holds
+ * them) and from h(t-1) are one gemm each against the concatenated
+ * weights, the candidate state one more gemm of h(t-1) * r(t), with the
+ * nonlinearities and the state update fused in between.
+ **/
 inline void gru_cell_op_internal(const tensor_t &x,
                                  const tensor_t &h_prev,
                                  const vec_t &W_x2z,
@@ -31,67 +63,77 @@ inline void gru_cell_op_internal(const tensor_t &x,
                                  tensor_t &z_neg,
                                  const core::gru_cell_params &params,
                                  const bool layer_parallelize) {
-  for_(layer_parallelize, 0u, x.size(),
-       [&](const blocked_range &range) {
-         const size_t in_size  = params.in_size_;
-         const size_t out_size = params.out_size_;
-         auto tanh             = params.tanh_;
-         auto sigmoid          = params.sigmoid_;
-         const bool has_bias   = params.has_bias_;
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
+  const size_t gates    = 3 * out_size;
+  const size_t batch    = x.size();
 
-         for (size_t sample = range.begin(); sample < range.end(); sample++) {
-           const vec_t &x_      = x[sample];
-           const vec_t &h_prev_ = h_prev[sample];
-           vec_t &out_          = out[sample];
-           vec_t &h_            = h[sample];
-           vec_t &r_            = r[sample];
-           vec_t &z_            = z[sample];
-           vec_t &hr_           = hr[sample];
-           vec_t &z_neg_        = z_neg[sample];
+  // the weights concatenated by the cell for the sequence, or here
+  vec_t W_x, W_h, b;
+  const bool concatenated = !params.W_h_.empty();
+  if (!concatenated) {
+    gru_cell_concat_weights(W_x2z, W_x2r, W_x2h, W_s2z, W_s2r, b_2z, b_2r,
+                            b_2h, params, W_x, W_h, b);
+  }
+  const vec_t &Wx = concatenated ? params.W_x_ : W_x;
+  const vec_t &Wh = concatenated ? params.W_h_ : W_h;
+  const vec_t &bg = concatenated ? params.b_ : b;
+  const bool projected =
+    (params.step_ + 1) * batch * gates <= params.x_proj_.size();
 
-           for (size_t o = 0; o < out_size; o++) {
-             float_t local_z = 0.0;
-             float_t local_r = 0.0;
-             float_t local_h = 0.0;
-             for (size_t i = 0; i < in_size; i++) {
-               local_z += W_x2z[i * out_size + o] * x_[i];
-               local_r += W_x2r[i * out_size + o] * x_[i];
-               local_h += W_x2h[i * out_size + o] * x_[i];
-             }
-             for (size_t o_2 = 0; o_2 < out_size; o_2++) {
-               local_z += W_s2z[o_2 * out_size + o] * h_prev_[o_2];
-               local_r += W_s2r[o_2 * out_size + o] * h_prev_[o_2];
-             }
-             if (has_bias) {
-               local_z += b_2z[o];
-               local_r += b_2r[o];
-               local_h += b_2h[o];
-             }
-             z_[o] = local_z;
-             r_[o] = local_r;
-             h_[o] = local_h;
-           }
-           sigmoid->forward_activation(z_, z_);
-           sigmoid->forward_activation(r_, r_);
+  for_(layer_parallelize, 0u, batch, [&](const blocked_range &range) {
+    const size_t rows = range.end() - range.begin();
+    vec_t gate(rows * gates);
+    vec_t buffer(rows * std::max(in_size, out_size));
 
-           for (size_t o = 0; o < out_size; o++) {  // from
-             out_[o]          = h_prev_[o] * z_[o];
-             z_neg_[o]        = 1 - z_[o];
-             float_t local_hr = h_prev_[o] * r_[o];
-             for (size_t o_2 = 0; o_2 < out_size; o_2++) {  // to
-               h_[o_2] += W_hr2c[o * out_size + o_2] * local_hr;
-             }
-             hr_[o] = local_hr;
-           }
-           tanh->forward_activation(h_, h_);
-           for (size_t o = 0; o < out_size; o++) {
-             out_[o] += z_neg_[o] * h_[o];
-           }
-         }
-       },
-       0u);  // for_i
+    if (projected) {
+      const float_t *proj =
+        &params.x_proj_[(params.step_ * batch + range.begin()) * gates];
+      std::copy(proj, proj + rows * gates, gate.begin());
+    } else {
+      project_rows(x, range.begin(), range.end(), Wx, bg, in_size, gates,
+                   buffer.data(), gate.data());
+    }
+    gather_rows(h_prev, range.begin(), range.end(), out_size, buffer.data());
+    vectorize::gemm(false, false, rows, 2 * out_size, out_size, buffer.data(),
+                    out_size, &Wh[0], 2 * out_size, gate.data(), gates);
+
+    // z(t), r(t) and h(t-1) * r(t), the latter into buffer
+    for (size_t sample = range.begin(); sample < range.end(); sample++) {
+      const size_t k = sample - range.begin();
+      float_t *g     = &gate[k * gates];
+      vectorize::sigmoid(g, 2 * out_size, g);
+      const vec_t &h_prev_ = h_prev[sample];
+      for (size_t o = 0; o < out_size; o++) {
+        z[sample][o]             = g[o];
+        r[sample][o]             = g[out_size + o];
+        hr[sample][o]            = h_prev_[o] * g[out_size + o];
+        buffer[k * out_size + o] = hr[sample][o];
+      }
+    }
+    vectorize::gemm(false, false, rows, out_size, out_size, buffer.data(),
+                    out_size, &W_hr2c[0], out_size, gate.data() + 2 * out_size,
+                    gates);
+
+    for (size_t sample = range.begin(); sample < range.end(); sample++) {
+      float_t *gh = &gate[(sample - range.begin()) * gates + 2 * out_size];
+      vectorize::tanh(gh, out_size, gh);
+      const vec_t &h_prev_ = h_prev[sample];
+      const vec_t &z_      = z[sample];
+      for (size_t o = 0; o < out_size; o++) {
+        h[sample][o]     = gh[o];
+        z_neg[sample][o] = 1 - z_[o];
+        out[sample][o]   = h_prev_[o] * z_[o] + (1 - z_[o]) * gh[o];
+      }
+    }
+  });
 }
 
+/**
+ * The deltas of the gates of a sample are computed elementwise; the deltas
+ * of x(t) and h(t-1) of all of the samples are gemms against the
+ * concatenated weights.
+ **/
 inline void gru_cell_op_internal(const tensor_t &x,
                                  const tensor_t &h_prev,
                                  const vec_t &W_x2z,
@@ -120,147 +162,99 @@ inline void gru_cell_op_internal(const tensor_t &x,
                                  const tensor_t &z_neg,
                                  const core::gru_cell_params &params,
                                  const bool layer_parallelize) {
-  for_(
-    layer_parallelize, 0u, x.size(),
-    [&](const blocked_range &range) {
-      const size_t in_size  = params.in_size_;
-      const size_t out_size = params.out_size_;
-      auto tanh             = params.tanh_;
-      auto sigmoid          = params.sigmoid_;
-      const bool has_bias   = params.has_bias_;
-
-      for (size_t sample = range.begin(); sample < range.end(); sample++) {
-        const vec_t x_         = x[sample];
-        const vec_t h_prev_    = h_prev[sample];
-        vec_t &dW_x2z_         = dW_x2z[sample];
-        vec_t &dW_x2r_         = dW_x2r[sample];
-        vec_t &dW_x2h_         = dW_x2h[sample];
-        vec_t &dW_hr2c_        = dW_hr2c[sample];
-        vec_t &dW_s2z_         = dW_s2z[sample];
-        vec_t &dW_s2r_         = dW_s2r[sample];
-        vec_t &db_2z_          = db_2z[sample];
-        vec_t &db_2r_          = db_2r[sample];
-        vec_t &db_2h_          = db_2h[sample];
-        const vec_t &d_o_next_ = d_o_next[sample];
-        vec_t d_s_next_        = d_s_next[sample];
-        vec_t &d_x_prev_       = d_x_prev[sample];
-        vec_t &d_h_prev_       = d_h_prev[sample];
-        const vec_t &h_        = h[sample];
-        const vec_t &r_        = r[sample];
-        const vec_t &z_        = z[sample];
-        const vec_t &hr_       = hr[sample];
-        const vec_t &z_neg_    = z_neg[sample];
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
+  const size_t gates    = 3 * out_size;
+  const bool has_bias   = params.has_bias_;
 
-        vec_t aux1(out_size, 0.0);
-        vec_t aux2(out_size, 0.0);
+  vec_t W_x, W_h, b;
+  const bool concatenated = !params.W_h_.empty();
+  if (!concatenated) {
+    const vec_t none;
+    gru_cell_concat_weights(W_x2z, W_x2r, W_x2h, W_s2z, W_s2r, none, none,
+                            none, params, W_x, W_h, b);
+  }
+  const vec_t &Wx = concatenated ? params.W_x_ : W_x;
+  const vec_t &Wh = concatenated ? params.W_h_ : W_h;
 
-        vectorize::add(&d_o_next_[0], out_size, &d_s_next_[0]);
+  for_(layer_parallelize, 0u, x.size(), [&](const blocked_range &range) {
+    const size_t rows = range.end() - range.begin();
+    vec_t delta(rows * gates);
+    vec_t d_hr(rows * out_size);
+    vec_t buffer(rows * std::max(in_size, out_size));
 
-        // do -> ds(t-1), do -> dz
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] = d_s_next_[o] * z_[o];
-          // dz = do / dh(t-1) + do / dh(t)
-          aux1[o] = d_s_next_[o] * (h_prev_[o] - h_[o]);  // aux1 = dz
-        }
-        sigmoid->backward_activation(z_, z_, aux1, aux1);
+    // dz and dh; do(t) and ds(t) both reach s(t)
+    for (size_t sample = range.begin(); sample < range.end(); sample++) {
+      float_t *dz = &delta[(sample - range.begin()) * gates];
+      float_t *dh = dz + 2 * out_size;
 
-        // dz -> db2z
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2z_[o] = aux1[o];
-          }
-        }
-        // from dz -> x
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&aux1[0], &W_x2z[i * out_size], out_size);
-        }
-        // dW_x2z
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux1[0], x_[i], out_size, &dW_x2z_[i * out_size]);
-        }
-        // from dz -> h_prev
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] +=
-            vectorize::dot(&aux1[0], &W_s2z[o * out_size], out_size);
-        }
-        // dW_s2z
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux1[0], h_prev_[o], out_size,
-                            &dW_s2z_[o * out_size]);
-        }
-        // do->dh_next
-        for (size_t o = 0; o < out_size; o++) {
-          aux1[o] = d_s_next_[o] * z_neg_[o];
-        }
+      const vec_t &h_prev_ = h_prev[sample];
+      const vec_t &h_      = h[sample];
+      const vec_t &z_      = z[sample];
+      const vec_t &z_neg_  = z_neg[sample];
+      for (size_t o = 0; o < out_size; o++) {
+        const float_t d_s   = d_s_next[sample][o] + d_o_next[sample][o];
+        d_h_prev[sample][o] = d_s * z_[o];
+        dz[o] = d_s * (h_prev_[o] - h_[o]) * z_[o] * (float_t(1) - z_[o]);
+        dh[o] = d_s * z_neg_[o] * (float_t(1) - h_[o] * h_[o]);
+      }
+    }
 
-        tanh->backward_activation(h_, h_, aux1, aux1);
+    // dhr = dh W[hr->c]^T
+    vectorize::gemm(false, true, rows, out_size, out_size,
+                    delta.data() + 2 * out_size, gates, &W_hr2c[0], out_size,
+                    d_hr.data(), out_size);
 
-        // dh -> db2h
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2h_[o] = aux1[o];
-          }
-        }
+    for (size_t sample = range.begin(); sample < range.end(); sample++) {
+      const size_t k = sample - range.begin();
+      float_t *dz    = &delta[k * gates];
+      float_t *dr    = dz + out_size;
+      float_t *dh    = dz + 2 * out_size;
 
-        // dh_prev -> dx
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&aux1[0], &W_x2h[i * out_size], out_size);
-        }
-        // dh_prev -> dWx2h
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux1[0], x_[i], out_size, &dW_x2h_[i * out_size]);
-        }
-        // dh_prev -> dWhr2c
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux1[0], hr_[o], out_size,
-                            &dW_hr2c_[o * out_size]);
-        }
-        // dWhr -> dhr
-        for (size_t o = 0; o < out_size; o++) {
-          aux2[o] = vectorize::dot(&aux1[0], &W_hr2c[o * out_size], out_size);
-        }
-        // dhr -> dh_prev
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] += aux2[o] * r_[o];
-        }
-        // dhr -> dr
-        for (size_t o = 0; o < out_size; o++) {
-          aux2[o] = aux2[o] * h_prev_[o];
-        }
+      const vec_t &x_      = x[sample];
+      const vec_t &h_prev_ = h_prev[sample];
+      const vec_t &r_      = r[sample];
+      const vec_t &hr_     = hr[sample];
+      for (size_t o = 0; o < out_size; o++) {
+        const float_t d_hr_o = d_hr[k * out_size + o];
+        d_h_prev[sample][o] += d_hr_o * r_[o];
+        dr[o] = d_hr_o * h_prev_[o] * r_[o] * (float_t(1) - r_[o]);
+      }
 
-        sigmoid->backward_activation(r_, r_, aux2, aux2);
+      if (has_bias) {
+        std::copy(dz, dz + out_size, db_2z[sample].begin());
+        std::copy(dr, dr + out_size, db_2r[sample].begin());
+        std::copy(dh, dh + out_size, db_2h[sample].begin());
+      }
+      for (size_t i = 0; i < in_size; i++) {
+        vectorize::muladd(dz, x_[i], out_size, &dW_x2z[sample][i * out_size]);
+        vectorize::muladd(dr, x_[i], out_size, &dW_x2r[sample][i * out_size]);
+        vectorize::muladd(dh, x_[i], out_size, &dW_x2h[sample][i * out_size]);
+      }
+      for (size_t o = 0; o < out_size; o++) {
+        vectorize::muladd(dz, h_prev_[o], out_size,
+                          &dW_s2z[sample][o * out_size]);
+        vectorize::muladd(dr, h_prev_[o], out_size,
+                          &dW_s2r[sample][o * out_size]);
+        vectorize::muladd(dh, hr_[o], out_size,
+                          &dW_hr2c[sample][o * out_size]);
+      }
+    }
 
-        // dr -> db2r
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2r_[o] = aux2[o];
-          }
-        }
+    // dx(t) += [dz dr dh] W_x^T, dh(t-1) += [dz dr] W_h^T
+    gather_rows(d_x_prev, range.begin(), range.end(), in_size, buffer.data());
+    vectorize::gemm(false, true, rows, in_size, gates, delta.data(), gates,
+                    &Wx[0], gates, buffer.data(), in_size);
+    scatter_rows(buffer.data(), range.begin(), range.end(), in_size,
+                 d_x_prev);
 
-        // dr -> dx
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&aux2[0], &W_x2r[i * out_size], out_size);
-        }
-        // dr -> dWx2r
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux2[0], x_[i], out_size, &dW_x2r_[out_size * i]);
-        }
-        // dr -> dh_prev
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] +=
-            vectorize::dot(&aux2[0], &W_s2r[o * out_size], out_size);
-        }
-        // dr -> dWs2r
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux2[0], h_prev_[o], out_size,
-                            &dW_s2r_[out_size * o]);
-        }
-      }
-    },
-    0u);  // for_i
+    gather_rows(d_h_prev, range.begin(), range.end(), out_size, buffer.data());
+    vectorize::gemm(false, true, rows, out_size, 2 * out_size, delta.data(),
+                    gates, &Wh[0], 2 * out_size, buffer.data(), out_size);
+    scatter_rows(buffer.data(), range.begin(), range.end(), out_size,
+                 d_h_prev);
+  });
 }
+
 }  // namespace kernels
 }  // namespace tinydnn
@@ -0,0 +1,206 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <cmath>
+#include "tinydnn/core/lrn_params.h"
+#include "tinydnn/utils/utils.h"
+
+namespace tinydnn {
+namespace kernels {
+
+/**
+ * The window of channel c is [c - before, c + after] (clipped to the
+ * channels), the channels of the windows containing c are
+ * [c - after, c + before].
+ **/
+struct lrn_window {
+  size_t before;
+  size_t after;
+};
+
+inline lrn_window lrn_channel_window(const core::lrn_params &params) {
+  return {params.local_size - params.local_size / 2 - 1,
+          params.local_size / 2};
+}
+
+/**
+ * the number of channel blocks of a sample: enough (sample, block) tasks to
+ * occupy the threads, each block at least local_size channels long so that
+ * the channels shared with its neighbours stay a fraction of its work
+ **/
+inline size_t lrn_channel_blocks(const core::lrn_params &params,
+                                 size_t samples,
+                                 const bool layer_parallelize) {
+  const size_t depth = params.in.depth_;
+  if (!layer_parallelize || samples == 0) return 1;
+  const size_t wanted = (parallel_concurrency() + samples - 1) / samples;
+  return std::max<size_t>(
+    1, std::min(wanted, depth / std::max<size_t>(params.local_size, 1)));
+}
+
+// dst = scale^-beta; the usual beta of 0.75 (AlexNet, Caffe) takes two
+// square roots instead of a pow
+inline void lrn_power(const float_t *scale,
+                      size_t size,
+                      float_t beta,
+                      float_t *dst) {
+  if (beta == float_t(0.75)) {
+    for (size_t j = 0; j < size; j++) {
+      dst[j] = float_t(1) / std::sqrt(scale[j] * std::sqrt(scale[j]));
+    }
+  } else {
+    for (size_t j = 0; j < size; j++) dst[j] = std::pow(scale[j], -beta);
+  }
+}
+
+/**
+ * Runs f(sample, begin, end) over the channel blocks [begin, end) of every
+ * sample, one task per (sample, block).
+ **/
+template <typename Func>
+inline void lrn_for_blocks(const core::lrn_params &params,
+                           size_t samples,
+                           const bool layer_parallelize,
+                           Func f) {
+  const size_t depth  = params.in.depth_;
+  const size_t blocks = lrn_channel_blocks(params, samples, layer_parallelize);
+  for_i(layer_parallelize, samples * blocks, [&](size_t task) {
+    const size_t block = task % blocks;
+    f(task / blocks, block * depth / blocks, (block + 1) * depth / blocks);
+  });
+}
+
+/**
+ * out = in * scale^-beta, scale = 1 + alpha / local_size * (sum of in^2 over
+ * the window of channels), which is kept in params.scale for the backward
+ * pass. The squares of a block of channels are computed once; the window
+ * sum then slides along the channels, adding the square entering and
+ * removing the one leaving it one whole plane at a time.
+ **/
+inline void lrn_op_internal(const tensor_t &in_data,
+                            tensor_t &out_data,
+                            core::lrn_params &params,
+                            const bool layer_parallelize) {
+  const size_t area      = params.in.area();
+  const size_t depth     = params.in.depth_;
+  const lrn_window w     = lrn_channel_window(params);
+  const float_t alpha_n  = params.alpha / params.local_size;
+  const size_t n_samples = in_data.size();
+
+  params.scale.resize(n_samples);
+  for (auto &s : params.scale) s.resize(params.in.size());
+
+  lrn_for_blocks(params, n_samples, layer_parallelize, [&](size_t sample,
+                                                           size_t begin,
+                                                           size_t end) {
+    const float_t *in = &in_data[sample][0];
+    float_t *out      = &out_data[sample][0];
+    float_t *scale    = &params.scale[sample][0];
+
+    // squares of the channels in the windows of the block
+    const size_t lo = begin > w.before ? begin - w.before : 0;
+    const size_t hi = std::min(end + w.after, depth);
+    vec_t square((hi - lo) * area);
+    for (size_t j = 0; j < square.size(); j++) {
+      square[j] = in[lo * area + j] * in[lo * area + j];
+    }
+    auto square_of = [&](size_t c) { return &square[(c - lo) * area]; };
+
+    vec_t sum(area, float_t{0});
+    for (size_t c = lo; c < std::min(begin + w.after + 1, depth); c++) {
+      vectorize::add(square_of(c), area, &sum[0]);
+    }
+
+    for (size_t c = begin; c < end; c++) {
+      if (c > begin) {
+        if (c + w.after < depth) {
+          vectorize::add(square_of(c + w.after), area, &sum[0]);
+        }
+        if (c > w.before) {
+          vectorize::muladd(square_of(c - w.before - 1), float_t(-1), area,
+                            &sum[0]);
+        }
+      }
+
+      float_t *s         = scale + c * area;
+      float_t *dst       = out + c * area;
+      const float_t *src = in + c * area;
+      for (size_t j = 0; j < area; j++) s[j] = float_t(1) + alpha_n * sum[j];
+      lrn_power(s, area, params.beta, dst);
+      for (size_t j = 0; j < area; j++) dst[j] *= src[j];
+    }
+  });
+}
+
+/**
+ * prev_delta = curr_delta * scale^-beta - 2 * alpha * beta / local_size *
+ * in * (sum of curr_delta * out / scale over the channels whose windows
+ * contain the channel), with the scale of the forward pass. That sum slides
+ * along the channels like the one of the forward pass.
+ **/
+inline void lrn_grad_op_internal(const tensor_t &in_data,
+                                 const tensor_t &out_data,
+                                 tensor_t &prev_delta,
+                                 const tensor_t &curr_delta,
+                                 const core::lrn_params &params,
+                                 const bool layer_parallelize) {
+  const size_t area      = params.in.area();
+  const size_t depth     = params.in.depth_;
+  const lrn_window w     = lrn_channel_window(params);
+  const float_t coeff    = 2 * params.alpha * params.beta / params.local_size;
+  const size_t n_samples = in_data.size();
+
+  lrn_for_blocks(params, n_samples, layer_parallelize, [&](size_t sample,
+                                                           size_t begin,
+                                                           size_t end) {
+    const float_t *in    = &in_data[sample][0];
+    const float_t *out   = &out_data[sample][0];
+    const float_t *dy    = &curr_delta[sample][0];
+    const float_t *scale = &params.scale[sample][0];
+    float_t *dx          = &prev_delta[sample][0];
+
+    const size_t lo = begin > w.after ? begin - w.after : 0;
+    const size_t hi = std::min(end + w.before, depth);
+    vec_t ratio((hi - lo) * area);
+    for (size_t j = 0; j < ratio.size(); j++) {
+      const size_t k = lo * area + j;
+      ratio[j]       = dy[k] * out[k] / scale[k];
+    }
+    auto ratio_of = [&](size_t c) { return &ratio[(c - lo) * area]; };
+
+    vec_t sum(area, float_t{0});
+    vec_t power(area);
+    for (size_t c = lo; c < std::min(begin + w.before + 1, depth); c++) {
+      vectorize::add(ratio_of(c), area, &sum[0]);
+    }
+
+    for (size_t c = begin; c < end; c++) {
+      if (c > begin) {
+        if (c + w.before < depth) {
+          vectorize::add(ratio_of(c + w.before), area, &sum[0]);
+        }
+        if (c > w.after) {
+          vectorize::muladd(ratio_of(c - w.after - 1), float_t(-1), area,
+                            &sum[0]);
+        }
+      }
+
+      const size_t offset = c * area;
+      lrn_power(scale + offset, area, params.beta, &power[0]);
+      for (size_t j = 0; j < area; j++) {
+        dx[offset + j] = dy[offset + j] * power[j] -
+                         coeff * in[offset + j] * sum[j];
+      }
+    }
+  });
+}
+
+}  // namespace kernels
+}  // namespace tinydnn
@@ -18,7 +18,7 @@ class LSTMCellGradOp : public core::OpKernel {
     : core::OpKernel(context) {}
 
   void compute(core::OpKernelContext &context) override {
-    auto params = OpKernel::params_->lstm_cell();
+    const auto &params = OpKernel::params_->lstm_cell();
     // incoming/outcoming data
     const tensor_t &x      = context.input(0);   // x
     const tensor_t &h_prev = context.input(1);   // h(t-1)
@@ -18,7 +18,7 @@ class LSTMCellOp : public core::OpKernel {
     : core::OpKernel(context) {}
 
   void compute(core::OpKernelContext &context) override {
-    auto params = OpKernel::params_->lstm_cell();
+    const auto &params = OpKernel::params_->lstm_cell();
 
     // incomimg/outcoming data
     const tensor_t &x      = context.input(0);   // x
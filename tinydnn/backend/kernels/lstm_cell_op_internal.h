@@ -7,11 +7,48 @@
 */
 #pragma once
 
+#include <algorithm>
+#include "tinydnn/backend/kernels/cell_op_internal.h"
 #include "tinydnn/core/lstm_cell_params.h"
 
 namespace tinydnn {
 namespace kernels {
 
+/**
+ * the weights of the four gates side by side in the order i, f, o, z, so
+ * that the sigmoid gates are contiguous: W_x is in_size x 4 * out_size,
+ * W_h out_size x 4 * out_size and b 4 * out_size (empty without bias).
+ **/
+inline void lstm_cell_concat_weights(const vec_t &W_x2i,
+                                     const vec_t &W_x2f,
+                                     const vec_t &W_x2c,
+                                     const vec_t &W_x2o,
+                                     const vec_t &W_h2i,
+                                     const vec_t &W_h2f,
+                                     const vec_t &W_h2c,
+                                     const vec_t &W_h2o,
+                                     const vec_t &b_2i,
+                                     const vec_t &b_2f,
+                                     const vec_t &b_2c,
+                                     const vec_t &b_2o,
+                                     const core::lstm_cell_params &params,
+                                     vec_t &W_x,
+                                     vec_t &W_h,
+                                     vec_t &b) {
+  const size_t out_size = params.out_size_;
+  concat_gates({&W_x2i, &W_x2f, &W_x2o, &W_x2c}, params.in_size_, out_size,
+               W_x);
+  concat_gates({&W_h2i, &W_h2f, &W_h2o, &W_h2c}, out_size, out_size, W_h);
+  concat_gates({&b_2i, &b_2f, &b_2o, &b_2c}, 1, out_size, b);
+}
+
+/**
+ * One step for a batch of samples: the gate inputs of all of the samples
+ * are two gemms against the concatenated weights, x W_x + b (computed for
+ * the whole sequence up front when params.x_proj_ holds it) and
+ * h(t-1) W_h, followed by one elementwise pass for the nonlinearities and
+ * the state update.
+ **/
 inline void lstm_cell_op_internal(const tensor_t &x,
                                   const tensor_t &h_prev,
                                   const tensor_t &c_prev,
@@ -36,71 +73,74 @@ inline void lstm_cell_op_internal(const tensor_t &x,
                                   tensor_t &c,
                                   const core::lstm_cell_params &params,
                                   const bool layer_parallelize) {
-  for_(layer_parallelize, 0u, x.size(),
-       [&](const blocked_range &r) {
-         const size_t in_size  = params.in_size_;
-         const size_t out_size = params.out_size_;
-         auto tanh             = params.tanh_;
-         auto sigmoid          = params.sigmoid_;
-         const bool has_bias   = params.has_bias_;
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
+  const size_t gates    = 4 * out_size;
+  const size_t batch    = x.size();
+
+  // the weights concatenated by the cell for the sequence, or here
+  vec_t W_x, W_h, b;
+  const bool concatenated = !params.W_h_.empty();
+  if (!concatenated) {
+    lstm_cell_concat_weights(W_x2i, W_x2f, W_x2c, W_x2o, W_h2i, W_h2f, W_h2c,
+                             W_h2o, b_2i, b_2f, b_2c, b_2o, params, W_x, W_h,
+                             b);
+  }
+  const vec_t &Wx = concatenated ? params.W_x_ : W_x;
+  const vec_t &Wh = concatenated ? params.W_h_ : W_h;
+  const vec_t &bg = concatenated ? params.b_ : b;
+  const bool projected =
+    (params.step_ + 1) * batch * gates <= params.x_proj_.size();
+
+  for_(layer_parallelize, 0u, batch, [&](const blocked_range &r) {
+    const size_t rows = r.end() - r.begin();
+    vec_t gate(rows * gates);
+    vec_t buffer(rows * std::max(in_size, out_size));
 
-         for (size_t sample = r.begin(); sample < r.end(); sample++) {
-           vec_t &i_            = i[sample];
-           vec_t &f_            = f[sample];
-           vec_t &z_            = z[sample];
-           vec_t &c_            = c[sample];
-           const vec_t &x_      = x[sample];
-           const vec_t &h_prev_ = h_prev[sample];
-           const vec_t &c_prev_ = c_prev[sample];
-           vec_t &o_            = out_data[sample];
-           vec_t &h_next_       = h_next[sample];
-           vec_t &c_next_       = c_next[sample];
-           for (size_t o = 0; o < out_size; o++) {
-             float_t i_tmp = 0;
-             float_t f_tmp = 0;
-             float_t z_tmp = 0;
-             float_t o_tmp = 0;
-             for (size_t i = 0; i < in_size; i++) {
-               i_tmp += W_x2i[i * out_size + o] * x_[i];
-               f_tmp += W_x2f[i * out_size + o] * x_[i];
-               z_tmp += W_x2c[i * out_size + o] * x_[i];
-               o_tmp += W_x2o[i * out_size + o] * x_[i];
-             }
-             for (size_t o_2 = 0; o_2 < out_size; o_2++) {
-               i_tmp += W_h2i[o_2 * out_size + o] * h_prev_[o_2];
-               f_tmp += W_h2f[o_2 * out_size + o] * h_prev_[o_2];
-               z_tmp += W_h2c[o_2 * out_size + o] * h_prev_[o_2];
-               o_tmp += W_h2o[o_2 * out_size + o] * h_prev_[o_2];
-             }
-             if (has_bias) {
-               i_tmp += b_2i[o];
-               f_tmp += b_2f[o];
-               z_tmp += b_2c[o];
-               o_tmp += b_2o[o];
-             }
-             i_[o] = i_tmp;
-             f_[o] = f_tmp;
-             z_[o] = z_tmp;
-             o_[o] = o_tmp;
-           }
+    if (projected) {
+      const float_t *proj =
+        &params.x_proj_[(params.step_ * batch + r.begin()) * gates];
+      std::copy(proj, proj + rows * gates, gate.begin());
+    } else {
+      project_rows(x, r.begin(), r.end(), Wx, bg, in_size, gates,
+                   buffer.data(), gate.data());
+    }
+    gather_rows(h_prev, r.begin(), r.end(), out_size, buffer.data());
+    vectorize::gemm(false, false, rows, gates, out_size, buffer.data(),
+                    out_size, &Wh[0], gates, gate.data(), gates);
 
-           sigmoid->forward_activation(i_, i_);
-           sigmoid->forward_activation(f_, f_);
-           sigmoid->forward_activation(o_, o_);
-           tanh->forward_activation(z_, z_);
+    for (size_t sample = r.begin(); sample < r.end(); sample++) {
+      float_t *g = &gate[(sample - r.begin()) * gates];
+      vectorize::sigmoid(g, 3 * out_size, g);
+      vectorize::tanh(g + 3 * out_size, out_size, g + 3 * out_size);
+      const float_t *gi = g;
+      const float_t *gf = g + out_size;
+      const float_t *go = g + 2 * out_size;
+      const float_t *gz = g + 3 * out_size;
 
-           for (size_t o = 0; o < out_size; o++) {
-             c_next_[o] = f_[o] * c_prev_[o] + i_[o] * z_[o];
-           }
-           tanh->forward_activation(c_next_, c_);
-           for (size_t o = 0; o < out_size; o++) {
-             h_next_[o] = o_[o] * c_[o];
-           }
-         }
-       },
-       0u);  // for_i
+      const vec_t &c_prev_ = c_prev[sample];
+      vec_t &c_next_       = c_next[sample];
+      vec_t &c_            = c[sample];
+      for (size_t o = 0; o < out_size; o++) {
+        i[sample][o]        = gi[o];
+        f[sample][o]        = gf[o];
+        z[sample][o]        = gz[o];
+        out_data[sample][o] = go[o];
+        c_next_[o]          = gf[o] * c_prev_[o] + gi[o] * gz[o];
+      }
+      vectorize::tanh(&c_next_[0], out_size, &c_[0]);
+      for (size_t o = 0; o < out_size; o++) {
+        h_next[sample][o] = go[o] * c_[o];
+      }
+    }
+  });
 }
 
+/**
+ * The deltas of the four gates of a sample are computed in one elementwise
+ * pass; the deltas of x(t) and h(t-1) of all of the samples are then two
+ * gemms against the concatenated weights.
+ **/
 inline void lstm_cell_op_internal(const tensor_t &x,
                                   const tensor_t &h_prev,
                                   const tensor_t &c_prev,
@@ -124,190 +164,105 @@ inline void lstm_cell_op_internal(const tensor_t &x,
                                   tensor_t &db_2f,
                                   tensor_t &db_2c,
                                   tensor_t &db_2o,
-                                  const tensor_t d_o,
-                                  const tensor_t d_h_next,
-                                  const tensor_t d_c_next,
+                                  const tensor_t &d_o,
+                                  const tensor_t &d_h_next,
+                                  const tensor_t &d_c_next,
                                   tensor_t &d_x_prev,
                                   tensor_t &d_h_prev,
                                   tensor_t &d_c_prev,
-                                  const tensor_t o,
-                                  const tensor_t i,
-                                  const tensor_t f,
-                                  const tensor_t z,
-                                  const tensor_t c,
+                                  const tensor_t &o,
+                                  const tensor_t &i,
+                                  const tensor_t &f,
+                                  const tensor_t &z,
+                                  const tensor_t &c,
                                   const core::lstm_cell_params &params,
                                   const bool layer_parallelize) {
-  for_(
-    layer_parallelize, 0u, x.size(),
-    [&](const blocked_range &r) {
-      const size_t in_size  = params.in_size_;
-      const size_t out_size = params.out_size_;
-      auto tanh             = params.tanh_;
-      auto sigmoid          = params.sigmoid_;
-      const bool has_bias   = params.has_bias_;
+  const size_t in_size  = params.in_size_;
+  const size_t out_size = params.out_size_;
+  const size_t gates    = 4 * out_size;
+  const bool has_bias   = params.has_bias_;
 
-      for (size_t sample = r.begin(); sample < r.end(); sample++) {
-        const vec_t &d_h_next_ = d_h_next[sample];
-        const vec_t &d_o_      = d_o[sample];
-        const vec_t &x_        = x[sample];
-        const vec_t &h_prev_   = h_prev[sample];
-        const vec_t &c_prev_   = c_prev[sample];
-        const vec_t &o_        = o[sample];
-        const vec_t &i_        = i[sample];
-        const vec_t &c_        = c[sample];
-        const vec_t &f_        = f[sample];
-        const vec_t &z_        = z[sample];
+  vec_t W_x, W_h, b;
+  const bool concatenated = !params.W_h_.empty();
+  if (!concatenated) {
+    const vec_t none;
+    lstm_cell_concat_weights(W_x2i, W_x2f, W_x2c, W_x2o, W_h2i, W_h2f, W_h2c,
+                             W_h2o, none, none, none, none, params, W_x, W_h,
+                             b);
+  }
+  const vec_t &Wx = concatenated ? params.W_x_ : W_x;
+  const vec_t &Wh = concatenated ? params.W_h_ : W_h;
 
-        vec_t &dW_x2i_ = dW_x2i[sample];
-        vec_t &dW_h2i_ = dW_h2i[sample];
-        vec_t &dW_x2f_ = dW_x2f[sample];
-        vec_t &dW_h2f_ = dW_h2f[sample];
-        vec_t &dW_x2c_ = dW_x2c[sample];
-        vec_t &dW_h2c_ = dW_h2c[sample];
-        vec_t &dW_x2o_ = dW_x2o[sample];
-        vec_t &dW_h2o_ = dW_h2o[sample];
-        vec_t &db_2i_  = db_2i[sample];
-        vec_t &db_2f_  = db_2f[sample];
-        vec_t &db_2c_  = db_2c[sample];
-        vec_t &db_2o_  = db_2o[sample];
+  for_(layer_parallelize, 0u, x.size(), [&](const blocked_range &r) {
+    const size_t rows = r.end() - r.begin();
+    vec_t delta(rows * gates);
+    vec_t buffer(rows * std::max(in_size, out_size));
 
-        vec_t aux1(out_size);
-        vec_t aux2(out_size);
+    for (size_t sample = r.begin(); sample < r.end(); sample++) {
+      float_t *di   = &delta[(sample - r.begin()) * gates];
+      float_t *df   = di + out_size;
+      float_t *dout = di + 2 * out_size;
+      float_t *dz   = di + 3 * out_size;
 
-        /** propagate deltas from o(t) to the inputs **/
-        vec_t &d_x_prev_ = d_x_prev[sample];
-        vec_t &d_h_prev_ = d_h_prev[sample];
-        // aux1 = do(t) + dh(t) / do(t)
-        for (size_t o = 0; o < out_size; o++) {
-          aux1[o] = d_o_[o] + d_h_next_[o] * c_[o];  // dh - + -> do
-        }
-        sigmoid->backward_activation(o_, o_, aux1, aux1);
-        // dW2o
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux1[0], x_[i], out_size, &dW_x2o_[i * out_size]);
-        }
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux1[0], h_prev_[o], out_size,
-                            &dW_h2o_[o * out_size]);
-        }
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2o_[o] = aux1[o];
-          }
-        }
-        // dh->dx
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&W_x2o[i * out_size], &aux1[0], out_size);
-        }
-        // dh(t)->dh(t-1)
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] +=
-            vectorize::dot(&W_h2o[o * out_size], &aux1[0], out_size);
-        }
-        /** propagate deltas from h(t) to c(t) **/
-        // aux1 = d/dc o(t)tanh(c(t))
-        for (size_t o = 0; o < out_size; o++) {
-          aux1[o] = d_h_next_[o] * o_[o];
-        }
-        // aux1 = dc(t) + dh(t) / dc(t)
-        tanh->backward_activation(c_, c_, aux1, aux1);
-        /** propagate deltas from c(t) to i(t) & inputs [x | h | c](t-1) **/
-        const vec_t &d_c_next_ = d_c_next[sample];
-        vec_t &d_c_prev_       = d_c_prev[sample];
-        for (size_t o = 0; o < out_size; o++) {
-          aux1[o] += d_c_next_[o];  // error coming from c(t)
-          aux2[o]      = aux1[o] * z_[o];
-          d_c_prev_[o] = aux1[o] * f_[o];  // dc(t-1)
-        }
-        // i to input; aux2 = di
-        sigmoid->backward_activation(i_, i_, aux2, aux2);
-        // dW2i
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux2[0], x_[i], out_size, &dW_x2i_[i * out_size]);
-        }
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux2[0], h_prev_[o], out_size,
-                            &dW_h2i_[o * out_size]);
-        }
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2i_[o] = aux2[o];
-          }
-        }
-        // di->dx input
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&W_x2i[i * out_size], &aux2[0], out_size);
-        }
-        // di->dh(t-1)
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] +=
-            vectorize::dot(&W_h2i[o * out_size], &aux2[0], out_size);
-        }
-        // aux2 can be reused from here
-        /** propagate deltas from c(t) to z & inputs **/
-        for (size_t o = 0; o < out_size; o++) {
-          aux2[o] = aux1[o] * i_[o];
-        }
-        // z to input; aux2 = dz
-        tanh->backward_activation(z_, z_, aux2, aux2);
-        // dW2c
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux2[0], x_[i], out_size, &dW_x2c_[i * out_size]);
-        }
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux2[0], h_prev_[o], out_size,
-                            &dW_h2c_[o * out_size]);
-        }
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2c_[o] = aux2[o];
-          }
-        }
-        // dz->dx input
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&W_x2c[i * out_size], &aux2[0], out_size);
-        }
-        // dz->dh(t-1)
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] +=
-            vectorize::dot(&W_h2c[o * out_size], &aux2[0], out_size);
-        }
-        // Note:: an aux3 can be used to merge these two blocks to reduce
-        // the "for" overhead at the expense of memory.
-        // aux2 can be reused from here
-        /** propagate deltas from f(t) to inputs **/
-        for (size_t o = 0; o < out_size; o++) {
-          aux2[o] = aux1[o] * c_prev_[o];
-        }
-        sigmoid->backward_activation(f_, f_, aux2, aux2);
-        // dW2f
-        for (size_t i = 0; i < in_size; i++) {
-          vectorize::muladd(&aux2[0], x_[i], out_size, &dW_x2f_[i * out_size]);
-        }
-        for (size_t o = 0; o < out_size; o++) {
-          vectorize::muladd(&aux2[0], h_prev_[o], out_size,
-                            &dW_h2f_[o * out_size]);
-        }
-        if (has_bias) {
-          for (size_t o = 0; o < out_size; o++) {
-            db_2f_[o] = aux2[o];
-          }
-        }
-        // d -> input
-        for (size_t i = 0; i < in_size; i++) {
-          d_x_prev_[i] +=
-            vectorize::dot(&W_x2f[i * out_size], &aux2[0], out_size);
-        }
-        for (size_t o = 0; o < out_size; o++) {
-          d_h_prev_[o] +=
-            vectorize::dot(&W_h2f[o * out_size], &aux2[0], out_size);
-        }
+      const vec_t &x_      = x[sample];
+      const vec_t &h_prev_ = h_prev[sample];
+      const vec_t &c_prev_ = c_prev[sample];
+      const vec_t &o_      = o[sample];
+      const vec_t &i_      = i[sample];
+      const vec_t &f_      = f[sample];
+      const vec_t &z_      = z[sample];
+      const vec_t &c_      = c[sample];
+      for (size_t k = 0; k < out_size; k++) {
+        // h(t) = o(t)tanh(c(t)), o(t) is also the output
+        const float_t d_h = d_h_next[sample][k];
+        dout[k] =
+          (d_o[sample][k] + d_h * c_[k]) * o_[k] * (float_t(1) - o_[k]);
+        // error coming from h(t) and c(t)
+        const float_t d_c =
+          d_h * o_[k] * (float_t(1) - c_[k] * c_[k]) + d_c_next[sample][k];
+        d_c_prev[sample][k] = d_c * f_[k];
+        di[k]               = d_c * z_[k] * i_[k] * (float_t(1) - i_[k]);
+        df[k]               = d_c * c_prev_[k] * f_[k] * (float_t(1) - f_[k]);
+        dz[k]               = d_c * i_[k] * (float_t(1) - z_[k] * z_[k]);
       }
-    },
-    0u);  // for_i
+
+      if (has_bias) {
+        std::copy(di, di + out_size, db_2i[sample].begin());
+        std::copy(df, df + out_size, db_2f[sample].begin());
+        std::copy(dout, dout + out_size, db_2o[sample].begin());
+        std::copy(dz, dz + out_size, db_2c[sample].begin());
+      }
+      for (size_t k = 0; k < in_size; k++) {
+        vectorize::muladd(di, x_[k], out_size, &dW_x2i[sample][k * out_size]);
+        vectorize::muladd(df, x_[k], out_size, &dW_x2f[sample][k * out_size]);
+        vectorize::muladd(dout, x_[k], out_size,
+                          &dW_x2o[sample][k * out_size]);
+        vectorize::muladd(dz, x_[k], out_size, &dW_x2c[sample][k * out_size]);
+      }
+      for (size_t k = 0; k < out_size; k++) {
+        vectorize::muladd(di, h_prev_[k], out_size,
+                          &dW_h2i[sample][k * out_size]);
+        vectorize::muladd(df, h_prev_[k], out_size,
+                          &dW_h2f[sample][k * out_size]);
+        vectorize::muladd(dout, h_prev_[k], out_size,
+                          &dW_h2o[sample][k * out_size]);
+        vectorize::muladd(dz, h_prev_[k], out_size,
+                          &dW_h2c[sample][k * out_size]);
+      }
+    }
+
+    // dx(t) += delta W_x^T, dh(t-1) += delta W_h^T
+    gather_rows(d_x_prev, r.begin(), r.end(), in_size, buffer.data());
+    vectorize::gemm(false, true, rows, in_size, gates, delta.data(), gates,
+                    &Wx[0], gates, buffer.data(), in_size);
+    scatter_rows(buffer.data(), r.begin(), r.end(), in_size, d_x_prev);
+
+    gather_rows(d_h_prev, r.begin(), r.end(), out_size, buffer.data());
+    vectorize::gemm(false, true, rows, out_size, gates, delta.data(), gates,
+                    &Wh[0], gates, buffer.data(), out_size);
+    scatter_rows(buffer.data(), r.begin(), r.end(), out_size, d_h_prev);
+  });
 }
+
 }  // namespace kernels
 }  // namespace tinydnn
@@ -35,11 +35,11 @@ class MaxPoolGradOp : public core::OpKernel {
 
     if (engine == backend_t::internal) {
       kernels::maxpool_grad_op_internal(prev_delta, curr_delta,
-                                        params.out2inmax, params.in2out,
+                                        params.out2inmax, params,
                                         context.parallelize());
     } else if (engine == backend_t::avx) {
       kernels::maxpool_grad_op_avx(prev_delta, curr_delta, params.out2inmax,
-                                   params.in2out, context.parallelize());
+                                   params, context.parallelize());
     } else {
       throw nn_error("Not supported engine: " + to_string(engine));
     }
@@ -35,8 +35,8 @@ class MaxPoolOp : public core::OpKernel {
     const core::backend_t engine = context.engine();
 
     if (engine == core::backend_t::internal) {
-      kernels::maxpool_op_internal(in_data, out_data, params.out2inmax,
-                                   params.out2in, context.parallelize());
+      kernels::maxpool_op_internal(in_data, out_data, params.out2inmax, params,
+                                   context.parallelize());
     } else if (engine == core::backend_t::nnpack) {
       // NNPACK supports stride != 2 or pool_size !=2
       // there's optimization over stride=2 and pool_size=2
@@ -52,8 +52,8 @@ class MaxPoolOp : public core::OpKernel {
       */
       kernels::maxpool_op_nnpack(in_data, out_data, params);
     } else if (engine == core::backend_t::avx) {
-      kernels::maxpool_op_avx(in_data, out_data, params.out2inmax,
-                              params.out2in, context.parallelize());
+      kernels::maxpool_op_avx(in_data, out_data, params.out2inmax, params,
+                              context.parallelize());
     } else {
       throw nn_error("Not supported engine: " + to_string(engine));
     }
@@ -7,29 +7,165 @@
 */
 #pragma once
 
+#include <cstdint>
+#include <limits>
 #include <vector>
-#include "tinydnn/utils/types.h"
 #include "tinydnn/backend/kernels/maxpool_op_internal.h"
+#include "tinydnn/core/maxpool_params.h"
+#include "tinydnn/utils/types.h"
+
+#ifdef USE_AVX
+#include "tinydnn/backend/kernels/avx_kernel_common.h"
+#endif
 
 namespace tinydnn {
 namespace kernels {
 
+#if defined(USE_AVX) && !defined(USE_DOUBLE)
+
+// undoes the lane order of _mm256_shuffle_ps over two vectors:
+// 0 1 4 5 2 3 6 7 -> 0 1 2 3 4 5 6 7, on AVX without permute4x64
+inline __m256 maxpool_s2_avx_unshuffle(__m256 v) {
+  const __m256d x = _mm256_castps_pd(v);
+  const __m256d t = _mm256_permute2f128_pd(x, x, 1);
+  return _mm256_castpd_ps(_mm256_blend_pd(_mm256_unpacklo_pd(x, t),
+                                          _mm256_unpackhi_pd(t, x), 0xc));
+}
+
+/**
+ * 8 outputs ox .. ox + 7 of output row oy of a pool x pool, stride 2 max
+ * pooling, whose windows must lie inside the input and whose loads (up to
+ * 15 + pool columns from 2 * ox, the last one at p + 10 for pool 3) must
+ * stay inside the row.
+ *
+ * _mm256_shuffle_ps splits 16 columns into the even and the odd ones, the
+ * first and second column of each window; for pool 3 the third column is
+ * the even split of the same columns shifted by 2. The argmax is tracked as
+ * int32 input indices next to the maxima, both are put back in output
+ * order once at the end.
+ **/
+template <size_t pool>
+inline void maxpool_s2_avx_block(const float *in,
+                                 size_t channel_offset,
+                                 size_t width,
+                                 size_t ox,
+                                 size_t oy,
+                                 float *out,
+                                 uint32_t *max) {
+  // column of each lane of the even split, relative to 2 * ox
+  const __m128i even_lo = _mm_setr_epi32(0, 2, 8, 10);
+  const __m128i even_hi = _mm_setr_epi32(4, 6, 12, 14);
+  const size_t x0       = ox * 2;
+  const size_t y0       = oy * 2;
+
+  __m256 m  = _mm256_set1_ps(std::numeric_limits<float>::lowest());
+  __m256 id = _mm256_castsi256_ps(
+    _mm256_set1_epi32(static_cast<int>(channel_offset + y0 * width + x0)));
+  for (size_t r = 0; r < pool; r++) {
+    const size_t row = channel_offset + (y0 + r) * width + x0;
+    const float *p   = in + row;
+    const __m256 a   = _mm256_loadu_ps(p);
+    const __m256 b   = _mm256_loadu_ps(p + 8);
+    __m256 column[3];
+    column[0] = _mm256_shuffle_ps(a, b, _MM_SHUFFLE(2, 0, 2, 0));
+    column[1] = _mm256_shuffle_ps(a, b, _MM_SHUFFLE(3, 1, 3, 1));
+    if (pool == 3) {
+      const __m256 c = _mm256_loadu_ps(p + 2);
+      const __m256 d = _mm256_loadu_ps(p + 10);
+      column[2]      = _mm256_shuffle_ps(c, d, _MM_SHUFFLE(2, 0, 2, 0));
+    }
+    for (size_t k = 0; k < pool; k++) {
+      const __m128i base = _mm_set1_epi32(static_cast<int>(row + k));
+      const __m256 k_id  = _mm256_castsi256_ps(_mm256_insertf128_si256(
+        _mm256_castsi128_si256(_mm_add_epi32(base, even_lo)),
+        _mm_add_epi32(base, even_hi), 1));
+      // strict compare, the first maximum in row-major order wins; max_ps
+      // returns its second operand for NaN like the scalar compare. Masks
+      // instead of blendv_ps, which is microcoded on many cores
+      const __m256 gt = _mm256_cmp_ps(column[k], m, _CMP_GT_OQ);
+      m               = _mm256_max_ps(column[k], m);
+      id = _mm256_or_ps(_mm256_andnot_ps(gt, id), _mm256_and_ps(gt, k_id));
+    }
+  }
+
+  _mm256_storeu_ps(out + ox, maxpool_s2_avx_unshuffle(m));
+  _mm256_storeu_si256(reinterpret_cast<__m256i *>(max + ox),
+                      _mm256_castps_si256(maxpool_s2_avx_unshuffle(id)));
+}
+
+template <size_t pool>
+inline void maxpool_s2_avx(const tensor_t &in_data,
+                           tensor_t &out_data,
+                           std::vector<std::vector<uint32_t>> &max_idx,
+                           const core::maxpool_params &params,
+                           const bool layer_parallelize) {
+  const size_t depth   = params.in.depth_;
+  const size_t width   = params.in.width_;
+  const size_t height  = params.in.height_;
+  const size_t out_w   = params.out.width_;
+  const size_t out_h   = params.out.height_;
+  const size_t in_area = width * height;
+
+  for_i(layer_parallelize, in_data.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    const float *in     = &in_data[sample][0];
+    float *out          = &out_data[sample][c * out_w * out_h];
+    uint32_t *max       = &max_idx[sample][c * out_w * out_h];
+
+    for (size_t oy = 0; oy < out_h; oy++) {
+      float *out_row    = out + oy * out_w;
+      uint32_t *max_row = max + oy * out_w;
+      size_t ox         = 0;
+      if (oy * 2 + pool <= height) {
+        for (; ox + 8 <= out_w && ox * 2 + 15 + pool <= width; ox += 8) {
+          maxpool_s2_avx_block<pool>(in, c * in_area, width, ox, oy, out_row,
+                                     max_row);
+        }
+      }
+      // clipped windows and the columns left over
+      for (; ox < out_w; ox++) {
+        maxpool_window(in, c * in_area, params, ox, oy, out_row[ox],
+                       max_row[ox]);
+      }
+    }
+  });
+}
+
+#endif  // USE_AVX && !USE_DOUBLE
+
 inline void maxpool_op_avx(const tensor_t &in_data,
                            tensor_t &out_data,
-                           std::vector<std::vector<size_t>> &max_idx,
-                           const std::vector<std::vector<size_t>> &out2in,
+                           std::vector<std::vector<uint32_t>> &max_idx,
+                           const core::maxpool_params &params,
                            const bool layer_parallelize) {
-  maxpool_op_internal(in_data, out_data, max_idx, out2in, layer_parallelize);
+#if defined(USE_AVX) && !defined(USE_DOUBLE)
+  if (params.stride_x == 2 && params.stride_y == 2 &&
+      params.pool_size_x == params.pool_size_y) {
+    if (params.pool_size_x == 2) {
+      maxpool_s2_avx<2>(in_data, out_data, max_idx, params, layer_parallelize);
+      return;
+    }
+    if (params.pool_size_x == 3) {
+      maxpool_s2_avx<3>(in_data, out_data, max_idx, params, layer_parallelize);
+      return;
+    }
+  }
+#endif
+  maxpool_op_internal(in_data, out_data, max_idx, params, layer_parallelize);
 }
 
-inline void maxpool_grad_op_avx(tensor_t &prev_delta,
-                                const tensor_t &curr_delta,
-                                std::vector<std::vector<size_t>> &max_idx,
-                                const std::vector<size_t> &in2out,
-                                const bool layer_parallelize) {
-  maxpool_grad_op_internal(prev_delta, curr_delta, max_idx, in2out,
+// the scatter of the gradients through the argmax indices has no vector
+// form before AVX-512, this is the internal kernel
+inline void maxpool_grad_op_avx(
+  tensor_t &prev_delta,
+  const tensor_t &curr_delta,
+  const std::vector<std::vector<uint32_t>> &max_idx,
+  const core::maxpool_params &params,
+  const bool layer_parallelize) {
+  maxpool_grad_op_internal(prev_delta, curr_delta, max_idx, params,
                            layer_parallelize);
 }
 
 }  // namespace kernels
-}  // namespace tiny_dnn
+}  // namespace tinydnn
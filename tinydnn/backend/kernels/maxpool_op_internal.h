@@ -7,52 +7,103 @@
 */
 #pragma once
 
+#include <algorithm>
+#include <cstdint>
 #include <limits>
 #include <vector>
+#include "tinydnn/core/maxpool_params.h"
 #include "tinydnn/utils/utils.h"
 
 namespace tinydnn {
 namespace kernels {
 
+/**
+ * max over the pooling window of output (ox, oy) in the channel starting at
+ * in, written to out along with the index of the maximum in the sample.
+ * Windows start at (ox * stride_x, oy * stride_y) and are clipped at the
+ * right/bottom border, where ceil_mode and same padding let them overhang.
+ * The first maximum in row-major order wins.
+ **/
+inline void maxpool_window(const float_t *in,
+                           size_t channel_offset,
+                           const core::maxpool_params &params,
+                           size_t ox,
+                           size_t oy,
+                           float_t &out,
+                           uint32_t &max_index) {
+  const size_t width = params.in.width_;
+  const size_t x0    = ox * params.stride_x;
+  const size_t y0    = oy * params.stride_y;
+  const size_t x1    = std::min(x0 + params.pool_size_x, width);
+  const size_t y1    = std::min(y0 + params.pool_size_y, params.in.height_);
+
+  float_t max_value = std::numeric_limits<float_t>::lowest();
+  size_t idx        = channel_offset + y0 * width + x0;
+  for (size_t y = y0; y < y1; y++) {
+    const size_t row = channel_offset + y * width;
+    for (size_t x = x0; x < x1; x++) {
+      if (in[row + x] > max_value) {
+        max_value = in[row + x];
+        idx       = row + x;
+      }
+    }
+  }
+  out       = max_value;
+  max_index = static_cast<uint32_t>(idx);
+}
+
 inline void maxpool_op_internal(const tensor_t &in_data,
                                 tensor_t &out_data,
-                                std::vector<std::vector<size_t>> &max_idx,
-                                const std::vector<std::vector<size_t>> &out2in,
+                                std::vector<std::vector<uint32_t>> &max_idx,
+                                const core::maxpool_params &params,
                                 const bool layer_parallelize) {
-  for_i(layer_parallelize, in_data.size(), [&](size_t sample) {
-    const vec_t &in          = in_data[sample];
-    vec_t &out               = out_data[sample];
-    std::vector<size_t> &max = max_idx[sample];
-
-    for (size_t i = 0; i < out2in.size(); i++) {
-      const auto &in_index = out2in[i];
-      float_t max_value    = std::numeric_limits<float_t>::lowest();
-      size_t idx           = 0;
-      for (auto j : in_index) {
-        if (in[j] > max_value) {
-          max_value = in[j];
-          idx       = j;
-        }
+  const size_t depth   = params.in.depth_;
+  const size_t in_area = params.in.width_ * params.in.height_;
+  const size_t out_w   = params.out.width_;
+  const size_t out_h   = params.out.height_;
+
+  // one task per channel of each sample
+  for_i(layer_parallelize, in_data.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    const float_t *in   = &in_data[sample][0];
+    float_t *out        = &out_data[sample][c * out_w * out_h];
+    uint32_t *max       = &max_idx[sample][c * out_w * out_h];
+
+    for (size_t oy = 0; oy < out_h; oy++) {
+      for (size_t ox = 0; ox < out_w; ox++) {
+        maxpool_window(in, c * in_area, params, ox, oy, out[oy * out_w + ox],
+                       max[oy * out_w + ox]);
       }
-      max[i] = idx;
-      out[i] = max_value;
     }
   });
 }
 
-inline void maxpool_grad_op_internal(tensor_t &prev_delta,
-                                     const tensor_t &curr_delta,
-                                     std::vector<std::vector<size_t>> &max_idx,
-                                     const std::vector<size_t> &in2out,
-                                     const bool layer_parallelize) {
-  for_i(layer_parallelize, prev_delta.size(), [&](size_t sample) {
-    vec_t &prev                    = prev_delta[sample];
-    const vec_t &curr              = curr_delta[sample];
-    const std::vector<size_t> &max = max_idx[sample];
-
-    for (size_t i = 0; i < in2out.size(); i++) {
-      size_t outi = in2out[i];
-      prev[i]     = (max[outi] == i) ? curr[outi] : float_t{0};
+/**
+ * routes each output gradient to the input which held the maximum,
+ * accumulating where overlapping windows (stride < pool size) share it.
+ * prev_delta must be zeroed.
+ **/
+inline void maxpool_grad_op_internal(
+  tensor_t &prev_delta,
+  const tensor_t &curr_delta,
+  const std::vector<std::vector<uint32_t>> &max_idx,
+  const core::maxpool_params &params,
+  const bool layer_parallelize) {
+  const size_t depth    = params.in.depth_;
+  const size_t out_area = params.out.width_ * params.out.height_;
+
+  // the windows of a channel only cover that channel, so the channels of
+  // a sample can be scattered concurrently
+  for_i(layer_parallelize, prev_delta.size() * depth, [&](size_t task) {
+    const size_t sample = task / depth;
+    const size_t c      = task % depth;
+    vec_t &prev         = prev_delta[sample];
+    const float_t *curr = &curr_delta[sample][c * out_area];
+    const uint32_t *max = &max_idx[sample][c * out_area];
+
+    for (size_t i = 0; i < out_area; i++) {
+      prev[max[i]] += curr[i];
     }
   });
 }
@@ -26,6 +26,10 @@
 ///<  define to enable Grand Central Dispatch parallelization
 #define USE_GCD
 
+///< define to use lookup tables for exp/sigmoid/tanh/softplus (for
+///< microcontrollers without a SIMD unit)
+// #define USE_ACTIVATION_LUT
+
 ///< define to enable NNPack acceleration
 // #define USE_NNPACK
 
@@ -0,0 +1,33 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include "tinydnn/core/params.h"
+#include "tinydnn/utils/types.h"
+
+namespace tinydnn {
+namespace core {
+
+/* average pooling and unpooling; for unpooling the windows lie in the
+ * output, one per input element */
+class avepool_params : public Params {
+ public:
+  shape3d in;
+  shape3d out;
+  size_t pool_size_x;
+  size_t pool_size_y;
+  size_t stride_x;
+  size_t stride_y;
+};
+
+inline avepool_params &Params::avepool() {
+  return *(static_cast<avepool_params *>(this));
+}
+
+}  // namespace core
+}  // namespace tinydnn
@@ -0,0 +1,129 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <vector>
+#include "thirdparty/xtensor/xarray.hpp"
+#include "tinydnn/core/tensor.h"
+#include "tinydnn/utils/parallel_for.h"
+#include "tinydnn/utils/types.h"
+
+namespace tinydnn {
+
+/**
+ * A batch of samples stored in one contiguous block of memory.
+ *
+ * The storage is a flat Tensor holding the samples back to back, so sample i
+ * starts at data() + i * sample_size(). Kernels can run a single GEMM over the
+ * whole batch, and resizing the batch is one allocation instead of one per
+ * sample.
+ *
+ * The old per-sample tensor_t layout is still used by the layer interface,
+ * use from_tensor() / to_tensor() to move data between the two.
+ *
+ *     BatchTensor<> batch(in_data);      // pack tensor_t
+ *     gemm(batch.data(), W, out.data());  // process the whole batch
+ *     out.to_tensor(out_data);           // unpack into tensor_t
+ */
+template <typename U = float_t>
+class BatchTensor {
+ public:
+  BatchTensor() : num_samples_(0), sample_size_(0) {}
+
+  /**
+   * @param num_samples number of samples in the batch
+   * @param sample_size number of elements of each sample
+   */
+  BatchTensor(size_t num_samples, size_t sample_size)
+    : num_samples_(0), sample_size_(0) {
+    resize(num_samples, sample_size);
+  }
+
+  /**
+   * Packs the samples of src into contiguous storage
+   * @param src samples of equal size
+   */
+  explicit BatchTensor(const tensor_t &src)
+    : num_samples_(0), sample_size_(0) {
+    from_tensor(src);
+  }
+
+  size_t num_samples() const { return num_samples_; }
+
+  size_t sample_size() const { return sample_size_; }
+
+  size_t size() const { return num_samples_ * sample_size_; }
+
+  bool empty() const { return size() == 0; }
+
+  /**
+   * Changes the shape of the batch. The storage is only reallocated if it
+   * grows, the contents are undefined afterwards.
+   */
+  void resize(size_t num_samples, size_t sample_size) {
+    if (num_samples * sample_size > storage_.size()) {
+      storage_ = Tensor<U>({num_samples * sample_size});
+    }
+    num_samples_ = num_samples;
+    sample_size_ = sample_size;
+  }
+
+  ///< pointer to the first element of the batch
+  U *data() { return storage_.host_pointer(); }
+
+  const U *data() const { return storage_.host_pointer(); }
+
+  ///< pointer to the first element of the i-th sample
+  U *sample(size_t i) { return data() + i * sample_size_; }
+
+  const U *sample(size_t i) const { return data() + i * sample_size_; }
+
+  U &operator()(size_t i, size_t j) { return sample(i)[j]; }
+
+  U operator()(size_t i, size_t j) const { return sample(i)[j]; }
+
+  BatchTensor &fill(U value) {
+    std::fill(data(), data() + size(), value);
+    return *this;
+  }
+
+  /**
+   * Copies the samples of src into this batch
+   * @param src samples of equal size
+   */
+  void from_tensor(const tensor_t &src) {
+    resize(src.size(), src.empty() ? 0 : src[0].size());
+    for_i(num_samples_ > 1, num_samples_, [&](size_t i) {
+      std::copy(src[i].begin(), src[i].end(), sample(i));
+    });
+  }
+
+  /**
+   * Copies this batch into dst, resizing it to num_samples() x sample_size()
+   */
+  void to_tensor(tensor_t &dst) const {
+    dst.resize(num_samples_);
+    for_i(num_samples_ > 1, num_samples_, [&](size_t i) {
+      dst[i].assign(sample(i), sample(i) + sample_size_);
+    });
+  }
+
+  tensor_t to_tensor() const {
+    tensor_t dst;
+    to_tensor(dst);
+    return dst;
+  }
+
+ private:
+  size_t num_samples_;
+  size_t sample_size_;
+  Tensor<U> storage_;
+};
+
+}  // namespace tinydnn
@@ -9,12 +9,17 @@
 
 #include <algorithm>
 #include <deque>
+#include <memory>
 #include <vector>
 #include "tinydnn/core/params.h"
 #include "tinydnn/utils/types.h"
 #include "tinydnn/utils/parallel_for.h"
 
 namespace tinydnn {
+namespace kernels {
+struct conv2d_winograd_cache;
+}  // namespace kernels
+
 namespace core {
 
 struct conv_layer_worker_specific_storage {
@@ -74,6 +79,9 @@ class conv_params : public Params {
   size_t h_stride;
   size_t w_dilation;
   size_t h_dilation;
+  /* filters transformed by the Winograd kernel, shared by the layers
+   * sharing the weights (see convolutional_layer::share_weights) */
+  std::shared_ptr<kernels::conv2d_winograd_cache> winograd_cache;
 
   friend std::ostream &operator<<(std::ostream &o,
                                   const core::conv_params &param) {
@@ -8,6 +8,8 @@
 #pragma once
 
 #include "tinydnn/core/params.h"
+#include "tinydnn/utils/product.h"
+#include <memory>
 #include <new>
 
 namespace tinydnn {
@@ -18,6 +20,9 @@ class fully_params : public Params {
   size_t in_size_;
   size_t out_size_;
   bool has_bias_;
+  /* the weights in the layout of the GEMM kernel, only while they are
+   * read-only (see fully_connected_layer::freeze_weights) */
+  std::shared_ptr<const vectorize::packed_matrix<float_t>> packed_W_;
 };
 
 // TODO(nyanp): can we do better here?
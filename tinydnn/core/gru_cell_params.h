@@ -22,6 +22,17 @@ class gru_cell_params : public Params {
   std::shared_ptr<tanh_layer> tanh_;
   std::shared_ptr<sigmoid_layer> sigmoid_;
   bool has_bias_;
+
+  // the gate weights side by side, z, r, h from x and z, r from the state
+  // (see kernels::concat_gates); set by the cell while a recurrent layer
+  // runs the steps of a sequence, empty otherwise
+  vec_t W_x_;
+  vec_t W_h_;
+  vec_t b_;
+  // the gate inputs from x of every step of the sequence being forwarded,
+  // step_ selects the rows of the current one
+  vec_t x_proj_;
+  size_t step_ = 0;
 };
 
 inline gru_cell_params &Params::gru_cell() {
@@ -0,0 +1,31 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include "tinydnn/core/params.h"
+#include "tinydnn/utils/types.h"
+
+namespace tinydnn {
+namespace core {
+
+/* local response normalization across channels; scale holds
+ * 1 + alpha / local_size * (sum of squares in the window) of each sample
+ * of the last forward pass, for the backward pass */
+class lrn_params : public Params {
+ public:
+  shape3d in;
+  size_t local_size;
+  float_t alpha;
+  float_t beta;
+  tensor_t scale;
+};
+
+inline lrn_params &Params::lrn() { return *(static_cast<lrn_params *>(this)); }
+
+}  // namespace core
+}  // namespace tinydnn
@@ -7,6 +7,7 @@
 */
 #pragma once
 
+#include <cstdint>
 #include <vector>
 #include "tinydnn/core/params.h"
 #include "tinydnn/utils/types.h"
@@ -25,17 +26,14 @@ class maxpool_params : public Params {
   bool ceil_mode;
   padding pad_type;
 
-  /* mapping out => max_index(in) (1:1) */
-  std::vector<std::vector<size_t>> out2inmax;
-  /* mapping out => in (1:N) */
-  std::vector<std::vector<size_t>> out2in;
-  /* mapping in => out (N:1) */
-  std::vector<size_t> in2out;
+  /* index of the max input of each output, per sample; the windows
+   * themselves follow from pool_size_x/y and stride_x/y */
+  std::vector<std::vector<uint32_t>> out2inmax;
 };
 
 struct max_pooling_layer_worker_specific_storage {
   /* mapping out => max_index(in) (1:1) */
-  std::vector<std::vector<size_t>> out2inmax_;
+  std::vector<std::vector<uint32_t>> out2inmax_;
 };
 
 // TODO(nyanp): can we do better here?
@@ -54,6 +54,9 @@ class OpKernelContext {
     bool parallelize = false;
 
     backend_t engine = default_engine();
+
+    // data_version of the weights, keys the caches of transformed weights
+    size_t weights_version = 0;
   };
 
   OpKernelContext()
@@ -116,6 +119,12 @@ class OpKernelContext {
 
   void setEngine(const backend_t engine) { op_params_->engine = engine; }
 
+  size_t weightsVersion() const { return op_params_->weights_version; }
+
+  void setWeightsVersion(const size_t version) {
+    op_params_->weights_version = version;
+  }
+
  private:
   std::vector<tensor_t *> *in_data_;
   std::vector<tensor_t *> *out_data_;
@@ -13,7 +13,9 @@ namespace core {
 class conv_params;
 class fully_params;
 class maxpool_params;
+class avepool_params;
 class global_avepool_params;
+class lrn_params;
 class gru_cell_params;
 class rnn_cell_params;
 class lstm_cell_params;
@@ -25,7 +27,9 @@ class Params {
   conv_params &conv();
   fully_params &fully();
   maxpool_params &maxpool();
+  avepool_params &avepool();
   global_avepool_params &global_avepool();
+  lrn_params &lrn();
   gru_cell_params &gru_cell();
   rnn_cell_params &rnn_cell();
   lstm_cell_params &lstm_cell();
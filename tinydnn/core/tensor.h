@@ -151,6 +151,15 @@ class Tensor {
 
   const auto host_end() const { return storage_.cend(); }
 
+  /**
+   * Pointer to the contiguous row-major host storage. Only available for
+   * tensors which own their storage (not for views)
+   * @return pointer to the first element
+   */
+  U *host_pointer() { return storage_.raw_data(); }
+
+  const U *host_pointer() const { return storage_.raw_data(); }
+
 // TODO(Randl)
 /*
 const auto host_flatten() const {
@@ -8,6 +8,7 @@
 #pragma once
 
 #include <algorithm>
+#include <cmath>
 #include <limits>
 #include <string>
 #include <vector>
@@ -168,6 +169,8 @@ class batch_normalization_layer : public layer {
 
   std::string layer_type() const override { return "batch-norm"; }
 
+  bool uses_batch_statistics() const override { return true; }
+
   void post_update() override {
     for (size_t i = 0; i < mean_.size(); i++) {
       mean_[i] = momentum_ * mean_[i] + (1 - momentum_) * mean_current_[i];
@@ -214,6 +217,22 @@ class batch_normalization_layer : public layer {
 
   float_t momentum() const { return momentum_; }
 
+  /**
+   * the normalization of the test phase as out = scale * in + shift
+   * (elementwise), from the moving averages of mean and variance
+   **/
+  void inference_scale_shift(vec_t &scale, vec_t &shift) const {
+    scale.resize(in_channels_ * in_spatial_size_);
+    shift.resize(in_channels_ * in_spatial_size_);
+    for (size_t j = 0; j < in_channels_; j++) {
+      const float_t s = float_t(1) / std::sqrt(variance_[j] + eps_);
+      float_t *sc     = &scale[j * in_spatial_size_];
+      float_t *sh     = &shift[j * in_spatial_size_];
+      std::fill(sc, sc + in_spatial_size_, s);
+      std::fill(sh, sh + in_spatial_size_, -mean_[j] * s);
+    }
+  }
+
   friend struct serialization_buddy;
 
  private:
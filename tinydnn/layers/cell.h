@@ -37,9 +37,28 @@ class cell : public layer {
 
   virtual void init_backend(const layer *wrapper) = 0;
 
+  /**
+   * Called by the wrapping layer before it forwards (forward = true) or
+   * backwards the steps of a sequence one by one, with the inputs of the
+   * whole sequence (seq_len * batch_size samples). Cells can prepare what
+   * the steps share until end_sequence is called.
+   **/
+  virtual void begin_sequence(const std::vector<tensor_t *> &in_data,
+                              bool forward) {
+    UNREFERENCED_PARAMETER(in_data);
+    UNREFERENCED_PARAMETER(forward);
+  }
+
+  virtual void end_sequence() {}
+
+  // the step of the sequence run next
+  inline void set_step(size_t step) { step_ = step; }
+
  protected:
   inline void set_wrapper(const layer *wrapper) { wrapper_ = wrapper; }
 
+  size_t step_ = 0;
+
   const layer *wrapper_;  // every forward iteration, we must get the engine,
                           // backend, etc from the wrapper
 };
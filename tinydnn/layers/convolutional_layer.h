@@ -289,6 +289,7 @@ class convolutional_layer : public layer {
     fwd_ctx_.set_in_out(fwd_in_data_, out_data);
     fwd_ctx_.setParallelize(layer::parallelize());
     fwd_ctx_.setEngine(layer::engine());
+    fwd_ctx_.setWeightsVersion(ith_in_node(1)->data_version());
 
     // launch convolutional kernel
     kernel_fwd_->compute(fwd_ctx_);
@@ -332,6 +333,11 @@ class convolutional_layer : public layer {
     padding_op_.copy_and_unpad_delta(cws_.prev_delta_padded_, *in_grad[0]);
   }
 
+  ///< samples are summed into one dW/db accumulator per thread
+  size_t weight_grad_slots(size_t sample_count) const override {
+    return accumulator_count(layer::parallelize(), sample_count);
+  }
+
   void set_sample_count(size_t sample_count) override {
     layer::set_sample_count(sample_count);
     cws_.prev_delta_padded_.resize(sample_count,
@@ -353,6 +359,43 @@ class convolutional_layer : public layer {
 
   std::string layer_type() const override { return std::string("conv"); }
 
+  void share_weights(layer &src) override {
+    layer::share_weights(src);
+    // the Winograd transform of the weights is shared as well
+    auto conv = dynamic_cast<convolutional_layer *>(&src);
+    if (conv) params_.winograd_cache = conv->params_.winograd_cache;
+  }
+
+  // scale and shift have to be uniform over each output channel, a shift
+  // needs the bias
+  bool fold_scale_shift(const vec_t &scale, const vec_t &shift) override {
+    const size_t area     = params_.out.area();
+    const size_t channels = params_.out.depth_;
+    for (size_t o = 0; o < channels; o++) {
+      const float_t *s = &scale[o * area];
+      const float_t *t = &shift[o * area];
+      for (size_t k = 0; k < area; k++) {
+        if (s[k] != s[0] || t[k] != t[0]) return false;
+      }
+      if (!params_.has_bias && t[0] != float_t{0}) return false;
+    }
+
+    auto w            = weights();
+    const size_t size = params_.weight.width_ * params_.weight.height_;
+    for (size_t o = 0; o < channels; o++) {
+      const float_t s = scale[o * area];
+      for (size_t inc = 0; inc < params_.in.depth_; inc++) {
+        const size_t idx =
+          params_.weight.get_index(0, 0, params_.in.depth_ * o + inc);
+        for (size_t k = 0; k < size; k++) (*w[0])[idx + k] *= s;
+      }
+      if (params_.has_bias) {
+        (*w[1])[o] = s * (*w[1])[o] + shift[o * area];
+      }
+    }
+    return true;
+  }
+
   // TODO(edgar): check this
   std::string kernel_file() const override {
     return std::string(
@@ -452,6 +495,8 @@ class convolutional_layer : public layer {
     params_.w_dilation = w_dilation;
     params_.h_dilation = h_dilation;
     params_.tbl        = tbl;
+    params_.winograd_cache =
+      std::make_shared<kernels::conv2d_winograd_cache>();
 
     // init padding buffer
     if (params_.pad_type == padding::same) {
@@ -507,7 +552,8 @@ class convolutional_layer : public layer {
 
     if (backend_type == core::backend_t::internal ||
         backend_type == core::backend_t::nnpack ||
-        backend_type == core::backend_t::avx) {
+        backend_type == core::backend_t::avx ||
+        backend_type == core::backend_t::cblas) {
       kernel_fwd_.reset(new Conv2dOp(ctx));
       kernel_back_.reset(new Conv2dGradOp(ctx));
       return;
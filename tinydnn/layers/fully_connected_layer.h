@@ -7,6 +7,7 @@
 */
 #pragma once
 
+#include <algorithm>
 #include <memory>
 #include <string>
 #include <utility>
@@ -89,8 +90,57 @@ class fully_connected_layer : public layer {
     kernel_back_->compute(bwd_ctx_);
   }
 
+  ///< samples are summed into one dW/db accumulator per thread
+  size_t weight_grad_slots(size_t sample_count) const override {
+    return accumulator_count(layer::parallelize(), sample_count);
+  }
+
+  /**
+   * read-only weights are packed for the GEMM kernel once, here rather than
+   * in the forward pass so that the layers sharing them (see share_weights)
+   * get the packed copy as well instead of packing their own
+   **/
+  void freeze_weights() override {
+    if (params_.packed_W_) return;  // shared from the source layer
+
+    layer::setup(false);
+    auto packed = std::make_shared<vectorize::packed_matrix<float_t>>();
+    packed->pack(false, params_.in_size_, params_.out_size_,
+                 &(*ith_in_node(1)->get_data())[0][0], params_.out_size_);
+    params_.packed_W_ = packed;
+  }
+
+  void share_weights(layer &src) override {
+    layer::share_weights(src);
+    // the packed copy of the weights is shared as well
+    auto fc = dynamic_cast<fully_connected_layer *>(&src);
+    if (fc) params_.packed_W_ = fc->params_.packed_W_;
+  }
+
   std::string layer_type() const override { return "fully-connected"; }
 
+  // a shift needs the bias
+  bool fold_scale_shift(const vec_t &scale, const vec_t &shift) override {
+    const size_t out_size = params_.out_size_;
+    if (!params_.has_bias_ &&
+        std::any_of(shift.begin(), shift.end(),
+                    [](float_t t) { return t != float_t{0}; })) {
+      return false;
+    }
+
+    auto w = weights();
+    for (size_t i = 0; i < params_.in_size_; i++) {
+      float_t *row = &(*w[0])[i * out_size];
+      for (size_t o = 0; o < out_size; o++) row[o] *= scale[o];
+    }
+    if (params_.has_bias_) {
+      vec_t &b = *w[1];
+      for (size_t o = 0; o < out_size; o++) b[o] = scale[o] * b[o] + shift[o];
+    }
+    params_.packed_W_.reset();
+    return true;
+  }
+
   friend struct serialization_buddy;
 
  protected:
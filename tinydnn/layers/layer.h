@@ -161,10 +161,12 @@ class layer : public node {
     return v;
   }
 
+  ///< the caller may write to the weights, so they get a new data_version
   std::vector<vec_t *> weights() {
     std::vector<vec_t *> v;
     for (size_t i = 0; i < in_channels_; i++) {
       if (is_trainable_weight(in_type_[i])) {
+        ith_in_node(i)->touch_data();
         v.push_back(get_weight_data(i));
       }
     }
@@ -443,6 +445,31 @@ class layer : public node {
    **/
   virtual void set_context(net_phase ctx) { UNREFERENCED_PARAMETER(ctx); }
 
+  /**
+   * notify that the weights won't change anymore (see network::freeze), so
+   * the layer may keep data derived from them, e.g. a repacked copy
+   **/
+  virtual void freeze_weights() {}
+
+  /**
+   * whether the output of a sample depends on the other samples of the
+   * minibatch during training, e.g. batch normalization. Such a network
+   * can't be trained on slices of the minibatch (see network::fit).
+   **/
+  virtual bool uses_batch_statistics() const { return false; }
+
+  /**
+   * fold out = scale * out + shift (elementwise over the output) into the
+   * weights and bias, e.g. a batch normalization behind this layer (see
+   * network::fold_batch_norm). Returns false without changing anything if
+   * the layer can't express it.
+   **/
+  virtual bool fold_scale_shift(const vec_t &scale, const vec_t &shift) {
+    UNREFERENCED_PARAMETER(scale);
+    UNREFERENCED_PARAMETER(shift);
+    return false;
+  }
+
   /* @brief Performs layer forward operation given an input tensor and
    * returns the computed data in tensor form.
    *
@@ -636,10 +663,12 @@ class layer : public node {
         case vector_type::weight:
           weight_init_->fill(get_weight_data(i), fan_in_size(i),
                              fan_out_size(i));
+          ith_in_node(i)->touch_data();
           break;
         // fill vector of bias type
         case vector_type::bias:
           bias_init_->fill(get_weight_data(i), fan_in_size(i), fan_out_size(i));
+          ith_in_node(i)->touch_data();
           break;
         default: break;
       }
@@ -670,6 +699,7 @@ class layer : public node {
         // thread spawning overhead.
         bool parallelize = (target.size() >= 512);
         o->update(diff, target, parallelize);
+        ith_in_node(i)->touch_data();
       }
     }
     clear_grads();
@@ -691,24 +721,61 @@ class layer : public node {
     return true;
   }
 
+  /**
+   * read the trainable weights from the edges of src instead of this layer's
+   * own edges. Both layers must have the same type and shape, src must stay
+   * alive as long as this layer is used. The weights are regarded as
+   * initialized, setup() doesn't overwrite them.
+   **/
+  virtual void share_weights(layer &src) {
+    for (size_t i = 0; i < in_channels_; i++) {
+      if (is_trainable_weight(in_type_[i])) {
+        prev_[i] = src.ith_in_node(i);
+      }
+    }
+    initialized_ = true;
+  }
+
+  /**
+   * number of buffers the gradients of the trainable weights are accumulated
+   * into for a batch of sample_count samples.
+   *
+   * By default each sample gets its own buffer. Layers whose kernels sum the
+   * samples into per-thread accumulators (see accumulator_count) override
+   * this, so the gradient memory doesn't grow with the batch size.
+   **/
+  virtual size_t weight_grad_slots(size_t sample_count) const {
+    return sample_count;
+  }
+
   virtual void set_sample_count(size_t sample_count) {
-    // increase the size if necessary - but do not decrease
-    auto resize = [sample_count](tensor_t *tensor) {
-      tensor->resize(sample_count, (*tensor)[0]);
+    auto resize = [](const edgeptr_t &e, tensor_t *tensor, size_t size) {
+      if (tensor->size() == size) return;
+      // new samples start zeroed instead of copying the contents of the
+      // first one (which may hold an accumulated gradient)
+      tensor->resize(size, vec_t(e->shape().size()));
     };
 
+    const size_t grad_slots = weight_grad_slots(sample_count);
     for (size_t i = 0; i < in_channels_; i++) {
+      const edgeptr_t &e = ith_in_node(i);
       if (!is_trainable_weight(in_type_[i])) {
-        resize(ith_in_node(i)->get_data());
+        resize(e, e->get_data(), sample_count);
+      }
+      if (e->gradient_enabled()) {
+        resize(e, e->get_gradient(),
+               is_trainable_weight(in_type_[i]) ? grad_slots : sample_count);
       }
-      resize(ith_in_node(i)->get_gradient());
     }
 
     for (size_t i = 0; i < out_channels_; i++) {
+      const edgeptr_t &e = ith_out_node(i);
       if (!is_trainable_weight(out_type_[i])) {
-        resize(ith_out_node(i)->get_data());
+        resize(e, e->get_data(), sample_count);
+      }
+      if (e->gradient_enabled()) {
+        resize(e, e->get_gradient(), sample_count);
       }
-      resize(ith_out_node(i)->get_gradient());
     }
   }
 
@@ -749,7 +816,7 @@ class layer : public node {
   vec_t weights_diff_;
 
   template <typename T, typename Func>
-  inline void for_i(T size, Func f, size_t grainsize = 100) {
+  inline void for_i(T size, Func f, size_t grainsize = grainsize_auto) {
     tiny_dnn::for_i(parallelize_, size, f, grainsize);
   }
 
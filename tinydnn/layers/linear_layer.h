@@ -42,6 +42,10 @@ class linear_layer : public layer {
 
   std::string layer_type() const override { return "linear"; }
 
+  float_t scale() const { return scale_; }
+
+  float_t bias() const { return bias_; }
+
   void forward_propagation(const std::vector<tensor_t *> &in_data,
                            std::vector<tensor_t *> &out_data) override {
     const tensor_t &in = *in_data[0];
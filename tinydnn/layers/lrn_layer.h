@@ -10,6 +10,7 @@
 #include <algorithm>
 #include <string>
 #include <vector>
+#include "tinydnn/backend/kernels/lrn_op_internal.h"
 #include "tinydnn/utils/utils.h"
 
 namespace tinydnn {
@@ -31,8 +32,12 @@ class lrn_layer : public layer {
       size_(local_size),
       alpha_(alpha),
       beta_(beta),
-      region_(region),
-      in_square_(in_shape_.area()) {}
+      region_(region) {
+    params_.in         = in_shape;
+    params_.local_size = local_size;
+    params_.alpha      = alpha;
+    params_.beta       = beta;
+  }
 
   /**
    * @param layer       [in] the previous layer connected to this
@@ -81,86 +86,33 @@ class lrn_layer : public layer {
 
   void forward_propagation(const std::vector<tensor_t *> &in_data,
                            std::vector<tensor_t *> &out_data) override {
-    // @todo revise the parallelism strategy
-    for (size_t sample = 0, sample_count = in_data[0]->size();
-         sample < sample_count; ++sample) {
-      vec_t &in  = (*in_data[0])[sample];
-      vec_t &out = (*out_data[0])[sample];
-
-      if (region_ == norm_region::across_channels) {
-        forward_across(in, out);
-      } else {
-        forward_within(in, out);
-      }
+    if (region_ == norm_region::within_channels) {
+      throw nn_error("not implemented");
     }
+    kernels::lrn_op_internal(*in_data[0], *out_data[0], params_, parallelize_);
   }
 
   void back_propagation(const std::vector<tensor_t *> &in_data,
                         const std::vector<tensor_t *> &out_data,
                         std::vector<tensor_t *> &out_grad,
                         std::vector<tensor_t *> &in_grad) override {
-    CNN_UNREFERENCED_PARAMETER(in_data);
-    CNN_UNREFERENCED_PARAMETER(out_data);
-    CNN_UNREFERENCED_PARAMETER(out_grad);
-    CNN_UNREFERENCED_PARAMETER(in_grad);
-    throw nn_error("not implemented");
+    if (region_ == norm_region::within_channels) {
+      throw nn_error("not implemented");
+    }
+    kernels::lrn_grad_op_internal(*in_data[0], *out_data[0], *in_grad[0],
+                                  *out_grad[0], params_, parallelize_);
   }
 
   friend struct serialization_buddy;
 
  private:
-  void forward_across(const vec_t &in, vec_t &out) {
-    vectorize::fill(&in_square_[0], in_square_.size(), float_t{0});
-
-    for (size_t i = 0; i < size_ / 2; i++) {
-      size_t idx = in_shape_.get_index(0, 0, i);
-      add_square_sum(&in[idx], in_shape_.area(), &in_square_[0]);
-    }
-
-    size_t head = size_ / 2;
-    long tail   = static_cast<long>(head) - static_cast<long>(size_);  // NOLINT
-    size_t channels              = in_shape_.depth_;
-    const size_t wxh             = in_shape_.area();
-    const float_t alpha_div_size = alpha_ / size_;
-
-    for (size_t i = 0; i < channels; i++, head++, tail++) {
-      if (head < channels)
-        add_square_sum(&in[in_shape_.get_index(0, 0, head)], wxh,
-                       &in_square_[0]);
-
-      if (tail >= 0)
-        sub_square_sum(&in[in_shape_.get_index(0, 0, tail)], wxh,
-                       &in_square_[0]);
-
-      float_t *dst       = &out[in_shape_.get_index(0, 0, i)];
-      const float_t *src = &in[in_shape_.get_index(0, 0, i)];
-      for (size_t j = 0; j < wxh; j++)
-        dst[j]      = src[j] *
-                 std::pow(float_t(1) + alpha_div_size * in_square_[j], -beta_);
-    }
-  }
-
-  void forward_within(const vec_t &in, vec_t &out) {
-    CNN_UNREFERENCED_PARAMETER(in);
-    CNN_UNREFERENCED_PARAMETER(out);
-    throw nn_error("not implemented");
-  }
-
-  void add_square_sum(const float_t *src, size_t size, float_t *dst) {
-    for (size_t i = 0; i < size; i++) dst[i] += src[i] * src[i];
-  }
-
-  void sub_square_sum(const float_t *src, size_t size, float_t *dst) {
-    for (size_t i = 0; i < size; i++) dst[i] -= src[i] * src[i];
-  }
-
   shape3d in_shape_;
 
   size_t size_;
   float_t alpha_, beta_;
   norm_region region_;
 
-  vec_t in_square_;
+  core::lrn_params params_;
 };
 
 }  // namespace tinydnn
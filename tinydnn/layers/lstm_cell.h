@@ -138,6 +138,7 @@ class lstm_cell : public cell {
   inline void forward_propagation(const std::vector<tensor_t *> &in_data,
                                   std::vector<tensor_t *> &out_data) {
     // forward lstm op context
+    params_.step_ = cell::step_;
     fwd_ctx_.set_in_out(in_data, out_data);
     fwd_ctx_.setParallelize(cell::wrapper_->parallelize());
     fwd_ctx_.setEngine(cell::wrapper_->engine());
@@ -159,6 +160,32 @@ class lstm_cell : public cell {
     kernel_back_->compute(bwd_ctx_);
   }
 
+  // concatenates the gate weights once for all of the steps, and computes
+  // the gate inputs from x of the steps of a forward pass in one gemm
+  inline void begin_sequence(const std::vector<tensor_t *> &in_data,
+                             bool forward) {
+    const vec_t none;
+    const bool bias = params_.has_bias_;
+    kernels::lstm_cell_concat_weights(
+      (*in_data[3])[0], (*in_data[4])[0], (*in_data[5])[0], (*in_data[6])[0],
+      (*in_data[7])[0], (*in_data[8])[0], (*in_data[9])[0], (*in_data[10])[0],
+      bias ? (*in_data[11])[0] : none, bias ? (*in_data[12])[0] : none,
+      bias ? (*in_data[13])[0] : none, bias ? (*in_data[14])[0] : none, params_,
+      params_.W_x_, params_.W_h_, params_.b_);
+    if (forward) {
+      kernels::project_inputs(*in_data[0], params_.W_x_, params_.b_,
+                              params_.in_size_, 4 * params_.out_size_,
+                              params_.x_proj_, cell::wrapper_->parallelize());
+    }
+  }
+
+  inline void end_sequence() {
+    params_.W_x_.clear();
+    params_.W_h_.clear();
+    params_.b_.clear();
+    params_.x_proj_.clear();
+  }
+
   inline std::string layer_type() const { return "lstm-cell"; }
 
   friend struct serialization_buddy;
@@ -8,6 +8,7 @@
 #pragma once
 
 #include <algorithm>
+#include <cstdint>
 #include <memory>
 #include <string>
 #include <utility>
@@ -108,7 +109,6 @@ class max_pooling_layer : public layer {
                        pooling_size_x, pooling_size_y, stride_x, stride_y,
                        ceil_mode, pad_type);
 
-    init_connection();
     init_backend(backend_type);
     layer::set_backend_type(backend_type);
   }
@@ -116,11 +116,12 @@ class max_pooling_layer : public layer {
   // move constructor
   max_pooling_layer(max_pooling_layer &&other)  // NOLINT
     : layer(std::move(other)), params_(std::move(other.params_)) {
-    init_connection();
     init_backend(std::move(layer::engine()));
   }
 
-  size_t fan_in_size() const override { return params_.out2in[0].size(); }
+  size_t fan_in_size() const override {
+    return params_.pool_size_x * params_.pool_size_y;
+  }
 
   size_t fan_out_size() const override { return 1; }
 
@@ -169,7 +170,7 @@ class max_pooling_layer : public layer {
   void set_sample_count(size_t sample_count) override {
     layer::set_sample_count(sample_count);
     params_.out2inmax.resize(sample_count,
-                             std::vector<size_t>(params_.out.size()));
+                             std::vector<uint32_t>(params_.out.size()));
   }
 
   friend struct serialization_buddy;
@@ -188,48 +189,6 @@ class max_pooling_layer : public layer {
   std::shared_ptr<core::OpKernel> kernel_fwd_;
   std::shared_ptr<core::OpKernel> kernel_back_;
 
-  void connect_kernel(size_t pooling_size_x,
-                      size_t pooling_size_y,
-                      size_t outx,
-                      size_t outy,
-                      size_t c) {
-    size_t dxmax =
-      std::min(pooling_size_x, params_.in.width_ - outx * params_.stride_x);
-
-    size_t dymax =
-      std::min(pooling_size_y, params_.in.height_ - outy * params_.stride_y);
-
-    for (size_t dy = 0; dy < dymax; dy++) {
-      for (size_t dx = 0; dx < dxmax; dx++) {
-        size_t in_index  = params_.in.get_index(outx * params_.stride_x + dx,
-                                               outy * params_.stride_y + dy, c);
-        size_t out_index = params_.out.get_index(outx, outy, c);
-
-        if (in_index >= params_.in2out.size()) {
-          throw nn_error("index overflow");
-        }
-        if (out_index >= params_.out2in.size()) {
-          throw nn_error("index overflow");
-        }
-        params_.in2out[in_index] = out_index;
-        params_.out2in[out_index].push_back(in_index);
-      }
-    }
-  }
-
-  void init_connection() {
-    params_.in2out.resize(params_.in.size());
-    params_.out2in.resize(params_.out.size());
-
-    for (size_t c = 0; c < params_.in.depth_; ++c) {
-      for (size_t y = 0; y < params_.out.height_; ++y) {
-        for (size_t x = 0; x < params_.out.width_; ++x) {
-          connect_kernel(params_.pool_size_x, params_.pool_size_y, x, y, c);
-        }
-      }
-    }
-  }
-
   void init_backend(core::backend_t backend_type) {
     core::OpKernelConstruction ctx =
       core::OpKernelConstruction(layer::device(), &params_);
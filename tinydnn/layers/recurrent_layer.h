@@ -171,6 +171,7 @@ class recurrent_layer : public layer {
       }
     }
 
+    cell_->begin_sequence(in_data, true);
     size_t start = 0;  // auxiliary variable
     for (size_t s = 0; s < seq_len_; s++) {
       start = s * batch_size;
@@ -193,6 +194,7 @@ class recurrent_layer : public layer {
         }
       }
       // forward current sequence batch
+      cell_->set_step(s);
       cell_->forward_propagation(input_buffer_, output_buffer_);
       // move from buffer to output
       for (size_t o = 0; o < out_data.size(); o++) {
@@ -210,6 +212,7 @@ class recurrent_layer : public layer {
         }
       }
     }
+    cell_->end_sequence();
     bptt_count_ = (bptt_count_ + seq_len_) % bptt_max_;
   }
 
@@ -231,6 +234,7 @@ class recurrent_layer : public layer {
     // resize input buffers
     reshape_backward_buffers_(batch_size, in_data);
 
+    cell_->begin_sequence(in_data, false);
     // move input to buffer
     for (int s = (seq_len_ - 1); s >= 0; s--) {
       const size_t start = batch_size * s;
@@ -263,6 +267,7 @@ class recurrent_layer : public layer {
           }
         }
       }
+      cell_->set_step(s);
       cell_->back_propagation(input_buffer_, output_buffer_,
                               output_grad_buffer_, input_grad_buffer_);
       for (size_t i = 0; i < in_data.size(); i++) {
@@ -290,6 +295,7 @@ class recurrent_layer : public layer {
         }
       }
     }
+    cell_->end_sequence();
   }
 
   std::string layer_type() const override { return "recurrent-layer"; }
@@ -7,6 +7,7 @@
 */
 #pragma once
 
+#include <utility>
 #include <vector>
 
 #include "tinydnn/utils/utils.h"
@@ -217,4 +218,49 @@ std::vector<tensor_t> gradient(const std::vector<tensor_t> &y,
   return gradients;
 }
 
+/**
+ * gradient of cross_entropy_multiclass for a minibatch, taken with respect to
+ * the input of the softmax layer which produced y: y * sum(c * t) - c * t,
+ * where c is the cost of each element (1 without t_cost).
+ *
+ * It equals gradient<cross_entropy_multiclass> chained with the softmax
+ * jacobian, without the -t / y division, which overflows once y underflows
+ * for confident predictions.
+ */
+inline std::vector<tensor_t> softmax_cross_entropy_gradient(
+  const std::vector<tensor_t> &y,
+  const std::vector<tensor_t> &t,
+  const std::vector<tensor_t> &t_cost) {
+  const size_t sample_count = y.size();
+
+  std::vector<tensor_t> gradients(sample_count);
+
+  assert(y.size() == t.size());
+  assert(t_cost.empty() || t_cost.size() == t.size());
+
+  for (size_t sample = 0; sample < sample_count; ++sample) {
+    assert(y[sample].size() == 1 && t[sample].size() == 1);
+    const vec_t &ys = y[sample][0];
+    const vec_t &ts = t[sample][0];
+    const vec_t *cost =
+      sample < t_cost.size() && !t_cost[sample].empty() &&
+          t_cost[sample][0].size() == ts.size()
+        ? &t_cost[sample][0]
+        : nullptr;
+    assert(ys.size() == ts.size());
+
+    vec_t d(ts.size());
+    float_t target_sum{0};
+    for (size_t i = 0; i < ts.size(); ++i) {
+      d[i] = cost ? (*cost)[i] * ts[i] : ts[i];
+      target_sum += d[i];
+    }
+    for (size_t i = 0; i < ts.size(); ++i) d[i] = ys[i] * target_sum - d[i];
+
+    gradients[sample].push_back(std::move(d));
+  }
+
+  return gradients;
+}
+
 }  // namespace tinydnn
@@ -8,17 +8,25 @@
 #pragma once
 
 #include <algorithm>
+#include <chrono>  // NOLINT
 #include <iomanip>
 #include <iostream>
 #include <iterator>
 #include <limits>
 #include <map>
 #include <memory>
+#include <mutex>  // NOLINT
+#include <numeric>
 #include <set>
+#include <sstream>
 #include <stdexcept>
 #include <string>
+#include <thread>  // NOLINT
+#include <type_traits>
+#include <unordered_map>
 #include <utility>
 #include <vector>
+#include "tinydnn/activation/softmax_layer.h"
 #include "tinydnn/config.h"
 #include "tinydnn/loss/loss.h"
 #include "tinydnn/nodes.h"
@@ -177,6 +185,16 @@ class network {
   void bprop(const std::vector<tensor_t> &out,
              const std::vector<tensor_t> &t,
              const std::vector<tensor_t> &t_cost) {
+    softmax_layer *softmax = fused_softmax_output<E>(out);
+    if (softmax) {
+      // cross-entropy after a softmax output: start from the gradient with
+      // respect to the softmax input, which the layer passes through
+      std::vector<tensor_t> delta =
+        softmax_cross_entropy_gradient(out, t, t_cost);
+      fused_loss_guard fused(*softmax);
+      net_.backward(delta);
+      return;
+    }
     std::vector<tensor_t> delta = gradient<E>(out, t, t_cost);
     net_.backward(delta);
   }
@@ -200,6 +218,7 @@ class network {
   }
 
   std::vector<tensor_t> fprop(const std::vector<tensor_t> &in) {
+    if (inference_) return frozen_forward(in);
     return net_.forward(in);
   }
 
@@ -214,8 +233,15 @@ class network {
 
   /**
    * executes forward-propagation and returns output
+   *
+   * If request batching is enabled (see set_request_batching), concurrent
+   * calls are gathered and propagated together.
    **/
-  vec_t predict(const vec_t &in) { return fprop(in); }
+  vec_t predict(const vec_t &in) {
+    if (!batcher_) return fprop(in);
+    if (in.size() != (size_t)in_data_size()) data_mismatch(**net_.begin(), in);
+    return batcher_->predict(in);
+  }
 
   /**
    * executes forward-propagation and returns output
@@ -436,11 +462,100 @@ class network {
    * @param phase phase of network, could be train or test
    */
   void set_netphase(net_phase phase) {
+    if (inference_) return;  // a frozen network stays in test phase
     for (auto n : net_) {
       n->set_context(phase);
     }
   }
 
+  /**
+   * share activation buffers between the layers during forward-propagation.
+   * Reduces the memory used by predict(), but the outputs of intermediate
+   * layers are overwritten by later layers. Disabled while training.
+   * @param reuse true to enable buffer reuse
+   */
+  void set_memory_reuse(bool reuse) { net_.set_memory_reuse(reuse); }
+
+  /**
+   * gather concurrent predict(const vec_t&) calls into batches.
+   *
+   * The calls are queued and a worker thread propagates them together, up
+   * to max_batch_size samples at a time. The first queued call waits at most
+   * max_wait for other calls to join its batch. Since only the worker runs
+   * the network, predict() may then be called from several threads.
+   *
+   * The worker is bound to this network: a copy of the network, or a network
+   * it is moved to, starts without request batching.
+   *
+   * @param max_batch_size largest number of samples per batch, 0 disables
+   *                       the batching
+   * @param max_wait       longest time a call waits for others
+   */
+  void set_request_batching(
+    size_t max_batch_size,
+    std::chrono::microseconds max_wait = std::chrono::microseconds(200)) {
+    batcher_.reset();
+    if (max_batch_size == 0) return;
+    batcher_.reset(new request_batcher(
+      [this](const std::vector<tensor_t> &in) { return fprop(in); },
+      max_batch_size, max_wait));
+  }
+
+  /**
+   * freeze the network for inference.
+   *
+   * The weights become read-only and the gradient buffers are freed.
+   * Afterwards predict(), test() and get_loss() can be called from several
+   * threads at once: each call checks out a workspace, a copy of the layers
+   * which reads the weights of this network and only holds the activations
+   * of that call, and returns it when done. Up to parallel_concurrency()
+   * idle workspaces are kept for later calls.
+   *
+   * Workspaces are created through the model serializer. If some layer
+   * can't be serialized, concurrent calls are executed one at a time.
+   * A frozen network can't be trained anymore.
+   */
+  void freeze() {
+    if (inference_) return;
+    set_netphase(net_phase::test);
+    net_.freeze();
+    inference_ = std::make_shared<inference_state>();
+#ifndef CNN_NO_SERIALIZATION
+    try {
+      inference_->model = model_archive();
+    } catch (const nn_error &) {
+      // some layer can't be serialized, fall back to serial execution
+    }
+#endif  // CNN_NO_SERIALIZATION
+  }
+
+  bool frozen() const { return inference_ != nullptr; }
+
+  ///< number of idle workspaces kept by a frozen network (see freeze())
+  size_t workspace_count() const {
+    if (!inference_) return 0;
+    std::lock_guard<std::mutex> lock(inference_->mtx);
+    return inference_->idle.size();
+  }
+
+  /**
+   * fold the batch normalization layers of a trained network into the
+   * weights and bias of the convolutional / fully connected layer in front
+   * of them, along with a linear_layer right behind them, and remove them.
+   * Saves one pass over the activations per folded layer at inference.
+   *
+   * The moving averages of mean and variance are used, as in the test
+   * phase; further training won't normalize anymore. Must be called before
+   * freeze(). Only available for sequential networks.
+   *
+   * @return the number of batch normalization layers removed
+   */
+  size_t fold_batch_norm() {
+    if (inference_) throw nn_error("fold_batch_norm() must precede freeze()");
+    replicas_.clear();
+    return net_.fold_batch_norm();
+  }
+
   /**
    * request to finish an ongoing training
    *
@@ -453,83 +568,106 @@ class network {
 
   /**
    * test and generate confusion-matrix for classification task
+   *
+   * @param batch_size number of samples propagated together
    **/
-  result test(const std::vector<vec_t> &in, const std::vector<label_t> &t) {
+  result test(const std::vector<vec_t> &in,
+              const std::vector<label_t> &t,
+              size_t batch_size = 64) {
     result test_result;
     set_netphase(net_phase::test);
+
+    // every batch writes its own range of predicted, no locking needed
+    std::vector<label_t> predicted(in.size());
+    for_each_batch(in, batch_size,
+                   [&](size_t begin, const std::vector<tensor_t> &out) {
+                     for (size_t i = 0; i < out.size(); i++) {
+                       predicted[begin + i] = label_t(max_index(out[i][0]));
+                     }
+                   });
+
     for (size_t i = 0; i < in.size(); i++) {
-      const label_t predicted = fprop_max_index(in[i]);
-      const label_t actual    = t[i];
+      const label_t actual = t[i];
 
-      if (predicted == actual) test_result.num_success++;
+      if (predicted[i] == actual) test_result.num_success++;
       test_result.num_total++;
-      test_result.confusion_matrix[predicted][actual]++;
+      test_result.confusion_matrix[predicted[i]][actual]++;
     }
     return test_result;
   }
 
   /**
    * generate output for each input
+   *
+   * @param batch_size number of samples propagated together
    **/
-  std::vector<vec_t> test(const std::vector<vec_t> &in) {
+  std::vector<vec_t> test(const std::vector<vec_t> &in,
+                          size_t batch_size = 64) {
     std::vector<vec_t> test_result(in.size());
     set_netphase(net_phase::test);
-    for (size_t i = 0; i < in.size(); i++) {
-      test_result[i] = predict(in[i]);
-    }
+    for_each_batch(in, batch_size,
+                   [&](size_t begin, const std::vector<tensor_t> &out) {
+                     for (size_t i = 0; i < out.size(); i++) {
+                       test_result[begin + i] = out[i][0];
+                     }
+                   });
     return test_result;
   }
 
   /**
    * calculate loss value (the smaller, the better)
+   *
+   * @param batch_size number of samples propagated together
    **/
   template <typename E>
   float_t get_loss(const std::vector<vec_t> &in,
-                   const std::vector<label_t> &t) {
-    float_t sum_loss = float_t(0);
-
+                   const std::vector<label_t> &t,
+                   size_t batch_size = 64) {
     std::vector<tensor_t> label_tensor;
     normalize_tensor(t, label_tensor);
 
-    for (size_t i = 0; i < in.size(); i++) {
-      const vec_t predicted = predict(in[i]);
-      for (size_t j = 0; j < predicted.size(); j++) {
-        sum_loss += E::f(predicted, label_tensor[i][j]);
-      }
-    }
-    return sum_loss;
+    return sum_batch_losses(
+      in, batch_size, [&](size_t sample, const tensor_t &predicted) {
+        float_t loss = float_t(0);
+        for (size_t j = 0; j < label_tensor[sample].size(); j++) {
+          loss += E::f(predicted[0], label_tensor[sample][j]);
+        }
+        return loss;
+      });
   }
 
   /**
    * calculate loss value (the smaller, the better) for regression task
+   *
+   * @param batch_size number of samples propagated together
    **/
   template <typename E>
-  float_t get_loss(const std::vector<vec_t> &in, const std::vector<vec_t> &t) {
-    float_t sum_loss = float_t(0);
-
-    for (size_t i = 0; i < in.size(); i++) {
-      const vec_t predicted = predict(in[i]);
-      sum_loss += E::f(predicted, t[i]);
-    }
-    return sum_loss;
+  float_t get_loss(const std::vector<vec_t> &in,
+                   const std::vector<vec_t> &t,
+                   size_t batch_size = 64) {
+    return sum_batch_losses(
+      in, batch_size, [&](size_t sample, const tensor_t &predicted) {
+        return E::f(predicted[0], t[sample]);
+      });
   }
 
   /**
    * calculate loss value (the smaller, the better) for regression task
+   *
+   * @param batch_size number of samples propagated together
    **/
   template <typename E, typename T>
-  float_t get_loss(const std::vector<T> &in, const std::vector<tensor_t> &t) {
-    float_t sum_loss = float_t(0);
-    std::vector<tensor_t> in_tensor;
-    normalize_tensor(in, in_tensor);
-
-    for (size_t i = 0; i < in.size(); i++) {
-      const tensor_t predicted = predict(in_tensor[i]);
-      for (size_t j = 0; j < predicted.size(); j++) {
-        sum_loss += E::f(predicted[j], t[i][j]);
-      }
-    }
-    return sum_loss;
+  float_t get_loss(const std::vector<T> &in,
+                   const std::vector<tensor_t> &t,
+                   size_t batch_size = 64) {
+    return sum_batch_losses(
+      in, batch_size, [&](size_t sample, const tensor_t &predicted) {
+        float_t loss = float_t(0);
+        for (size_t j = 0; j < predicted.size(); j++) {
+          loss += E::f(predicted[j], t[sample][j]);
+        }
+        return loss;
+      });
   }
 
   /**
@@ -833,6 +971,39 @@ class network {
                               const std::vector<layer *> &inputs,
                               const std::vector<layer *> &outputs);
 
+  /**
+   * softmax output layer whose backward pass can be fused into the loss E,
+   * or nullptr. Only cross_entropy_multiclass is fused, and only for a
+   * network with a single output layer whose output isn't read by other
+   * layers as well.
+   */
+  template <typename E>
+  softmax_layer *fused_softmax_output(const std::vector<tensor_t> &out) {
+    if (!std::is_same<E, cross_entropy_multiclass>::value) return nullptr;
+    const std::vector<layer *> outputs = net_.output_layers();
+    if (outputs.size() != 1 || out.empty() || out[0].size() != 1) {
+      return nullptr;
+    }
+    if (!outputs[0]->next()[0]->next().empty()) return nullptr;
+    return dynamic_cast<softmax_layer *>(outputs[0]);
+  }
+
+  // the softmax passes the gradient through for the lifetime of this object
+  class fused_loss_guard {
+   public:
+    explicit fused_loss_guard(softmax_layer &softmax) : softmax_(softmax) {
+      softmax_.set_fused_loss(true);
+    }
+
+    ~fused_loss_guard() { softmax_.set_fused_loss(false); }
+
+    fused_loss_guard(const fused_loss_guard &) = delete;
+    fused_loss_guard &operator=(const fused_loss_guard &) = delete;
+
+   private:
+    softmax_layer &softmax_;
+  };
+
   template <typename Error,
             typename Optimizer,
             typename OnBatchEnumerate,
@@ -847,12 +1018,16 @@ class network {
            const bool reset_weights            = false,
            const int n_threads                 = CNN_TASK_SIZE,
            const std::vector<tensor_t> &t_cost = std::vector<tensor_t>()) {
+    if (inference_) throw nn_error("can't train a frozen network");
     // check_training_data(in, t);
     check_target_cost_matrix(desired_outputs, t_cost);
     set_netphase(net_phase::train);
     net_.setup(reset_weights);
 
+    const bool memory_reuse = net_.memory_reuse();
+    net_.set_memory_reuse(false);
     for (auto n : net_) n->set_parallelize(true);
+    prepare_replicas(batch_size, n_threads);
     optimizer.reset();
     stop_training_ = false;
     in_batch_.resize(batch_size);
@@ -874,6 +1049,9 @@ class network {
       }
       on_epoch_enumerate();
     }
+    replicas_.clear();
+    for (auto n : net_) n->set_parallelize(true);
+    net_.set_memory_reuse(memory_reuse);
     set_netphase(net_phase::test);
     return true;
   }
@@ -905,7 +1083,13 @@ class network {
    * (weights),
    * then calls the optimizer algorithm to update the weights
    *
+   * If replicas of the network are available (see prepare_replicas), the
+   * minibatch is split into one slice per replica, every slice is propagated
+   * on its own thread, and the weight gradients of the replicas are reduced
+   * into this network before the update.
+   *
    * @param batch_size the number of data points to use in this batch
+   * @param num_tasks  the maximum number of slices the batch is split into
    */
   template <typename E, typename Optimizer>
   void train_onebatch(Optimizer &optimizer,
@@ -914,17 +1098,271 @@ class network {
                       int batch_size,
                       const int num_tasks,
                       const tensor_t *t_cost) {
-    CNN_UNREFERENCED_PARAMETER(num_tasks);
-    std::copy(&in[0], &in[0] + batch_size, &in_batch_[0]);
-    std::copy(&t[0], &t[0] + batch_size, &t_batch_[0]);
-    std::vector<tensor_t> t_cost_batch =
-      t_cost ? std::vector<tensor_t>(&t_cost[0], &t_cost[0] + batch_size)
-             : std::vector<tensor_t>();
-
-    bprop<E>(fprop(in_batch_), t_batch_, t_cost_batch);
+    size_t num_slices = std::min<size_t>(
+      {static_cast<size_t>(std::max(num_tasks, 1)),
+       static_cast<size_t>(batch_size), replicas_.size() + 1});
+
+    if (num_slices <= 1) {
+      std::copy(&in[0], &in[0] + batch_size, &in_batch_[0]);
+      std::copy(&t[0], &t[0] + batch_size, &t_batch_[0]);
+      std::vector<tensor_t> t_cost_batch =
+        t_cost ? std::vector<tensor_t>(&t_cost[0], &t_cost[0] + batch_size)
+               : std::vector<tensor_t>();
+
+      bprop<E>(fprop(in_batch_), t_batch_, t_cost_batch);
+      net_.update_weights(&optimizer);
+      return;
+    }
+
+    // slice 0 runs on this network, slice i on replicas_[i - 1]
+    for_i(true, num_slices,
+          [&](size_t slice) {
+            size_t begin = batch_size * slice / num_slices;
+            size_t end   = batch_size * (slice + 1) / num_slices;
+            network *net = slice == 0 ? this : replicas_[slice - 1].get();
+
+            if (net != this) net->copy_weights_from(*this);
+
+            std::vector<tensor_t> in_slice(&in[begin], &in[end]);
+            std::vector<tensor_t> t_slice(&t[begin], &t[end]);
+            std::vector<tensor_t> t_cost_slice =
+              t_cost ? std::vector<tensor_t>(&t_cost[begin], &t_cost[end])
+                     : std::vector<tensor_t>();
+
+            net->template bprop<E>(net->fprop(in_slice), t_slice,
+                                   t_cost_slice);
+          },
+          1);
+
+    for (size_t r = 0; r + 1 < num_slices; r++) {
+      reduce_grads_from(*replicas_[r]);
+    }
     net_.update_weights(&optimizer);
   }
 
+  /**
+   * build the per-thread copies of this network used by train_onebatch.
+   *
+   * Replicas are created through the model serializer, so every layer of
+   * the network must be registered for serialization. Otherwise (or if
+   * tiny-dnn is built without serialization) training falls back to a
+   * single copy which parallelizes inside each layer. The same holds for
+   * networks with layers normalizing over the minibatch (see
+   * layer::uses_batch_statistics), which need the whole batch at once.
+   */
+  void prepare_replicas(size_t batch_size, int n_threads) {
+    replicas_.clear();
+
+    size_t num_replicas =
+      std::min<size_t>({static_cast<size_t>(std::max(n_threads, 1)),
+                        batch_size, parallel_concurrency()});
+    if (num_replicas <= 1) return;
+
+    for (auto n : net_) {
+      if (n->uses_batch_statistics()) return;
+    }
+
+#ifndef CNN_NO_SERIALIZATION
+    try {
+      const std::string model = model_archive();
+      for (size_t i = 1; i < num_replicas; i++) {
+        auto replica = from_model_archive(model);
+        replica->net_.setup(false);
+        replica->set_netphase(net_phase::train);
+        replicas_.push_back(replica);
+      }
+    } catch (const nn_error &) {
+      // some layer can't be serialized, train on a single copy
+      replicas_.clear();
+      return;
+    }
+
+    // each slice runs on its own thread, don't split it any further
+    for (auto n : net_) n->set_parallelize(false);
+    for (auto &replica : replicas_) {
+      for (auto n : replica->net_) n->set_parallelize(false);
+    }
+#endif  // CNN_NO_SERIALIZATION
+  }
+
+#ifndef CNN_NO_SERIALIZATION
+  // architecture of this network (without weights) in binary format
+  std::string model_archive() const {
+    std::stringstream ss;
+    {
+      cereal::BinaryOutputArchive oa(ss);
+      to_archive(oa, content_type::model);
+    }
+    return ss.str();
+  }
+
+  // new network with the architecture stored by model_archive()
+  std::shared_ptr<network> from_model_archive(const std::string &model) const {
+    std::stringstream ss(model);
+    cereal::BinaryInputArchive ia(ss);
+    auto net = std::make_shared<network>(name_);
+    net->from_archive(ia, content_type::model);
+    return net;
+  }
+#endif  // CNN_NO_SERIALIZATION
+
+  tensor_t as_sample(const vec_t &in) {
+    if (in.size() != (size_t)in_data_size()) data_mismatch(**net_.begin(), in);
+    return tensor_t{in};
+  }
+
+  const tensor_t &as_sample(const tensor_t &in) { return in; }
+
+  /**
+   * propagate in[] in batches of batch_size samples and call
+   * f(index of the first sample of the batch, outputs of the batch).
+   *
+   * The batches of a frozen network run in parallel, each on a workspace
+   * checked out for it. Otherwise they run one after another and the layers
+   * parallelize over the samples of a batch.
+   */
+  template <typename T, typename F>
+  void for_each_batch(const std::vector<T> &in, size_t batch_size, F f) {
+    batch_size               = std::max<size_t>(batch_size, 1);
+    const size_t num_batches = (in.size() + batch_size - 1) / batch_size;
+
+    for_i(frozen(), num_batches,
+          [&](size_t b) {
+            size_t begin = b * batch_size;
+            size_t end   = std::min(begin + batch_size, in.size());
+
+            std::vector<tensor_t> batch;
+            batch.reserve(end - begin);
+            for (size_t i = begin; i < end; i++) {
+              batch.push_back(as_sample(in[i]));
+            }
+            f(begin, fprop(batch));
+          },
+          1);
+  }
+
+  // sum of loss(sample index, output of the sample) over all samples of in.
+  // the partial sums of the batches are added in order, so the result
+  // doesn't depend on the number of threads
+  template <typename T, typename Loss>
+  float_t sum_batch_losses(const std::vector<T> &in,
+                           size_t batch_size,
+                           Loss loss) {
+    batch_size = std::max<size_t>(batch_size, 1);
+    std::vector<float_t> partial((in.size() + batch_size - 1) / batch_size,
+                                 float_t(0));
+    for_each_batch(in, batch_size,
+                   [&](size_t begin, const std::vector<tensor_t> &out) {
+                     float_t &sum = partial[begin / batch_size];
+                     for (size_t i = 0; i < out.size(); i++) {
+                       sum += loss(begin + i, out[i]);
+                     }
+                   });
+    return std::accumulate(partial.begin(), partial.end(), float_t(0));
+  }
+
+  // forward-propagation of a frozen network on a workspace checked out for
+  // this call
+  std::vector<tensor_t> frozen_forward(const std::vector<tensor_t> &in) {
+    workspace_lease ws(*this);
+    if (ws) return ws->net_.forward(in);
+
+    // no workspaces, run the calls on this network one at a time
+    std::lock_guard<std::mutex> lock(inference_->mtx);
+    return net_.forward(in);
+  }
+
+  // an idle workspace, or a new one. returns nullptr if the network can't be
+  // copied
+  std::shared_ptr<network> checkout_workspace() {
+    {
+      std::lock_guard<std::mutex> lock(inference_->mtx);
+      if (inference_->model.empty()) return nullptr;
+      if (!inference_->idle.empty()) {
+        auto ws = std::move(inference_->idle.back());
+        inference_->idle.pop_back();
+        return ws;
+      }
+    }
+
+    std::shared_ptr<network> ws;
+#ifndef CNN_NO_SERIALIZATION
+    ws       = from_model_archive(inference_->model);
+    auto src = net_.begin();
+    for (auto l : ws->net_) {
+      l->share_weights(**src++);
+    }
+    ws->set_netphase(net_phase::test);
+    ws->net_.freeze();
+    ws->net_.set_memory_reuse(true);
+#endif  // CNN_NO_SERIALIZATION
+    return ws;
+  }
+
+  // keep ws for later calls, unless enough workspaces are idle already
+  void return_workspace(std::shared_ptr<network> ws) {
+    std::lock_guard<std::mutex> lock(inference_->mtx);
+    if (inference_->idle.size() < parallel_concurrency()) {
+      inference_->idle.push_back(std::move(ws));
+    }
+  }
+
+  // a workspace checked out for the lifetime of this object
+  class workspace_lease {
+   public:
+    explicit workspace_lease(network &net)
+      : net_(net), ws_(net.checkout_workspace()) {}
+
+    ~workspace_lease() {
+      if (ws_) net_.return_workspace(std::move(ws_));
+    }
+
+    workspace_lease(const workspace_lease &) = delete;
+    workspace_lease &operator=(const workspace_lease &) = delete;
+
+    explicit operator bool() const { return ws_ != nullptr; }
+    network *operator->() const { return ws_.get(); }
+
+   private:
+    network &net_;
+    std::shared_ptr<network> ws_;
+  };
+
+  // overwrite all trainable weights with the ones of src (same topology)
+  void copy_weights_from(const network &src) {
+    auto dst_layer = net_.begin();
+    for (auto src_layer = src.net_.begin(); src_layer != src.net_.end();
+         ++src_layer, ++dst_layer) {
+      auto src_weights = static_cast<const layer *>(*src_layer)->weights();
+      auto dst_weights = (*dst_layer)->weights();
+      for (size_t i = 0; i < src_weights.size(); i++) {
+        std::copy(src_weights[i]->begin(), src_weights[i]->end(),
+                  dst_weights[i]->begin());
+      }
+    }
+  }
+
+  // add the weight gradients of src into this network and clear them in src
+  void reduce_grads_from(network &src) {
+    auto dst_layer = net_.begin();
+    for (auto src_layer = src.net_.begin(); src_layer != src.net_.end();
+         ++src_layer, ++dst_layer) {
+      auto src_grads = (*src_layer)->weights_grads();
+      auto dst_grads = (*dst_layer)->weights_grads();
+      for (size_t i = 0; i < src_grads.size(); i++) {
+        const tensor_t &src_grad = *src_grads[i];
+        vec_t &dst_grad          = (*dst_grads[i])[0];
+        for_(true, 0u, dst_grad.size(), [&](const blocked_range &r) {
+          for (size_t sample = 0; sample < src_grad.size(); sample++) {
+            vectorize::reduce(&src_grad[sample][r.begin()],
+                              r.end() - r.begin(), &dst_grad[r.begin()]);
+          }
+        });
+      }
+    }
+    src.net_.clear_grads();
+  }
+
   //    template <typename E>
   //    float_t get_loss(const vec_t& out, const vec_t& t) {
   //        assert(out.size() == t.size());
@@ -977,9 +1415,10 @@ class network {
     // calculate dw/dE by bprop
     bprop<E>(fprop(in), v, std::vector<tensor_t>());
 
+    // dw holds one accumulator per sample or per thread
     float_t delta_by_bprop = 0;
-    for (size_t sample = 0; sample < sample_count; ++sample) {
-      delta_by_bprop += dw[sample][check_index];
+    for (const vec_t &dw_slot : dw) {
+      delta_by_bprop += dw_slot[check_index];
     }
     net_.clear_grads();
 
@@ -1102,6 +1541,42 @@ class network {
   bool stop_training_;
   std::vector<tensor_t> in_batch_;
   std::vector<tensor_t> t_batch_;
+  /* per-thread copies of this network used for data-parallel training */
+  std::vector<std::shared_ptr<network>> replicas_;
+
+  /* state of a frozen network, see freeze() */
+  struct inference_state {
+    std::mutex mtx;
+    /* serialized architecture, empty if workspaces can't be created */
+    std::string model;
+    /* workspaces which no call has checked out */
+    std::vector<std::shared_ptr<network>> idle;
+  };
+  std::shared_ptr<inference_state> inference_;
+
+  /**
+   * owner of the request batcher. Its worker calls fprop() on the network
+   * which created it, so it is neither copied nor moved with the network;
+   * assigning a network keeps the batcher of the assigned-to one.
+   **/
+  class batcher_holder {
+   public:
+    batcher_holder() = default;
+    batcher_holder(const batcher_holder &) {}
+    batcher_holder(batcher_holder &&) {}
+    batcher_holder &operator=(const batcher_holder &) { return *this; }
+    batcher_holder &operator=(batcher_holder &&) { return *this; }
+
+    void reset(request_batcher *batcher = nullptr) { ptr_.reset(batcher); }
+    explicit operator bool() const { return ptr_ != nullptr; }
+    request_batcher *operator->() const { return ptr_.get(); }
+
+   private:
+    std::unique_ptr<request_batcher> ptr_;
+  };
+
+  /* queue of predict() calls, see set_request_batching() */
+  batcher_holder batcher_;
 };
 
 /**
@@ -8,6 +8,7 @@
 #pragma once
 
 #include <algorithm>
+#include <atomic>
 #include <iomanip>
 #include <memory>
 #include <numeric>
@@ -81,6 +82,8 @@ class edge {
       vtype_(vtype),
       data_({vec_t(shape.size())}),
       grad_({vec_t(shape.size())}),
+      grad_enabled_(true),
+      version_(new_version()),
       prev_(prev) {}
 
   void merge_grads(vec_t *dst) {
@@ -89,14 +92,18 @@ class edge {
     size_t sz             = grad_head.size();
     dst->resize(sz);
     float_t *pdst = &(*dst)[0];
-    // dst = grad_[0]
-    std::copy(grad_head.begin(), grad_head.end(), pdst);
-    // @todo consider adding parallelism
-    for (size_t sample = 1, sample_count = grad_.size(); sample < sample_count;
-         ++sample) {
-      // dst += grad_[sample]
-      vectorize::reduce<float_t>(&grad_[sample][0], sz, pdst);
-    }
+    // grad_ holds one accumulator per sample or per thread, sum them up
+    for_(true, 0, sz, [&](const blocked_range &r) {
+      size_t len = r.end() - r.begin();
+      // dst = grad_[0]
+      std::copy(&grad_head[r.begin()], &grad_head[r.begin()] + len,
+                pdst + r.begin());
+      for (size_t i = 1, slot_count = grad_.size(); i < slot_count; ++i) {
+        // dst += grad_[i]
+        vectorize::reduce<float_t>(&grad_[i][r.begin()], len,
+                                   pdst + r.begin());
+      }
+    });
   }
 
   void clear_grads() {
@@ -107,6 +114,45 @@ class edge {
     }
   }
 
+  /**
+   * move the data buffer of src into this edge, leaving src empty.
+   * used by the memory planner of nodes to pass buffers between edges.
+   **/
+  void take_data(edge &src) {
+    data_.swap(src.data_);
+    tensor_t().swap(src.data_);
+    for (auto &sample : data_) sample.resize(shape_.size());
+    touch_data();
+  }
+
+  /**
+   * stamp of the current contents of the data buffer, unique across all
+   * edges. Caches derived from the data (e.g. transformed weights) compare
+   * the stamp instead of the data.
+   **/
+  size_t data_version() const {
+    return version_.load(std::memory_order_acquire);
+  }
+
+  ///< give the data a new stamp, call after writing to it
+  void touch_data() {
+    version_.store(new_version(), std::memory_order_release);
+  }
+
+  ///< free the data buffer, it is reallocated by the next forward pass
+  void release_data() { tensor_t().swap(data_); }
+
+  /**
+   * edges which are never back-propagated through (e.g. during inference)
+   * don't need to keep a gradient buffer
+   **/
+  void set_gradient_enabled(bool enabled) {
+    grad_enabled_ = enabled;
+    if (!enabled) tensor_t().swap(grad_);
+  }
+
+  bool gradient_enabled() const { return grad_enabled_; }
+
   tensor_t *get_data() { return &data_; }
 
   const tensor_t *get_data() const { return &data_; }
@@ -122,12 +168,22 @@ class edge {
   const shape3d &shape() const { return shape_; }
   vector_type vtype() const { return vtype_; }
   void add_next_node(node *next) { next_.push_back(next); }
+  void remove_next_node(node *next) {
+    next_.erase(std::remove(next_.begin(), next_.end(), next), next_.end());
+  }
 
  private:
+  static size_t new_version() {
+    static std::atomic<size_t> counter(0);
+    return counter.fetch_add(1, std::memory_order_relaxed) + 1;
+  }
+
   shape3d shape_;
   vector_type vtype_;
   tensor_t data_;
   tensor_t grad_;
+  bool grad_enabled_;
+  std::atomic<size_t> version_;
   node *prev_;                // previous node, "producer" of this tensor
   std::vector<node *> next_;  // next nodes, "consumers" of this tensor
 };
@@ -7,6 +7,7 @@
 */
 #pragma once
 
+#include <algorithm>
 #include <memory>
 #include <tuple>
 #include <unordered_map>
@@ -18,7 +19,9 @@
 #include "thirdparty/cereal/types/utility.hpp"
 #endif
 
+#include "tinydnn/layers/batch_normalization_layer.h"
 #include "tinydnn/layers/layer.h"
+#include "tinydnn/layers/linear_layer.h"
 #include "tinydnn/optimizer/optimizer.h"
 #include "tinydnn/utils/utils.h"
 
@@ -97,6 +100,9 @@ class nodes {
   virtual std::vector<tensor_t> forward(
     const std::vector<tensor_t> &first) = 0;  // NOLINT
 
+  ///< the layers producing the outputs of the network, one per channel
+  virtual std::vector<layer *> output_layers() const = 0;
+
   /**
    * update weights and clear all gradients
    **/
@@ -121,6 +127,60 @@ class nodes {
     }
   }
 
+  /**
+   * enable/disable the reuse of activation buffers in forward().
+   *
+   * When enabled, the data edges between the layers share the arenas of the
+   * memory plan (see plan_memory) and keep no gradient buffers, so peak
+   * memory of inference is roughly the largest tensors alive at the same
+   * time. The output of an intermediate layer is only valid until a later
+   * layer reuses its arena. backward() after such a forward pass first runs
+   * forward again without reuse.
+   **/
+  void set_memory_reuse(bool reuse) {
+    if (reuse == memory_reuse_) return;
+    memory_reuse_ = reuse;
+    if (reuse) {
+      for (auto &step : plan_) {
+        for (auto &p : step) {
+          p.e->release_data();
+          p.e->set_gradient_enabled(false);
+        }
+      }
+    } else {
+      restore_planned_edges();
+    }
+  }
+
+  bool memory_reuse() const { return memory_reuse_; }
+
+  /**
+   * switch the nodes to inference only: free the gradient buffers of all
+   * edges and the activations left by earlier forward passes. The weights
+   * are kept and regarded as read-only (see layer::freeze_weights).
+   * backward() can't be used afterwards.
+   *
+   * Edges whose gradients are already disabled aren't touched, so weight
+   * edges shared with another (frozen) network are only read.
+   **/
+  void freeze() {
+    frozen_ = true;
+    auto drop = [](const edgeptr_t &e) {
+      if (e->gradient_enabled()) e->set_gradient_enabled(false);
+      if (e->vtype() == vector_type::data) e->release_data();
+    };
+    for (auto l : nodes_) {
+      for (auto &e : l->inputs()) drop(e);
+      for (auto &e : l->outputs()) drop(e);
+      l->freeze_weights();
+    }
+  }
+
+  bool frozen() const { return frozen_; }
+
+  ///< number of buffers shared by the data edges between layers
+  size_t memory_arena_count() const { return arena_holder_.size(); }
+
   size_t size() const { return nodes_.size(); }
   iterator begin() { return nodes_.begin(); }
   iterator end() { return nodes_.end(); }
@@ -249,6 +309,116 @@ class nodes {
     }
   }
 
+  /**
+   * compute the inference memory plan from the (topologically sorted) order
+   * of nodes_.
+   *
+   * An edge between two layers is alive from its producer until its last
+   * consumer. Edges whose lifetimes don't overlap are assigned to the same
+   * arena, preferring the smallest free arena which is large enough. Inputs
+   * of the network, outputs of the network and edges with a consumer
+   * outside of nodes_ are never shared.
+   *
+   * @param outputs layers whose outputs are read after forward()
+   **/
+  void plan_memory(const std::vector<layer *> &outputs) {
+    const size_t npos = static_cast<size_t>(-1);
+    std::unordered_map<const node *, size_t> order;
+    for (size_t i = 0; i < nodes_.size(); i++) order[nodes_[i]] = i;
+
+    bool reuse = memory_reuse_;
+    set_memory_reuse(false);
+
+    plan_.assign(nodes_.size(), std::vector<planned_edge>());
+    std::vector<size_t> arena_size;  // largest sample size stored
+    std::vector<size_t> arena_free;  // arena is free after this node
+
+    for (size_t i = 0; i < nodes_.size(); i++) {
+      if (std::find(outputs.begin(), outputs.end(), nodes_[i]) !=
+          outputs.end()) {
+        continue;
+      }
+      for (auto &e : nodes_[i]->next()) {
+        if (!e || e->vtype() != vector_type::data || e->next().empty()) {
+          continue;
+        }
+
+        size_t last_use = i;
+        for (auto n : e->next()) {
+          auto it  = order.find(n);
+          last_use = it == order.end() ? npos : std::max(last_use, it->second);
+          if (last_use == npos) break;
+        }
+        if (last_use == npos) continue;
+
+        size_t need  = e->shape().size();
+        size_t arena = npos;
+        for (size_t k = 0; k < arena_size.size(); k++) {
+          if (arena_free[k] >= i) continue;
+          if (arena == npos) {
+            arena = k;
+          } else if (arena_size[k] >= need) {
+            if (arena_size[arena] < need || arena_size[k] < arena_size[arena])
+              arena = k;
+          } else if (arena_size[arena] < need &&
+                     arena_size[k] > arena_size[arena]) {
+            arena = k;
+          }
+        }
+        if (arena == npos) {
+          arena = arena_size.size();
+          arena_size.push_back(0);
+          arena_free.push_back(0);
+        }
+        arena_size[arena] = std::max(arena_size[arena], need);
+        arena_free[arena] = last_use;
+        plan_[i].push_back(planned_edge{e, arena});
+      }
+    }
+    arena_holder_.assign(arena_size.size(), nullptr);
+
+    set_memory_reuse(reuse);
+  }
+
+  // run the layers, passing arena buffers to the planned edges if enabled
+  void forward_layers() {
+    if (!memory_reuse_ || plan_.size() != nodes_.size()) {
+      for (auto l : nodes_) {
+        l->forward();
+      }
+      return;
+    }
+
+    for (size_t i = 0; i < nodes_.size(); i++) {
+      for (auto &p : plan_[i]) {
+        edge *&holder = arena_holder_[p.arena];
+        if (holder && holder != p.e.get()) p.e->take_data(*holder);
+        holder = p.e.get();
+      }
+      nodes_[i]->forward();
+    }
+    reused_forward_ = true;
+  }
+
+  // backward needs the outputs of every layer, recompute them if they were
+  // overwritten by a forward pass with memory reuse
+  void prepare_backward() {
+    if (frozen_) throw nn_error("backward() is not available after freeze()");
+    if (!reused_forward_) return;
+    restore_planned_edges();
+    for (auto l : nodes_) {
+      l->forward();
+    }
+  }
+
+  void restore_planned_edges() {
+    for (auto &step : plan_) {
+      for (auto &p : step) p.e->set_gradient_enabled(!frozen_);
+    }
+    std::fill(arena_holder_.begin(), arena_holder_.end(), nullptr);
+    reused_forward_ = false;
+  }
+
   template <typename T>
   void push_back_impl(T &&node, std::true_type) {  // is_rvalue_reference
     own_nodes_.push_back(
@@ -266,6 +436,20 @@ class nodes {
   std::vector<std::shared_ptr<layer>> own_nodes_;
   /* List of all nodes which includes own_nodes */
   std::vector<layer *> nodes_;
+
+ private:
+  struct planned_edge {
+    edgeptr_t e;
+    size_t arena;
+  };
+
+  /* output edges of nodes_[i] which share buffers, with their arena */
+  std::vector<std::vector<planned_edge>> plan_;
+  /* edge currently owning the buffer of each arena */
+  std::vector<edge *> arena_holder_;
+  bool memory_reuse_   = false;
+  bool reused_forward_ = false;
+  bool frozen_         = false;
 };
 
 /**
@@ -273,11 +457,17 @@ class nodes {
  **/
 class sequential : public nodes {
  public:
+  std::vector<layer *> output_layers() const override {
+    if (nodes_.empty()) return {};
+    return {nodes_.back()};
+  }
+
   void backward(const std::vector<tensor_t> &first) override {
     std::vector<std::vector<const vec_t *>> reordered_grad;
     reorder_for_layerwise_processing(first, reordered_grad);
     assert(reordered_grad.size() == 1);
 
+    prepare_backward();
     nodes_.back()->set_out_grads(&reordered_grad[0], 1);
 
     for (auto l = nodes_.rbegin(); l != nodes_.rend(); l++) {
@@ -292,9 +482,7 @@ class sequential : public nodes {
 
     nodes_.front()->set_in_data(&reordered_data[0], 1);
 
-    for (auto l : nodes_) {
-      l->forward();
-    }
+    forward_layers();
 
     std::vector<const tensor_t *> out;
     nodes_.back()->output(out);
@@ -314,6 +502,7 @@ class sequential : public nodes {
       auto in  = tail->inputs();
     }
     check_connectivity();
+    plan_memory({nodes_.back()});
   }
 
   void check_connectivity() {
@@ -327,6 +516,47 @@ class sequential : public nodes {
     }
   }
 
+  /**
+   * fold each batch normalization layer, together with a linear layer right
+   * behind it, into the weights of the layer in front of it and remove it
+   * (see layer::fold_scale_shift). The normalization uses the moving
+   * averages of the test phase. Layers which can't be folded are kept.
+   *
+   * @return the number of batch normalization layers removed
+   **/
+  size_t fold_batch_norm() {
+    if (frozen()) throw nn_error("fold_batch_norm() must precede freeze()");
+    size_t folded = 0;
+    for (size_t i = 1; i < nodes_.size(); i++) {
+      auto bn = dynamic_cast<batch_normalization_layer *>(nodes_[i]);
+      if (!bn) continue;
+
+      vec_t scale, shift;
+      bn->inference_scale_shift(scale, shift);
+      size_t count = 1;
+      auto linear  = i + 1 < nodes_.size()
+                      ? dynamic_cast<linear_layer *>(nodes_[i + 1])
+                      : nullptr;
+      if (linear) {
+        for (size_t j = 0; j < scale.size(); j++) {
+          scale[j] *= linear->scale();
+          shift[j] = linear->scale() * shift[j] + linear->bias();
+        }
+        count = 2;
+      }
+
+      if (!nodes_[i - 1]->fold_scale_shift(scale, shift)) continue;
+      remove_nodes(i, count);
+      folded++;
+      i--;
+    }
+    if (folded > 0) {
+      check_connectivity();
+      plan_memory({nodes_.back()});
+    }
+    return folded;
+  }
+
   template <typename InputArchive>
   void load_connections(InputArchive &ia) {
     CNN_UNREFERENCED_PARAMETER(ia);
@@ -335,6 +565,7 @@ class sequential : public nodes {
       auto tail = nodes_[i + 1];
       connect(head, tail, 0, 0);
     }
+    plan_memory({nodes_.back()});
   }
 
   template <typename OutputArchive>
@@ -343,6 +574,30 @@ class sequential : public nodes {
  private:
   friend class nodes;
 
+  // remove nodes_[first .. first + count) and connect their neighbours
+  void remove_nodes(size_t first, size_t count) {
+    layer *head = nodes_[first - 1];
+    layer *last = nodes_[first + count - 1];
+    layer *tail =
+      first + count < nodes_.size() ? nodes_[first + count] : nullptr;
+
+    head->outputs()[0]->remove_next_node(nodes_[first]);
+    if (tail) last->outputs()[0]->remove_next_node(tail);
+
+    std::vector<layer *> removed(nodes_.begin() + first,
+                                 nodes_.begin() + first + count);
+    nodes_.erase(nodes_.begin() + first, nodes_.begin() + first + count);
+    own_nodes_.erase(
+      std::remove_if(own_nodes_.begin(), own_nodes_.end(),
+                     [&](const std::shared_ptr<layer> &n) {
+                       return std::find(removed.begin(), removed.end(),
+                                        n.get()) != removed.end();
+                     }),
+      own_nodes_.end());
+
+    if (tail) connect(head, tail, 0, 0);
+  }
+
   std::vector<tensor_t> normalize_out(
     const std::vector<const tensor_t *> &out) {
     // normalize indexing back to [sample][layer][feature]
@@ -365,6 +620,10 @@ class sequential : public nodes {
  **/
 class graph : public nodes {
  public:
+  std::vector<layer *> output_layers() const override {
+    return output_layers_;
+  }
+
   void backward(const std::vector<tensor_t> &out_grad) override {
     size_t output_channel_count = out_grad[0].size();
 
@@ -376,6 +635,7 @@ class graph : public nodes {
     reorder_for_layerwise_processing(out_grad, reordered_grad);
     assert(reordered_grad.size() == output_channel_count);
 
+    prepare_backward();
     for (size_t i = 0; i < output_channel_count; i++) {
       output_layers_[i]->set_out_grads(&reordered_grad[i], 1);
     }
@@ -402,9 +662,7 @@ class graph : public nodes {
                                                 1);
     }
 
-    for (auto l : nodes_) {
-      l->forward();
-    }
+    forward_layers();
     return merge_outs();
   }
 
@@ -448,6 +706,7 @@ class graph : public nodes {
     output_layers_ = output;
 
     setup(false);
+    plan_memory(output_layers_);
   }
 
  private:
@@ -539,6 +798,7 @@ class graph : public nodes {
     for (auto out : gc.out_nodes) {
       output_layers_.push_back(nodes_[out]);
     }
+    plan_memory(output_layers_);
 #else
     throw nn_error("TinyDNN was not built with Serialization support");
 #endif  // CNN_NO_SERIALIZATION
@@ -0,0 +1,117 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+#include <vector>
+
+namespace vectorize {
+
+/**
+ * lookup-table versions of vectorize::exp, sigmoid, tanh and softplus with
+ * linear interpolation, used with USE_ACTIVATION_LUT. Meant for the
+ * microcontrollers under platform/, where std::exp is slow and there is
+ * no SIMD unit to run the polynomial kernels on.
+ *
+ * exp reads a 256-interval table of 2^f, f in [0, 1) (relative error
+ * < 1e-6), sigmoid and tanh a 1024-interval table of the sigmoid over
+ * [-8, 8] (absolute error < 3e-6).
+ */
+namespace lut {
+
+namespace detail {
+
+template <typename T>
+struct tables {
+  enum { exp_size = 256, sigmoid_size = 1024 };
+  static constexpr double sigmoid_range = 8.0;
+
+  std::vector<T> exp2;     // 2^(i / exp_size), i in [0, exp_size]
+  std::vector<T> sigmoid;  // sigmoid over [-range, range], both ends in
+
+  tables() : exp2(exp_size + 1), sigmoid(sigmoid_size + 1) {
+    for (size_t i = 0; i <= exp_size; i++) {
+      exp2[i] = static_cast<T>(std::exp2(double(i) / exp_size));
+    }
+    for (size_t i = 0; i <= sigmoid_size; i++) {
+      double x   = (2.0 * i / sigmoid_size - 1.0) * sigmoid_range;
+      sigmoid[i] = static_cast<T>(1.0 / (1.0 + std::exp(-x)));
+    }
+  }
+
+  static const tables &get() {
+    static const tables t;
+    return t;
+  }
+};
+
+template <typename T>
+inline T interpolate(const std::vector<T> &table, T pos) {
+  size_t i = static_cast<size_t>(pos);
+  i        = std::min(i, table.size() - 2);
+  return table[i] + (pos - static_cast<T>(i)) * (table[i + 1] - table[i]);
+}
+
+// +inf above the largest number and 0 below the smallest subnormal, which
+// ldexp takes care of once x is clamped to just beyond them
+template <typename T>
+inline T exp1(T x) {
+  typedef tables<T> tbl;
+  const bool single = sizeof(T) == 4;
+  if (std::isnan(x)) return x;
+  x   = std::min(std::max(x, T(single ? -104.0 : -746.0)),
+               T(single ? 89.0 : 710.0));
+  T t = x * T(1.44269504088896341);  // exp(x) = 2^t
+  T n = std::floor(t);
+  T f = interpolate(tbl::get().exp2, (t - n) * T(tbl::exp_size));
+  return std::ldexp(f, static_cast<int>(n));
+}
+
+template <typename T>
+inline T sigmoid1(T x) {
+  typedef tables<T> tbl;
+  const T range = T(tbl::sigmoid_range);
+  // outside the table, or NaN
+  if (!(x > -range && x < range)) return T(1) / (T(1) + exp1(-x));
+  T pos = (x + range) * (T(tbl::sigmoid_size) / (2 * range));
+  return interpolate(tbl::get().sigmoid, pos);
+}
+
+}  // namespace detail
+
+template <typename T>
+void exp(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) dst[i] = detail::exp1(src[i]);
+}
+
+template <typename T>
+void sigmoid(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) dst[i] = detail::sigmoid1(src[i]);
+}
+
+// tanh(x) = 2 sigmoid(2x) - 1
+template <typename T>
+void tanh(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) {
+    dst[i] = T(2) * detail::sigmoid1(T(2) * src[i]) - T(1);
+  }
+}
+
+// log(1 + exp(x)) = max(x, 0) + log1p(exp(-|x|))
+template <typename T>
+void softplus(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) {
+    const T x = src[i];
+    dst[i]    = std::max(x, T(0)) + std::log1p(detail::exp1(-std::abs(x)));
+  }
+}
+
+}  // namespace lut
+}  // namespace vectorize
@@ -0,0 +1,138 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+
+#if defined(__x86_64__) || defined(__i386__) || defined(_M_X64) || \
+  defined(_M_IX86)
+#if defined(_MSC_VER)
+#include <intrin.h>
+#define VECTORIZE_X86
+#elif defined(__GNUC__)
+#include <cpuid.h>
+#define VECTORIZE_X86
+#endif
+#endif
+
+namespace vectorize {
+
+/**
+ * instruction set levels the vectorize:: kernels are compiled for. Each
+ * level includes the ones before it, avx2 includes FMA.
+ */
+enum class isa { scalar, sse2, avx, avx2, avx512 };
+
+inline const char *to_string(isa level) {
+  switch (level) {
+    case isa::sse2: return "sse2";
+    case isa::avx: return "avx";
+    case isa::avx2: return "avx2";
+    case isa::avx512: return "avx512";
+    default: return "scalar";
+  }
+}
+
+namespace detail {
+
+#ifdef VECTORIZE_X86
+inline void cpuid(uint32_t leaf, uint32_t subleaf, uint32_t regs[4]) {
+#if defined(_MSC_VER)
+  int r[4];
+  __cpuidex(r, static_cast<int>(leaf), static_cast<int>(subleaf));
+  for (int i = 0; i < 4; i++) regs[i] = static_cast<uint32_t>(r[i]);
+#else
+  __cpuid_count(leaf, subleaf, regs[0], regs[1], regs[2], regs[3]);
+#endif
+}
+
+// register state the OS saves on context switches (XCR0)
+inline uint64_t xgetbv() {
+#if defined(_MSC_VER)
+  return _xgetbv(0);
+#else
+  uint32_t eax, edx;
+  __asm__ volatile("xgetbv" : "=a"(eax), "=d"(edx) : "c"(0));
+  return (static_cast<uint64_t>(edx) << 32) | eax;
+#endif
+}
+#endif  // VECTORIZE_X86
+
+///< the highest level the CPU and the OS support
+inline isa cpu_isa() {
+#ifdef VECTORIZE_X86
+  uint32_t r[4];
+  cpuid(0, 0, r);
+  const uint32_t max_leaf = r[0];
+  if (max_leaf < 1) return isa::scalar;
+
+  cpuid(1, 0, r);
+  const bool sse2    = (r[3] >> 26) & 1;
+  const bool osxsave = (r[2] >> 27) & 1;
+  const bool avx     = (r[2] >> 28) & 1;
+  const bool fma     = (r[2] >> 12) & 1;
+  if (!sse2) return isa::scalar;
+  if (!osxsave || !avx) return isa::sse2;
+
+  const uint64_t xcr0 = xgetbv();
+  if ((xcr0 & 0x6) != 0x6) return isa::sse2;  // XMM and YMM state
+
+  bool avx2 = false, avx512f = false;
+  if (max_leaf >= 7) {
+    cpuid(7, 0, r);
+    avx2    = (r[1] >> 5) & 1;
+    avx512f = (r[1] >> 16) & 1;
+  }
+  if (!avx2 || !fma) return isa::avx;
+  // opmask and ZMM state
+  if (!avx512f || (xcr0 & 0xe6) != 0xe6) return isa::avx2;
+  return isa::avx512;
+#else
+  return isa::scalar;
+#endif
+}
+
+///< parse a level name as returned by to_string(isa), false if unknown
+inline bool parse_isa(const char *name, isa *level) {
+  const isa levels[] = {isa::scalar, isa::sse2, isa::avx, isa::avx2,
+                        isa::avx512};
+  for (isa l : levels) {
+    if (std::strcmp(name, to_string(l)) == 0) {
+      *level = l;
+      return true;
+    }
+  }
+  return false;
+}
+
+}  // namespace detail
+
+/**
+ * the level the vectorize:: kernels run with, chosen once at startup: the
+ * highest one the CPU supports, or the one in the TINYDNN_SIMD environment
+ * variable (scalar, sse2, avx, avx2 or avx512) if that is lower. Unknown
+ * names are ignored.
+ *
+ *     TINYDNN_SIMD=sse2 ./benchmark  # compare against the SSE2 kernels
+ */
+inline isa active_isa() {
+  static const isa level = [] {
+    isa best = detail::cpu_isa();
+    isa requested;
+    const char *env = std::getenv("TINYDNN_SIMD");
+    if (env && detail::parse_isa(env, &requested) && requested < best) {
+      best = requested;
+    }
+    return best;
+  }();
+  return level;
+}
+
+}  // namespace vectorize
@@ -0,0 +1,111 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <cmath>
+#include <complex>
+#include <utility>
+#include <vector>
+
+#include "tinydnn/utils/logging.h"
+#include "tinydnn/utils/types.h"
+
+namespace tinydnn {
+
+typedef std::complex<float_t> complex_t;
+
+/**
+ * in-place radix-2 complex FFT of a fixed power-of-two size.
+ * The twiddle factors and the bit-reversal permutation are computed once
+ * per plan, so a plan should be reused for all transforms of its size.
+ *
+ *     fft_plan plan(64);
+ *     plan.forward(&x[0]);  // X[k] = sum_n x[n] exp(-2 pi i k n / 64)
+ *     plan.inverse(&x[0]);  // unscaled, x is now 64 times the input
+ **/
+class fft_plan {
+ public:
+  explicit fft_plan(size_t n) : n_(n), twiddle_(n / 2), rev_(n) {
+    if (n == 0 || (n & (n - 1)) != 0) {
+      throw nn_error("fft size must be a power of 2");
+    }
+    const double pi = 3.14159265358979323846;
+    for (size_t k = 0; k < n / 2; k++) {
+      double phi  = -2 * pi * static_cast<double>(k) / static_cast<double>(n);
+      twiddle_[k] = complex_t(static_cast<float_t>(std::cos(phi)),
+                              static_cast<float_t>(std::sin(phi)));
+    }
+    size_t bits = 0;
+    while ((size_t(1) << bits) < n) bits++;
+    for (size_t i = 0; i < n; i++) {
+      size_t r = 0;
+      for (size_t b = 0; b < bits; b++) r |= ((i >> b) & 1) << (bits - 1 - b);
+      rev_[i] = r;
+    }
+  }
+
+  size_t size() const { return n_; }
+
+  void forward(complex_t *x) const { transform(x, 1, 1, false); }
+
+  ///< inverse transform without the 1/n scaling
+  void inverse(complex_t *x) const { transform(x, 1, 1, true); }
+
+  /**
+   * transform count sequences at once, element k of sequence j being
+   * x[k * stride + j] (e.g. all columns of a row-major matrix)
+   **/
+  void forward(complex_t *x, size_t stride, size_t count) const {
+    transform(x, stride, count, false);
+  }
+
+  void inverse(complex_t *x, size_t stride, size_t count) const {
+    transform(x, stride, count, true);
+  }
+
+ private:
+  void transform(complex_t *x,
+                 size_t stride,
+                 size_t count,
+                 bool inverse) const {
+    for (size_t i = 0; i < n_; i++) {
+      if (i < rev_[i]) {
+        std::swap_ranges(x + i * stride, x + i * stride + count,
+                         x + rev_[i] * stride);
+      }
+    }
+    for (size_t len = 2; len <= n_; len <<= 1) {
+      const size_t half = len / 2;
+      const size_t step = n_ / len;
+      for (size_t i = 0; i < n_; i += len) {
+        for (size_t j = 0; j < half; j++) {
+          const float_t wr = twiddle_[j * step].real();
+          const float_t wi = inverse ? -twiddle_[j * step].imag()
+                                     : twiddle_[j * step].imag();
+          complex_t *u = x + (i + j) * stride;
+          complex_t *v = x + (i + j + half) * stride;
+          for (size_t k = 0; k < count; k++) {
+            // v * w spelled out, std::complex multiplication guards
+            // against NaN/inf in a slow path
+            const complex_t vw(v[k].real() * wr - v[k].imag() * wi,
+                               v[k].real() * wi + v[k].imag() * wr);
+            v[k] = u[k] - vw;
+            u[k] += vw;
+          }
+        }
+      }
+    }
+  }
+
+  size_t n_;
+  std::vector<complex_t> twiddle_;
+  std::vector<size_t> rev_;
+};
+
+}  // namespace tinydnn
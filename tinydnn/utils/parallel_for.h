@@ -7,7 +7,10 @@
 */
 #pragma once
 
+#include <algorithm>
+#include <atomic>
 #include <cassert>
+#include <chrono>  // NOLINT
 #include <cstdio>
 #include <limits>
 #include <string>
@@ -26,8 +29,13 @@
 #include <tbb/tbb.h>
 #endif
 
+#if defined(USE_OMP) && defined(_OPENMP)
+#include <omp.h>
+#endif
+
 #if !defined(USE_OMP) && !defined(SINGLE_THREAD)
-#include <future>  // NOLINT
+#include "tinydnn/utils/thread_pool.h"
+#else
 #include <thread>  // NOLINT
 #endif
 
@@ -47,8 +55,8 @@ typedef tbb::blocked_range<size_t> blocked_range;
 template <typename Func>
 void parallel_for(size_t begin, size_t end, const Func &f, size_t grainsize) {
   assert(end >= begin);
-  tbb::parallel_for(
-    blocked_range(begin, end, end - begin > grainsize ? grainsize : 1), f);
+  tbb::parallel_for(blocked_range(begin, end, std::max<size_t>(grainsize, 1)),
+                    f);
 }
 
 template <typename Func>
@@ -56,6 +64,10 @@ void xparallel_for(size_t begin, size_t end, const Func &f) {
   f(blocked_range(begin, end, 100));
 }
 
+inline size_t parallel_concurrency() {
+  return static_cast<size_t>(tbb::task_scheduler_init::default_num_threads());
+}
+
 #else
 
 struct blocked_range {
@@ -80,34 +92,55 @@ void xparallel_for(size_t begin, size_t end, const Func &f) {
 
 #if defined(USE_OMP)
 
+inline size_t parallel_concurrency() {
+#ifdef _OPENMP
+  return static_cast<size_t>(omp_get_max_threads());
+#else
+  return std::max<size_t>(std::thread::hardware_concurrency(), 1);
+#endif
+}
+
 template <typename Func>
-void parallel_for(size_t begin,
-                  size_t end,
-                  const Func &f,
-                  size_t /*grainsize*/) {
+void parallel_for(size_t begin, size_t end, const Func &f, size_t grainsize) {
   assert(end >= begin);
+  size_t count = end - begin;
+  if (count <= grainsize) {
+    xparallel_for(begin, end, f);
+    return;
+  }
+  size_t blockSize  = std::max<size_t>(grainsize, 1);
+  size_t blockCount = (count + blockSize - 1) / blockSize;
+
 // unsigned index isn't allowed in OpenMP 2.0
-#pragma omp parallel for
-  for (int i = static_cast<int>(begin); i < static_cast<int>(end); ++i)
-    f(blocked_range(i, i + 1));
+#pragma omp parallel for schedule(dynamic)
+  for (int block = 0; block < static_cast<int>(blockCount); ++block) {
+    size_t blockBegin = begin + block * blockSize;
+    size_t blockEnd   = std::min(blockBegin + blockSize, end);
+    f(blocked_range(blockBegin, blockEnd));
+  }
 }
 
 #elif defined(USE_GCD)
 
+inline size_t parallel_concurrency() {
+  return std::max<size_t>(std::thread::hardware_concurrency(), 1);
+}
+
 template <typename Func>
 void parallel_for(size_t begin, size_t end, const Func &f, size_t grainsize) {
   assert(end >= begin);
-  size_t count     = end - begin;
-  size_t blockSize = grainsize;
-  if (count < blockSize || blockSize == 0) {
-    blockSize = 1;
+  size_t count = end - begin;
+  if (count <= grainsize) {
+    xparallel_for(begin, end, f);
+    return;
   }
+  size_t blockSize  = std::max<size_t>(grainsize, 1);
   size_t blockCount = (count + blockSize - 1) / blockSize;
   assert(blockCount > 0);
 
   dispatch_apply(blockCount, dispatch_get_global_queue(QOS_CLASS_DEFAULT, 0),
                  ^(size_t block) {
-                   size_t blockStart = block * blockSize;
+                   size_t blockStart = begin + block * blockSize;
                    size_t blockEnd   = blockStart + blockSize;
                    if (blockEnd > end) {
                      blockEnd = end;
@@ -120,6 +153,8 @@ void parallel_for(size_t begin, size_t end, const Func &f, size_t grainsize) {
 
 #elif defined(SINGLE_THREAD)
 
+inline size_t parallel_concurrency() { return 1; }
+
 template <typename Func>
 void parallel_for(size_t begin,
                   size_t end,
@@ -130,35 +165,34 @@ void parallel_for(size_t begin,
 
 #else
 
+inline size_t parallel_concurrency() {
+  return thread_pool::instance().concurrency();
+}
+
 template <typename Func>
-void parallel_for(size_t begin,
-                  size_t end,
-                  const Func &f,
-                  size_t /*grainsize*/) {
+void parallel_for(size_t begin, size_t end, const Func &f, size_t grainsize) {
   assert(end >= begin);
-  size_t nthreads  = std::thread::hardware_concurrency();
-  size_t blockSize = (end - begin) / nthreads;
-  if (blockSize * nthreads < end - begin) blockSize++;
-
-  std::vector<std::future<void> > futures;
-
-  size_t blockBegin            = begin;
-  size_t blockEnd              = blockBegin + blockSize;
-  if (blockEnd > end) blockEnd = end;
+  size_t count = end - begin;
+  if (count <= grainsize) {
+    xparallel_for(begin, end, f);
+    return;
+  }
 
-  for (size_t i = 0; i < nthreads; i++) {
-    futures.push_back(
-      std::move(std::async(std::launch::async, [blockBegin, blockEnd, &f] {
-        f(blocked_range(blockBegin, blockEnd));
-      })));
+  // blocks are at least grainsize long, and there are at most a few blocks
+  // per thread so that stealing can balance the load without flooding the
+  // queues with tiny tasks.
+  thread_pool &pool = thread_pool::instance();
+  size_t maxBlocks  = pool.concurrency() * 4;
+  size_t blockSize  = std::max<size_t>(
+    std::max<size_t>(grainsize, 1), (count + maxBlocks - 1) / maxBlocks);
+  size_t blockCount = (count + blockSize - 1) / blockSize;
 
-    blockBegin += blockSize;
-    blockEnd = blockBegin + blockSize;
-    if (blockBegin >= end) break;
+  pool.run(blockCount, [begin, end, blockSize, &f](size_t block) {
+    size_t blockBegin = begin + block * blockSize;
+    size_t blockEnd   = blockBegin + blockSize;
     if (blockEnd > end) blockEnd = end;
-  }
-
-  for (auto &future : futures) future.wait();
+    f(blocked_range(blockBegin, blockEnd));
+  });
 }
 
 #endif
@@ -170,17 +204,133 @@ bool value_representation(U const &value) {
   return static_cast<U>(static_cast<T>(value)) == value;
 }
 
+/**
+ * grainsize which lets for_ / for_i choose the chunk size at runtime
+ * from the measured cost of one iteration (see adaptive_grain).
+ **/
+static const size_t grainsize_auto = 0;
+
+namespace detail {
+
+/**
+ * running estimate of the cost of one iteration of a parallel loop.
+ *
+ * for_ keeps one instance per call site (i.e. per loop body type) and picks
+ * chunks which take about target_ns each. Loops whose whole range is cheaper
+ * than two chunks are executed serially.
+ **/
+class adaptive_grain {
+ public:
+  typedef std::chrono::steady_clock clock;
+
+  ///< desired duration of one chunk, large enough to hide scheduling cost
+  static constexpr double target_ns = 50000.0;
+
+  adaptive_grain() : ns_per_iter_(-1.0) {}
+
+  bool measured() const {
+    return ns_per_iter_.load(std::memory_order_relaxed) >= 0.0;
+  }
+
+  /**
+   * grainsize for a loop of count iterations. A result >= count means the
+   * loop should run serially.
+   **/
+  size_t grainsize(size_t count, size_t concurrency) const {
+    double ns = ns_per_iter_.load(std::memory_order_relaxed);
+    if (concurrency <= 1) return count;
+
+    size_t min_chunk =
+      ns > 0.0 ? static_cast<size_t>(target_ns / ns) + 1 : count;
+    if (min_chunk * 2 > count) return count;
+    return min_chunk;
+  }
+
+  void record(size_t iterations, clock::duration elapsed) {
+    if (iterations == 0) return;
+    double ns = static_cast<double>(
+                  std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed)
+                    .count()) /
+                static_cast<double>(iterations);
+    double prev = ns_per_iter_.load(std::memory_order_relaxed);
+    // exponential moving average; concurrent updates may overwrite each
+    // other, which only loses a sample.
+    ns_per_iter_.store(prev < 0.0 ? ns : prev * 0.75 + ns * 0.25,
+                       std::memory_order_relaxed);
+  }
+
+ private:
+  std::atomic<double> ns_per_iter_;
+};
+
+template <typename Func>
+adaptive_grain &call_site_grain() {
+  static adaptive_grain grain;
+  return grain;
+}
+
+template <typename Func>
+void adaptive_parallel_for(size_t begin, size_t end, const Func &f) {
+  typedef adaptive_grain::clock clock;
+  adaptive_grain &grain = call_site_grain<Func>();
+
+  if (!grain.measured() && begin < end) {
+    // time a single iteration to get a first estimate
+    auto t0 = clock::now();
+    f(blocked_range(begin, begin + 1));
+    grain.record(1, clock::now() - t0);
+    ++begin;
+  }
+
+  size_t count     = end - begin;
+  size_t grainsize = grain.grainsize(count, parallel_concurrency());
+  if (grainsize >= count) {
+    auto t0 = clock::now();
+    xparallel_for(begin, end, f);
+    grain.record(count, clock::now() - t0);
+    return;
+  }
+
+  parallel_for(begin, end,
+               [&](const blocked_range &r) {
+                 auto t0 = clock::now();
+                 f(r);
+                 grain.record(r.end() - r.begin(), clock::now() - t0);
+               },
+               grainsize);
+}
+
+}  // namespace detail
+
+/**
+ * execute f over [begin, end) split into blocked_range chunks.
+ *
+ * @param grainsize minimum number of iterations in one chunk; ranges not
+ *                  larger than grainsize run on the calling thread.
+ *                  grainsize_auto picks it from the measured iteration cost.
+ **/
 template <typename T, typename Func>
-inline void for_(
-  bool parallelize, size_t begin, T end, Func f, size_t grainsize = 100) {
+inline void for_(bool parallelize,
+                 size_t begin,
+                 T end,
+                 Func f,
+                 size_t grainsize = grainsize_auto) {
   static_assert(std::is_integral<T>::value, "end must be integral type");
   parallelize = parallelize && value_representation<size_t>(end);
-  parallelize ? parallel_for(begin, end, f, grainsize)
-              : xparallel_for(begin, end, f);
+  if (!parallelize) {
+    xparallel_for(begin, end, f);
+  } else if (grainsize == grainsize_auto) {
+    detail::adaptive_parallel_for(begin, end, f);
+  } else {
+    parallel_for(begin, end, f, grainsize);
+  }
 }
 
 template <typename T, typename Func>
-inline void for_i(bool parallelize, T size, Func f, size_t grainsize = 100u) {
+inline void for_i(bool parallelize,
+                  T size,
+                  Func f,
+                  size_t grainsize = grainsize_auto) {
 #ifdef SINGLE_THREAD
   for (size_t i = 0; i < size; ++i) {
     f(i);
@@ -205,8 +355,55 @@ inline void for_i(bool parallelize, T size, Func f, size_t grainsize = 100u) {
 }
 
 template <typename T, typename Func>
-inline void for_i(T size, Func f, size_t grainsize = 100) {
+inline void for_i(T size, Func f, size_t grainsize = grainsize_auto) {
   for_i(true, size, f, grainsize);
 }
 
+/**
+ * number of accumulators to use when num_items results are summed up in
+ * parallel: one per thread, so the memory used doesn't grow with num_items.
+ **/
+inline size_t accumulator_count(bool parallelize, size_t num_items) {
+  if (!parallelize || num_items == 0) return 1;
+  return std::min(num_items, parallel_concurrency());
+}
+
+///< the accumulator item i is summed into, see accumulator_range
+inline size_t accumulator_slot(size_t i, size_t num_items, size_t num_slots) {
+  return i * num_slots / num_items;
+}
+
+/**
+ * the items summed into accumulator `slot` when num_items items are spread
+ * over num_slots accumulators. Each slot gets a consecutive range of items,
+ * item i belongs to slot i * num_slots / num_items.
+ **/
+inline blocked_range accumulator_range(size_t slot,
+                                       size_t num_items,
+                                       size_t num_slots) {
+  return blocked_range((slot * num_items + num_slots - 1) / num_slots,
+                       ((slot + 1) * num_items + num_slots - 1) / num_slots);
+}
+
+/**
+ * number of parts each of num_items independent work items should be split
+ * into so that every thread gets something to do.
+ *
+ * Kernels use this to parallelize inside a sample (over output channels,
+ * rows or neurons) when the batch is smaller than the number of threads,
+ * e.g. for single-sample inference. Returns 1 when num_items alone keeps all
+ * threads busy or parallelization is disabled.
+ *
+ * @param max_split upper bound of the result (the number of splittable units
+ *                  in one item)
+ **/
+inline size_t intra_item_split(bool parallelize,
+                               size_t num_items,
+                               size_t max_split) {
+  size_t concurrency = parallel_concurrency();
+  if (!parallelize || num_items == 0 || num_items >= concurrency) return 1;
+  size_t split = (concurrency + num_items - 1) / num_items;
+  return std::max<size_t>(1, std::min(split, max_split));
+}
+
 }  // namespace tinydnn
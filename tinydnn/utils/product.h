@@ -7,17 +7,45 @@
 */
 #pragma once
 
-#if defined(USE_SSE) || defined(USE_AVX)
-#include <immintrin.h>
-#endif
+#include <algorithm>
+#include <atomic>
 #include <cassert>
+#include <cmath>
 #include <cstdint>
 #include <numeric>
+#include <vector>
+#include "tinydnn/config.h"
+#include "tinydnn/utils/activation_lut.h"
+#include "tinydnn/utils/aligned_allocator.h"
+#include "tinydnn/utils/cpu_features.h"
 #include "tinydnn/utils/macro.h"
+#ifdef VECTORIZE_X86
+#include <immintrin.h>
+#endif
 #ifdef USE_AVX
 #include "tinydnn/backend/kernels/avx_kernel_common.h"
 #endif
 
+// The SSE, AVX and AVX-512 kernels are compiled for their instruction set
+// whatever the compiler flags are, and one of them is picked at run time (see
+// vectorize::active_isa). VECTORIZE_TARGET_BEGIN/END enable an instruction
+// set for the functions defined between them.
+#define VECTORIZE_PRAGMA(x) _Pragma(#x)
+#if defined(__clang__)
+#define VECTORIZE_TARGET_BEGIN(isa) \
+  VECTORIZE_PRAGMA(                 \
+    clang attribute push(__attribute__((target(isa))), apply_to = function))
+#define VECTORIZE_TARGET_END VECTORIZE_PRAGMA(clang attribute pop)
+#elif defined(__GNUC__)
+#define VECTORIZE_TARGET_BEGIN(isa) \
+  VECTORIZE_PRAGMA(GCC push_options) VECTORIZE_PRAGMA(GCC target(isa))
+#define VECTORIZE_TARGET_END VECTORIZE_PRAGMA(GCC pop_options)
+#else
+// MSVC accepts all intrinsics without /arch options
+#define VECTORIZE_TARGET_BEGIN(isa)
+#define VECTORIZE_TARGET_END
+#endif
+
 namespace vectorize {
 
 namespace detail {
@@ -52,6 +80,33 @@ struct scalar_generic {
     *px = v;
   }
 
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return v1 - v2;
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return v1 / v2;
+  }
+  ///< v2 if either is NaN, like minps
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return v1 < v2 ? v1 : v2;
+  }
+  ///< v2 if either is NaN, like maxps
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return v1 > v2 ? v1 : v2;
+  }
+  ///< nearest integer, ties to even. |x| < 2^31
+  static MUST_INLINE register_type round(const register_type &x) {
+    return std::nearbyint(x);
+  }
+  ///< 2^n for an integral n within the normal exponent range
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    return std::ldexp(value_type(1), static_cast<int>(n));
+  }
+
   static MUST_INLINE value_type resemble(const register_type &x) {
     return x;
   }
@@ -59,7 +114,98 @@ struct scalar_generic {
   static MUST_INLINE bool is_aligned(value_type *p) { return true; }
 };
 
-#ifdef USE_SSE
+// the kernels of one instruction set, see kernels()
+template <typename T>
+struct kernel_table {
+  T (*dot)(const T *s1, const T *s2, std::size_t size);
+  void (*add_scalar)(T c, std::size_t size, T *dst);
+  void (*add)(const T *src, std::size_t size, T *dst);
+  void (*muladd)(const T *src, T c, std::size_t size, T *dst);
+  void (*reduce)(const T *src, std::size_t size, T *dst);
+  void (*fill)(T *dst, std::size_t size, T value);
+  T (*sum)(const T *src, std::size_t size);
+  void (*exp)(const T *src, std::size_t size, T *dst);
+  void (*sigmoid)(const T *src, std::size_t size, T *dst);
+  void (*tanh)(const T *src, std::size_t size, T *dst);
+  void (*softplus)(const T *src, std::size_t size, T *dst);
+  void (*gemm)(bool trans_a,
+               bool trans_b,
+               std::size_t M,
+               std::size_t N,
+               std::size_t K,
+               const T *A,
+               std::size_t lda,
+               const T *B,
+               std::size_t ldb,
+               T *C,
+               std::size_t ldc);
+  void (*pack_b)(bool trans,
+                 const T *B,
+                 std::size_t ldb,
+                 std::size_t p0,
+                 std::size_t k,
+                 std::size_t j0,
+                 std::size_t n,
+                 T *dst);
+  void (*gemm_packed)(bool trans_a,
+                      std::size_t M,
+                      std::size_t N,
+                      std::size_t K,
+                      const T *A,
+                      std::size_t lda,
+                      const T *packed,
+                      std::size_t stride,
+                      std::size_t j0,
+                      T *C,
+                      std::size_t ldc);
+  std::size_t nr;  // panel width of packed matrices
+  std::size_t kc;  // rows per slab of packed matrices
+};
+
+namespace generic {
+#include "tinydnn/utils/product_kernels.h"
+}  // namespace generic
+
+// without SIMD the polynomials of product_kernels.h lose to the C library,
+// so the scalar level calls it for the transcendental functions
+template <typename T>
+void exp_std(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) dst[i] = std::exp(src[i]);
+}
+
+template <typename T>
+void sigmoid_std(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) {
+    dst[i] = T(1) / (T(1) + std::exp(-src[i]));
+  }
+}
+
+template <typename T>
+void tanh_std(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) dst[i] = std::tanh(src[i]);
+}
+
+template <typename T>
+void softplus_std(const T *src, std::size_t size, T *dst) {
+  for (std::size_t i = 0; i < size; i++) {
+    const T x = src[i];
+    dst[i]    = std::max(x, T(0)) + std::log1p(std::exp(-std::abs(x)));
+  }
+}
+
+template <typename T>
+kernel_table<T> make_scalar_kernel_table() {
+  kernel_table<T> table = generic::make_kernel_table<scalar_generic<T>>();
+  table.exp             = &exp_std<T>;
+  table.sigmoid         = &sigmoid_std<T>;
+  table.tanh            = &tanh_std<T>;
+  table.softplus        = &softplus_std<T>;
+  return table;
+}
+
+#ifdef VECTORIZE_X86
+
+VECTORIZE_TARGET_BEGIN("sse2")
 
 struct float_sse {
   typedef __m128 register_type;
@@ -89,6 +235,30 @@ struct float_sse {
   template <typename aligned>
   static MUST_INLINE void store(value_type *px, const register_type &v);
 
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm_sub_ps(v1, v2);
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm_div_ps(v1, v2);
+  }
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm_min_ps(v1, v2);
+  }
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm_max_ps(v1, v2);
+  }
+  static MUST_INLINE register_type round(const register_type &x) {
+    return _mm_cvtepi32_ps(_mm_cvtps_epi32(x));
+  }
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    __m128i e = _mm_add_epi32(_mm_cvttps_epi32(n), _mm_set1_epi32(127));
+    return _mm_castsi128_ps(_mm_slli_epi32(e, 23));
+  }
+
   static MUST_INLINE value_type resemble(const register_type &x) {
     alignas(16) float tmp[4];
     _mm_store_ps(tmp, x);
@@ -147,6 +317,33 @@ struct double_sse {
   template <typename aligned>
   static MUST_INLINE void store(value_type *px, const register_type &v);
 
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm_sub_pd(v1, v2);
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm_div_pd(v1, v2);
+  }
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm_min_pd(v1, v2);
+  }
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm_max_pd(v1, v2);
+  }
+  static MUST_INLINE register_type round(const register_type &x) {
+    return _mm_cvtepi32_pd(_mm_cvtpd_epi32(x));
+  }
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    // biased exponents to the low half of each 64-bit lane, shifted into
+    // place, the high halves shift out
+    __m128i e = _mm_add_epi32(_mm_cvttpd_epi32(n), _mm_set1_epi32(1023));
+    e         = _mm_shuffle_epi32(e, _MM_SHUFFLE(1, 1, 0, 0));
+    return _mm_castsi128_pd(_mm_slli_epi64(e, 52));
+  }
+
   static MUST_INLINE value_type resemble(const register_type &x) {
     alignas(16) double tmp[2];
     _mm_store_pd(tmp, x);
@@ -178,9 +375,13 @@ MUST_INLINE void double_sse::store<std::false_type>(double *px,
   _mm_storeu_pd(px, v);
 }
 
-#endif  // USE_SSE
+namespace sse2 {
+#include "tinydnn/utils/product_kernels.h"
+}  // namespace sse2
 
-#ifdef USE_AVX
+VECTORIZE_TARGET_END
+
+VECTORIZE_TARGET_BEGIN("avx")
 
 struct float_avx {
   typedef __m256 register_type;
@@ -198,19 +399,11 @@ struct float_avx {
                                            const register_type &v2) {
     return _mm256_add_ps(v1, v2);
   }
-#ifdef USE_AVX2
-  static MUST_INLINE register_type madd(const register_type &v1,
-                                            const register_type &v2,
-                                            const register_type &v3) {
-    return _mm256_fmadd_ps(v1, v2, v3);
-  }
-#else
   static MUST_INLINE register_type madd(const register_type &v1,
                                             const register_type &v2,
                                             const register_type &v3) {
     return _mm256_add_ps(_mm256_mul_ps(v1, v2), v3);
   }
-#endif
 
   template <typename aligned>
   static MUST_INLINE register_type load(const value_type *px);
@@ -218,8 +411,43 @@ struct float_avx {
   template <typename aligned>
   static MUST_INLINE void store(value_type *px, const register_type &v);
 
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm256_sub_ps(v1, v2);
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm256_div_ps(v1, v2);
+  }
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm256_min_ps(v1, v2);
+  }
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm256_max_ps(v1, v2);
+  }
+  static MUST_INLINE register_type round(const register_type &x) {
+    return _mm256_round_ps(x, _MM_FROUND_TO_NEAREST_INT | _MM_FROUND_NO_EXC);
+  }
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    // AVX has no 256-bit integer ops, build each half with SSE2
+    const __m128i bias = _mm_set1_epi32(127);
+    const __m256i i    = _mm256_cvttps_epi32(n);
+    __m128i lo         = _mm_add_epi32(_mm256_castsi256_si128(i), bias);
+    __m128i hi         = _mm_add_epi32(_mm256_extractf128_si256(i, 1), bias);
+    lo                 = _mm_slli_epi32(lo, 23);
+    hi                 = _mm_slli_epi32(hi, 23);
+    return _mm256_castsi256_ps(
+      _mm256_insertf128_si256(_mm256_castsi128_si256(lo), hi, 1));
+  }
+
   static MUST_INLINE value_type resemble(const register_type &x) {
-    return _mm_cvtss_f32(hsum256_ps(x));
+    __m128 h = _mm_add_ps(_mm256_castps256_ps128(x),
+                          _mm256_extractf128_ps(x, 1));
+    h        = _mm_add_ps(h, _mm_movehl_ps(h, h));
+    h        = _mm_add_ss(h, _mm_shuffle_ps(h, h, 1));
+    return _mm_cvtss_f32(h);
   }
   static MUST_INLINE bool is_aligned(value_type *p) {
     return reinterpret_cast<uintptr_t>(p) % 32 == 0;
@@ -262,19 +490,11 @@ struct double_avx {
                                            const register_type &v2) {
     return _mm256_add_pd(v1, v2);
   }
-#ifdef USE_AVX2
-  static MUST_INLINE register_type madd(const register_type &v1,
-                                            const register_type &v2,
-                                            const register_type &v3) {
-    return _mm256_fmadd_pd(v1, v2, v3);
-  }
-#else
   static MUST_INLINE register_type madd(const register_type &v1,
                                             const register_type &v2,
                                             const register_type &v3) {
     return _mm256_add_pd(_mm256_mul_pd(v1, v2), v3);
   }
-#endif
 
   template <typename aligned>
   static MUST_INLINE register_type load(const value_type *px);
@@ -282,6 +502,36 @@ struct double_avx {
   template <typename aligned>
   static MUST_INLINE void store(value_type *px, const register_type &v);
 
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm256_sub_pd(v1, v2);
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm256_div_pd(v1, v2);
+  }
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm256_min_pd(v1, v2);
+  }
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm256_max_pd(v1, v2);
+  }
+  static MUST_INLINE register_type round(const register_type &x) {
+    return _mm256_round_pd(x, _MM_FROUND_TO_NEAREST_INT | _MM_FROUND_NO_EXC);
+  }
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    // see double_sse::pow2n
+    __m128i e  = _mm_add_epi32(_mm256_cvttpd_epi32(n), _mm_set1_epi32(1023));
+    __m128i lo = _mm_shuffle_epi32(e, _MM_SHUFFLE(1, 1, 0, 0));
+    __m128i hi = _mm_shuffle_epi32(e, _MM_SHUFFLE(3, 3, 2, 2));
+    lo         = _mm_slli_epi64(lo, 52);
+    hi         = _mm_slli_epi64(hi, 52);
+    return _mm256_castsi256_pd(
+      _mm256_insertf128_si256(_mm256_castsi128_si256(lo), hi, 1));
+  }
+
   static MUST_INLINE value_type resemble(const register_type &x) {
     alignas(32) double tmp[4];
     _mm256_store_pd(tmp, x);
@@ -312,424 +562,530 @@ MUST_INLINE void double_avx::store<std::false_type>(double *px,
   _mm256_storeu_pd(px, v);
 }
 
-#endif  // USE_AVX
+namespace avx {
+#include "tinydnn/utils/product_kernels.h"
+}  // namespace avx
 
-// generic dot-product
-template <typename T, typename f1_aligned, typename f2_aligned>
-MUST_INLINE typename T::value_type dot_product(
-  const typename T::value_type *f1,
-  const typename T::value_type *f2,
-  std::size_t size) {
-  typename T::register_type r0 = T::zero();
-  typename T::register_type r1 = T::zero();
-  typename T::register_type r2 = T::zero();
-  typename T::register_type r3 = T::zero();
-  auto sz                      = T::unroll_size;
-  auto sz4                     = T::unroll_size * 4;
-  auto n4                      = size / sz4;
-  auto n1                      = (size % sz4) / sz;
-  auto remain                  = size % sz;
-  for (size_t i = 0; i < n4; ++i) {
-    auto s10 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 0]);
-    auto s11 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 1]);
-    auto s12 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 2]);
-    auto s13 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 3]);
-    auto s20 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 0]);
-    auto s21 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 1]);
-    auto s22 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 2]);
-    auto s23 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 3]);
-    r0       = T::madd(s10, s20, r0);
-    r1       = T::madd(s11, s21, r1);
-    r2       = T::madd(s12, s22, r2);
-    r3       = T::madd(s13, s23, r3);
-  }
-  size_t idx = n4 * sz4;
-  for (size_t i = 0; i < n1; ++i) {
-    auto s1 = T::template load<f1_aligned>(&f1[idx + i * sz]);
-    auto s2 = T::template load<f2_aligned>(&f2[idx + i * sz]);
-    r0      = T::madd(s1, s2, r0);
-  }
-  r0                         = T::add(r0, r1);
-  r2                         = T::add(r2, r3);
-  r0                         = T::add(r0, r2);
-  typename T::value_type sum = T::resemble(r0);
-  idx += n1 * sz;
-  for (size_t i = 0; i < remain; ++i) {
-    sum += f1[idx + i] * f2[idx + i];
-  }
-  return sum;
-}
-
-template <typename T, typename dst_aligned>
-MUST_INLINE void add(typename T::value_type c,
-                         std::size_t size,
-                         typename T::value_type *dst) {
-  typename T::register_type c2 = T::set1(c);
-  auto sz                      = T::unroll_size;
-  auto sz4                     = T::unroll_size * 4;
-  auto n4                      = size / sz4;
-  auto n1                      = (size % sz4) / sz;
-  auto remain                  = size % sz;
-  for (size_t i = 0; i < n4; ++i) {
-    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
-    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
-    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
-    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
-    d0      = T::add(c2, d0);
-    d1      = T::add(c2, d1);
-    d2      = T::add(c2, d2);
-    d3      = T::add(c2, d3);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
-  }
-  size_t idx = n4 * sz4;
-  for (size_t i = 0; i < n1; ++i) {
-    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
-    d      = T::add(c2, d);
-    T::template store<dst_aligned>(&dst[idx + i * sz], d);
-  }
-  idx += n1 * sz;
-  for (size_t i = 0; i < remain; ++i) {
-    dst[idx + i] += c;
-  }
-}
-
-template <typename T, typename src_aligned, typename dst_aligned>
-MUST_INLINE void add(const typename T::value_type *src,
-                         std::size_t size,
-                         typename T::value_type *dst) {
-  auto sz     = T::unroll_size;
-  auto sz4    = T::unroll_size * 4;
-  auto n4     = size / sz4;
-  auto n1     = (size % sz4) / sz;
-  auto remain = size % sz;
-  for (size_t i = 0; i < n4; ++i) {
-    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
-    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
-    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
-    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
-    auto s0 = T::template load<src_aligned>(&src[i * sz4 + sz * 0]);
-    auto s1 = T::template load<src_aligned>(&src[i * sz4 + sz * 1]);
-    auto s2 = T::template load<src_aligned>(&src[i * sz4 + sz * 2]);
-    auto s3 = T::template load<src_aligned>(&src[i * sz4 + sz * 3]);
-    d0      = T::add(s0, d0);
-    d1      = T::add(s1, d1);
-    d2      = T::add(s2, d2);
-    d3      = T::add(s3, d3);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
-  }
-  size_t idx = n4 * sz4;
-  for (size_t i = 0; i < n1; ++i) {
-    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
-    auto s = T::template load<src_aligned>(&src[idx + i * sz]);
-    d      = T::add(s, d);
-    T::template store<dst_aligned>(&dst[idx + i * sz], d);
-  }
-  idx += n1 * sz;
-  for (size_t i = 0; i < remain; ++i) {
-    dst[idx + i] += src[idx + i];
-  }
-}
-
-// TODO(beru): documentation
-/**
- *
- * @tparam T
- * @tparam src_aligned
- * @tparam dst_aligned
- * @param src
- * @param c
- * @param size
- * @param dst
- */
-template <typename T, typename src_aligned, typename dst_aligned>
-MUST_INLINE void muladd(const typename T::value_type *src,
-                            typename T::value_type c,
-                            std::size_t size,
-                            typename T::value_type *dst) {
-  auto factor = T::set1(c);
-  auto sz     = T::unroll_size;
-  auto sz4    = T::unroll_size * 4;
-  auto n4     = size / sz4;
-  auto n1     = (size % sz4) / sz;
-  auto remain = size % sz;
-  for (size_t i = 0; i < n4; ++i) {
-    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
-    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
-    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
-    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
-    auto s0 = T::template load<src_aligned>(&src[i * sz4 + sz * 0]);
-    auto s1 = T::template load<src_aligned>(&src[i * sz4 + sz * 1]);
-    auto s2 = T::template load<src_aligned>(&src[i * sz4 + sz * 2]);
-    auto s3 = T::template load<src_aligned>(&src[i * sz4 + sz * 3]);
-    d0      = T::madd(s0, factor, d0);
-    d1      = T::madd(s1, factor, d1);
-    d2      = T::madd(s2, factor, d2);
-    d3      = T::madd(s3, factor, d3);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
-  }
-  size_t idx = n4 * sz4;
-  for (size_t i = 0; i < n1; ++i) {
-    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
-    auto s = T::template load<src_aligned>(&src[idx + i * sz]);
-    d      = T::madd(s, factor, d);
-    T::template store<dst_aligned>(&dst[idx + i * sz], d);
-  }
-  idx += n1 * sz;
-  for (size_t i = 0; i < remain; ++i) {
-    dst[idx + i] += src[idx + i] * c;
-  }
-}
-
-template <typename T, typename src_aligned, typename dst_aligned>
-MUST_INLINE void reduce(const typename T::value_type *src,
-                            std::size_t size,
-                            typename T::value_type *dst) {
-  auto sz     = T::unroll_size;
-  auto sz4    = T::unroll_size * 4;
-  auto n4     = size / sz4;
-  auto n1     = (size % sz4) / sz;
-  auto remain = size % sz;
-  for (size_t i = 0; i < n4; ++i) {
-    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
-    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
-    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
-    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
-    auto s0 = T::template load<src_aligned>(&src[i * sz4 + sz * 0]);
-    auto s1 = T::template load<src_aligned>(&src[i * sz4 + sz * 1]);
-    auto s2 = T::template load<src_aligned>(&src[i * sz4 + sz * 2]);
-    auto s3 = T::template load<src_aligned>(&src[i * sz4 + sz * 3]);
-    d0      = T::add(s0, d0);
-    d1      = T::add(s1, d1);
-    d2      = T::add(s2, d2);
-    d3      = T::add(s3, d3);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
-    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
-  }
-  size_t idx = n4 * sz4;
-  for (size_t i = 0; i < n1; ++i) {
-    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
-    auto s = T::template load<src_aligned>(&src[idx + i * sz]);
-    d      = T::add(s, d);
-    T::template store<dst_aligned>(&dst[idx + i * sz], d);
-  }
-  idx += n1 * sz;
-  for (size_t i = 0; i < remain; ++i) {
-    dst[idx + i] += src[idx + i];
+VECTORIZE_TARGET_END
+
+VECTORIZE_TARGET_BEGIN("avx2,fma")
+
+// AVX with fused multiply-add
+struct float_avx2 : float_avx {
+  static MUST_INLINE register_type madd(const register_type &v1,
+                                            const register_type &v2,
+                                            const register_type &v3) {
+    return _mm256_fmadd_ps(v1, v2, v3);
+  }
+};
+
+struct double_avx2 : double_avx {
+  static MUST_INLINE register_type madd(const register_type &v1,
+                                            const register_type &v2,
+                                            const register_type &v3) {
+    return _mm256_fmadd_pd(v1, v2, v3);
+  }
+};
+
+namespace avx2 {
+#include "tinydnn/utils/product_kernels.h"
+}  // namespace avx2
+
+VECTORIZE_TARGET_END
+
+VECTORIZE_TARGET_BEGIN("avx512f")
+#if defined(__GNUC__) && !defined(__clang__)
+// the AVX-512 intrinsics of gcc pass _mm512_undefined_*() as masked-off
+// sources, which -Wuninitialized reports once they are inlined here
+#pragma GCC diagnostic push
+#pragma GCC diagnostic ignored "-Wuninitialized"
+#pragma GCC diagnostic ignored "-Wmaybe-uninitialized"
+#endif
+
+struct float_avx512 {
+  typedef __m512 register_type;
+  typedef float value_type;
+  enum { unroll_size = 16 };
+  static MUST_INLINE register_type set1(const value_type &x) {
+    return _mm512_set1_ps(x);
+  }
+  static MUST_INLINE register_type zero() { return _mm512_setzero_ps(); }
+  static MUST_INLINE register_type mul(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_mul_ps(v1, v2);
+  }
+  static MUST_INLINE register_type add(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_add_ps(v1, v2);
+  }
+  static MUST_INLINE register_type madd(const register_type &v1,
+                                        const register_type &v2,
+                                        const register_type &v3) {
+    return _mm512_fmadd_ps(v1, v2, v3);
+  }
+
+  template <typename aligned>
+  static MUST_INLINE register_type load(const value_type *px);
+
+  template <typename aligned>
+  static MUST_INLINE void store(value_type *px, const register_type &v);
+
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_sub_ps(v1, v2);
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_div_ps(v1, v2);
+  }
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm512_min_ps(v1, v2);
+  }
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm512_max_ps(v1, v2);
+  }
+  static MUST_INLINE register_type round(const register_type &x) {
+    return _mm512_roundscale_ps(x, _MM_FROUND_TO_NEAREST_INT);
+  }
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    __m512i e = _mm512_cvttps_epi32(n);
+    e         = _mm512_add_epi32(e, _mm512_set1_epi32(127));
+    return _mm512_castsi512_ps(_mm512_slli_epi32(e, 23));
+  }
+
+  static MUST_INLINE value_type resemble(const register_type &x) {
+    alignas(64) float tmp[16];
+    _mm512_store_ps(tmp, x);
+    return std::accumulate(tmp, tmp + 16, 0.0f);
+  }
+  static MUST_INLINE bool is_aligned(value_type *p) {
+    return reinterpret_cast<uintptr_t>(p) % 64 == 0;
+  }
+};
+
+template <>
+MUST_INLINE __m512 float_avx512::load<std::true_type>(const float *px) {
+  return _mm512_load_ps(px);
+}
+template <>
+MUST_INLINE __m512 float_avx512::load<std::false_type>(const float *px) {
+  return _mm512_loadu_ps(px);
+}
+
+template <>
+MUST_INLINE void float_avx512::store<std::true_type>(float *px,
+                                                     const __m512 &v) {
+  _mm512_store_ps(px, v);
+}
+template <>
+MUST_INLINE void float_avx512::store<std::false_type>(float *px,
+                                                      const __m512 &v) {
+  _mm512_storeu_ps(px, v);
+}
+
+struct double_avx512 {
+  typedef __m512d register_type;
+  typedef double value_type;
+  enum { unroll_size = 8 };
+  static MUST_INLINE register_type set1(const value_type &x) {
+    return _mm512_set1_pd(x);
   }
+  static MUST_INLINE register_type zero() { return _mm512_setzero_pd(); }
+  static MUST_INLINE register_type mul(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_mul_pd(v1, v2);
+  }
+  static MUST_INLINE register_type add(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_add_pd(v1, v2);
+  }
+  static MUST_INLINE register_type madd(const register_type &v1,
+                                        const register_type &v2,
+                                        const register_type &v3) {
+    return _mm512_fmadd_pd(v1, v2, v3);
+  }
+
+  template <typename aligned>
+  static MUST_INLINE register_type load(const value_type *px);
+
+  template <typename aligned>
+  static MUST_INLINE void store(value_type *px, const register_type &v);
+
+  static MUST_INLINE register_type sub(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_sub_pd(v1, v2);
+  }
+  static MUST_INLINE register_type div(const register_type &v1,
+                                       const register_type &v2) {
+    return _mm512_div_pd(v1, v2);
+  }
+  static MUST_INLINE register_type minimum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm512_min_pd(v1, v2);
+  }
+  static MUST_INLINE register_type maximum(const register_type &v1,
+                                           const register_type &v2) {
+    return _mm512_max_pd(v1, v2);
+  }
+  static MUST_INLINE register_type round(const register_type &x) {
+    return _mm512_roundscale_pd(x, _MM_FROUND_TO_NEAREST_INT);
+  }
+  static MUST_INLINE register_type pow2n(const register_type &n) {
+    __m512i e = _mm512_cvtepi32_epi64(_mm512_cvttpd_epi32(n));
+    e         = _mm512_add_epi64(e, _mm512_set1_epi64(1023));
+    return _mm512_castsi512_pd(_mm512_slli_epi64(e, 52));
+  }
+
+  static MUST_INLINE value_type resemble(const register_type &x) {
+    alignas(64) double tmp[8];
+    _mm512_store_pd(tmp, x);
+    return std::accumulate(tmp, tmp + 8, 0.0);
+  }
+  static MUST_INLINE bool is_aligned(value_type *p) {
+    return reinterpret_cast<uintptr_t>(p) % 64 == 0;
+  }
+};
+
+template <>
+MUST_INLINE __m512d double_avx512::load<std::true_type>(const double *px) {
+  return _mm512_load_pd(px);
+}
+template <>
+MUST_INLINE __m512d double_avx512::load<std::false_type>(const double *px) {
+  return _mm512_loadu_pd(px);
+}
+
+template <>
+MUST_INLINE void double_avx512::store<std::true_type>(double *px,
+                                                      const __m512d &v) {
+  _mm512_store_pd(px, v);
+}
+template <>
+MUST_INLINE void double_avx512::store<std::false_type>(double *px,
+                                                       const __m512d &v) {
+  _mm512_storeu_pd(px, v);
 }
 
+namespace avx512 {
+#include "tinydnn/utils/product_kernels.h"
+}  // namespace avx512
+
+#if defined(__GNUC__) && !defined(__clang__)
+#pragma GCC diagnostic pop
+#endif
+
+VECTORIZE_TARGET_END
+
+#endif  // VECTORIZE_X86
+
 template <typename T>
 void fill(T *dst, size_t size, T value) {
   std::fill(dst, dst + size, value);
 }
 
-#if defined(USE_AVX)
-#ifdef USE_DOUBLE
-#define VECTORIZE_TYPE detail::double_avx
-#else
-#define VECTORIZE_TYPE detail::float_avx
-#endif
-#elif defined(USE_SSE)
-#ifdef USE_DOUBLE
-#define VECTORIZE_TYPE detail::double_sse
-#else
-#define VECTORIZE_TYPE detail::float_sse
-#endif
-#else
-#ifdef USE_DOUBLE
-#define VECTORIZE_TYPE detail::scalar_generic<double>
-#else
-#define VECTORIZE_TYPE detail::scalar_generic<float>
-#endif
-#endif
+#ifdef VECTORIZE_X86
+template <typename T>
+struct simd_types;
+
+template <>
+struct simd_types<float> {
+  typedef float_sse sse2;
+  typedef float_avx avx;
+  typedef float_avx2 avx2;
+  typedef float_avx512 avx512;
+};
+
+template <>
+struct simd_types<double> {
+  typedef double_sse sse2;
+  typedef double_avx avx;
+  typedef double_avx2 avx2;
+  typedef double_avx512 avx512;
+};
+#endif  // VECTORIZE_X86
+
+/**
+ * bit 1 << level is set once a kernel table of that level was built. Only
+ * the tables asked for are built: make_kernel_table is compiled for its
+ * instruction set and may use it even to fill the table.
+ */
+inline std::atomic<unsigned> &built_kernel_tables() {
+  static std::atomic<unsigned> levels(0);
+  return levels;
+}
+
+template <typename T>
+kernel_table<T> record_built(isa level, const kernel_table<T> &table) {
+  built_kernel_tables() |= 1u << static_cast<unsigned>(level);
+  return table;
+}
+
+///< the kernels compiled for level, or for the closest level below it
+template <typename T>
+const kernel_table<T> &kernels_for(isa level) {
+#ifdef VECTORIZE_X86
+  typedef simd_types<T> types;
+  switch (level) {
+    case isa::sse2: {
+      static const kernel_table<T> table =
+        record_built(level, sse2::make_kernel_table<typename types::sse2>());
+      return table;
+    }
+    case isa::avx: {
+      static const kernel_table<T> table =
+        record_built(level, avx::make_kernel_table<typename types::avx>());
+      return table;
+    }
+    case isa::avx2: {
+      static const kernel_table<T> table =
+        record_built(level, avx2::make_kernel_table<typename types::avx2>());
+      return table;
+    }
+    case isa::avx512: {
+      static const kernel_table<T> table = record_built(
+        level, avx512::make_kernel_table<typename types::avx512>());
+      return table;
+    }
+    default: break;
+  }
+#endif  // VECTORIZE_X86
+  static const kernel_table<T> scalar =
+    record_built(isa::scalar, make_scalar_kernel_table<T>());
+  return scalar;
+}
+
+///< the kernels of the active instruction set level
+template <typename T>
+const kernel_table<T> &kernels() {
+  static const kernel_table<T> &table = kernels_for<T>(active_isa());
+  return table;
+}
 
 }  // namespace detail
 
 #ifdef USE_AVX
-// vertically accumulate 'n' AVX registers into single register.
-template <typename aligned>
+namespace detail {
 #ifdef USE_DOUBLE
-MUST_INLINE VECTORIZE_TYPE::register_type accumulate(
-  const double *start, const size_t &nblocks) {
+typedef double_avx avx_type;
 #else
-MUST_INLINE VECTORIZE_TYPE::register_type accumulate(
-  const float *start, const size_t &nblocks) {
+typedef float_avx avx_type;
 #endif
-  const size_t n4                      = nblocks / 4;
-  const size_t n2                      = (nblocks % 4) / 2;
-  const size_t n1                      = nblocks % 2;
-  VECTORIZE_TYPE::register_type v0 = VECTORIZE_TYPE::load<aligned>(
-    start + VECTORIZE_TYPE::unroll_size * 0);
-  VECTORIZE_TYPE::register_type v1 = VECTORIZE_TYPE::load<aligned>(
-    start + VECTORIZE_TYPE::unroll_size * 1);
-  VECTORIZE_TYPE::register_type v2 = VECTORIZE_TYPE::load<aligned>(
-    start + VECTORIZE_TYPE::unroll_size * 2);
-  VECTORIZE_TYPE::register_type v3 = VECTORIZE_TYPE::load<aligned>(
-    start + VECTORIZE_TYPE::unroll_size * 3);
-  VECTORIZE_TYPE::register_type sum0 = VECTORIZE_TYPE::zero();
-  VECTORIZE_TYPE::register_type sum1 = VECTORIZE_TYPE::zero();
-  VECTORIZE_TYPE::register_type sum2 = VECTORIZE_TYPE::zero();
-  VECTORIZE_TYPE::register_type sum3 = VECTORIZE_TYPE::zero();
+}  // namespace detail
+
+// vertically accumulate 'n' AVX registers into single register.
+template <typename aligned>
+MUST_INLINE detail::avx_type::register_type accumulate(
+  const detail::avx_type::value_type *start, const size_t &nblocks) {
+  typedef detail::avx_type T;
+  const size_t n4       = nblocks / 4;
+  const size_t n2       = (nblocks % 4) / 2;
+  const size_t n1       = nblocks % 2;
+  T::register_type v0   = T::load<aligned>(start + T::unroll_size * 0);
+  T::register_type v1   = T::load<aligned>(start + T::unroll_size * 1);
+  T::register_type v2   = T::load<aligned>(start + T::unroll_size * 2);
+  T::register_type v3   = T::load<aligned>(start + T::unroll_size * 3);
+  T::register_type sum0 = T::zero();
+  T::register_type sum1 = T::zero();
+  T::register_type sum2 = T::zero();
+  T::register_type sum3 = T::zero();
   for (size_t j = 0; j < n4; ++j) {
-    VECTORIZE_TYPE::register_type f0 = VECTORIZE_TYPE::load<aligned>(
-      start + VECTORIZE_TYPE::unroll_size * 4);
-    VECTORIZE_TYPE::register_type f1 = VECTORIZE_TYPE::load<aligned>(
-      start + VECTORIZE_TYPE::unroll_size * 5);
-    VECTORIZE_TYPE::register_type f2 = VECTORIZE_TYPE::load<aligned>(
-      start + VECTORIZE_TYPE::unroll_size * 6);
-    VECTORIZE_TYPE::register_type f3 = VECTORIZE_TYPE::load<aligned>(
-      start + VECTORIZE_TYPE::unroll_size * 7);
-    sum0 = VECTORIZE_TYPE::add(sum0, v0);
-    sum1 = VECTORIZE_TYPE::add(sum1, v1);
-    sum2 = VECTORIZE_TYPE::add(sum2, v2);
-    sum3 = VECTORIZE_TYPE::add(sum3, v3);
-    v0   = f0;
-    v1   = f1;
-    v2   = f2;
-    v3   = f3;
-    start += VECTORIZE_TYPE::unroll_size * 4;
+    T::register_type f0 = T::load<aligned>(start + T::unroll_size * 4);
+    T::register_type f1 = T::load<aligned>(start + T::unroll_size * 5);
+    T::register_type f2 = T::load<aligned>(start + T::unroll_size * 6);
+    T::register_type f3 = T::load<aligned>(start + T::unroll_size * 7);
+    sum0                = T::add(sum0, v0);
+    sum1                = T::add(sum1, v1);
+    sum2                = T::add(sum2, v2);
+    sum3                = T::add(sum3, v3);
+    v0                  = f0;
+    v1                  = f1;
+    v2                  = f2;
+    v3                  = f3;
+    start += T::unroll_size * 4;
   }
   if (n2) {
-    sum0 = VECTORIZE_TYPE::add(sum0, v0);
-    sum1 = VECTORIZE_TYPE::add(sum1, v1);
-    start += VECTORIZE_TYPE::unroll_size * 2;
+    sum0 = T::add(sum0, v0);
+    sum1 = T::add(sum1, v1);
+    start += T::unroll_size * 2;
   }
   if (n1) {
-    sum2 = VECTORIZE_TYPE::add(
-      sum2, VECTORIZE_TYPE::load<aligned>(start + 0));
-    start += VECTORIZE_TYPE::unroll_size * 1;
+    sum2 = T::add(sum2, T::load<aligned>(start + 0));
+    start += T::unroll_size * 1;
   }
-  sum0 = VECTORIZE_TYPE::add(sum0, sum1);
-  sum2 = VECTORIZE_TYPE::add(sum2, sum3);
-  return VECTORIZE_TYPE::add(sum0, sum2);
+  sum0 = T::add(sum0, sum1);
+  sum2 = T::add(sum2, sum3);
+  return T::add(sum0, sum2);
 }
 #endif  // USE_AVX
 
 // dst[i] += c
 template <typename T>
 void add(T c, std::size_t size, T *dst) {
-  bool is_dst_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)dst);
-  if (is_dst_aligned) {
-    detail::add<VECTORIZE_TYPE, std::true_type>(c, size, dst);
-  } else {
-    detail::add<VECTORIZE_TYPE, std::false_type>(c, size, dst);
-  }
+  detail::kernels<T>().add_scalar(c, size, dst);
 }
 
 // dst[i] += src[i]
 template <typename T>
 void add(const T *src, std::size_t size, T *dst) {
-  bool src_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)src);
-  bool dst_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)dst);
-  if (src_aligned) {
-    if (dst_aligned) {
-      detail::add<VECTORIZE_TYPE, std::true_type, std::true_type>(src, size,
-                                                                      dst);
-    } else {
-      detail::add<VECTORIZE_TYPE, std::true_type, std::false_type>(
-        src, size, dst);
-    }
-  } else {
-    if (dst_aligned) {
-      detail::add<VECTORIZE_TYPE, std::false_type, std::true_type>(
-        src, size, dst);
-    } else {
-      detail::add<VECTORIZE_TYPE, std::false_type, std::false_type>(
-        src, size, dst);
-    }
-  }
+  detail::kernels<T>().add(src, size, dst);
 }
 
 // dst[i] += c * src[i]
 template <typename T>
 void muladd(const T *src, T c, std::size_t size, T *dst) {
-  bool src_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)src);
-  bool dst_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)dst);
-  if (src_aligned) {
-    if (dst_aligned) {
-      detail::muladd<VECTORIZE_TYPE, std::true_type, std::true_type>(
-        src, c, size, dst);
-    } else {
-      detail::muladd<VECTORIZE_TYPE, std::true_type, std::false_type>(
-        src, c, size, dst);
-    }
-  } else {
-    if (dst_aligned) {
-      detail::muladd<VECTORIZE_TYPE, std::false_type, std::true_type>(
-        src, c, size, dst);
-    } else {
-      detail::muladd<VECTORIZE_TYPE, std::false_type, std::false_type>(
-        src, c, size, dst);
-    }
-  }
+  detail::kernels<T>().muladd(src, c, size, dst);
 }
 
 // sum(s1[i] * s2[i])
 template <typename T>
 T dot(const T *s1, const T *s2, std::size_t size) {
-  bool s1_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)s1);
-  bool s2_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)s2);
-  if (s1_aligned) {
-    if (s2_aligned) {
-      return detail::dot_product<VECTORIZE_TYPE, std::true_type,
-                                 std::true_type>(s1, s2, size);
-    } else {
-      return detail::dot_product<VECTORIZE_TYPE, std::true_type,
-                                 std::false_type>(s1, s2, size);
-    }
-  } else {
-    if (s2_aligned) {
-      return detail::dot_product<VECTORIZE_TYPE, std::false_type,
-                                 std::true_type>(s1, s2, size);
-    } else {
-      return detail::dot_product<VECTORIZE_TYPE, std::false_type,
-                                 std::false_type>(s1, s2, size);
-    }
-  }
+  return detail::kernels<T>().dot(s1, s2, size);
 }
 
 /// dst[i] += src[i]
 template <typename T>
 void reduce(const T *src, std::size_t size, T *dst) {
-  bool src_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)src);
-  bool dst_aligned =
-    VECTORIZE_TYPE::is_aligned((VECTORIZE_TYPE::value_type *)dst);
-  if (src_aligned) {
-    if (dst_aligned) {
-      detail::reduce<VECTORIZE_TYPE, std::true_type, std::true_type>(
-        src, size, dst);
-    } else {
-      detail::reduce<VECTORIZE_TYPE, std::true_type, std::false_type>(
-        src, size, dst);
-    }
-  } else {
-    if (dst_aligned) {
-      detail::reduce<VECTORIZE_TYPE, std::false_type, std::true_type>(
-        src, size, dst);
-    } else {
-      detail::reduce<VECTORIZE_TYPE, std::false_type, std::false_type>(
-        src, size, dst);
+  detail::kernels<T>().reduce(src, size, dst);
+}
+
+// sum(src[i])
+template <typename T>
+T sum(const T *src, std::size_t size) {
+  return detail::kernels<T>().sum(src, size);
+}
+
+// dst[i] = exp(src[i]). this and the functions below approximate, see
+// exp_register in product_kernels.h, or read lookup tables with
+// USE_ACTIVATION_LUT (see activation_lut.h). src may be dst
+template <typename T>
+void exp(const T *src, std::size_t size, T *dst) {
+#ifdef USE_ACTIVATION_LUT
+  lut::exp(src, size, dst);
+#else
+  detail::kernels<T>().exp(src, size, dst);
+#endif
+}
+
+// dst[i] = 1 / (1 + exp(-src[i]))
+template <typename T>
+void sigmoid(const T *src, std::size_t size, T *dst) {
+#ifdef USE_ACTIVATION_LUT
+  lut::sigmoid(src, size, dst);
+#else
+  detail::kernels<T>().sigmoid(src, size, dst);
+#endif
+}
+
+// dst[i] = tanh(src[i])
+template <typename T>
+void tanh(const T *src, std::size_t size, T *dst) {
+#ifdef USE_ACTIVATION_LUT
+  lut::tanh(src, size, dst);
+#else
+  detail::kernels<T>().tanh(src, size, dst);
+#endif
+}
+
+// dst[i] = log(1 + exp(src[i]))
+template <typename T>
+void softplus(const T *src, std::size_t size, T *dst) {
+#ifdef USE_ACTIVATION_LUT
+  lut::softplus(src, size, dst);
+#else
+  detail::kernels<T>().softplus(src, size, dst);
+#endif
+}
+
+/**
+ * C += op(A) * op(B) with row-major matrices, op(X) = X or X^T.
+ * op(A) is M x K, op(B) is K x N and C is M x N. lda, ldb and ldc are the
+ * row strides of A, B and C as stored (before transposition).
+ */
+template <typename T>
+void gemm(bool trans_a,
+          bool trans_b,
+          std::size_t M,
+          std::size_t N,
+          std::size_t K,
+          const T *A,
+          std::size_t lda,
+          const T *B,
+          std::size_t ldb,
+          T *C,
+          std::size_t ldc) {
+  if (M == 0 || N == 0 || K == 0) return;
+  detail::kernels<T>().gemm(trans_a, trans_b, M, N, K, A, lda, B, ldb, C,
+                            ldc);
+}
+
+/**
+ * a K x N matrix packed once into the panel layout the gemm kernel reads,
+ * for right-hand sides which are multiplied many times without changing
+ * (e.g. the weights of a layer during inference). Saves repacking it in
+ * every gemm call.
+ */
+template <typename T>
+class packed_matrix {
+ public:
+  ///< pack op(B), which is K x N, B stored row-major with row stride ldb
+  void pack(bool trans,
+            std::size_t K,
+            std::size_t N,
+            const T *B,
+            std::size_t ldb) {
+    const detail::kernel_table<T> &k = detail::kernels<T>();
+    rows_                            = K;
+    cols_                            = N;
+    stride_                          = (N + k.nr - 1) / k.nr * k.nr;
+    data_.resize(K * stride_);
+    for (std::size_t p0 = 0; p0 < K; p0 += k.kc) {
+      k.pack_b(trans, B, ldb, p0, std::min(k.kc, K - p0), 0, N,
+               &data_[p0 * stride_]);
     }
   }
+
+  void clear() {
+    rows_ = cols_ = stride_ = 0;
+    data_.clear();
+    data_.shrink_to_fit();
+  }
+
+  bool empty() const { return data_.empty(); }
+  std::size_t rows() const { return rows_; }
+  std::size_t cols() const { return cols_; }
+  std::size_t stride() const { return stride_; }
+  const T *data() const { return &data_[0]; }
+
+  ///< column ranges passed to gemm must start at a multiple of this
+  static std::size_t panel_width() { return detail::kernels<T>().nr; }
+
+ private:
+  std::size_t rows_   = 0;
+  std::size_t cols_   = 0;
+  std::size_t stride_ = 0;  // columns rounded up to whole panels
+  std::vector<T, tinydnn::aligned_allocator<T, 64>> data_;
+};
+
+/**
+ * C += op(A) * B[:, j0:j0 + N] with a packed B of K = B.rows() rows.
+ * op(A) is M x K and C is M x N, j0 must be a multiple of
+ * packed_matrix<T>::panel_width().
+ */
+template <typename T>
+void gemm(bool trans_a,
+          std::size_t M,
+          std::size_t N,
+          const T *A,
+          std::size_t lda,
+          const packed_matrix<T> &B,
+          std::size_t j0,
+          T *C,
+          std::size_t ldc) {
+  if (M == 0 || N == 0 || B.rows() == 0) return;
+  detail::kernels<T>().gemm_packed(trans_a, M, N, B.rows(), A, lda, B.data(),
+                                   B.stride(), j0, C, ldc);
 }
 
 template <typename T>
@@ -779,7 +1135,7 @@ MUST_INLINE void fill(T *dst, std::size_t size, T value) {
 #endif
 
 #else  // #if defined(_MSC_VER)
-  detail::fill(dst, size, value);
+  detail::kernels<T>().fill(dst, size, value);
 #endif
 };
 
@@ -0,0 +1,785 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+
+// The vectorize:: kernels, written against the register traits T
+// (scalar_generic, float_sse, float_avx, ...). product.h includes this file
+// once per instruction set, each time inside its own namespace and with the
+// matching target options, so there is deliberately no include guard.
+// Don't include it directly.
+
+// generic dot-product
+template <typename T, typename f1_aligned, typename f2_aligned>
+MUST_INLINE typename T::value_type dot_product(
+  const typename T::value_type *f1,
+  const typename T::value_type *f2,
+  std::size_t size) {
+  typename T::register_type r0 = T::zero();
+  typename T::register_type r1 = T::zero();
+  typename T::register_type r2 = T::zero();
+  typename T::register_type r3 = T::zero();
+  auto sz                      = T::unroll_size;
+  auto sz4                     = T::unroll_size * 4;
+  auto n4                      = size / sz4;
+  auto n1                      = (size % sz4) / sz;
+  auto remain                  = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    auto s10 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 0]);
+    auto s11 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 1]);
+    auto s12 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 2]);
+    auto s13 = T::template load<f1_aligned>(&f1[i * sz4 + sz * 3]);
+    auto s20 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 0]);
+    auto s21 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 1]);
+    auto s22 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 2]);
+    auto s23 = T::template load<f2_aligned>(&f2[i * sz4 + sz * 3]);
+    r0       = T::madd(s10, s20, r0);
+    r1       = T::madd(s11, s21, r1);
+    r2       = T::madd(s12, s22, r2);
+    r3       = T::madd(s13, s23, r3);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    auto s1 = T::template load<f1_aligned>(&f1[idx + i * sz]);
+    auto s2 = T::template load<f2_aligned>(&f2[idx + i * sz]);
+    r0      = T::madd(s1, s2, r0);
+  }
+  r0                         = T::add(r0, r1);
+  r2                         = T::add(r2, r3);
+  r0                         = T::add(r0, r2);
+  typename T::value_type sum = T::resemble(r0);
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    sum += f1[idx + i] * f2[idx + i];
+  }
+  return sum;
+}
+
+template <typename T, typename dst_aligned>
+MUST_INLINE void add(typename T::value_type c,
+                         std::size_t size,
+                         typename T::value_type *dst) {
+  typename T::register_type c2 = T::set1(c);
+  auto sz                      = T::unroll_size;
+  auto sz4                     = T::unroll_size * 4;
+  auto n4                      = size / sz4;
+  auto n1                      = (size % sz4) / sz;
+  auto remain                  = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
+    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
+    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
+    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
+    d0      = T::add(c2, d0);
+    d1      = T::add(c2, d1);
+    d2      = T::add(c2, d2);
+    d3      = T::add(c2, d3);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
+    d      = T::add(c2, d);
+    T::template store<dst_aligned>(&dst[idx + i * sz], d);
+  }
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    dst[idx + i] += c;
+  }
+}
+
+template <typename T, typename src_aligned, typename dst_aligned>
+MUST_INLINE void add(const typename T::value_type *src,
+                         std::size_t size,
+                         typename T::value_type *dst) {
+  auto sz     = T::unroll_size;
+  auto sz4    = T::unroll_size * 4;
+  auto n4     = size / sz4;
+  auto n1     = (size % sz4) / sz;
+  auto remain = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
+    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
+    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
+    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
+    auto s0 = T::template load<src_aligned>(&src[i * sz4 + sz * 0]);
+    auto s1 = T::template load<src_aligned>(&src[i * sz4 + sz * 1]);
+    auto s2 = T::template load<src_aligned>(&src[i * sz4 + sz * 2]);
+    auto s3 = T::template load<src_aligned>(&src[i * sz4 + sz * 3]);
+    d0      = T::add(s0, d0);
+    d1      = T::add(s1, d1);
+    d2      = T::add(s2, d2);
+    d3      = T::add(s3, d3);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
+    auto s = T::template load<src_aligned>(&src[idx + i * sz]);
+    d      = T::add(s, d);
+    T::template store<dst_aligned>(&dst[idx + i * sz], d);
+  }
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    dst[idx + i] += src[idx + i];
+  }
+}
+
+// TODO(beru): documentation
+/**
+ *
+ * @tparam T
+ * @tparam src_aligned
+ * @tparam dst_aligned
+ * @param src
+ * @param c
+ * @param size
+ * @param dst
+ */
+template <typename T, typename src_aligned, typename dst_aligned>
+MUST_INLINE void muladd(const typename T::value_type *src,
+                            typename T::value_type c,
+                            std::size_t size,
+                            typename T::value_type *dst) {
+  auto factor = T::set1(c);
+  auto sz     = T::unroll_size;
+  auto sz4    = T::unroll_size * 4;
+  auto n4     = size / sz4;
+  auto n1     = (size % sz4) / sz;
+  auto remain = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
+    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
+    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
+    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
+    auto s0 = T::template load<src_aligned>(&src[i * sz4 + sz * 0]);
+    auto s1 = T::template load<src_aligned>(&src[i * sz4 + sz * 1]);
+    auto s2 = T::template load<src_aligned>(&src[i * sz4 + sz * 2]);
+    auto s3 = T::template load<src_aligned>(&src[i * sz4 + sz * 3]);
+    d0      = T::madd(s0, factor, d0);
+    d1      = T::madd(s1, factor, d1);
+    d2      = T::madd(s2, factor, d2);
+    d3      = T::madd(s3, factor, d3);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
+    auto s = T::template load<src_aligned>(&src[idx + i * sz]);
+    d      = T::madd(s, factor, d);
+    T::template store<dst_aligned>(&dst[idx + i * sz], d);
+  }
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    dst[idx + i] += src[idx + i] * c;
+  }
+}
+
+template <typename T, typename src_aligned, typename dst_aligned>
+MUST_INLINE void reduce(const typename T::value_type *src,
+                            std::size_t size,
+                            typename T::value_type *dst) {
+  auto sz     = T::unroll_size;
+  auto sz4    = T::unroll_size * 4;
+  auto n4     = size / sz4;
+  auto n1     = (size % sz4) / sz;
+  auto remain = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    auto d0 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 0]);
+    auto d1 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 1]);
+    auto d2 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 2]);
+    auto d3 = T::template load<dst_aligned>(&dst[i * sz4 + sz * 3]);
+    auto s0 = T::template load<src_aligned>(&src[i * sz4 + sz * 0]);
+    auto s1 = T::template load<src_aligned>(&src[i * sz4 + sz * 1]);
+    auto s2 = T::template load<src_aligned>(&src[i * sz4 + sz * 2]);
+    auto s3 = T::template load<src_aligned>(&src[i * sz4 + sz * 3]);
+    d0      = T::add(s0, d0);
+    d1      = T::add(s1, d1);
+    d2      = T::add(s2, d2);
+    d3      = T::add(s3, d3);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], d0);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], d1);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], d2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], d3);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    auto d = T::template load<dst_aligned>(&dst[idx + i * sz]);
+    auto s = T::template load<src_aligned>(&src[idx + i * sz]);
+    d      = T::add(s, d);
+    T::template store<dst_aligned>(&dst[idx + i * sz], d);
+  }
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    dst[idx + i] += src[idx + i];
+  }
+}
+
+template <typename T, typename dst_aligned>
+MUST_INLINE void fill(typename T::value_type c,
+                      std::size_t size,
+                      typename T::value_type *dst) {
+  typename T::register_type c2 = T::set1(c);
+  auto sz                      = T::unroll_size;
+  auto sz4                     = T::unroll_size * 4;
+  auto n4                      = size / sz4;
+  auto n1                      = (size % sz4) / sz;
+  auto remain                  = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 0], c2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 1], c2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 2], c2);
+    T::template store<dst_aligned>(&dst[i * sz4 + sz * 3], c2);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    T::template store<dst_aligned>(&dst[idx + i * sz], c2);
+  }
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    dst[idx + i] = c;
+  }
+}
+
+// sum(src[i])
+template <typename T, typename src_aligned>
+MUST_INLINE typename T::value_type sum(const typename T::value_type *src,
+                                       std::size_t size) {
+  typename T::register_type r0 = T::zero();
+  typename T::register_type r1 = T::zero();
+  typename T::register_type r2 = T::zero();
+  typename T::register_type r3 = T::zero();
+  auto sz                      = T::unroll_size;
+  auto sz4                     = T::unroll_size * 4;
+  auto n4                      = size / sz4;
+  auto n1                      = (size % sz4) / sz;
+  auto remain                  = size % sz;
+  for (size_t i = 0; i < n4; ++i) {
+    r0 = T::add(T::template load<src_aligned>(&src[i * sz4 + sz * 0]), r0);
+    r1 = T::add(T::template load<src_aligned>(&src[i * sz4 + sz * 1]), r1);
+    r2 = T::add(T::template load<src_aligned>(&src[i * sz4 + sz * 2]), r2);
+    r3 = T::add(T::template load<src_aligned>(&src[i * sz4 + sz * 3]), r3);
+  }
+  size_t idx = n4 * sz4;
+  for (size_t i = 0; i < n1; ++i) {
+    r0 = T::add(T::template load<src_aligned>(&src[idx + i * sz]), r0);
+  }
+  r0                         = T::add(r0, r1);
+  r2                         = T::add(r2, r3);
+  r0                         = T::add(r0, r2);
+  typename T::value_type acc = T::resemble(r0);
+  idx += n1 * sz;
+  for (size_t i = 0; i < remain; ++i) {
+    acc += src[idx + i];
+  }
+  return acc;
+}
+
+// exp(x). x = n ln2 + r with |r| <= ln2 / 2, and exp(r) is a Taylor
+// polynomial of degree 7 (float) or 11 (double): the relative error is
+// within a few ulp. Results beyond the largest number are +inf, those
+// below the smallest subnormal 0, and NaN stays NaN.
+template <typename T>
+MUST_INLINE typename T::register_type exp_register(
+  const typename T::register_type &x) {
+  typedef typename T::register_type register_type;
+  const bool single = sizeof(typename T::value_type) == 4;
+
+  // just beyond the overflow and underflow thresholds, NaN becomes a bound
+  register_type xc = T::minimum(x, T::set1(single ? 89.0 : 710.0));
+  xc               = T::maximum(xc, T::set1(single ? -104.0 : -746.0));
+
+  // ln2 split in a part exact for any n and the remainder (Cody-Waite)
+  register_type n = T::round(T::mul(xc, T::set1(1.44269504088896341)));
+  register_type r = T::sub(xc, T::mul(n, T::set1(0.693145751953125)));
+  r               = T::sub(r, T::mul(n, T::set1(1.42860682030941723e-6)));
+
+  // 1 / k!, k = 11 ... 0
+  static const double c[] = {
+    2.50521083854417188e-8, 2.75573192239858907e-7, 2.75573192239858907e-6,
+    2.48015873015873016e-5, 1.98412698412698413e-4, 1.38888888888888889e-3,
+    8.33333333333333333e-3, 4.16666666666666667e-2, 1.66666666666666667e-1,
+    0.5,                    1.0,                    1.0};
+  const int first = single ? 4 : 0;  // degree 7 or 11
+  register_type p = T::set1(c[first]);
+  for (int i = first + 1; i < 12; i++) p = T::madd(p, r, T::set1(c[i]));
+
+  // 2^n as 2^h 2^(n - h): both factors are normal numbers, the product
+  // overflows to +inf or rounds to a subnormal or 0
+  register_type h = T::round(T::mul(n, T::set1(0.5)));
+  register_type e = T::mul(T::mul(p, T::pow2n(h)), T::pow2n(T::sub(n, h)));
+
+  // minimum and maximum return the second operand if one is NaN, so this
+  // is NaN for a NaN x and e otherwise (min(0, x) <= 0 <= e)
+  return T::maximum(e, T::minimum(T::zero(), x));
+}
+
+// 1 / (1 + exp(-x))
+template <typename T>
+MUST_INLINE typename T::register_type sigmoid_register(
+  const typename T::register_type &x) {
+  const typename T::register_type one = T::set1(1);
+  return T::div(one, T::add(one, exp_register<T>(T::sub(T::zero(), x))));
+}
+
+// 1 - 2 / (exp(2x) + 1), absolute error within a few ulp of 1
+template <typename T>
+MUST_INLINE typename T::register_type tanh_register(
+  const typename T::register_type &x) {
+  const typename T::register_type one = T::set1(1);
+  const typename T::register_type e2x = exp_register<T>(T::add(x, x));
+  return T::sub(one, T::div(T::set1(2), T::add(e2x, one)));
+}
+
+// log(1 + exp(x)) = max(x, 0) + log1p(u), u = exp(-|x|) in (0, 1]. with
+// s = u / (2 + u) <= 1/3, log1p(u) = 2 atanh(s) = 2 (s + s^3/3 + s^5/5 ...)
+template <typename T>
+MUST_INLINE typename T::register_type softplus_register(
+  const typename T::register_type &x) {
+  typedef typename T::register_type register_type;
+  const bool single = sizeof(typename T::value_type) == 4;
+
+  register_type u  = exp_register<T>(T::minimum(x, T::sub(T::zero(), x)));
+  register_type s  = T::div(u, T::add(T::set1(2), u));
+  register_type s2 = T::mul(s, s);
+
+  // 1 / (2k + 1), k = 16 ... 0
+  static const double c[] = {1.0 / 33, 1.0 / 31, 1.0 / 29, 1.0 / 27, 1.0 / 25,
+                             1.0 / 23, 1.0 / 21, 1.0 / 19, 1.0 / 17, 1.0 / 15,
+                             1.0 / 13, 1.0 / 11, 1.0 / 9,  1.0 / 7,  1.0 / 5,
+                             1.0 / 3,  1.0};
+  const int first = single ? 9 : 0;  // 8 or 17 terms
+  register_type p = T::set1(c[first]);
+  for (int i = first + 1; i < 17; i++) p = T::madd(p, s2, T::set1(c[i]));
+  register_type log1p_u = T::mul(T::add(s, s), p);
+  return T::add(T::maximum(x, T::zero()), log1p_u);
+}
+
+template <typename T>
+struct exp_op {
+  static MUST_INLINE typename T::register_type apply(
+    const typename T::register_type &x) {
+    return exp_register<T>(x);
+  }
+};
+
+template <typename T>
+struct sigmoid_op {
+  static MUST_INLINE typename T::register_type apply(
+    const typename T::register_type &x) {
+    return sigmoid_register<T>(x);
+  }
+};
+
+template <typename T>
+struct tanh_op {
+  static MUST_INLINE typename T::register_type apply(
+    const typename T::register_type &x) {
+    return tanh_register<T>(x);
+  }
+};
+
+template <typename T>
+struct softplus_op {
+  static MUST_INLINE typename T::register_type apply(
+    const typename T::register_type &x) {
+    return softplus_register<T>(x);
+  }
+};
+
+// dst[i] = Op(src[i]). the tail goes through a padded register too, so
+// every element sees the same approximation. src may be dst
+template <typename T, typename Op>
+void transform(const typename T::value_type *src,
+               std::size_t size,
+               typename T::value_type *dst) {
+  typedef typename T::value_type value_type;
+  const size_t sz = T::unroll_size;
+  const size_t n  = size / sz * sz;
+  for (size_t i = 0; i < n; i += sz) {
+    T::template store<std::false_type>(
+      &dst[i], Op::apply(T::template load<std::false_type>(&src[i])));
+  }
+  if (n < size) {
+    alignas(64) value_type buf[T::unroll_size] = {};
+    std::copy(src + n, src + size, buf);
+    T::template store<std::true_type>(
+      buf, Op::apply(T::template load<std::true_type>(buf)));
+    std::copy(buf, buf + (size - n), dst + n);
+  }
+}
+
+// block sizes of gemm. a packed kc x nc panel of B stays in L2, a mc x kc
+// panel of A in L1, and the mr x nr block of C in registers
+template <typename T>
+struct gemm_blocking {
+  enum {
+    mr = 4,
+    nr = T::unroll_size * 2,
+    mc = 64,
+    kc = 256,
+    nc = 2048
+  };
+};
+
+// copy op(A)[i0:i0+m, p0:p0+k] into panels of mr rows, padded with zeros.
+// panel r holds element (i, p) at [r * k * mr + p * mr + i % mr]
+template <typename T>
+void gemm_pack_a(bool trans,
+                 const typename T::value_type *A,
+                 size_t lda,
+                 size_t i0,
+                 size_t m,
+                 size_t p0,
+                 size_t k,
+                 typename T::value_type *dst) {
+  const size_t mr = gemm_blocking<T>::mr;
+  for (size_t ir = 0; ir < m; ir += mr) {
+    for (size_t p = 0; p < k; p++) {
+      for (size_t i = ir; i < ir + mr; i++) {
+        *dst++ = i >= m ? 0
+                        : trans ? A[(p0 + p) * lda + i0 + i]
+                                : A[(i0 + i) * lda + p0 + p];
+      }
+    }
+  }
+}
+
+// copy op(B)[p0:p0+k, j0:j0+n] into panels of nr columns, padded with zeros
+template <typename T>
+void gemm_pack_b(bool trans,
+                 const typename T::value_type *B,
+                 size_t ldb,
+                 size_t p0,
+                 size_t k,
+                 size_t j0,
+                 size_t n,
+                 typename T::value_type *dst) {
+  const size_t nr = gemm_blocking<T>::nr;
+  for (size_t jr = 0; jr < n; jr += nr) {
+    for (size_t p = 0; p < k; p++) {
+      if (!trans && jr + nr <= n) {
+        const typename T::value_type *src = &B[(p0 + p) * ldb + j0 + jr];
+        std::copy(src, src + nr, dst);
+        dst += nr;
+        continue;
+      }
+      for (size_t j = jr; j < jr + nr; j++) {
+        *dst++ = j >= n ? 0
+                        : trans ? B[(j0 + j) * ldb + p0 + p]
+                                : B[(p0 + p) * ldb + j0 + j];
+      }
+    }
+  }
+}
+
+// C[0:m, 0:n] += a * b for one panel of packed A (mr rows) and packed B
+// (nr columns), m <= mr and n <= nr
+template <typename T>
+MUST_INLINE void gemm_micro_kernel(size_t k,
+                                   const typename T::value_type *a,
+                                   const typename T::value_type *b,
+                                   typename T::value_type *c,
+                                   size_t ldc,
+                                   size_t m,
+                                   size_t n) {
+  typedef typename T::register_type register_type;
+  const size_t sz = T::unroll_size;
+  const size_t nr = gemm_blocking<T>::nr;
+
+  register_type c00 = T::zero(), c01 = T::zero();
+  register_type c10 = T::zero(), c11 = T::zero();
+  register_type c20 = T::zero(), c21 = T::zero();
+  register_type c30 = T::zero(), c31 = T::zero();
+  for (size_t p = 0; p < k; p++) {
+    register_type b0 = T::template load<std::true_type>(b);
+    register_type b1 = T::template load<std::true_type>(b + sz);
+    register_type a0 = T::set1(a[0]);
+    register_type a1 = T::set1(a[1]);
+    c00              = T::madd(a0, b0, c00);
+    c01              = T::madd(a0, b1, c01);
+    c10              = T::madd(a1, b0, c10);
+    c11              = T::madd(a1, b1, c11);
+    a0               = T::set1(a[2]);
+    a1               = T::set1(a[3]);
+    c20              = T::madd(a0, b0, c20);
+    c21              = T::madd(a0, b1, c21);
+    c30              = T::madd(a1, b0, c30);
+    c31              = T::madd(a1, b1, c31);
+    a += gemm_blocking<T>::mr;
+    b += nr;
+  }
+
+  alignas(64) typename T::value_type tmp[gemm_blocking<T>::mr * nr];
+  T::template store<std::true_type>(tmp + 0 * nr, c00);
+  T::template store<std::true_type>(tmp + 0 * nr + sz, c01);
+  T::template store<std::true_type>(tmp + 1 * nr, c10);
+  T::template store<std::true_type>(tmp + 1 * nr + sz, c11);
+  T::template store<std::true_type>(tmp + 2 * nr, c20);
+  T::template store<std::true_type>(tmp + 2 * nr + sz, c21);
+  T::template store<std::true_type>(tmp + 3 * nr, c30);
+  T::template store<std::true_type>(tmp + 3 * nr + sz, c31);
+  for (size_t i = 0; i < m; i++) {
+    for (size_t j = 0; j < n; j++) {
+      c[i * ldc + j] += tmp[i * nr + j];
+    }
+  }
+}
+
+// C[M x N] += op(A)[M x K] * B[K x N], all matrices row-major. B is read
+// through packed_b(p0, k, j0, n), which returns rows [p0, p0 + k) and
+// columns [j0, j0 + n) of B packed by gemm_pack_b
+template <typename T, typename PackedB>
+void gemm_blocked(bool trans_a,
+                  size_t M,
+                  size_t N,
+                  size_t K,
+                  const typename T::value_type *A,
+                  size_t lda,
+                  PackedB packed_b,
+                  typename T::value_type *C,
+                  size_t ldc) {
+  typedef typename T::value_type value_type;
+  typedef gemm_blocking<T> blk;
+  typedef std::vector<value_type, tinydnn::aligned_allocator<value_type, 64>>
+    buffer;
+
+  // the packing buffer is reused by later calls from the same thread
+  thread_local buffer packed_a;
+  packed_a.resize(size_t(blk::mc) * blk::kc);
+
+  for (size_t j0 = 0; j0 < N; j0 += blk::nc) {
+    const size_t n = std::min<size_t>(blk::nc, N - j0);
+    for (size_t p0 = 0; p0 < K; p0 += blk::kc) {
+      const size_t k      = std::min<size_t>(blk::kc, K - p0);
+      const value_type *b = packed_b(p0, k, j0, n);
+
+      for (size_t i0 = 0; i0 < M; i0 += blk::mc) {
+        const size_t m = std::min<size_t>(blk::mc, M - i0);
+        gemm_pack_a<T>(trans_a, A, lda, i0, m, p0, k, &packed_a[0]);
+
+        for (size_t jr = 0; jr < n; jr += blk::nr) {
+          for (size_t ir = 0; ir < m; ir += blk::mr) {
+            gemm_micro_kernel<T>(
+              k, &packed_a[ir * k], &b[jr * k], &C[(i0 + ir) * ldc + j0 + jr],
+              ldc, std::min<size_t>(blk::mr, m - ir),
+              std::min<size_t>(blk::nr, n - jr));
+          }
+        }
+      }
+    }
+  }
+}
+
+// C[M x N] += op(A)[M x K] * op(B)[K x N], all matrices row-major
+template <typename T>
+void gemm(bool trans_a,
+          bool trans_b,
+          size_t M,
+          size_t N,
+          size_t K,
+          const typename T::value_type *A,
+          size_t lda,
+          const typename T::value_type *B,
+          size_t ldb,
+          typename T::value_type *C,
+          size_t ldc) {
+  typedef typename T::value_type value_type;
+  typedef gemm_blocking<T> blk;
+  typedef std::vector<value_type, tinydnn::aligned_allocator<value_type, 64>>
+    buffer;
+
+  thread_local buffer packed_b;
+  packed_b.resize(size_t(blk::kc) * (blk::nc + blk::nr));
+
+  gemm_blocked<T>(trans_a, M, N, K, A, lda,
+                  [&](size_t p0, size_t k, size_t j0, size_t n) {
+                    gemm_pack_b<T>(trans_b, B, ldb, p0, k, j0, n,
+                                   &packed_b[0]);
+                    return &packed_b[0];
+                  },
+                  C, ldc);
+}
+
+
+// entry points of the kernel table, the alignment of the arguments is
+// checked at run time
+
+template <typename T>
+typename T::value_type dot(const typename T::value_type *s1,
+                           const typename T::value_type *s2,
+                           std::size_t size) {
+  typedef typename T::value_type value_type;
+  const bool s1_aligned = T::is_aligned(const_cast<value_type *>(s1));
+  const bool s2_aligned = T::is_aligned(const_cast<value_type *>(s2));
+  if (s1_aligned) {
+    if (s2_aligned) {
+      return dot_product<T, std::true_type, std::true_type>(s1, s2, size);
+    } else {
+      return dot_product<T, std::true_type, std::false_type>(s1, s2, size);
+    }
+  } else {
+    if (s2_aligned) {
+      return dot_product<T, std::false_type, std::true_type>(s1, s2, size);
+    } else {
+      return dot_product<T, std::false_type, std::false_type>(s1, s2, size);
+    }
+  }
+}
+
+template <typename T>
+void add_scalar(typename T::value_type c,
+                std::size_t size,
+                typename T::value_type *dst) {
+  if (T::is_aligned(dst)) {
+    add<T, std::true_type>(c, size, dst);
+  } else {
+    add<T, std::false_type>(c, size, dst);
+  }
+}
+
+template <typename T>
+void add_vector(const typename T::value_type *src,
+                std::size_t size,
+                typename T::value_type *dst) {
+  typedef typename T::value_type value_type;
+  const bool src_aligned = T::is_aligned(const_cast<value_type *>(src));
+  const bool dst_aligned = T::is_aligned(dst);
+  if (src_aligned) {
+    if (dst_aligned) {
+      add<T, std::true_type, std::true_type>(src, size, dst);
+    } else {
+      add<T, std::true_type, std::false_type>(src, size, dst);
+    }
+  } else {
+    if (dst_aligned) {
+      add<T, std::false_type, std::true_type>(src, size, dst);
+    } else {
+      add<T, std::false_type, std::false_type>(src, size, dst);
+    }
+  }
+}
+
+template <typename T>
+void muladd_vector(const typename T::value_type *src,
+                   typename T::value_type c,
+                   std::size_t size,
+                   typename T::value_type *dst) {
+  typedef typename T::value_type value_type;
+  const bool src_aligned = T::is_aligned(const_cast<value_type *>(src));
+  const bool dst_aligned = T::is_aligned(dst);
+  if (src_aligned) {
+    if (dst_aligned) {
+      muladd<T, std::true_type, std::true_type>(src, c, size, dst);
+    } else {
+      muladd<T, std::true_type, std::false_type>(src, c, size, dst);
+    }
+  } else {
+    if (dst_aligned) {
+      muladd<T, std::false_type, std::true_type>(src, c, size, dst);
+    } else {
+      muladd<T, std::false_type, std::false_type>(src, c, size, dst);
+    }
+  }
+}
+
+template <typename T>
+void reduce_vector(const typename T::value_type *src,
+                   std::size_t size,
+                   typename T::value_type *dst) {
+  typedef typename T::value_type value_type;
+  const bool src_aligned = T::is_aligned(const_cast<value_type *>(src));
+  const bool dst_aligned = T::is_aligned(dst);
+  if (src_aligned) {
+    if (dst_aligned) {
+      reduce<T, std::true_type, std::true_type>(src, size, dst);
+    } else {
+      reduce<T, std::true_type, std::false_type>(src, size, dst);
+    }
+  } else {
+    if (dst_aligned) {
+      reduce<T, std::false_type, std::true_type>(src, size, dst);
+    } else {
+      reduce<T, std::false_type, std::false_type>(src, size, dst);
+    }
+  }
+}
+
+template <typename T>
+void fill_vector(typename T::value_type *dst,
+                 std::size_t size,
+                 typename T::value_type value) {
+  if (T::is_aligned(dst)) {
+    fill<T, std::true_type>(value, size, dst);
+  } else {
+    fill<T, std::false_type>(value, size, dst);
+  }
+}
+
+template <typename T>
+typename T::value_type sum_vector(const typename T::value_type *src,
+                                  std::size_t size) {
+  typedef typename T::value_type value_type;
+  if (T::is_aligned(const_cast<value_type *>(src))) {
+    return sum<T, std::true_type>(src, size);
+  } else {
+    return sum<T, std::false_type>(src, size);
+  }
+}
+
+// C[M x N] += op(A)[M x K] * B[:, j0:j0 + N], B packed by gemm_pack_b in
+// slabs of kc rows, stride columns (rounded up to whole panels) per row
+template <typename T>
+void gemm_packed(bool trans_a,
+                 std::size_t M,
+                 std::size_t N,
+                 std::size_t K,
+                 const typename T::value_type *A,
+                 std::size_t lda,
+                 const typename T::value_type *packed,
+                 std::size_t stride,
+                 std::size_t j0,
+                 typename T::value_type *C,
+                 std::size_t ldc) {
+  const std::size_t kc = gemm_blocking<T>::kc;
+  gemm_blocked<T>(
+    trans_a, M, N, K, A, lda,
+    [&](std::size_t p0, std::size_t k, std::size_t j, std::size_t) {
+      return packed + p0 * stride + (j0 + j) * std::min(kc, k);
+    },
+    C, ldc);
+}
+
+template <typename T>
+kernel_table<typename T::value_type> make_kernel_table() {
+  kernel_table<typename T::value_type> table;
+  table.dot         = &dot<T>;
+  table.add_scalar  = &add_scalar<T>;
+  table.add         = &add_vector<T>;
+  table.muladd      = &muladd_vector<T>;
+  table.reduce      = &reduce_vector<T>;
+  table.fill        = &fill_vector<T>;
+  table.sum         = &sum_vector<T>;
+  table.exp         = &transform<T, exp_op<T>>;
+  table.sigmoid     = &transform<T, sigmoid_op<T>>;
+  table.tanh        = &transform<T, tanh_op<T>>;
+  table.softplus    = &transform<T, softplus_op<T>>;
+  table.gemm        = &gemm<T>;
+  table.pack_b      = &gemm_pack_b<T>;
+  table.gemm_packed = &gemm_packed<T>;
+  table.nr          = gemm_blocking<T>::nr;
+  table.kc          = gemm_blocking<T>::kc;
+  return table;
+}
@@ -0,0 +1,159 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <chrono>              // NOLINT
+#include <condition_variable>  // NOLINT
+#include <cstddef>
+#include <deque>
+#include <exception>
+#include <functional>
+#include <future>  // NOLINT
+#include <mutex>   // NOLINT
+#include <thread>  // NOLINT
+#include <utility>
+#include <vector>
+
+#include "tinydnn/utils/types.h"
+
+namespace tinydnn {
+
+/**
+ * coalesces single-sample requests from concurrent callers into batches.
+ *
+ * Requests are queued and handed to a worker thread, which waits until
+ * max_batch_size requests are pending or the oldest one has waited for
+ * max_wait, and then runs the batch function once for all of them. The
+ * outputs are passed back through the future of each request.
+ *
+ *     request_batcher batcher(
+ *       [&](const std::vector<tensor_t> &in) { return net.fprop(in); },
+ *       32, std::chrono::microseconds(500));
+ *     vec_t out = batcher.predict(in);  // blocks until the batch is done
+ *
+ * The batch function takes one tensor_t (with a single channel) per sample
+ * and returns the outputs in the same order. It is only called from the
+ * worker thread.
+ **/
+class request_batcher {
+ public:
+  typedef std::function<std::vector<tensor_t>(const std::vector<tensor_t> &)>
+    batch_fn;
+  typedef std::chrono::steady_clock clock;
+
+  request_batcher(batch_fn fn,
+                  size_t max_batch_size,
+                  std::chrono::microseconds max_wait)
+    : fn_(std::move(fn)),
+      max_batch_size_(std::max<size_t>(max_batch_size, 1)),
+      max_wait_(max_wait),
+      stop_(false) {
+    worker_ = std::thread([this]() { run(); });
+  }
+
+  /**
+   * finishes the pending requests and stops the worker
+   **/
+  ~request_batcher() {
+    {
+      std::lock_guard<std::mutex> lock(mtx_);
+      stop_ = true;
+    }
+    cv_.notify_all();
+    worker_.join();
+  }
+
+  request_batcher(const request_batcher &) = delete;
+  request_batcher &operator=(const request_batcher &) = delete;
+
+  /**
+   * queue one sample, the future holds its output once its batch ran
+   **/
+  std::future<vec_t> submit(const vec_t &in) {
+    request r;
+    r.in                      = in;
+    r.arrival                 = clock::now();
+    std::future<vec_t> result = r.out.get_future();
+    {
+      std::lock_guard<std::mutex> lock(mtx_);
+      queue_.push_back(std::move(r));
+    }
+    cv_.notify_all();
+    return result;
+  }
+
+  ///< queue one sample and wait for its output
+  vec_t predict(const vec_t &in) { return submit(in).get(); }
+
+  size_t max_batch_size() const { return max_batch_size_; }
+
+  std::chrono::microseconds max_wait() const { return max_wait_; }
+
+ private:
+  struct request {
+    vec_t in;
+    clock::time_point arrival;
+    std::promise<vec_t> out;
+  };
+
+  void run() {
+    std::unique_lock<std::mutex> lock(mtx_);
+    for (;;) {
+      cv_.wait(lock, [this]() { return stop_ || !queue_.empty(); });
+      if (queue_.empty()) break;  // stopped and drained
+
+      // give other callers the chance to join the batch
+      cv_.wait_until(lock, queue_.front().arrival + max_wait_, [this]() {
+        return stop_ || queue_.size() >= max_batch_size_;
+      });
+
+      size_t n = std::min(queue_.size(), max_batch_size_);
+      std::vector<request> batch;
+      batch.reserve(n);
+      for (size_t i = 0; i < n; i++) {
+        batch.push_back(std::move(queue_.front()));
+        queue_.pop_front();
+      }
+
+      lock.unlock();
+      run_batch(&batch);
+      lock.lock();
+    }
+  }
+
+  void run_batch(std::vector<request> *batch) {
+    std::vector<tensor_t> in(batch->size());
+    for (size_t i = 0; i < batch->size(); i++) {
+      in[i].push_back(std::move((*batch)[i].in));
+    }
+
+    std::vector<tensor_t> out;
+    try {
+      out = fn_(in);
+    } catch (...) {
+      for (auto &r : *batch) r.out.set_exception(std::current_exception());
+      return;
+    }
+    for (size_t i = 0; i < batch->size(); i++) {
+      (*batch)[i].out.set_value(std::move(out[i][0]));
+    }
+  }
+
+  batch_fn fn_;
+  size_t max_batch_size_;
+  std::chrono::microseconds max_wait_;
+
+  std::mutex mtx_;
+  std::condition_variable cv_;
+  std::deque<request> queue_;
+  bool stop_;
+  std::thread worker_;
+};
+
+}  // namespace tinydnn
@@ -0,0 +1,283 @@
+/*
+    Copyright (c) 2013, Taiga Nomi and the respective contributors
+    All rights reserved.
+
+    Use of this source code is governed by a BSD-style license that can be found
+    in the LICENSE file.
+*/
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <cassert>
+#include <condition_variable>  // NOLINT
+#include <cstddef>
+#include <deque>
+#include <exception>
+#include <functional>
+#include <memory>
+#include <mutex>  // NOLINT
+#include <thread>  // NOLINT
+#include <utility>
+#include <vector>
+
+namespace tinydnn {
+
+/**
+ * process-wide pool of persistent worker threads.
+ *
+ * Each worker owns a task deque. A worker pops tasks from the back of its own
+ * deque and, when it runs dry, steals from the front of the other deques.
+ * The thread that submits a batch of tasks also executes tasks of that batch
+ * while it waits, so nested parallel loops never block the pool. It never
+ * picks up tasks of other batches: a task waiting for its inner loop is not
+ * re-entered on the same thread, so per-thread buffers of the outer task are
+ * left alone.
+ *
+ *     // run f(0), f(1), ..., f(n - 1) and wait until all of them are done
+ *     thread_pool::instance().run(n, [&](size_t i) { f(i); });
+ *
+ * The default number of workers is hardware_concurrency() - 1 because the
+ * calling thread takes part in the computation. Use set_num_threads() to
+ * change it.
+ **/
+class thread_pool {
+ public:
+  typedef std::function<void()> task_t;
+
+  explicit thread_pool(size_t num_workers = default_num_workers())
+    : stop_(false), queued_(0), next_queue_(0) {
+    start(num_workers);
+  }
+
+  ~thread_pool() { stop(); }
+
+  thread_pool(const thread_pool &) = delete;
+  thread_pool &operator=(const thread_pool &) = delete;
+
+  /**
+   * the pool shared by parallel_for, for_ and for_i
+   **/
+  static thread_pool &instance() {
+    static thread_pool pool;
+    return pool;
+  }
+
+  static size_t default_num_workers() {
+    size_t n = std::thread::hardware_concurrency();
+    return n > 1 ? n - 1 : 0;
+  }
+
+  ///< number of worker threads (not counting the calling thread)
+  size_t size() const { return workers_.size(); }
+
+  ///< number of threads which execute tasks of a batch
+  size_t concurrency() const { return workers_.size() + 1; }
+
+  /**
+   * restart the pool with a different number of workers.
+   * must not be called while a batch is running.
+   **/
+  void resize(size_t num_workers) {
+    if (num_workers == workers_.size()) return;
+    stop();
+    start(num_workers);
+  }
+
+  /**
+   * execute f(0) ... f(num_tasks - 1) on the pool and block until all tasks
+   * are finished. The first exception thrown by a task is re-thrown here.
+   **/
+  template <typename Func>
+  void run(size_t num_tasks, const Func &f) {
+    if (num_tasks == 0) return;
+    if (num_tasks == 1 || workers_.empty()) {
+      for (size_t i = 0; i < num_tasks; i++) f(i);
+      return;
+    }
+
+    // the pushed helpers and the calling thread claim the tasks one by one.
+    // A helper which starts after all tasks are claimed finds nothing to do
+    // and never touches f, so it may outlive this call.
+    auto b = std::make_shared<batch>(
+      num_tasks, std::function<void(size_t)>([&f](size_t i) { f(i); }));
+    const size_t helpers = std::min(num_tasks - 1, workers_.size());
+    for (size_t i = 0; i < helpers; i++) {
+      push([b]() { b->work(); });
+    }
+
+    b->work();
+    while (b->done.load(std::memory_order_acquire) < num_tasks) {
+      std::this_thread::yield();
+    }
+
+    if (b->error) std::rethrow_exception(b->error);
+  }
+
+ private:
+  struct task_queue {
+    std::mutex mtx;
+    std::deque<task_t> tasks;
+  };
+
+  struct batch {
+    batch(size_t n, std::function<void(size_t)> f)
+      : size(n), body(std::move(f)), next(0), done(0) {}
+
+    // run unclaimed tasks until there are none left
+    void work() {
+      for (;;) {
+        const size_t i = next.fetch_add(1, std::memory_order_relaxed);
+        if (i >= size) return;
+        try {
+          body(i);
+        } catch (...) {
+          set_exception(std::current_exception());
+        }
+        done.fetch_add(1, std::memory_order_acq_rel);
+      }
+    }
+
+    void set_exception(std::exception_ptr e) {
+      std::lock_guard<std::mutex> lock(mtx);
+      if (!error) error = e;
+    }
+
+    const size_t size;
+    std::function<void(size_t)> body;
+    std::atomic<size_t> next;
+    std::atomic<size_t> done;
+    std::mutex mtx;
+    std::exception_ptr error;
+  };
+
+  enum : size_t { npos = static_cast<size_t>(-1) };
+
+  // index of the worker running on this thread, or npos
+  size_t worker_index() const {
+    const tls_slot &slot = current_slot();
+    return slot.pool == this ? slot.index : npos;
+  }
+
+  struct tls_slot {
+    const thread_pool *pool = nullptr;
+    size_t index            = npos;
+  };
+
+  static tls_slot &current_slot() {
+    static thread_local tls_slot slot;
+    return slot;
+  }
+
+  void start(size_t num_workers) {
+    stop_ = false;
+    queues_.clear();
+    for (size_t i = 0; i < num_workers; i++) {
+      queues_.emplace_back(new task_queue());
+    }
+    for (size_t i = 0; i < num_workers; i++) {
+      workers_.emplace_back([this, i]() { worker_loop(i); });
+    }
+  }
+
+  void stop() {
+    {
+      std::lock_guard<std::mutex> lock(sleep_mtx_);
+      stop_ = true;
+    }
+    sleep_cv_.notify_all();
+    for (auto &w : workers_) w.join();
+    workers_.clear();
+  }
+
+  void push(task_t task) {
+    size_t self = worker_index();
+    size_t q    = self != npos
+                 ? self
+                 : next_queue_.fetch_add(1, std::memory_order_relaxed) %
+                     queues_.size();
+    {
+      std::lock_guard<std::mutex> lock(queues_[q]->mtx);
+      queues_[q]->tasks.push_back(std::move(task));
+    }
+    queued_.fetch_add(1, std::memory_order_release);
+    {
+      // take the lock so a worker can't miss the notification between
+      // checking queued_ and going to sleep
+      std::lock_guard<std::mutex> lock(sleep_mtx_);
+    }
+    sleep_cv_.notify_one();
+  }
+
+  bool pop(size_t q, bool from_back, task_t *task) {
+    std::lock_guard<std::mutex> lock(queues_[q]->mtx);
+    auto &tasks = queues_[q]->tasks;
+    if (tasks.empty()) return false;
+    if (from_back) {
+      *task = std::move(tasks.back());
+      tasks.pop_back();
+    } else {
+      *task = std::move(tasks.front());
+      tasks.pop_front();
+    }
+    queued_.fetch_sub(1, std::memory_order_acq_rel);
+    return true;
+  }
+
+  // run one pending task: own deque first (LIFO), then steal (FIFO)
+  bool try_run_one() {
+    const size_t n    = queues_.size();
+    const size_t self = worker_index();
+    task_t task;
+
+    bool found = self != npos && pop(self, true, &task);
+    for (size_t k = 1; !found && k <= n; k++) {
+      size_t victim = ((self != npos ? self : 0) + k) % n;
+      found         = pop(victim, false, &task);
+    }
+    if (!found) return false;
+
+    task();
+    return true;
+  }
+
+  void worker_loop(size_t index) {
+    current_slot().pool  = this;
+    current_slot().index = index;
+
+    for (;;) {
+      if (try_run_one()) continue;
+
+      std::unique_lock<std::mutex> lock(sleep_mtx_);
+      sleep_cv_.wait(lock, [this]() {
+        return stop_ || queued_.load(std::memory_order_acquire) > 0;
+      });
+      if (stop_) break;
+    }
+  }
+
+  std::vector<std::unique_ptr<task_queue>> queues_;
+  std::vector<std::thread> workers_;
+
+  std::mutex sleep_mtx_;
+  std::condition_variable sleep_cv_;
+  bool stop_;
+
+  std::atomic<size_t> queued_;
+  std::atomic<size_t> next_queue_;
+};
+
+/**
+ * set the number of threads used by parallel_for, for_ and for_i
+ * (including the calling thread). 0 restores the default.
+ **/
+inline void set_num_threads(size_t num_threads) {
+  size_t workers = num_threads == 0 ? thread_pool::default_num_workers()
+                                    : num_threads - 1;
+  thread_pool::instance().resize(workers);
+}
+
+///< number of threads used by parallel_for, for_ and for_i
+inline size_t num_threads() { return thread_pool::instance().concurrency(); }
+
+}  // namespace tinydnn
@@ -12,12 +12,15 @@
 #include "tinydnn/utils/logging.h"
 #include "tinydnn/utils/index3d.h"
 #include "tinydnn/utils/parallel_for.h"
+#include "tinydnn/utils/thread_pool.h"
+#include "tinydnn/utils/request_batcher.h"
 #include "tinydnn/utils/product.h"
 #include "tinydnn/utils/random.h"
 #include "tinydnn/utils/nms.h"
 #include "tinydnn/utils/math_functions.h"
 #include "tinydnn/utils/miscellaneous.h"
 #include "tinydnn/utils/tensor_utils.h"
+#include "tinydnn/core/batch_tensor.h"
 #include "tinydnn/utils/target_cost.h"
 #include "tinydnn/utils/weight_init.h"
 